@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark parsing & writing large manifests.
+
+For every size, a manifest is written the way big trees lay them out: a
+default.xml that includes a file per group of projects, and a local manifest
+that adds & removes a few.  Then these are timed (taking the best of --runs):
+
+  parse    Loading the manifest (XmlManifest.Load)
+  ToXml    Turning it back into an XML document
+  ToDict   Turning it into a dict (e.g. for `repo manifest --format=json`)
+
+The peak memory Python allocated for each is measured in a separate run, as
+tracemalloc slows everything down.  The results are written & compared the same
+way as run.py.
+
+Examples:
+  ./benchmarks/manifest.py --projects 1000 10000 -o new.json
+  ./benchmarks/manifest.py --baseline old.json
+"""
+
+import argparse
+import gc
+import json
+from pathlib import Path
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+import run
+
+
+THIS_FILE = Path(__file__).resolve()
+TOPDIR = THIS_FILE.parent.parent
+
+# Load repo local modules.
+sys.path.insert(0, str(TOPDIR))
+import manifest_xml
+
+
+# The metrics of a benchmark that are compared against a baseline.
+METRICS = ("wall", "cpu", "peak_alloc_kb")
+
+# How many projects each included file has.
+_PROJECTS_PER_INCLUDE = 500
+
+
+def _ProjectXml(i: int) -> str:
+    attrs = (
+        f'name="platform/group{i % 50}/project{i}" '
+        f'path="group{i % 50}/project{i}" groups="group{i % 50},pdk"'
+    )
+    if i % 10:
+        return f"  <project {attrs} />\n"
+    return (
+        f'  <project {attrs} revision="refs/tags/v{i}" clone-depth="1">\n'
+        f'    <copyfile src="Makefile" dest="out/{i}.mk" />\n'
+        f'    <linkfile src="tools" dest="tools/{i}" />\n'
+        f'    <annotation name="owner" value="team{i % 7}" />\n'
+        "  </project>\n"
+    )
+
+
+def WriteClient(topdir: Path, projects: int) -> Path:
+    """Write a client checkout with a manifest of |projects| projects.
+
+    Returns:
+        The path of the manifest to load.
+    """
+    repodir = topdir / ".repo"
+    manifests = repodir / "manifests"
+    manifests.mkdir(parents=True)
+    subprocess.run(["git", "init", "-q", str(manifests)], check=True)
+    # Loading the manifest wants the manifest project's git config.
+    (repodir / "manifests.git").mkdir()
+    (repodir / "manifests.git" / "config").write_text(
+        '[remote "origin"]\n\turl = https://localhost/manifest\n'
+    )
+
+    includes = []
+    for start in range(0, projects, _PROJECTS_PER_INCLUDE):
+        name = f"projects-{start // _PROJECTS_PER_INCLUDE}.xml"
+        end = min(start + _PROJECTS_PER_INCLUDE, projects)
+        (manifests / name).write_text(
+            "<manifest>\n"
+            + "".join(_ProjectXml(i) for i in range(start, end))
+            + "</manifest>\n"
+        )
+        includes.append(f'  <include name="{name}" />\n')
+    (manifests / "default.xml").write_text(
+        "<manifest>\n"
+        '  <remote name="aosp" fetch=".." review="https://review.example.com"'
+        " />\n"
+        '  <default revision="main" remote="aosp" sync-j="4" />\n'
+        "  <notice>\n    A benchmark manifest.\n  </notice>\n"
+        + "".join(includes)
+        + '  <repo-hooks in-project="platform/group0/project0" '
+        'enabled-list="pre-upload" />\n'
+        "</manifest>\n"
+    )
+
+    local = repodir / manifest_xml.LOCAL_MANIFESTS_DIR_NAME
+    local.mkdir()
+    (local / "local.xml").write_text(
+        "<manifest>\n"
+        '  <remove-project name="platform/group1/project1" />\n'
+        '  <extend-project name="platform/group2/project2" groups="extra" />\n'
+        '  <project name="local/tools" path="local/tools" />\n'
+        "</manifest>\n"
+    )
+
+    manifest_file = repodir / manifest_xml.MANIFEST_FILE_NAME
+    manifest_file.write_text(
+        '<manifest>\n  <include name="default.xml" />\n</manifest>\n'
+    )
+    return manifest_file
+
+
+def _Time(func: Callable[[], Any], runs: int) -> Dict[str, float]:
+    """Get the best wall & CPU time of |runs| calls to |func|."""
+    wall = cpu = float("inf")
+    for _ in range(runs):
+        # Don't charge the garbage of the last run to this one.
+        gc.collect()
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        func()
+        wall = min(wall, time.perf_counter() - start_wall)
+        cpu = min(cpu, time.process_time() - start_cpu)
+    return {"wall": round(wall, 4), "cpu": round(cpu, 4)}
+
+
+def _PeakAlloc(func: Callable[[], Any]) -> int:
+    """Get the peak KiB that Python allocated while calling |func|."""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] // 1024
+    finally:
+        tracemalloc.stop()
+
+
+def RunSize(projects: int, runs: int) -> Dict[str, Dict[str, Any]]:
+    """Benchmark a manifest of |projects| projects."""
+    with tempfile.TemporaryDirectory(prefix="repo-manifest-bench-") as tmp:
+        manifest_file = WriteClient(Path(tmp), projects)
+        repodir = str(manifest_file.parent)
+
+        def _Load():
+            m = manifest_xml.XmlManifest(repodir, str(manifest_file))
+            m.Load()
+            return m
+
+        manifest = _Load()
+        benchmarks = {
+            "parse": _Load,
+            "ToXml": manifest.ToXml,
+            "ToDict": manifest.ToDict,
+        }
+        results = {}
+        for name, func in benchmarks.items():
+            results[name] = _Time(func, runs)
+            results[name]["peak_alloc_kb"] = _PeakAlloc(func)
+            print(
+                f"{projects:>6} {name:<8} {results[name]['wall']:8.4f}s wall "
+                f"{results[name]['cpu']:8.4f}s cpu "
+                f"{results[name]['peak_alloc_kb'] // 1024:6}MiB peak",
+                file=sys.stderr,
+            )
+        return results
+
+
+def get_parser() -> argparse.ArgumentParser:
+    """Get a CLI parser."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--projects",
+        type=int,
+        nargs="+",
+        default=[1000, 10000, 50000],
+        metavar="N",
+        help="the manifest sizes to benchmark (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=3,
+        help="how many times to time each benchmark (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=Path,
+        help="write the results as JSON to this file",
+    )
+    parser.add_argument(
+        "--baseline",
+        type=Path,
+        help="compare the results to the JSON results of an earlier run",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=10.0,
+        help="how many percent slower (or bigger) counts as a regression "
+        "(default: %(default)s)",
+    )
+    return parser
+
+
+def main(argv: List[str]) -> int:
+    """The main func!"""
+    parser = get_parser()
+    opts = parser.parse_args(argv)
+
+    data = {
+        "machine": run.MachineInfo(),
+        "results": {str(x): RunSize(x, opts.runs) for x in opts.projects},
+    }
+    if opts.output:
+        opts.output.write_text(json.dumps(data, indent=2) + "\n")
+
+    if opts.baseline:
+        baseline = json.loads(opts.baseline.read_text())
+        regressions = run.Compare(
+            baseline, data, opts.threshold, metrics=METRICS
+        )
+        if regressions:
+            print("\nRegressions:", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
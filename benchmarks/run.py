@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark repo commands against synthetic workspaces.
+
+For every workspace size, a workspace is created (see workspace.py) and each
+scenario is run in order with the repo in this checkout: init, a full sync, a
+no-op sync, `sync -l`, status, forall, grep, `start --all` & gc.  For each run
+the wall time, CPU time & peak RSS of repo and all the git processes it ran are
+recorded, along with how many git commands it ran (from the trace2 log).
+
+The results are written as JSON.  Given the results of an earlier run as a
+baseline, the changes are shown, and the exit status is 1 if anything got
+slower (or bigger) by more than --threshold, or ran more git commands.
+
+Examples:
+  ./benchmarks/run.py --projects 100 1000 -o new.json
+  ./benchmarks/run.py --projects 100 --baseline old.json -o new.json
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import workspace
+
+
+THIS_FILE = Path(__file__).resolve()
+TOPDIR = THIS_FILE.parent.parent
+
+# Load repo local modules.
+sys.path.insert(0, str(TOPDIR))
+import wrapper
+
+
+# The metrics of a run that are compared against a baseline.
+METRICS = ("wall", "cpu", "peak_rss_kb", "git_commands")
+
+# The scenarios that set up the client, so always run.
+_SETUP = ("init", "sync")
+
+
+class Scenario(NamedTuple):
+    """A repo command to benchmark."""
+
+    name: str
+    argv: List[str]
+
+
+def _Scenarios(jobs: int, superproject: bool) -> List[Scenario]:
+    sync = ["sync", f"-j{jobs}"]
+    if superproject:
+        sync.append("--use-superproject")
+    return [
+        Scenario("init", ["init", "--no-repo-verify"]),
+        Scenario("sync", sync),
+        Scenario("sync (no-op)", sync),
+        Scenario("sync -l", ["sync", "-l", f"-j{jobs}"]),
+        Scenario("status", ["status", f"-j{jobs}"]),
+        Scenario("forall", ["forall", f"-j{jobs}", "-c", "true"]),
+        Scenario("grep", ["grep", "-e", workspace.NEEDLE]),
+        Scenario("start --all", ["start", "bench", "--all"]),
+        Scenario("gc", ["gc", "--yes"]),
+    ]
+
+
+def _RepoArgv(client: Path) -> List[str]:
+    """Get the argv to run the repo of this checkout in |client|."""
+    ver = ".".join(str(x) for x in wrapper.Wrapper().VERSION)
+    return [
+        sys.executable,
+        str(TOPDIR / "main.py"),
+        f"--repo-dir={client / '.repo'}",
+        f"--wrapper-version={ver}",
+        f"--wrapper-path={wrapper.WrapperPath()}",
+        "--",
+    ]
+
+
+def _GitCommands(trace_dir: Path) -> Optional[int]:
+    """Get how many git commands repo ran from its trace2 log."""
+    for log in trace_dir.iterdir():
+        for line in log.read_text().splitlines():
+            event = json.loads(line)
+            if event.get("key") == "git_stats/total":
+                return json.loads(event["value"])[0]
+    return None
+
+
+def Measure(argv: List[str], cwd: Path, log: Path) -> Dict[str, Any]:
+    """Run |argv| and measure it & everything it runs."""
+    trace_dir = log.with_suffix(".trace2")
+    trace_dir.mkdir()
+    # Add the global option after the "--" that ends the launcher's.
+    sep = argv.index("--") + 1
+    argv = argv[:sep] + [f"--git-trace2-event-log={trace_dir}"] + argv[sep:]
+    with log.open("w") as fp:
+        start = time.perf_counter()
+        proc = subprocess.Popen(argv, cwd=cwd, stdout=fp, stderr=fp)
+        _, status, usage = os.wait4(proc.pid, 0)
+        wall = time.perf_counter() - start
+    # Keep Popen from waiting on the pid again.
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return {
+        "rc": proc.returncode,
+        "wall": round(wall, 3),
+        "cpu": round(usage.ru_utime + usage.ru_stime, 3),
+        # NB: Linux reports KiB, but macOS reports bytes.
+        "peak_rss_kb": usage.ru_maxrss,
+        "git_commands": _GitCommands(trace_dir),
+    }
+
+
+def RunSize(
+    opts: argparse.Namespace, spec: workspace.Spec, topdir: Path
+) -> Dict[str, Dict[str, Any]]:
+    """Create a workspace of |spec| and run all the scenarios in it."""
+    print(f"Creating {spec.projects} projects in {topdir}", file=sys.stderr)
+    url = workspace.Create(spec, topdir, jobs=opts.jobs)
+    client = topdir / "client"
+    client.mkdir()
+    logs = topdir / "logs"
+    logs.mkdir()
+    repo = _RepoArgv(client)
+
+    results = {}
+    for i, scenario in enumerate(_Scenarios(opts.jobs, spec.superproject)):
+        if opts.scenarios and scenario.name not in opts.scenarios:
+            if scenario.name not in _SETUP:
+                continue
+        argv = repo + scenario.argv
+        if scenario.name == "init":
+            argv += ["-u", url]
+        result = Measure(argv, client, logs / f"{i:02}.log")
+        print(f"  {scenario.name:<14} {_Format(result)}", file=sys.stderr)
+        if result["rc"]:
+            print(f"  see {logs / f'{i:02}.log'}", file=sys.stderr)
+        results[scenario.name] = result
+
+        if scenario.name == "init":
+            # An empty repo project that was just fetched, so sync doesn't
+            # try to update repo itself.
+            repo_dir = client / ".repo" / "repo"
+            subprocess.run(["git", "init", "-q", str(repo_dir)], check=True)
+            (repo_dir / ".git" / "FETCH_HEAD").touch()
+    return results
+
+
+def _Format(result: Dict[str, Any]) -> str:
+    return (
+        f"{result['wall']:8.3f}s wall {result['cpu']:8.3f}s cpu "
+        f"{result['peak_rss_kb'] // 1024:6}MiB "
+        f"{result['git_commands']} git commands"
+    )
+
+
+def Compare(
+    baseline: Dict[str, Any],
+    results: Dict[str, Any],
+    threshold: float,
+    metrics: Tuple[str, ...] = METRICS,
+) -> List[str]:
+    """Compare |results| to |baseline|, printing the changes.
+
+    Returns:
+        Descriptions of the regressions.
+    """
+    regressions = []
+    for size, scenarios in results["results"].items():
+        for name, result in scenarios.items():
+            old = baseline["results"].get(size, {}).get(name)
+            if not old:
+                continue
+            changes = []
+            for metric in metrics:
+                before, after = old.get(metric), result.get(metric)
+                if not before or after is None:
+                    continue
+                change = (after - before) / before * 100
+                changes.append(f"{metric} {change:+.1f}%")
+                if metric == "git_commands":
+                    regressed = after > before
+                else:
+                    regressed = change > threshold
+                if regressed:
+                    regressions.append(
+                        f"{size} projects: {name}: {metric} went from "
+                        f"{before} to {after}"
+                    )
+            print(f"{size:>6} {name:<14} {', '.join(changes)}")
+    return regressions
+
+
+def MachineInfo() -> Dict[str, Any]:
+    """Describe what the benchmarks ran on."""
+    git = subprocess.run(
+        ["git", "--version"], capture_output=True, encoding="utf-8"
+    )
+    return {
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+        "git": git.stdout.strip(),
+    }
+
+
+def get_parser() -> argparse.ArgumentParser:
+    """Get a CLI parser."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--projects",
+        type=int,
+        nargs="+",
+        default=[100, 1000, 5000],
+        metavar="N",
+        help="the workspace sizes to benchmark (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        metavar="NAME",
+        help="only run these scenarios (init & sync always run)",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count(),
+        help="the --jobs to pass to repo (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--workdir",
+        type=Path,
+        help="where to create the workspaces; they are kept "
+        "(default: a temporary directory that is deleted)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=Path,
+        help="write the results as JSON to this file",
+    )
+    parser.add_argument(
+        "--baseline",
+        type=Path,
+        help="compare the results to the JSON results of an earlier run",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=10.0,
+        help="how many percent slower (or bigger) counts as a regression "
+        "(default: %(default)s)",
+    )
+    workspace.AddSpecArguments(parser)
+    return parser
+
+
+def main(argv: List[str]) -> int:
+    """The main func!"""
+    parser = get_parser()
+    opts = parser.parse_args(argv)
+    if not hasattr(os, "wait4"):
+        parser.error("benchmarks need os.wait4 (i.e. a POSIX system)")
+
+    if opts.superproject and opts.nested:
+        parser.error("nested projects can't be in a superproject")
+
+    workdir = opts.workdir
+    if workdir is None:
+        workdir = Path(tempfile.mkdtemp(prefix="repo-benchmarks-"))
+    try:
+        results = {}
+        for projects in opts.projects:
+            spec = workspace.SpecFromArguments(opts, projects)
+            results[str(projects)] = RunSize(
+                opts, spec, workdir / str(projects)
+            )
+    finally:
+        if opts.workdir is None:
+            shutil.rmtree(workdir)
+
+    data = {
+        "machine": MachineInfo(),
+        "workspace": workspace.SpecFromArguments(opts, 0)._asdict(),
+        "results": results,
+    }
+    if opts.output:
+        opts.output.write_text(json.dumps(data, indent=2) + "\n")
+
+    if opts.baseline:
+        baseline = json.loads(opts.baseline.read_text())
+        regressions = Compare(baseline, data, opts.threshold)
+        if regressions:
+            print("\nRegressions:", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Create a synthetic repo workspace to benchmark against.
+
+Everything is local: the projects are bare repositories that the manifest
+reaches over file:// URLs, so no server is needed.  The layout is:
+
+  upstream/manifest.git       default.xml for all the projects
+  upstream/superproject.git   A gitlink for every project (if enabled)
+  upstream/lib.git            The submodule some projects use
+  upstream/p<N>.git           The projects
+
+Every repository is written with a single `git fast-import`, and they are
+written in parallel, so thousands of projects only take a minute or two.
+
+Examples:
+  ./benchmarks/workspace.py --projects 1000 --depth 10 /tmp/ws
+  repo init -u file:///tmp/ws/upstream/manifest.git
+"""
+
+import argparse
+from concurrent import futures
+import os
+from pathlib import Path
+import subprocess
+import sys
+from typing import Dict, List, NamedTuple, Optional
+from xml.sax import saxutils
+
+
+assert sys.version_info >= (3, 9), "Benchmarks require Python 3.9+"
+
+
+# The branch every repository is written on.
+BRANCH = "main"
+
+# A word every project has in its files, for `repo grep`.
+NEEDLE = "benchmark-needle"
+
+_COMMITTER = "Repo Benchmark <bench@example.com>"
+
+
+class Spec(NamedTuple):
+    """What the workspace looks like."""
+
+    # How many projects are in the manifest.
+    projects: int = 100
+    # How many commits each project has.
+    depth: int = 5
+    # How many files each project has.
+    files: int = 20
+    # How many directories each project path is under (e.g. d1/d4/p12).
+    nesting: int = 2
+    # How many projects are checked out inside another project.
+    nested: int = 0
+    # How many projects reuse the objects of another one (the same name
+    # checked out at another path).
+    shared: int = 0
+    # How many projects have a submodule (synced with sync-s).
+    submodules: int = 0
+    # How many projects have a <copyfile> & how many have a <linkfile>.
+    copyfiles: int = 0
+    linkfiles: int = 0
+    # Whether to create a superproject.
+    superproject: bool = True
+
+
+class _Project(NamedTuple):
+    """A project in the manifest."""
+
+    name: str
+    path: str
+    submodule: bool
+    copyfile: bool
+    linkfile: bool
+
+
+def _ProjectPath(spec: Spec, i: int) -> str:
+    dirs = [f"d{(i >> (3 * x)) % 8}" for x in range(spec.nesting)]
+    return "/".join(dirs + [f"p{i}"])
+
+
+def _Projects(spec: Spec) -> List[_Project]:
+    """Work out the name & path of every project."""
+    projects = []
+    for i in range(spec.projects):
+        if i < spec.shared:
+            # Reuse the objects of a project at the other end of the list.
+            name = f"p{spec.projects - 1 - i}"
+            path = f"shared/{_ProjectPath(spec, i)}"
+        elif i < spec.shared + spec.nested:
+            # Inside the first project that isn't shared or nested itself.
+            name = f"p{i}"
+            parent = _ProjectPath(spec, spec.shared + spec.nested)
+            path = f"{parent}/nested/p{i}"
+        else:
+            name = f"p{i}"
+            path = _ProjectPath(spec, i)
+        projects.append(
+            _Project(
+                name,
+                path,
+                i < spec.submodules,
+                i < spec.copyfiles,
+                i < spec.linkfiles,
+            )
+        )
+    return projects
+
+
+class _Stream:
+    """Write a git fast-import stream."""
+
+    def __init__(self):
+        self._parts = []
+        self._mark = 0
+
+    def _Data(self, data: str) -> None:
+        raw = data.encode("utf-8")
+        self._parts.append(b"data %d\n%s\n" % (len(raw), raw))
+
+    def Commit(self, message: str, files: Dict[str, str]) -> None:
+        """Add a commit that writes |files| (path to content, or a commit id
+        for a gitlink)."""
+        self._mark += 1
+        self._parts.append(
+            (
+                f"commit refs/heads/{BRANCH}\n"
+                f"mark :{self._mark}\n"
+                f"committer {_COMMITTER} {1700000000 + self._mark} +0000\n"
+            ).encode("utf-8")
+        )
+        self._Data(message)
+        if self._mark > 1:
+            self._parts.append(b"from :%d\n" % (self._mark - 1))
+        for path, content in sorted(files.items()):
+            if content.startswith("gitlink:"):
+                self._parts.append(
+                    f"M 160000 {content[8:]} {path}\n".encode("utf-8")
+                )
+            else:
+                self._parts.append(f"M 100644 inline {path}\n".encode("utf-8"))
+                self._Data(content)
+
+    def Write(self, gitdir: Path) -> str:
+        """Create the bare repository |gitdir| and return its head commit."""
+        subprocess.run(
+            ["git", "init", "-q", "--bare", f"--initial-branch={BRANCH}"]
+            + [str(gitdir)],
+            check=True,
+        )
+        marks = gitdir / "bench-marks"
+        subprocess.run(
+            ["git", "fast-import", "--quiet", f"--export-marks={marks}"],
+            cwd=gitdir,
+            input=b"".join(self._parts),
+            check=True,
+        )
+        last = marks.read_text().splitlines()[-1]
+        marks.unlink()
+        return last.split()[1]
+
+
+def _ProjectFiles(spec: Spec, name: str, commit: int) -> Dict[str, str]:
+    """The files a commit of a project writes."""
+    paths = [f"src/{x % 5}/file{x}.txt" for x in range(spec.files)]
+    if commit == 0:
+        files = {x: f"{name} {x} {NEEDLE}\n" for x in paths}
+        files["README"] = f"{name}\n"
+        return files
+    path = paths[commit % len(paths)] if paths else "README"
+    return {path: f"{name} {path} {NEEDLE} {commit}\n"}
+
+
+def _WriteProject(
+    spec: Spec, upstream: Path, name: str, submodule: Optional[str]
+) -> str:
+    stream = _Stream()
+    for commit in range(max(spec.depth, 1)):
+        files = _ProjectFiles(spec, name, commit)
+        if commit == 0 and submodule:
+            files[".gitmodules"] = (
+                '[submodule "lib"]\n'
+                "\tpath = lib\n"
+                f"\turl = {(upstream / 'lib.git').as_uri()}\n"
+            )
+            files["lib"] = f"gitlink:{submodule}"
+        stream.Commit(f"{name}: commit {commit}", files)
+    return stream.Write(upstream / f"{name}.git")
+
+
+def _Manifest(spec: Spec, upstream: Path, projects: List[_Project]) -> str:
+    fetch = saxutils.quoteattr(upstream.as_uri())
+    lines = [
+        "<?xml version='1.0' encoding='UTF-8'?>",
+        "<manifest>",
+        f'  <remote name="origin" fetch={fetch} />',
+        f'  <default remote="origin" revision="{BRANCH}" />',
+    ]
+    if spec.superproject:
+        lines.append('  <superproject name="superproject" remote="origin" />')
+    for project in projects:
+        attrs = f'name="{project.name}" path="{project.path}"'
+        if project.submodule:
+            attrs += ' sync-s="true"'
+        dest = project.path.replace("/", "_")
+        children = []
+        if project.copyfile:
+            children.append(f'<copyfile src="README" dest="copied/{dest}" />')
+        if project.linkfile:
+            children.append(f'<linkfile src="README" dest="linked/{dest}" />')
+        if children:
+            lines.append(f"  <project {attrs}>")
+            lines += [f"    {x}" for x in children]
+            lines.append("  </project>")
+        else:
+            lines.append(f"  <project {attrs} />")
+    lines.append("</manifest>")
+    return "\n".join(lines) + "\n"
+
+
+def Create(spec: Spec, topdir: Path, jobs: Optional[int] = None) -> str:
+    """Create the upstream repositories of |spec| under |topdir|.
+
+    Returns:
+        The URL to `repo init -u` with.
+    """
+    if spec.superproject and spec.nested:
+        # A gitlink can't have other gitlinks under it.
+        raise ValueError("nested projects can't be in a superproject")
+    upstream = topdir.resolve() / "upstream"
+    upstream.mkdir(parents=True)
+    projects = _Projects(spec)
+
+    submodule = None
+    if spec.submodules:
+        stream = _Stream()
+        stream.Commit("lib", {"lib.txt": f"lib {NEEDLE}\n"})
+        submodule = stream.Write(upstream / "lib.git")
+
+    names = sorted({x.name for x in projects})
+    with_submodule = {x.name for x in projects if x.submodule}
+    with futures.ThreadPoolExecutor(jobs or os.cpu_count()) as pool:
+        heads = dict(
+            zip(
+                names,
+                pool.map(
+                    lambda x: _WriteProject(
+                        spec,
+                        upstream,
+                        x,
+                        submodule if x in with_submodule else None,
+                    ),
+                    names,
+                ),
+            )
+        )
+
+    if spec.superproject:
+        stream = _Stream()
+        stream.Commit(
+            "superproject",
+            {x.path: f"gitlink:{heads[x.name]}" for x in projects},
+        )
+        stream.Write(upstream / "superproject.git")
+
+    stream = _Stream()
+    stream.Commit(
+        "manifest", {"default.xml": _Manifest(spec, upstream, projects)}
+    )
+    stream.Write(upstream / "manifest.git")
+    return (upstream / "manifest.git").as_uri()
+
+
+def AddSpecArguments(parser: argparse.ArgumentParser) -> None:
+    """Add options for every field of Spec to |parser|."""
+    defaults = Spec()
+    group = parser.add_argument_group("Workspace")
+    for field in Spec._fields:
+        if field == "projects":
+            continue
+        default = getattr(defaults, field)
+        flag = "--" + field.replace("_", "-")
+        if isinstance(default, bool):
+            group.add_argument(
+                flag,
+                default=default,
+                action=argparse.BooleanOptionalAction,
+                help=f"(default: {default})",
+            )
+        else:
+            group.add_argument(
+                flag,
+                type=int,
+                default=default,
+                metavar="N",
+                help=f"(default: {default})",
+            )
+
+
+def SpecFromArguments(opts: argparse.Namespace, projects: int) -> Spec:
+    """Get a Spec for |projects| projects from parsed options."""
+    fields = {x: getattr(opts, x) for x in Spec._fields if x != "projects"}
+    return Spec(projects=projects, **fields)
+
+
+def get_parser() -> argparse.ArgumentParser:
+    """Get a CLI parser."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--projects",
+        type=int,
+        default=Spec().projects,
+        metavar="N",
+        help="how many projects to create (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="how many repositories to write at once",
+    )
+    AddSpecArguments(parser)
+    parser.add_argument("topdir", type=Path, help="where to create it")
+    return parser
+
+
+def main(argv: List[str]) -> int:
+    """The main func!"""
+    parser = get_parser()
+    opts = parser.parse_args(argv)
+    if opts.superproject and opts.nested:
+        parser.error("nested projects can't be in a superproject")
+    url = Create(
+        SpecFromArguments(opts, opts.projects), opts.topdir, jobs=opts.jobs
+    )
+    print(f"repo init -u {url}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -14,6 +14,7 @@
 
 import contextlib
 import multiprocessing
+import multiprocessing.pool
 import optparse
 import os
 import re
@@ -22,7 +23,10 @@ from error import InvalidProjectGroupsError
 from error import NoSuchProjectError
 from error import RepoExitError
 from event_log import EventLog
+import git_stats
 import progress
+import repo_trace
+import timeline
 
 
 # Are we generating man-pages?
@@ -47,6 +51,44 @@ class UsageError(RepoExitError):
     """Exception thrown with invalid command usage."""
 
 
+class _WithGitStats:
+    """Wrap a worker function to also return the git stats & spans it
+    recorded."""
+
+    def __init__(self, func):
+        self.func = func
+
+    def __call__(self, *args):
+        result = self.func(*args)
+        # Pool workers are killed without running atexit handlers.
+        repo_trace.Flush()
+        return result, git_stats.Take(), timeline.Take()
+
+
+class _GitStatsResults:
+    """Unwrap the results of _WithGitStats, and merge the git stats & spans."""
+
+    def __init__(self, results):
+        self._results = results
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.next()
+
+    def next(self, timeout=None):
+        """Like IMapIterator.next."""
+        # Pool.imap returns a plain generator when chunksize > 1.
+        if isinstance(self._results, multiprocessing.pool.IMapIterator):
+            result, stats, events = self._results.next(timeout=timeout)
+        else:
+            result, stats, events = next(self._results)
+        git_stats.Merge(stats)
+        timeline.Extend(events)
+        return result
+
+
 class Command:
     """Base class for any command line action in repo."""
 
@@ -273,8 +315,11 @@ class Command:
             cls._parallel_context = None
 
     @classmethod
-    def _InitParallelWorker(cls, context, initializer):
+    def _InitParallelWorker(cls, context, initializer, record_timeline=False):
         cls._parallel_context = context
+        # Workers send their spans & git stats back with their results.
+        timeline.Reset(record_timeline)
+        git_stats.Take()
         if initializer:
             initializer()
 
@@ -328,13 +373,21 @@ class Command:
                 with multiprocessing.Pool(
                     jobs,
                     initializer=cls._InitParallelWorker,
-                    initargs=(cls._parallel_context, initializer),
+                    initargs=(
+                        cls._parallel_context,
+                        initializer,
+                        timeline.IsEnabled(),
+                    ),
                 ) as pool:
                     submit = pool.imap if ordered else pool.imap_unordered
                     return callback(
                         pool,
                         output,
-                        submit(func, inputs, chunksize=chunksize),
+                        _GitStatsResults(
+                            submit(
+                                _WithGitStats(func), inputs, chunksize=chunksize
+                            )
+                        ),
                     )
         finally:
             if isinstance(output, progress.Progress):
@@ -17,7 +17,6 @@
 import subprocess
 import sys
 from urllib.parse import urlparse
-from urllib.request import urlopen
 
 from error import RepoExitError
 
@@ -54,5 +53,7 @@ def fetch_file(url, verbose=False):
                 file=sys.stderr,
             )
         raise FetchFileError(aggregate_errors=errors)
-    with urlopen(url) as f:
+    import repo_http
+
+    with repo_http.urlopen(url) as f:
         return f.read()
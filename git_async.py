@@ -0,0 +1,377 @@
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Run many short git commands at once with asyncio.
+
+Commands like status run a few quick git commands in every project.  With
+GitCommand each of those blocks, so they are spread over --jobs worker
+processes, and only that many git commands run at a time.  Here one process
+keeps many git commands in flight on an event loop instead: a Runner starts
+each command once it is under its limit, and Map runs a coroutine for every
+project & hands back the results in order.
+
+If a coroutine fails (or repo is interrupted), the others are cancelled, and
+the git commands they were running are killed.
+
+asyncio takes a while to import (it loads ssl), so it is only imported once
+git is run, to keep it out of the startup of every command.
+
+Examples:
+  async def _Head(runner, project):
+      result = await runner.Run(project, ["rev-parse", "HEAD"], check=True)
+      return result.stdout.strip()
+
+  for project, head in zip(projects, git_async.Map(_Head, projects)):
+      ...
+
+  # Print each result as soon as it (and those before it) are done.
+  git_async.Map(_Status, projects, jobs=opt.jobs, callback=print)
+"""
+
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+)
+
+import git_command
+from git_command import GitCommandError
+from git_command import GitPopenCommandError
+import git_stats
+from git_trace2_event_log_base import ReserveSid
+import platform_utils
+from repo_trace import Trace
+
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# How many git commands run at once by default.  They are short & spend most of
+# their time waiting on the disk, so many more than there are CPUs can run.
+DEFAULT_JOBS = 64
+
+# How many file descriptors each running command takes (its pipes, and some
+# slack for the child watcher), and how many to leave for everything else.
+_FDS_PER_JOB = 4
+_RESERVED_FDS = 64
+
+
+class Result(NamedTuple):
+    """A finished git command."""
+
+    rc: int
+    stdout: str
+    stderr: str
+
+
+def MaxJobs(jobs: int) -> int:
+    """Return |jobs|, lowered to what the open file limit allows."""
+    if resource is None:
+        return jobs
+    soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft == resource.RLIM_INFINITY:
+        return jobs
+    return max(1, min(jobs, (soft - _RESERVED_FDS) // _FDS_PER_JOB))
+
+
+class Runner:
+    """Runs git commands on the event loop, at most |jobs| at a time.
+
+    It must be created in a coroutine (i.e. with the event loop running).
+    """
+
+    def __init__(self, jobs: int = DEFAULT_JOBS):
+        import asyncio
+
+        self.jobs = jobs
+        self._limit = asyncio.Semaphore(jobs)
+
+    async def Run(
+        self,
+        project,
+        cmdv: List[str],
+        bare: bool = False,
+        cwd: Optional[str] = None,
+        gitdir: Optional[str] = None,
+        input: Optional[str] = None,
+        check: bool = False,
+        log_as_error: bool = True,
+    ) -> Result:
+        """Run a git command & return its output.
+
+        Args:
+            project: The project to run the command in (for its work tree &
+                git dir, unless |cwd| or |gitdir| are passed).
+            cmdv: The git command line (without "git").
+            bare: Whether to run in |gitdir| rather than the work tree.
+            cwd: The directory to run in.
+            gitdir: The git dir to run with.
+            input: What to write to the command's stdin.
+            check: Whether to raise GitCommandError when the command fails.
+            log_as_error: Whether a failure is logged as an error.
+
+        Raises:
+            GitPopenCommandError: The command couldn't be started.
+            GitCommandError: The command failed, and |check| is set.
+        """
+        if project:
+            if not cwd:
+                cwd = project.worktree
+            if not gitdir:
+                gitdir = project.gitdir
+
+        # Git on Windows wants its paths only using / for reliability.
+        if platform_utils.isWindows() and gitdir:
+            gitdir = gitdir.replace("\\", "/")
+
+        env = git_command._build_env(gitdir=gitdir, bare=bare)
+        if bare:
+            cwd = None
+        command = [git_command.GIT] + cmdv
+        sid = ReserveSid(env)
+
+        async with self._limit:
+            result = await self._Exec(project, command, env, cwd, input)
+
+        if check and result.rc:
+            stdout = "\n".join(
+                result.stdout.split("\n")[: git_command.GIT_ERROR_STDOUT_LINES]
+            )
+            stderr = "\n".join(
+                result.stderr.split("\n")[: git_command.GIT_ERROR_STDERR_LINES]
+            )
+            e = GitCommandError(
+                project=project.name if project else None,
+                command_args=cmdv,
+                git_rc=result.rc,
+                git_stdout=stdout or None,
+                git_stderr=stderr or None,
+            )
+            git_command.LogCommandError(
+                sid, e, git_command._CommandName(cmdv), log_as_error
+            )
+            raise e
+        return result
+
+    async def _Exec(self, project, command, env, cwd, input):
+        import asyncio
+
+        stdin = subprocess.PIPE if input is not None else subprocess.DEVNULL
+        dbg = git_command._DebugString(
+            command, env, cwd, stdin, subprocess.PIPE, subprocess.PIPE
+        )
+        start = time.time()
+        start_cpu = git_stats.ChildCpuTime()
+        with Trace(
+            "git command %s %s with debug: %s",
+            git_command.LAST_GITDIR,
+            command,
+            dbg,
+        ):
+            spawn = asyncio.ensure_future(
+                asyncio.create_subprocess_exec(
+                    *command,
+                    cwd=cwd,
+                    env=env,
+                    stdin=stdin,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                )
+            )
+            proc = None
+            try:
+                # Cancelling asyncio while it starts a command races with the
+                # child watcher reaping it, so it's always left to finish.
+                proc = await asyncio.shield(spawn)
+                stdout, stderr = await proc.communicate(
+                    input.encode("utf-8") if input is not None else None
+                )
+            except asyncio.CancelledError:
+                if proc is None:
+                    (proc,) = await asyncio.gather(
+                        spawn, return_exceptions=True
+                    )
+                if (
+                    isinstance(proc, asyncio.subprocess.Process)
+                    and proc.returncode is None
+                ):
+                    try:
+                        proc.kill()
+                    except ProcessLookupError:
+                        pass
+                    await proc.wait()
+                raise
+            except Exception as e:
+                if proc is not None:
+                    raise
+                raise GitPopenCommandError(
+                    message=f"{command[1]}: {e}",
+                    project=project.name if project else None,
+                    command_args=command[1:],
+                )
+        git_command._RecordCommand(
+            command, project, start, start_cpu, proc, proc.returncode
+        )
+        return Result(
+            proc.returncode,
+            stdout.decode("utf-8", "backslashreplace"),
+            stderr.decode("utf-8", "backslashreplace"),
+        )
+
+
+async def Gather(*aws: Awaitable[Any]) -> List[Any]:
+    """Run |aws| at once, & return their results once all are done."""
+    import asyncio
+
+    return await asyncio.gather(*aws)
+
+
+def Map(
+    func: Callable[[Runner, Any], Any],
+    items: Iterable[Any],
+    jobs: int = DEFAULT_JOBS,
+    callback: Optional[Callable[[Any], None]] = None,
+) -> List[Any]:
+    """Run the coroutine func(runner, item) for every item at once.
+
+    Args:
+        func: The coroutine function to run for each item.  Its git commands
+            should be run with |runner|.
+        items: The items to run it for.
+        jobs: How many git commands may run at a time.
+        callback: Called with each result in the order of |items|, as soon as
+            it & the ones before it are done.
+
+    Returns:
+        The results, in the order of |items|.
+    """
+    import asyncio
+
+    items = list(items)
+
+    async def _Main():
+        runner = Runner(MaxJobs(jobs))
+        tasks = [asyncio.ensure_future(func(runner, x)) for x in items]
+        try:
+            results = []
+            for task in tasks:
+                result = await task
+                if callback:
+                    callback(result)
+                results.append(result)
+            return results
+        finally:
+            # When one failed (or we were cancelled), stop the rest.
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    return _RunLoop(_Main())
+
+
+def _RunLoop(main):
+    """Run the coroutine |main| in a new event loop & return its result."""
+    import asyncio
+
+    loop = asyncio.new_event_loop()
+    # The child watcher of older Pythons only watches the current loop.
+    set_loop = sys.version_info < (3, 8)
+    if set_loop:
+        asyncio.set_event_loop(loop)
+    watcher = _PidfdWatcher(loop)
+    if watcher:
+        asyncio.set_child_watcher(watcher)
+    task = loop.create_task(main)
+    interrupted = []
+
+    def _Interrupt():
+        interrupted.append(True)
+        task.cancel()
+
+    old_handler = _HandleInterrupt(loop, _Interrupt)
+    try:
+        return loop.run_until_complete(task)
+    except asyncio.CancelledError:
+        if interrupted:
+            raise KeyboardInterrupt()
+        raise
+    finally:
+        if old_handler is not None:
+            loop.remove_signal_handler(signal.SIGINT)
+            signal.signal(signal.SIGINT, old_handler)
+        if not task.done():
+            # Interrupted, so kill the git commands still running.
+            task.cancel()
+            loop.run_until_complete(
+                asyncio.gather(task, return_exceptions=True)
+            )
+        if watcher:
+            # Go back to the default (which also closes this one).
+            asyncio.set_child_watcher(None)
+        loop.close()
+        if set_loop:
+            asyncio.set_event_loop(None)
+
+
+def _HandleInterrupt(loop, callback):
+    """Call |callback| on SIGINT, instead of raising KeyboardInterrupt.
+
+    KeyboardInterrupt can be raised anywhere, even while the loop is reaping a
+    command, so have the loop cancel everything in its own time instead.
+
+    Returns:
+        The old SIGINT handler to restore, or None if it wasn't changed.
+    """
+    old_handler = signal.getsignal(signal.SIGINT)
+    if old_handler is not signal.default_int_handler:
+        return None
+    try:
+        loop.add_signal_handler(signal.SIGINT, callback)
+    except (RuntimeError, ValueError):
+        # Windows, or not the main thread.
+        return None
+    return old_handler
+
+
+def _PidfdWatcher(loop):
+    """Get a child watcher that waits for commands with pidfds, if it can.
+
+    Pythons 3.8 to 3.11 start a thread to wait for every command by default,
+    which makes starting each one a lot slower.  Newer Pythons use pidfds
+    already (and deprecate changing the watcher).
+    """
+    import asyncio
+
+    if not (3, 9) <= sys.version_info < (3, 12):
+        return None
+    try:
+        # Make sure the kernel supports them.
+        os.close(os.pidfd_open(os.getpid()))
+    except (AttributeError, OSError):
+        return None
+    watcher = asyncio.PidfdChildWatcher()
+    watcher.attach_loop(loop)
+    return watcher
@@ -18,16 +18,22 @@ import os
 import re
 import subprocess
 import sys
+import tempfile
+import time
 from typing import Any, Optional
 
 from error import GitError
 from error import RepoExitError
+import git_info_cache
+import git_stats
 from git_trace2_event_log_base import BaseEventLog
+from git_trace2_event_log_base import ReserveSid
 import platform_utils
 from repo_logging import RepoLogger
 from repo_trace import IsTrace
 from repo_trace import REPO_TRACE
 from repo_trace import Trace
+import timeline
 from wrapper import Wrapper
 
 
@@ -41,6 +47,8 @@ ERROR_EVENT_LOGGING_PREFIX = "RepoGitCommandError"
 # Common line length limit
 GIT_ERROR_STDOUT_LINES = 1
 GIT_ERROR_STDERR_LINES = 10
+# How much GitStream reads from git at a time.
+STREAM_CHUNK_SIZE = 64 * 1024
 INVALID_GIT_EXIT_CODE = 126
 
 logger = RepoLogger(__file__)
@@ -49,7 +57,10 @@ logger = RepoLogger(__file__)
 class _GitCall:
     @functools.lru_cache(maxsize=None)  # noqa: B019
     def version_tuple(self):
-        ret = Wrapper().ParseGitVersion()
+        ver_str = git_info_cache.Get(
+            "version", lambda: Wrapper().run_git("--version").stdout
+        )
+        ret = Wrapper().ParseGitVersion(ver_str)
         if ret is None:
             msg = "fatal: unable to detect git version"
             logger.error(msg)
@@ -210,6 +221,58 @@ def git_require(min_version, fail=False, msg=""):
     return False
 
 
+# The environments for _CachedEnv: name -> (os.environ snapshot, env).
+_env_cache = {}
+
+
+def _CachedEnv(name, build):
+    """Return build(), only calling it again when os.environ changes.
+
+    The env is shared, so callers must not modify it.
+    """
+    # Comparing the raw (undecoded) environ is much cheaper than copying it.
+    raw = getattr(os.environ, "_data", None)
+    cached = _env_cache.get(name)
+    if cached is not None and cached[0] == raw:
+        return cached[1]
+    env = build()
+    if raw is not None:
+        _env_cache[name] = (dict(raw), env)
+    return env
+
+
+def _BasicEnv():
+    env = os.environ.copy()
+    for key in (
+        REPO_TRACE,
+        GIT_DIR,
+        "GIT_ALTERNATE_OBJECT_DIRECTORIES",
+        "GIT_OBJECT_DIRECTORY",
+        "GIT_WORK_TREE",
+        "GIT_GRAFT_FILE",
+        "GIT_INDEX_FILE",
+    ):
+        env.pop(key, None)
+    return env
+
+
+def _GitEnv():
+    """The part of _build_env that is the same for every command."""
+    env = dict(_CachedEnv("basic", _BasicEnv))
+    if "http_proxy" in env and "darwin" == sys.platform:
+        s = f"'http.proxy={env['http_proxy']}'"
+        p = env.get("GIT_CONFIG_PARAMETERS")
+        if p is not None:
+            s = p + " " + s
+        env["GIT_CONFIG_PARAMETERS"] = s
+    if "GIT_ALLOW_PROTOCOL" not in env:
+        env["GIT_ALLOW_PROTOCOL"] = (
+            "file:git:http:https:ssh:persistent-http:persistent-https:sso:rpc"
+        )
+    env["GIT_HTTP_USER_AGENT"] = user_agent.git
+    return env
+
+
 def _build_env(
     _kwargs_only=(),
     bare: Optional[bool] = False,
@@ -222,7 +285,7 @@ def _build_env(
 
     assert _kwargs_only == (), "_build_env only accepts keyword arguments."
 
-    env = GitCommand._GetBasicEnv()
+    env = dict(_CachedEnv("git", _GitEnv))
 
     if disable_editor:
         env["GIT_EDITOR"] = ":"
@@ -230,18 +293,6 @@ def _build_env(
         env["REPO_SSH_SOCK"] = ssh_proxy.sock()
         env["GIT_SSH"] = ssh_proxy.proxy
         env["GIT_SSH_VARIANT"] = "ssh"
-    if "http_proxy" in env and "darwin" == sys.platform:
-        s = f"'http.proxy={env['http_proxy']}'"
-        p = env.get("GIT_CONFIG_PARAMETERS")
-        if p is not None:
-            s = p + " " + s
-        env["GIT_CONFIG_PARAMETERS"] = s
-    if "GIT_ALLOW_PROTOCOL" not in env:
-        env["GIT_ALLOW_PROTOCOL"] = (
-            "file:git:http:https:ssh:persistent-http:persistent-https:sso:rpc"
-        )
-    env["GIT_HTTP_USER_AGENT"] = user_agent.git
-
     if objdir:
         # Set to the place we want to save the objects.
         env["GIT_OBJECT_DIRECTORY"] = objdir
@@ -260,6 +311,106 @@ def _build_env(
     return env
 
 
+def _CommandName(cmdv):
+    """Return the git subcommand that |cmdv| runs."""
+    args = iter(cmdv)
+    for arg in args:
+        if arg == "-c":
+            next(args, None)
+        elif not arg.startswith("-"):
+            return arg
+    return cmdv[0] if cmdv else ""
+
+
+def _DebugString(command, env, cwd, stdin, stdout, stderr):
+    """Describe the command being run for the trace, like a shell would."""
+    dbg = ""
+    if IsTrace():
+        global LAST_CWD
+        global LAST_GITDIR
+
+        if cwd and LAST_CWD != cwd:
+            if LAST_GITDIR or LAST_CWD:
+                dbg += "\n"
+            dbg += ": cd %s\n" % cwd
+            LAST_CWD = cwd
+
+        if GIT_DIR in env and LAST_GITDIR != env[GIT_DIR]:
+            if LAST_GITDIR or LAST_CWD:
+                dbg += "\n"
+            dbg += ": export GIT_DIR=%s\n" % env[GIT_DIR]
+            LAST_GITDIR = env[GIT_DIR]
+
+        if "GIT_OBJECT_DIRECTORY" in env:
+            dbg += (
+                ": export GIT_OBJECT_DIRECTORY=%s\n"
+                % env["GIT_OBJECT_DIRECTORY"]
+            )
+        if "GIT_ALTERNATE_OBJECT_DIRECTORIES" in env:
+            dbg += ": export GIT_ALTERNATE_OBJECT_DIRECTORIES=%s\n" % (
+                env["GIT_ALTERNATE_OBJECT_DIRECTORIES"]
+            )
+
+        dbg += ": "
+        dbg += " ".join(command)
+        if stdin == subprocess.PIPE:
+            dbg += " 0<|"
+        if stdout == subprocess.PIPE:
+            dbg += " 1>|"
+        if stderr == subprocess.PIPE:
+            dbg += " 2>|"
+        elif stderr == subprocess.STDOUT:
+            dbg += " 2>&1"
+    return dbg
+
+
+def _RecordCommand(command, project, start, start_cpu, process, rc):
+    """Record a finished git command in the stats & timeline."""
+    finish = time.time()
+    name = _CommandName(command[1:])
+    project = project.name if project else None
+    git_stats.Add(
+        name, project, finish - start, git_stats.ChildCpuTime() - start_cpu
+    )
+    if timeline.IsEnabled():
+        timeline.Add(
+            f"git {name}",
+            start,
+            finish,
+            cat="git",
+            argv=command,
+            pid=process.pid,
+            rc=rc,
+            project=project,
+        )
+
+
+def LogCommandError(sid, error, command_name, log_as_error=True):
+    """Write an event log for a failed git command.
+
+    Args:
+        sid: The sid reserved for the command (see ReserveSid).
+        error: The GitCommandError the command failed with.
+        command_name: The git subcommand that failed.
+        log_as_error: Whether the failure is logged as an error.
+    """
+    error_info = json.dumps(
+        {
+            "ErrorType": type(error).__name__,
+            "Project": error.project,
+            "CommandName": command_name,
+            "Message": str(error),
+            "ReturnCode": (
+                str(error.git_rc) if error.git_rc is not None else None
+            ),
+            "IsError": log_as_error,
+        }
+    )
+    event_log = BaseEventLog(full_sid=sid)
+    event_log.ErrorEvent(f"{ERROR_EVENT_LOGGING_PREFIX}:{error_info}")
+    event_log.Write(GetEventTargetPath())
+
+
 class GitCommand:
     """Wrapper around a single git invocation."""
 
@@ -323,11 +474,9 @@ class GitCommand:
                     command.append("--progress")
         command.extend(cmdv[1:])
 
-        event_log = (
-            BaseEventLog(env=env, add_init_count=True)
-            if add_event_log
-            else None
-        )
+        # The event log is only written if the command fails, so only reserve
+        # its sid (for git to log under) until then.
+        sid = ReserveSid(env) if add_event_log else None
 
         try:
             self._RunCommand(
@@ -342,23 +491,8 @@ class GitCommand:
             )
             self.VerifyCommand()
         except GitCommandError as e:
-            if event_log is not None:
-                error_info = json.dumps(
-                    {
-                        "ErrorType": type(e).__name__,
-                        "Project": e.project,
-                        "CommandName": command_name,
-                        "Message": str(e),
-                        "ReturnCode": (
-                            str(e.git_rc) if e.git_rc is not None else None
-                        ),
-                        "IsError": log_as_error,
-                    }
-                )
-                event_log.ErrorEvent(
-                    f"{ERROR_EVENT_LOGGING_PREFIX}:{error_info}"
-                )
-                event_log.Write(GetEventTargetPath())
+            if sid is not None:
+                LogCommandError(sid, e, command_name, log_as_error)
             if isinstance(e, GitPopenCommandError):
                 raise
 
@@ -406,44 +540,10 @@ class GitCommand:
             stderr = subprocess.PIPE
             kwargs = {}
 
-        dbg = ""
-        if IsTrace():
-            global LAST_CWD
-            global LAST_GITDIR
-
-            if cwd and LAST_CWD != cwd:
-                if LAST_GITDIR or LAST_CWD:
-                    dbg += "\n"
-                dbg += ": cd %s\n" % cwd
-                LAST_CWD = cwd
-
-            if GIT_DIR in env and LAST_GITDIR != env[GIT_DIR]:
-                if LAST_GITDIR or LAST_CWD:
-                    dbg += "\n"
-                dbg += ": export GIT_DIR=%s\n" % env[GIT_DIR]
-                LAST_GITDIR = env[GIT_DIR]
-
-            if "GIT_OBJECT_DIRECTORY" in env:
-                dbg += (
-                    ": export GIT_OBJECT_DIRECTORY=%s\n"
-                    % env["GIT_OBJECT_DIRECTORY"]
-                )
-            if "GIT_ALTERNATE_OBJECT_DIRECTORIES" in env:
-                dbg += ": export GIT_ALTERNATE_OBJECT_DIRECTORIES=%s\n" % (
-                    env["GIT_ALTERNATE_OBJECT_DIRECTORIES"]
-                )
-
-            dbg += ": "
-            dbg += " ".join(command)
-            if stdin == subprocess.PIPE:
-                dbg += " 0<|"
-            if stdout == subprocess.PIPE:
-                dbg += " 1>|"
-            if stderr == subprocess.PIPE:
-                dbg += " 2>|"
-            elif stderr == subprocess.STDOUT:
-                dbg += " 2>&1"
+        dbg = _DebugString(command, env, cwd, stdin, stdout, stderr)
 
+        start = time.time()
+        start_cpu = git_stats.ChildCpuTime()
         with Trace(
             "git command %s %s with debug: %s", LAST_GITDIR, command, dbg
         ):
@@ -481,6 +581,7 @@ class GitCommand:
                 if ssh_proxy:
                     ssh_proxy.remove_client(p)
             self.rc = p.wait()
+        _RecordCommand(command, self.project, start, start_cpu, p, self.rc)
 
     @staticmethod
     def _Tee(in_stream, out_stream):
@@ -515,18 +616,7 @@ class GitCommand:
 
         This is guaranteed to be side-effect free.
         """
-        env = os.environ.copy()
-        for key in (
-            REPO_TRACE,
-            GIT_DIR,
-            "GIT_ALTERNATE_OBJECT_DIRECTORIES",
-            "GIT_OBJECT_DIRECTORY",
-            "GIT_WORK_TREE",
-            "GIT_GRAFT_FILE",
-            "GIT_INDEX_FILE",
-        ):
-            env.pop(key, None)
-        return env
+        return dict(_CachedEnv("basic", _BasicEnv))
 
     def VerifyCommand(self):
         if self.rc == 0:
@@ -556,6 +646,219 @@ class GitCommand:
         return self.rc
 
 
+class GitStream:
+    """A git command whose output is read while it runs.
+
+    GitCommand collects all the output in memory before returning, so reading
+    the output of commands like `ls-tree -r` or `grep` in pieces here keeps
+    memory use from growing with it.  stderr is spooled to a temporary file
+    (so git never blocks on it), and is in .stderr once the command finishes.
+
+    The command is started right away.  When the output has been read, Wait()
+    (or leaving the with block) waits for the command & returns its exit
+    status.  To stop reading early, Kill() the command first.
+
+    Examples:
+      with GitStream(project, ["ls-tree", "-r", "-z", rev], bare=True) as p:
+          for record in p.Records("\0"):
+              ...
+      if p.rc:
+          ...
+
+      # Pipe the output of one command into another.
+      with GitStream(project, ["pack-objects", ...], stdin=subprocess.PIPE,
+                     stdout=subprocess.DEVNULL, verify_command=True) as pack:
+          GitStream(project, ["rev-list", ...], stdout=pack.stdin).Wait()
+    """
+
+    def __init__(
+        self,
+        project,
+        cmdv,
+        bare=False,
+        cwd=None,
+        gitdir=None,
+        objdir=None,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        verify_command=False,
+    ):
+        """Start the command.
+
+        Args:
+            project: The project to run the command in (for its work tree &
+                git dir, unless |cwd| or |gitdir| are passed).
+            cmdv: The git command line (without "git").
+            bare: Whether to run in |gitdir| rather than the work tree.
+            cwd: The directory to run in.
+            gitdir: The git dir to run with.
+            objdir: The object directory to run with.
+            stdin: What to connect stdin to (e.g. subprocess.PIPE to write to
+                .stdin).
+            stdout: What to connect stdout to.  Only when it is
+                subprocess.PIPE (the default) can the output be read here.
+            verify_command: Whether Wait() raises GitCommandError when the
+                command fails.
+
+        Raises:
+            GitPopenCommandError: The command couldn't be started.
+        """
+        if project:
+            if not cwd:
+                cwd = project.worktree
+            if not gitdir:
+                gitdir = project.gitdir
+
+        self.project = project
+        self.cmdv = cmdv
+        self.verify_command = verify_command
+        self.rc = None
+        self.stderr = None
+        self._killed = False
+
+        # Git on Windows wants its paths only using / for reliability.
+        if platform_utils.isWindows():
+            if objdir:
+                objdir = objdir.replace("\\", "/")
+            if gitdir:
+                gitdir = gitdir.replace("\\", "/")
+
+        env = _build_env(objdir=objdir, gitdir=gitdir, bare=bare)
+        if bare:
+            cwd = None
+        command = [GIT] + cmdv
+        self._command = command
+        # As with GitCommand, the event log is only written if it fails.
+        self._sid = ReserveSid(env)
+        self._stderr_file = tempfile.TemporaryFile()
+        dbg = _DebugString(command, env, cwd, stdin, stdout, subprocess.PIPE)
+        self._trace = Trace(
+            "git command %s %s with debug: %s", LAST_GITDIR, command, dbg
+        )
+        self._trace.__enter__()
+        self._start = time.time()
+        self._start_cpu = git_stats.ChildCpuTime()
+        try:
+            self.process = subprocess.Popen(
+                command,
+                cwd=cwd,
+                env=env,
+                stdin=stdin,
+                stdout=stdout,
+                stderr=self._stderr_file,
+            )
+        except Exception as e:
+            self._trace.__exit__(None, None, None)
+            self._stderr_file.close()
+            raise GitPopenCommandError(
+                message=f"{cmdv[0]}: {e}",
+                project=project.name if project else None,
+                command_args=cmdv,
+            )
+
+    @property
+    def stdin(self):
+        """The pipe to the command's stdin, if it was opened with one."""
+        return self.process.stdin
+
+    def Chunks(self, size=STREAM_CHUNK_SIZE):
+        """Yield the output (as bytes) as it is written."""
+        read = self.process.stdout.read1
+        chunk = read(size)
+        while chunk:
+            yield chunk
+            chunk = read(size)
+
+    def Records(self, sep="\n"):
+        """Yield the output split by |sep|, without the separators.
+
+        The records are bytes if |sep| is, and decoded strs otherwise.
+        """
+        decode = not isinstance(sep, bytes)
+        if decode:
+            sep = sep.encode("utf-8")
+        partial = b""
+        for chunk in self.Chunks():
+            records = (partial + chunk).split(sep)
+            partial = records.pop()
+            if decode:
+                for record in records:
+                    yield record.decode("utf-8", "backslashreplace")
+            else:
+                yield from records
+        if partial:
+            if decode:
+                partial = partial.decode("utf-8", "backslashreplace")
+            yield partial
+
+    def Lines(self):
+        """Yield the lines of the output as strs (without the newlines)."""
+        return self.Records("\n")
+
+    def Kill(self):
+        """Stop the command, e.g. when no more output is needed.
+
+        Its exit status isn't checked then.
+        """
+        self._killed = True
+        self.process.kill()
+
+    def Wait(self):
+        """Wait for the command to finish, and return its exit status.
+
+        Raises:
+            GitCommandError: The command failed, and verify_command is set.
+        """
+        if self.rc is not None:
+            return self.rc
+        p = self.process
+        for pipe in (p.stdin, p.stdout):
+            if pipe:
+                pipe.close()
+        self.rc = p.wait()
+        self._trace.__exit__(None, None, None)
+        _RecordCommand(
+            self._command,
+            self.project,
+            self._start,
+            self._start_cpu,
+            p,
+            self.rc,
+        )
+        self._stderr_file.seek(0)
+        self.stderr = self._stderr_file.read().decode(
+            "utf-8", "backslashreplace"
+        )
+        self._stderr_file.close()
+
+        if self.rc and not self._killed:
+            stderr = "\n".join(self.stderr.split("\n")[:GIT_ERROR_STDERR_LINES])
+            error = GitCommandError(
+                project=self.project.name if self.project else None,
+                command_args=self.cmdv,
+                git_rc=self.rc,
+                git_stderr=stderr or None,
+            )
+            LogCommandError(self._sid, error, _CommandName(self.cmdv))
+            if self.verify_command:
+                raise error
+        return self.rc
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.Wait()
+        else:
+            # Don't hide the error with one from the command.
+            try:
+                self.Wait()
+            except GitCommandError:
+                pass
+        return False
+
+
 class GitRequireError(RepoExitError):
     """Error raised when git version is unavailable or invalid."""
 
@@ -15,16 +15,12 @@
 import contextlib
 import datetime
 import errno
-import http.client
 import json
 import os
 import re
-import ssl
 import subprocess
 import sys
 from typing import Union
-import urllib.error
-import urllib.request
 
 from error import GitError
 from error import UploadError
@@ -647,15 +643,21 @@ class Remote:
                 self._review_url = http_url
                 REVIEW_CACHE[u] = self._review_url
             else:
+                import http.client
+                import ssl
+                import urllib.error
+
+                import repo_http
+
                 try:
                     info_url = u + "ssh_info"
                     if not validate_certs:
                         context = ssl._create_unverified_context()
-                        info = urllib.request.urlopen(
+                        info = repo_http.urlopen(
                             info_url, context=context
                         ).read()
                     else:
-                        info = urllib.request.urlopen(info_url).read()
+                        info = repo_http.urlopen(info_url).read()
                     if info == b"NOT_AVAILABLE" or b"<" in info:
                         # If `info` contains '<', we assume the server gave us
                         # some sort of HTML response back, like maybe a login
@@ -0,0 +1,133 @@
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Remember what git is installed across repo processes.
+
+Every repo process needs the git version, and a few settings from the global
+git config (e.g. protocol.version).  Rather than run git to learn them every
+time, they are saved in the .repo directory, along with the path, size & mtime
+of the git binary and the mtimes of the global config files.  When any of
+those change, everything saved is thrown away.
+
+Files pulled in by [include] in the global config aren't tracked.
+
+Examples:
+  git_info_cache.SetRepoDir(repodir)
+
+  ver_str = git_info_cache.Get("version", lambda: run_git("--version"))
+"""
+
+import json
+import os
+import shutil
+from typing import Any, Callable, Optional
+
+import platform_utils
+
+
+_CACHE_NAME = ".repo_git_info.json"
+
+# The git binary (see git_command.GIT).
+_GIT = "git"
+
+# The environment that changes which git & global config files are used.
+_ENV_VARS = (
+    "HOME",
+    "XDG_CONFIG_HOME",
+    "GIT_CONFIG_GLOBAL",
+    "GIT_CONFIG_SYSTEM",
+    "GIT_CONFIG_NOSYSTEM",
+)
+
+_path = None
+_stamp = None
+_values = None
+
+
+def SetRepoDir(repodir: Optional[str]) -> None:
+    """Save the cache in |repodir| (or only in memory if None)."""
+    global _path, _values
+    _path = os.path.join(repodir, _CACHE_NAME) if repodir else None
+    _values = None
+
+
+def _FileStamp(path: Optional[str]) -> Optional[list]:
+    if not path:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [path, st.st_size, st.st_mtime_ns]
+
+
+def _Stamp() -> dict:
+    """Return what the cached values depend on."""
+    home = os.path.expanduser("~")
+    xdg = os.environ.get("XDG_CONFIG_HOME") or os.path.join(home, ".config")
+    config_files = [
+        os.environ.get("GIT_CONFIG_GLOBAL"),
+        os.environ.get("GIT_CONFIG_SYSTEM"),
+        os.path.join(home, ".gitconfig"),
+        os.path.join(xdg, "git", "config"),
+        "/etc/gitconfig",
+    ]
+    return {
+        "env": {x: os.environ.get(x) for x in _ENV_VARS},
+        "git": _FileStamp(shutil.which(_GIT)),
+        "config": [_FileStamp(x) for x in config_files],
+    }
+
+
+def _Load() -> dict:
+    global _stamp
+    _stamp = _Stamp()
+    if _path:
+        try:
+            with open(_path) as fp:
+                data = json.load(fp)
+            if data.get("stamp") == _stamp:
+                return data["values"]
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass
+    return {}
+
+
+def _Save() -> None:
+    if not _path:
+        return
+    # Other repo processes may be saving at the same time; last one wins.
+    tmp_path = f"{_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w") as fp:
+            json.dump({"stamp": _stamp, "values": _values}, fp)
+        platform_utils.rename(tmp_path, _path)
+    except OSError:
+        platform_utils.remove(tmp_path, missing_ok=True)
+
+
+def Get(key: str, load: Callable[[], Any]) -> Any:
+    """Return the value of |key|, calling |load| to work it out if needed.
+
+    Args:
+        key: The name of the value.
+        load: Returns the value; it must be JSON serializable.
+    """
+    global _values
+    if _values is None:
+        _values = _Load()
+    if key not in _values:
+        _values[key] = load()
+        _Save()
+    return _values[key]
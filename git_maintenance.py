@@ -0,0 +1,246 @@
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Plan & run incremental housekeeping of git object directories.
+
+Rather than running a blanket `git gc --auto`, look at the object directory
+(without running git) and only run the cheap, incremental tasks that
+`git maintenance` would: write the commit-graph & multi-pack-index, and do a
+geometric repack (which also packs loose objects) once there are too many
+loose objects or packs.
+
+Examples:
+  plan = PlanMaintenance(project)
+  if plan.tasks:
+      RunMaintenance(project, plan.tasks, config={"pack.threads": 4})
+"""
+
+import os
+from typing import List, NamedTuple, Optional
+
+from git_config import IsId
+
+
+# The oldest git that supports all the tasks (repack --write-midx).
+MIN_GIT_VERSION = (2, 34, 0)
+
+# The defaults of gc.auto & gc.autoPackLimit.
+_DEFAULT_AUTO = 6700
+_DEFAULT_AUTO_PACK_LIMIT = 50
+
+# The files that belong to a pack, by extension.
+_PACK_EXTENSIONS = {
+    ".pack",
+    ".idx",
+    ".rev",
+    ".bitmap",
+    ".keep",
+    ".promisor",
+    ".mtimes",
+}
+
+# The tasks, in the order they should run.
+TASK_REPACK = "geometric-repack"
+TASK_PACK_REFS = "pack-refs"
+TASK_MULTI_PACK_INDEX = "multi-pack-index"
+TASK_COMMIT_GRAPH = "commit-graph"
+
+
+class ObjectStats(NamedTuple):
+    """What an object directory looks like."""
+
+    # Estimated number of loose objects (the same way `git gc --auto` does).
+    loose: int
+    # Number of packs.
+    packs: int
+    # Total size of the packs.
+    pack_size: int
+    # Modification time of the newest pack (0 if there are none).
+    newest_pack: float
+    # Modification time of the commit-graph (0 if there is none).
+    commit_graph: float
+    # Modification time of the multi-pack-index (0 if there is none).
+    midx: float
+    # Total size of the files that `git count-objects` reports as garbage.
+    garbage_size: int = 0
+
+
+class MaintenancePlan(NamedTuple):
+    """The housekeeping to do for a project."""
+
+    # How much work this is likely to be, for scheduling the largest first.
+    cost: int
+    # The tasks to run, in order (None to fall back to `git gc --auto`).
+    tasks: Optional[List[str]]
+
+
+def _GetMtime(path: str) -> float:
+    """Return the modification time of |path|, or 0 if it doesn't exist."""
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return 0
+
+
+def ReadObjectStats(objdir: str, scan_loose: bool = False) -> ObjectStats:
+    """Read the stats of the git directory |objdir| without running git.
+
+    Args:
+        objdir: The git directory.
+        scan_loose: Whether to scan all the loose object directories, to get
+            an exact count of loose objects & the garbage in them.  Otherwise
+            the count is estimated from a single directory.
+    """
+    objects = os.path.join(objdir, "objects")
+    loose = 0
+    garbage_size = 0
+
+    for fanout in [f"{x:02x}" for x in range(256)] if scan_loose else ["17"]:
+        try:
+            with os.scandir(os.path.join(objects, fanout)) as it:
+                for entry in it:
+                    if len(entry.name) == 38 and IsId(fanout + entry.name):
+                        loose += 1
+                    elif scan_loose:
+                        try:
+                            garbage_size += entry.stat().st_size
+                        except OSError:
+                            pass
+        except OSError:
+            pass
+    if not scan_loose:
+        # Like git, extrapolate from a single fan-out directory.
+        loose *= 256
+
+    packs = 0
+    pack_size = 0
+    newest_pack = 0
+    # The pack files by base name, to find the incomplete ones.
+    pack_files = {}
+    try:
+        with os.scandir(os.path.join(objects, "pack")) as it:
+            for entry in it:
+                base, ext = os.path.splitext(entry.name)
+                if entry.name.startswith("multi-pack-index"):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                if ext not in _PACK_EXTENSIONS:
+                    garbage_size += st.st_size
+                    continue
+                pack_files.setdefault(base, {})[ext] = st
+    except OSError:
+        pass
+    for files in pack_files.values():
+        if ".pack" in files and ".idx" in files:
+            packs += 1
+            pack_size += files[".pack"].st_size
+            newest_pack = max(newest_pack, files[".pack"].st_mtime)
+        else:
+            # A pack & its index are useless without each other.
+            garbage_size += sum(x.st_size for x in files.values())
+
+    commit_graph = max(
+        _GetMtime(os.path.join(objects, "info", "commit-graph")),
+        _GetMtime(
+            os.path.join(objects, "info", "commit-graphs", "commit-graph-chain")
+        ),
+    )
+    midx = _GetMtime(os.path.join(objects, "pack", "multi-pack-index"))
+    return ObjectStats(
+        loose,
+        packs,
+        pack_size,
+        newest_pack,
+        commit_graph,
+        midx,
+        garbage_size,
+    )
+
+
+def PlanMaintenance(
+    project, stats: Optional[ObjectStats] = None
+) -> MaintenancePlan:
+    """Work out the housekeeping |project|'s object directory needs.
+
+    Args:
+        project: The project whose objdir to look at.
+        stats: The stats of the objdir (read from disk by default).
+    """
+    if stats is None:
+        stats = ReadObjectStats(project.objdir)
+    config = project.config
+    tasks = []
+
+    # Packs may not be deleted from shared object directories.
+    if not config.GetBoolean("extensions.preciousObjects"):
+        auto = config.GetInt("gc.auto")
+        if auto is None:
+            auto = _DEFAULT_AUTO
+        pack_limit = config.GetInt("gc.autoPackLimit")
+        if pack_limit is None:
+            pack_limit = _DEFAULT_AUTO_PACK_LIMIT
+        if auto > 0 and (
+            stats.loose > auto or (pack_limit > 0 and stats.packs > pack_limit)
+        ):
+            tasks += [TASK_REPACK, TASK_PACK_REFS]
+
+    # The repack writes a new multi-pack-index itself.
+    if TASK_REPACK not in tasks and stats.packs > 1:
+        if stats.midx < stats.newest_pack:
+            tasks.append(TASK_MULTI_PACK_INDEX)
+
+    if tasks or (stats.packs and stats.commit_graph < stats.newest_pack):
+        tasks.append(TASK_COMMIT_GRAPH)
+
+    return MaintenancePlan(stats.pack_size + stats.loose * 1024, tasks)
+
+
+def RunMaintenance(
+    project, tasks: List[str], config: Optional[dict] = None
+) -> None:
+    """Run the housekeeping |tasks| on |project|.
+
+    Args:
+        project: The project to run the tasks on.
+        tasks: The tasks from PlanMaintenance.
+        config: Extra git config to run the commands with.
+    """
+    git = project.bare_git
+    for task in tasks:
+        if task == TASK_REPACK:
+            git.repack(
+                "-d",
+                "-l",
+                "-q",
+                "--geometric=2",
+                "--write-midx",
+                config=config,
+            )
+        elif task == TASK_PACK_REFS:
+            git.pack_refs(config=config)
+        elif task == TASK_MULTI_PACK_INDEX:
+            git.multi_pack_index("write", "--no-progress", config=config)
+        elif task == TASK_COMMIT_GRAPH:
+            git.commit_graph(
+                "write",
+                "--reachable",
+                "--split",
+                "--no-progress",
+                config=config,
+            )
+        else:
+            raise ValueError(f"unknown maintenance task: {task}")
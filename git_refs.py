@@ -13,6 +13,7 @@
 # limitations under the License.
 
 import os
+import re
 
 from git_command import GitCommand
 import platform_utils
@@ -28,6 +29,51 @@ R_WORKTREE = "refs/worktree/"
 R_WORKTREE_M = R_WORKTREE + "m/"
 R_M = "refs/remotes/m/"
 
+# What HEAD contains for ref backends other than "files".
+_INVALID_HEAD = "refs/heads/.invalid"
+
+_ID_RE = re.compile(r"^[0-9a-f]{40}([0-9a-f]{24})?$")
+
+_FOR_EACH_REF = [
+    "for-each-ref",
+    "--format=%(objectname)%00%(refname)%00%(symref)",
+]
+
+
+def ReadHead(gitdir):
+    """Read the commit HEAD points to straight from the files in |gitdir|.
+
+    This doesn't run git, so it only understands the "files" ref backend.
+
+    Returns:
+        The commit id, or None if it couldn't be worked out.
+    """
+    try:
+        with open(os.path.join(gitdir, HEAD)) as fp:
+            head = fp.read().strip()
+    except OSError:
+        return None
+    if not head.startswith("ref: "):
+        return head or None
+
+    ref = head[len("ref: ") :]
+    try:
+        with open(os.path.join(gitdir, ref)) as fp:
+            return fp.read().strip() or None
+    except OSError:
+        pass
+    try:
+        with open(os.path.join(gitdir, "packed-refs")) as fp:
+            for line in fp:
+                if line.startswith(("#", "^")):
+                    continue
+                ref_id, _, name = line.rstrip("\n").partition(" ")
+                if name == ref:
+                    return ref_id
+    except OSError:
+        pass
+    return None
+
 
 class GitRefs:
     def __init__(self, gitdir):
@@ -69,6 +115,15 @@ class GitRefs:
         if self._phyref is None or self._NeedUpdate():
             self._LoadAll()
 
+    async def LoadAsync(self, runner):
+        """Load the refs (unless they're loaded & unchanged), running git with
+        a git_async.Runner, so reading them after doesn't block."""
+        if self._phyref is None or self._NeedUpdate():
+            result = await runner.Run(
+                None, _FOR_EACH_REF, bare=True, gitdir=self._gitdir
+            )
+            self._LoadAll(result.stdout if result.rc == 0 else "")
+
     def _NeedUpdate(self):
         with Trace(": scan refs %s", self._gitdir):
             for name, mtime in self._mtime.items():
@@ -81,14 +136,22 @@ class GitRefs:
                     return True
             return False
 
-    def _LoadAll(self):
+    def _LoadAll(self, refs=None):
+        """Load all the refs.
+
+        Args:
+            refs: The output of `git for-each-ref` (_FOR_EACH_REF), if it was
+                already run.
+        """
         with Trace(": load refs %s", self._gitdir):
             self._phyref = {}
             self._symref = {}
             self._mtime = {}
 
-            self._ReadRefs()
-            self._ReadSymbolicRef(HEAD)
+            if refs is None:
+                refs = self._ReadRefs()
+            self._ParseRefs(refs)
+            self._ReadHead()
 
             scan = self._symref
             attempts = 0
@@ -113,26 +176,47 @@ class GitRefs:
         """Check if a ref_id is a null object ID."""
         return ref_id and all(ch == "0" for ch in ref_id)
 
-    def _ReadRefs(self) -> None:
+    def _ReadRefs(self) -> str:
         """Read all references using git for-each-ref."""
         p = GitCommand(
             None,
-            ["for-each-ref", "--format=%(objectname)%00%(refname)%00%(symref)"],
+            _FOR_EACH_REF,
             capture_stdout=True,
             capture_stderr=True,
             bare=True,
             gitdir=self._gitdir,
         )
         if p.Wait() != 0:
-            return
+            return ""
+        return p.stdout
 
-        for line in p.stdout.splitlines():
+    def _ParseRefs(self, refs: str) -> None:
+        """Parse the output of _ReadRefs."""
+        for line in refs.splitlines():
             ref_id, name, symref = line.split("\0")
             if symref:
                 self._symref[name] = symref
             elif ref_id and not self._IsNullRef(ref_id):
                 self._phyref[name] = ref_id
 
+    def _ReadHead(self) -> None:
+        """Read HEAD, straight from the file when the ref backend allows."""
+        try:
+            with open(os.path.join(self._gitdir, HEAD)) as fp:
+                head = fp.read().strip()
+        except OSError:
+            head = ""
+        if head.startswith("ref: "):
+            ref = head[len("ref: ") :]
+            # Other ref backends (e.g. reftable) leave a stub HEAD behind.
+            if ref != _INVALID_HEAD:
+                self._symref[HEAD] = ref
+                return
+        elif _ID_RE.match(head):
+            self._phyref[HEAD] = head
+            return
+        self._ReadSymbolicRef(HEAD)
+
     def _ReadSymbolicRef(self, name: str) -> None:
         """Read a symbolic reference."""
         p = GitCommand(
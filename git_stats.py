@@ -0,0 +1,131 @@
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Count & time the git commands repo runs.
+
+Every GitCommand is recorded by git subcommand & by project: how many ran,
+their total wall time, and the CPU time of the git processes.  Workers of
+Command.ExecuteInParallel send their counts back to the parent along with
+their results, so the totals cover the whole repo command.
+
+CPU time is taken from the resource usage of all child processes, so it is
+only approximate when git runs in several threads at once, and is always 0 on
+Windows.
+
+Examples:
+  git_stats.Add("rev-parse", project.name, wall, cpu)
+
+  for line in git_stats.Summary():
+      print(line)
+"""
+
+from typing import Dict, List, NamedTuple, Optional
+
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# Where commands that don't belong to a project are recorded.
+NO_PROJECT = ""
+
+
+class Stat(NamedTuple):
+    """The git commands run for a subcommand or project."""
+
+    count: int = 0
+    wall: float = 0.0
+    cpu: float = 0.0
+
+    def __add__(self, other):
+        return Stat(
+            self.count + other.count,
+            self.wall + other.wall,
+            self.cpu + other.cpu,
+        )
+
+
+_by_command: Dict[str, Stat] = {}
+_by_project: Dict[str, Stat] = {}
+
+
+def ChildCpuTime() -> float:
+    """Return the CPU time used by all the child processes that finished."""
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def Add(
+    command: str, project: Optional[str], wall: float, cpu: float = 0.0
+) -> None:
+    """Record that git |command| ran for |project|."""
+    stat = Stat(1, wall, cpu)
+    _by_command[command] = _by_command.get(command, Stat()) + stat
+    project = project or NO_PROJECT
+    _by_project[project] = _by_project.get(project, Stat()) + stat
+
+
+def Take() -> dict:
+    """Return what was recorded so far (to pass to Merge), and forget it."""
+    data = {"command": dict(_by_command), "project": dict(_by_project)}
+    _by_command.clear()
+    _by_project.clear()
+    return data
+
+
+def Merge(data: Optional[dict]) -> None:
+    """Add what another process recorded (from Take)."""
+    if not data:
+        return
+    for totals, stats in (
+        (_by_command, data["command"]),
+        (_by_project, data["project"]),
+    ):
+        for name, stat in stats.items():
+            totals[name] = totals.get(name, Stat()) + Stat(*stat)
+
+
+def ByCommand() -> Dict[str, Stat]:
+    """Return the totals by git subcommand."""
+    return dict(_by_command)
+
+
+def ByProject() -> Dict[str, Stat]:
+    """Return the totals by project name."""
+    return dict(_by_project)
+
+
+def Total() -> Stat:
+    """Return the totals of all git commands."""
+    return sum(_by_command.values(), Stat())
+
+
+def Summary(limit: int = 5) -> List[str]:
+    """Return lines describing the git commands run, for `repo --time`."""
+    total = Total()
+    lines = [
+        "git\t%d commands, %.3fs wall, %.3fs cpu"
+        % (total.count, total.wall, total.cpu)
+    ]
+    top = sorted(_by_command.items(), key=lambda x: x[1].wall, reverse=True)
+    for name, stat in top[:limit]:
+        lines.append(
+            "\t%-16s %6d  %.3fs wall, %.3fs cpu"
+            % (name, stat.count, stat.wall, stat.cpu)
+        )
+    return lines
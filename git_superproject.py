@@ -34,6 +34,7 @@ import urllib.parse
 
 from git_command import git_require
 from git_command import GitCommand
+from git_command import GitStream
 from git_config import IsId
 from git_config import RepoConfig
 from git_refs import GitRefs
@@ -353,38 +354,40 @@ class Superproject:
         Works only in git repositories.
 
         Returns:
-            data: data returned from 'git ls-tree ...'. None on error.
+            A dict of the project paths to their commit ids (from the gitlinks
+            of 'git ls-tree ...').  None on error.
         """
         if not os.path.exists(self._work_git):
             self._LogWarning(
                 "git ls-tree missing directory: {}", self._work_git
             )
             return None
-        data = None
         branch = "HEAD" if not self.revision else self.revision
         cmd = ["ls-tree", "-z", "-r", branch]
 
-        p = GitCommand(
-            None,
-            cmd,
-            gitdir=self._work_git,
-            bare=True,
-            capture_stdout=True,
-            capture_stderr=True,
-        )
-        retval = p.Wait()
-        if retval == 0:
-            data = p.stdout
-        else:
+        # Parse records like the following to select the ones starting with
+        # '160000' and build a dictionary with project path (last element) and
+        # its commit id (3rd element).  The tree can be huge, so read it as git
+        # writes it.
+        #
+        # 160000 commit 2c2724cb36cd5a9cec6c852c681efc3b7c6b86ea\tart\x00
+        # 120000 blob acc2cbdf438f9d2141f0ae424cec1d8fc4b5d97f\tbootstrap.bash\x00  # noqa: E501
+        commit_ids = {}
+        with GitStream(None, cmd, gitdir=self._work_git, bare=True) as p:
+            for record in p.Records("\0"):
+                if record.startswith("160000 "):
+                    ls_data = record.split(None, 3)
+                    commit_ids[ls_data[3]] = ls_data[2]
+        if p.rc:
             self._LogWarning(
                 "git ls-tree call failed, command: git {}, "
                 "return code: {}, stderr: {}",
                 cmd,
-                retval,
+                p.rc,
                 p.stderr,
             )
             return None
-        return data
+        return commit_ids
 
     def Sync(self, git_event_log):
         """Gets a local copy of a superproject for the manifest.
@@ -435,28 +438,14 @@ class Superproject:
         if not sync_result.success:
             return CommitIdsResult(None, sync_result.fatal)
 
-        data = self._LsTree()
-        if not data:
+        commit_ids = self._LsTree()
+        if commit_ids is None:
             self._LogWarning(
                 "git ls-tree failed to return data for manifest: {}",
                 self._manifest.manifestFile,
             )
             return CommitIdsResult(None, True)
 
-        # Parse lines like the following to select lines starting with '160000'
-        # and build a dictionary with project path (last element) and its commit
-        # id (3rd element).
-        #
-        # 160000 commit 2c2724cb36cd5a9cec6c852c681efc3b7c6b86ea\tart\x00
-        # 120000 blob acc2cbdf438f9d2141f0ae424cec1d8fc4b5d97f\tbootstrap.bash\x00  # noqa: E501
-        commit_ids = {}
-        for line in data.split("\x00"):
-            ls_data = line.split(None, 3)
-            if not ls_data:
-                break
-            if ls_data[0] == "160000":
-                commit_ids[ls_data[3]] = ls_data[2]
-
         self._project_commit_ids = commit_ids
         return CommitIdsResult(commit_ids, False)
 
@@ -44,6 +44,52 @@ SOCK_TIMEOUT = 0.5  # in seconds
 p_init_count = 0
 
 
+# The environment variable that has the sid of the parent process.
+_PARENT_SID_KEY = "GIT_TRACE2_PARENT_SID"
+
+
+def _NewSid(start, add_init_count):
+    """Returns a sid component for a log started at |start|."""
+    global p_init_count
+    p_init_count += 1
+    sid = f"repo-{start.strftime('%Y%m%dT%H%M%SZ')}-P{os.getpid():08x}"
+    if add_init_count:
+        sid = f"{sid}-{p_init_count}"
+    return sid
+
+
+def _SetSid(env, sid):
+    """Appends |sid| to the parent sid in |env|, and returns the full sid."""
+    # Try to get session-id (sid) from environment (setup in repo launcher).
+    if env is None:
+        env = os.environ
+    parent_sid = env.get(_PARENT_SID_KEY)
+    # Append our sid component to the parent sid (if it exists).
+    if parent_sid is not None:
+        full_sid = parent_sid + "/" + sid
+    else:
+        full_sid = sid
+
+    # Set/update the environment variable.
+    # Environment handling across systems is messy.
+    try:
+        env[_PARENT_SID_KEY] = full_sid
+    except UnicodeEncodeError:
+        env[_PARENT_SID_KEY] = full_sid.encode()
+    return full_sid
+
+
+def ReserveSid(env):
+    """Sets the sid of a log that might never be created in |env|.
+
+    This is like BaseEventLog(env=env, add_init_count=True), without the cost
+    of creating the log.  Pass the returned sid to BaseEventLog(full_sid=...)
+    if there turns out to be something to log.
+    """
+    start = datetime.datetime.now(datetime.timezone.utc)
+    return _SetSid(env, _NewSid(start, True))
+
+
 class BaseEventLog:
     """Event log that records events that occurred during a repo invocation.
 
@@ -62,43 +108,35 @@ class BaseEventLog:
     """
 
     def __init__(
-        self, env=None, repo_source_version=None, add_init_count=False
+        self,
+        env=None,
+        repo_source_version=None,
+        add_init_count=False,
+        full_sid=None,
     ):
-        """Initializes the event log."""
-        global p_init_count
-        p_init_count += 1
+        """Initializes the event log.
+
+        Args:
+            env: The environment to get the parent sid from, and to set our
+                sid in (for the processes we run).  Defaults to os.environ.
+            repo_source_version: The version to log in a 'version' event.
+            add_init_count: Whether to make the sid unique in this process.
+            full_sid: The sid from ReserveSid, if it was reserved for this log
+                before creating it.  |env| is not used then.
+        """
         self._log = []
         self.verbose = False
-        # Try to get session-id (sid) from environment (setup in repo launcher).
-        KEY = "GIT_TRACE2_PARENT_SID"
-        if env is None:
-            env = os.environ
-
         self.start = datetime.datetime.now(datetime.timezone.utc)
 
         # Save both our sid component and the complete sid.
         # We use our sid component (self._sid) as the unique filename prefix and
         # the full sid (self._full_sid) in the log itself.
-        self._sid = (
-            f"repo-{self.start.strftime('%Y%m%dT%H%M%SZ')}-P{os.getpid():08x}"
-        )
-
-        if add_init_count:
-            self._sid = f"{self._sid}-{p_init_count}"
-
-        parent_sid = env.get(KEY)
-        # Append our sid component to the parent sid (if it exists).
-        if parent_sid is not None:
-            self._full_sid = parent_sid + "/" + self._sid
+        if full_sid is None:
+            self._sid = _NewSid(self.start, add_init_count)
+            self._full_sid = _SetSid(env, self._sid)
         else:
-            self._full_sid = self._sid
-
-        # Set/update the environment variable.
-        # Environment handling across systems is messy.
-        try:
-            env[KEY] = self._full_sid
-        except UnicodeEncodeError:
-            env[KEY] = self._full_sid.encode()
+            self._sid = full_sid.rsplit("/", 1)[-1]
+            self._full_sid = full_sid
 
         if repo_source_version is not None:
             # Add a version event to front of the log.
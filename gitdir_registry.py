@@ -0,0 +1,97 @@
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Keep track of the git directories repo has created.
+
+Every gitdir & objdir that repo creates is appended to a registry in the .repo
+directory, so finding the ones that are no longer used doesn't require walking
+all of .repo/projects & .repo/project-objects.  Appends are single small
+writes, so projects can be registered from parallel workers.
+
+The registry only lists every git directory once it has been marked complete,
+which happens after a full scan of the file system (see Scan).
+
+Examples:
+  Register(repodir, [project.gitdir, project.objdir])
+
+  paths = Load(repodir)
+  if paths is None:
+      paths = Scan(os.path.join(repodir, "projects"))
+  Save(repodir, paths)
+"""
+
+import os
+from typing import Iterable, Optional, Set
+
+import platform_utils
+
+
+_REGISTRY_NAME = ".repo_gitdirs"
+
+# The first line of a registry that lists every git directory.
+_COMPLETE = "# complete"
+
+
+def _Path(repodir: str) -> str:
+    return os.path.join(repodir, _REGISTRY_NAME)
+
+
+def Register(repodir: str, paths: Iterable[str]) -> None:
+    """Add the git directories |paths| to the registry."""
+    data = "".join(
+        os.path.relpath(os.path.abspath(x), repodir) + "\n" for x in paths
+    )
+    with open(_Path(repodir), "a") as fp:
+        fp.write(data)
+
+
+def Load(repodir: str) -> Optional[Set[str]]:
+    """Return the registered git directories.
+
+    Returns:
+        The absolute paths, or None if the registry isn't complete.
+    """
+    try:
+        with open(_Path(repodir)) as fp:
+            lines = fp.read().splitlines()
+    except OSError:
+        return None
+    if not lines or lines[0] != _COMPLETE:
+        return None
+    return {os.path.normpath(os.path.join(repodir, x)) for x in lines[1:] if x}
+
+
+def Save(repodir: str, paths: Iterable[str]) -> None:
+    """Replace the registry with the complete list of git directories."""
+    path = _Path(repodir)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as fp:
+        fp.write(_COMPLETE + "\n")
+        for x in sorted(paths):
+            fp.write(os.path.relpath(x, repodir) + "\n")
+    platform_utils.rename(tmp_path, path)
+
+
+def Scan(start_dir: str) -> Set[str]:
+    """Find the git directories under |start_dir|.
+
+    This doesn't look inside the git directories themselves.
+    """
+    found = set()
+    for root, dirs, _ in platform_utils.walk(start_dir):
+        for directory in dirs:
+            if directory.endswith(".git"):
+                found.add(os.path.join(root, directory))
+        dirs[:] = [x for x in dirs if not x.endswith(".git")]
+    return found
@@ -0,0 +1,420 @@
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Persistent trigram index used to speed up `repo grep --indexed`.
+
+Every object directory gets a small sqlite database that maps the trigrams of
+each (lowercased) blob to the blob, and the trees that have been indexed to
+the blobs they contain.  Blobs are shared between trees, so indexing a new tree
+(e.g. after a sync) only needs to read the blobs that changed.
+
+The index is only ever used to narrow down the files to search: the final
+answer always comes from running `git grep` on the candidate files.
+
+Examples:
+  index = GrepIndex(project)
+  index.Update(tree)
+  paths = index.Candidates(tree, [["literal"]])
+"""
+
+import contextlib
+import os
+import sqlite3
+import subprocess
+import time
+from typing import Iterable, List, Optional
+
+from git_command import GIT
+from git_command import GitCommand
+from git_command import GitStream
+from repo_logging import RepoLogger
+from repo_trace import Trace
+
+
+logger = RepoLogger(__file__)
+
+
+# Name of the database in the objdir.
+_INDEX_NAME = "repo-grep-index.sqlite"
+
+# Bump when the schema or trigram encoding changes.
+_INDEX_VERSION = 1
+
+# How many trees to keep indexed per objdir.
+_MAX_TREES = 8
+
+# Blobs larger than this aren't indexed (they're always searched).
+_MAX_BLOB_SIZE = 1024 * 1024
+
+# How long (in seconds) to wait for other repo processes using the index.
+_LOCK_TIMEOUT = 60
+
+# Characters with a special meaning in git grep's basic or extended regexps.
+_REGEX_CHARS = set(".[]*^$+?(){}|\\")
+
+
+def _RunGit(project, args, bare=False):
+    """Run a git command and return its raw stdout (or None on failure).
+
+    Unlike GitCommand, the output isn't decoded, so paths round trip exactly.
+    """
+    with GitStream(project, args, bare=bare) as p:
+        out = b"".join(p.Chunks())
+    return out if p.rc == 0 else None
+
+
+def Trigrams(data: bytes):
+    """Return the set of (ASCII case folded) trigrams in |data| as ints."""
+    data = data.lower()
+    return {
+        int.from_bytes(data[i : i + 3], "big") for i in range(len(data) - 2)
+    }
+
+
+def RequiredLiterals(pattern: str, fixed: bool = False) -> Optional[List[str]]:
+    """Find literal strings that every match of |pattern| has to contain.
+
+    This is deliberately conservative: when in doubt, less is required.
+
+    Args:
+        pattern: The git grep pattern.
+        fixed: Whether the pattern is a fixed string (-F).
+
+    Returns:
+        The literals (all of which must be present), or None if nothing usable
+        for the index could be found.
+    """
+    if fixed:
+        literals = [pattern]
+    elif any(x in pattern for x in "\\|()"):
+        # Escapes, groups & alternations differ between basic & extended
+        # regexps, so don't bother trying to make sense of them.
+        return None
+    else:
+        literals = []
+        current = ""
+        i = 0
+        while i < len(pattern):
+            c = pattern[i]
+            i += 1
+            if c not in _REGEX_CHARS:
+                current += c
+                continue
+            if c in "*?{":
+                # The previous character is optional.
+                current = current[:-1]
+                if c == "{":
+                    end = pattern.find("}", i)
+                    i = len(pattern) if end < 0 else end + 1
+            elif c == "[":
+                i = _SkipBracket(pattern, i)
+            literals.append(current)
+            current = ""
+        literals.append(current)
+    literals = [x for x in literals if len(x.encode("utf-8")) >= 3]
+    return literals or None
+
+
+def _SkipBracket(pattern, i):
+    """Return the index just past the bracket expression starting at |i|."""
+    if pattern[i : i + 1] == "^":
+        i += 1
+    # A leading "]" is a member rather than the end.
+    if pattern[i : i + 1] == "]":
+        i += 1
+    while i < len(pattern):
+        if pattern[i] == "]":
+            return i + 1
+        if pattern[i] == "[" and pattern[i + 1 : i + 2] in (":", ".", "="):
+            end = pattern.find(pattern[i + 1] + "]", i + 2)
+            if end < 0:
+                return len(pattern)
+            i = end + 2
+        else:
+            i += 1
+    return len(pattern)
+
+
+class GrepIndex:
+    """The trigram index of a project's object directory."""
+
+    def __init__(self, project):
+        self._project = project
+        self.path = os.path.join(project.objdir, _INDEX_NAME)
+
+    @property
+    def Exists(self):
+        return os.path.exists(self.path)
+
+    @contextlib.contextmanager
+    def _Open(self):
+        db = sqlite3.connect(self.path, timeout=_LOCK_TIMEOUT)
+        try:
+            version = db.execute("PRAGMA user_version").fetchone()[0]
+            if version != _INDEX_VERSION:
+                with db:
+                    db.executescript(
+                        """
+                        DROP TABLE IF EXISTS blobs;
+                        DROP TABLE IF EXISTS postings;
+                        DROP TABLE IF EXISTS trees;
+                        DROP TABLE IF EXISTS tree_entries;
+                        CREATE TABLE blobs (
+                            id INTEGER PRIMARY KEY,
+                            oid TEXT UNIQUE NOT NULL,
+                            indexed INTEGER NOT NULL
+                        );
+                        CREATE TABLE postings (
+                            trigram INTEGER NOT NULL,
+                            blob INTEGER NOT NULL,
+                            PRIMARY KEY (trigram, blob)
+                        ) WITHOUT ROWID;
+                        CREATE TABLE trees (
+                            tree TEXT PRIMARY KEY,
+                            used REAL NOT NULL
+                        );
+                        CREATE TABLE tree_entries (
+                            tree TEXT NOT NULL,
+                            path TEXT NOT NULL,
+                            blob INTEGER NOT NULL,
+                            PRIMARY KEY (tree, path)
+                        ) WITHOUT ROWID;
+                        """
+                    )
+                    db.execute("PRAGMA user_version = %d" % _INDEX_VERSION)
+            yield db
+        finally:
+            db.close()
+
+    def HeadTree(self) -> Optional[str]:
+        """Return the tree id of the project's HEAD."""
+        out = _RunGit(self._project, ["rev-parse", "HEAD^{tree}"], bare=True)
+        return out.decode("utf-8").strip() if out else None
+
+    def LocalChanges(self, cached: bool = False) -> Optional[List[str]]:
+        """Return the tracked paths that differ from HEAD.
+
+        Args:
+            cached: Only look at the index rather than the work tree.
+        """
+        args = ["diff-index", "--name-only", "-z"]
+        if cached:
+            args.append("--cached")
+        args.append("HEAD")
+        with GitStream(self._project, args) as p:
+            paths = [os.fsdecode(x) for x in p.Records(b"\0") if x]
+        return paths if p.rc == 0 else None
+
+    def HasTree(self, tree: str) -> bool:
+        if not self.Exists:
+            return False
+        with self._Open() as db:
+            return (
+                db.execute(
+                    "SELECT 1 FROM trees WHERE tree = ?", (tree,)
+                ).fetchone()
+                is not None
+            )
+
+    def Update(self, tree: Optional[str] = None) -> bool:
+        """Make sure |tree| (or HEAD's tree) is in the index.
+
+        Only blobs that aren't indexed already are read.
+
+        Returns:
+            Whether the tree is indexed.
+        """
+        if tree is None:
+            tree = self.HeadTree()
+            if tree is None:
+                return False
+        try:
+            return self._Update(tree)
+        except sqlite3.Error as e:
+            logger.warning("warning: %s: grep index failed: %s", self.path, e)
+            return False
+
+    def _Update(self, tree):
+        with Trace(": grep index %s %s", self.path, tree), self._Open() as db:
+            if db.execute(
+                "SELECT 1 FROM trees WHERE tree = ?", (tree,)
+            ).fetchone():
+                with db:
+                    db.execute(
+                        "UPDATE trees SET used = ? WHERE tree = ?",
+                        (time.time(), tree),
+                    )
+                return True
+
+            entries = []
+            cmd = ["ls-tree", "-r", "-l", "-z", tree]
+            with GitStream(self._project, cmd, bare=True) as p:
+                for record in p.Records(b"\0"):
+                    if not record:
+                        continue
+                    info, path = record.split(b"\t", 1)
+                    _mode, kind, oid, size = info.split()
+                    if kind != b"blob":
+                        continue
+                    entries.append(
+                        (os.fsdecode(path), oid.decode("utf-8"), int(size))
+                    )
+            if p.rc:
+                return False
+
+            known = {}
+            for oid, blob_id in db.execute("SELECT oid, id FROM blobs"):
+                known[oid] = blob_id
+            missing = {}
+            for _path, oid, size in entries:
+                if oid not in known:
+                    missing[oid] = size
+
+            with db:
+                self._IndexBlobs(db, missing, known)
+                db.executemany(
+                    "INSERT OR REPLACE INTO tree_entries VALUES (?, ?, ?)",
+                    ((tree, path, known[oid]) for path, oid, _ in entries),
+                )
+                db.execute(
+                    "INSERT OR REPLACE INTO trees VALUES (?, ?)",
+                    (tree, time.time()),
+                )
+                self._Prune(db)
+        return True
+
+    def _IndexBlobs(self, db, sizes, known):
+        """Add the trigrams of the blobs in |sizes| to the index."""
+        small = [oid for oid, size in sizes.items() if size <= _MAX_BLOB_SIZE]
+        for oid, size in sizes.items():
+            if size > _MAX_BLOB_SIZE:
+                known[oid] = db.execute(
+                    "INSERT INTO blobs (oid, indexed) VALUES (?, 0)", (oid,)
+                ).lastrowid
+        if not small:
+            return
+
+        env = GitCommand._GetBasicEnv()
+        env["GIT_DIR"] = self._project.gitdir
+        with subprocess.Popen(
+            [GIT, "cat-file", "--batch"],
+            env=env,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        ) as p:
+            # Request one blob at a time so neither side's pipe can fill up.
+            for oid in small:
+                p.stdin.write(oid.encode("utf-8") + b"\n")
+                p.stdin.flush()
+                header = p.stdout.readline().split()
+                if len(header) != 3:
+                    # Missing (e.g. partial clone): always search it.
+                    data = None
+                else:
+                    data = p.stdout.read(int(header[2]) + 1)[:-1]
+                blob_id = db.execute(
+                    "INSERT INTO blobs (oid, indexed) VALUES (?, ?)",
+                    (oid, 0 if data is None else 1),
+                ).lastrowid
+                known[oid] = blob_id
+                if data:
+                    db.executemany(
+                        "INSERT OR IGNORE INTO postings VALUES (?, ?)",
+                        ((x, blob_id) for x in Trigrams(data)),
+                    )
+            p.stdin.close()
+
+    @staticmethod
+    def _Prune(db):
+        """Forget the least recently used trees & their unused blobs."""
+        old = [
+            row[0]
+            for row in db.execute(
+                "SELECT tree FROM trees ORDER BY used DESC LIMIT -1 OFFSET ?",
+                (_MAX_TREES,),
+            )
+        ]
+        if not old:
+            return
+        db.executemany("DELETE FROM trees WHERE tree = ?", ((x,) for x in old))
+        db.executemany(
+            "DELETE FROM tree_entries WHERE tree = ?", ((x,) for x in old)
+        )
+        db.execute(
+            "DELETE FROM blobs WHERE id NOT IN "
+            "(SELECT DISTINCT blob FROM tree_entries)"
+        )
+        db.execute(
+            "DELETE FROM postings WHERE blob NOT IN (SELECT id FROM blobs)"
+        )
+
+    def Candidates(
+        self,
+        tree: str,
+        alternatives: Iterable[List[str]],
+        ignore_case: bool = False,
+    ) -> Optional[List[str]]:
+        """Return the paths in |tree| that might match.
+
+        Args:
+            tree: An indexed tree.
+            alternatives: Any of these may match; each is a list of literals
+                that all have to be present.
+            ignore_case: Whether the search ignores case.
+
+        Returns:
+            The candidate paths, or None if the index can't narrow things down.
+        """
+        try:
+            return self._Candidates(tree, alternatives, ignore_case)
+        except sqlite3.Error as e:
+            logger.warning("warning: %s: grep index failed: %s", self.path, e)
+            return None
+
+    def _Candidates(self, tree, alternatives, ignore_case):
+        blobs = set()
+        with self._Open() as db:
+            for literals in alternatives:
+                trigrams = set()
+                for literal in literals:
+                    trigrams.update(Trigrams(literal.encode("utf-8")))
+                if ignore_case:
+                    # The index only folds ASCII, so non-ASCII trigrams might
+                    # be spelled differently in the files.
+                    trigrams = {x for x in trigrams if not x & 0x808080}
+                if not trigrams:
+                    return None
+                trigrams = list(trigrams)
+                blobs.update(
+                    row[0]
+                    for row in db.execute(
+                        "SELECT blob FROM postings WHERE trigram IN (%s) "
+                        "GROUP BY blob HAVING COUNT(*) = ?"
+                        % ",".join("?" * len(trigrams)),
+                        trigrams + [len(trigrams)],
+                    )
+                )
+            blobs.update(
+                row[0]
+                for row in db.execute("SELECT id FROM blobs WHERE indexed = 0")
+            )
+            return sorted(
+                path
+                for path, blob in db.execute(
+                    "SELECT path, blob FROM tree_entries WHERE tree = ?",
+                    (tree,),
+                )
+                if blob in blobs
+            )
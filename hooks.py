@@ -12,14 +12,19 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import hashlib
+import json
 import os
 import re
 import sys
+import time
 import traceback
 import urllib.parse
 
 from error import HookError
 from git_refs import HEAD
+import platform_utils
+import trash
 
 
 # The API we've documented to hook authors.  Keep in sync with repo-hooks.md.
@@ -29,6 +34,68 @@ _API_ARGS = {
 }
 
 
+class HookResultCache:
+    """Remember which projects a hook has already passed on.
+
+    Each pass is an empty file named after its key, so separate repo processes
+    can share the cache without locking.  Only passes are ever recorded.
+    """
+
+    # The name of the cache directory under the .repo directory.
+    _DIR = "hook-results"
+
+    # How long (in seconds) a pass is remembered for.  This bounds how stale a
+    # result can get when a hook depends on things outside of its own files.
+    _MAX_AGE = 7 * 24 * 60 * 60
+
+    def __init__(self, repodir):
+        self._repodir = repodir
+        self._path = os.path.join(repodir, self._DIR)
+
+    @staticmethod
+    def Key(hook_type, hook_hash, name, worktree, commits, args):
+        """Return the cache key of a hook run on a single project.
+
+        Args:
+            hook_type: The type of the hook, e.g. "pre-upload".
+            hook_hash: The hash of the hook scripts (see RepoHook._GetHash).
+            name: The name of the project.
+            worktree: The checkout of the project.
+            commits: The ordered commit ids the hook checks.
+            args: The other (JSON-serializable) arguments the hook is run with.
+        """
+        data = json.dumps(
+            [hook_type, hook_hash, name, worktree, list(commits), args],
+            sort_keys=True,
+        )
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def Passed(self, key):
+        """Whether the hook has passed for |key|."""
+        try:
+            mtime = os.stat(os.path.join(self._path, key)).st_mtime
+        except OSError:
+            return False
+        return time.time() - mtime < self._MAX_AGE
+
+    def AddPass(self, key):
+        """Record that the hook has passed for |key|."""
+        path = os.path.join(self._path, key)
+        try:
+            os.makedirs(self._path, exist_ok=True)
+            # Creating an empty file is atomic, and refreshes an old pass.
+            with open(path, "w"):
+                pass
+        except OSError:
+            # Failing to cache a result only costs a rerun of the hook.
+            pass
+
+    def Clear(self):
+        """Forget all the recorded results."""
+        if platform_utils.isdir(self._path):
+            trash.Delete(self._repodir, self._path)
+
+
 class RepoHook:
     """A RepoHook contains information about a script to run as a hook.
 
@@ -424,6 +491,70 @@ class RepoHook:
                 AddHookOptionGroup().
         """
         # Make sure our own callers use the documented API.
+        if not self._CheckArgs(kwargs):
+            return False
+
+        if not self._IsEnabled():
+            return True
+
+        passed, _ = self._RunHook(**kwargs)
+        return self._CheckResult(passed)
+
+    def RunCached(self, cache, project_commits, **kwargs):
+        """Run the hook on the projects it hasn't already passed on.
+
+        The hook must take project_list & worktree_list arguments.  Projects
+        whose commits haven't changed since the hook last passed on them are
+        left out of those lists, and if no projects are left, the hook isn't
+        run at all.  Failed or ignored results are never cached.
+
+        Args:
+            cache: The HookResultCache to use.
+            project_commits: The ordered commit ids the hook checks in each
+                project of project_list.
+            kwargs: Keyword arguments to pass to the hook, as with Run.
+
+        Returns:
+            The same as Run.
+        """
+        if not self._CheckArgs(kwargs):
+            return False
+
+        if not self._IsEnabled():
+            return True
+
+        hook_hash = self._GetHash()
+        args = {
+            k: v
+            for k, v in kwargs.items()
+            if k not in ("project_list", "worktree_list")
+        }
+        keys = [
+            cache.Key(self._hook_type, hook_hash, name, worktree, commits, args)
+            for name, worktree, commits in zip(
+                kwargs["project_list"], kwargs["worktree_list"], project_commits
+            )
+        ]
+        todo = [i for i, key in enumerate(keys) if not cache.Passed(key)]
+        if not todo:
+            print(
+                "%s hooks already passed on these commits; skipping."
+                % self._hook_type,
+                file=sys.stderr,
+            )
+            return True
+
+        kwargs = kwargs.copy()
+        kwargs["project_list"] = [kwargs["project_list"][i] for i in todo]
+        kwargs["worktree_list"] = [kwargs["worktree_list"][i] for i in todo]
+        passed, ran = self._RunHook(**kwargs)
+        if passed and ran:
+            for i in todo:
+                cache.AddPass(keys[i])
+        return self._CheckResult(passed)
+
+    def _CheckArgs(self, kwargs):
+        """Whether |kwargs| match the documented API of the hook."""
         exp_kwargs = _API_ARGS.get(self._hook_type, set())
         got_kwargs = set(kwargs.keys())
         if exp_kwargs != got_kwargs:
@@ -436,18 +567,27 @@ class RepoHook:
                 file=sys.stderr,
             )
             return False
+        return True
 
+    def _IsEnabled(self):
+        """Whether the hook should be run at all."""
         # Do not do anything in case bypass_hooks is set, or
         # no-op if there is no hooks project or if hook is disabled.
-        if (
+        return not (
             self._bypass_hooks
             or not self._hooks_project
             or not self._script_fullpath
             or self._hook_type not in self._hooks_project.enabled_repo_hooks
-        ):
-            return True
+        )
+
+    def _RunHook(self, **kwargs):
+        """Run the hook, if the user allows it.
 
+        Returns:
+            Whether the hook passed, and whether it actually ran.
+        """
         passed = True
+        ran = False
         try:
             self._CheckHook()
 
@@ -455,6 +595,7 @@ class RepoHook:
             if self._allow_all_hooks or self._CheckForHookApproval():
                 # Run the hook with the same version of python we're using.
                 self._ExecuteHook(**kwargs)
+                ran = True
         except SystemExit as e:
             passed = False
             print(
@@ -465,7 +606,10 @@ class RepoHook:
         except HookError as e:
             passed = False
             print("ERROR: %s" % str(e), file=sys.stderr)
+        return passed, ran
 
+    def _CheckResult(self, passed):
+        """Return whether the action may go ahead after the hook |passed|."""
         if not passed and self._ignore_hooks:
             print(
                 "\nWARNING: %s hooks failed, but continuing anyways."
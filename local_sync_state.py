@@ -0,0 +1,197 @@
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Keep track of what sync did to each project.
+
+sync records when it last fetched & checked out every project, and the
+revision it checked out, in .repo/.repo_localsyncstate.json.  Other commands
+read it back, e.g. to tell whether the last sync was interrupted, or to find
+the projects it changed.  Named checkpoints of those revisions are kept in
+.repo/.repo_checkpoints.json.
+
+Examples:
+  state = LocalSyncState(manifest)
+  state.SetCheckoutTime(project, revision)
+  state.Save()
+
+  if LocalSyncState(manifest).ChangedInLastSync(project):
+      ...
+"""
+
+import json
+import os
+import time
+
+import platform_utils
+
+
+class LocalSyncState:
+    _LAST_FETCH = "last_fetch"
+    _LAST_CHECKOUT = "last_checkout"
+    _REVISION = "revision"
+    _PREVIOUS_REVISION = "previous_revision"
+
+    def __init__(self, manifest):
+        self._manifest = manifest
+        self._path = os.path.join(
+            self._manifest.repodir, ".repo_localsyncstate.json"
+        )
+        self._checkpoints_path = os.path.join(
+            self._manifest.repodir, ".repo_checkpoints.json"
+        )
+        self._time = time.time()
+        self._state = None
+        self._Load()
+
+    def SetFetchTime(self, project):
+        self._Set(project, self._LAST_FETCH)
+
+    def SetCheckoutTime(self, project, revision=None):
+        """Record a checkout of |project| (to |revision| if known)."""
+        self._Set(project, self._LAST_CHECKOUT)
+        if revision:
+            data = self._state[project.relpath]
+            data[self._PREVIOUS_REVISION] = data.get(self._REVISION)
+            data[self._REVISION] = revision
+
+    def GetFetchTime(self, project):
+        return self._Get(project, self._LAST_FETCH)
+
+    def GetCheckoutTime(self, project):
+        return self._Get(project, self._LAST_CHECKOUT)
+
+    def GetRevision(self, project):
+        """The revision |project| was checked out to by the last sync."""
+        return self._Get(project, self._REVISION)
+
+    def ChangedInLastSync(self, project):
+        """Whether the last sync moved |project| to a different revision.
+
+        Projects we know nothing about are assumed to have changed.
+        """
+        self._Load()
+        data = self._state.get(project.relpath)
+        if not data or not data.get(self._REVISION):
+            return True
+        if data.get(self._REVISION) == data.get(self._PREVIOUS_REVISION):
+            return False
+        # Only the projects checked out by the most recent sync count.
+        last_checkout = max(
+            (
+                x.get(self._LAST_CHECKOUT) or 0
+                for path, x in self._state.items()
+                if path != self._manifest.repoProject.relpath
+            ),
+            default=0,
+        )
+        return data.get(self._LAST_CHECKOUT) == last_checkout
+
+    def _LoadCheckpoints(self):
+        try:
+            with open(self._checkpoints_path) as f:
+                checkpoints = json.load(f)
+            if isinstance(checkpoints, dict):
+                return checkpoints
+        except (OSError, ValueError):
+            pass
+        return {}
+
+    def GetCheckpoint(self, name):
+        """Return the {relpath: revision} recorded for checkpoint |name|.
+
+        Returns None if the checkpoint doesn't exist.
+        """
+        return self._LoadCheckpoints().get(name)
+
+    def SaveCheckpoint(self, name, projects):
+        """Record the current revisions of |projects| in checkpoint |name|.
+
+        Other projects already recorded in the checkpoint are kept as-is.
+        """
+        checkpoints = self._LoadCheckpoints()
+        checkpoint = checkpoints.setdefault(name, {})
+        for p in projects:
+            revision = self.GetRevision(p)
+            if revision:
+                checkpoint[p.relpath] = revision
+            else:
+                checkpoint.pop(p.relpath, None)
+        try:
+            with open(self._checkpoints_path, "w") as f:
+                json.dump(checkpoints, f, indent=2)
+        except (OSError, TypeError):
+            platform_utils.remove(self._checkpoints_path, missing_ok=True)
+
+    def _Get(self, project, key):
+        self._Load()
+        p = project.relpath
+        if p not in self._state:
+            return
+        return self._state[p].get(key)
+
+    def _Set(self, project, key):
+        p = project.relpath
+        if p not in self._state:
+            self._state[p] = {}
+        self._state[p][key] = self._time
+
+    def _Load(self):
+        if self._state is None:
+            try:
+                with open(self._path) as f:
+                    self._state = json.load(f)
+            except (OSError, ValueError):
+                platform_utils.remove(self._path, missing_ok=True)
+                self._state = {}
+
+    def Save(self):
+        if not self._state:
+            return
+        try:
+            with open(self._path, "w") as f:
+                json.dump(self._state, f, indent=2)
+        except (OSError, TypeError):
+            platform_utils.remove(self._path, missing_ok=True)
+
+    def PruneRemovedProjects(self):
+        """Remove entries don't exist on disk and save."""
+        if not self._state:
+            return
+        delete = set()
+        for path in self._state:
+            gitdir = os.path.join(self._manifest.topdir, path, ".git")
+            if not os.path.exists(gitdir) or os.path.islink(gitdir):
+                delete.add(path)
+        if not delete:
+            return
+        for path in delete:
+            del self._state[path]
+        self.Save()
+
+    def IsPartiallySynced(self):
+        """Return whether a partial sync state is detected."""
+        self._Load()
+        prev_checkout_t = None
+        for path, data in self._state.items():
+            if path == self._manifest.repoProject.relpath:
+                # The repo project isn't included in most syncs so we should
+                # ignore it here.
+                continue
+            checkout_t = data.get(self._LAST_CHECKOUT)
+            if not checkout_t:
+                return True
+            prev_checkout_t = prev_checkout_t or checkout_t
+            if prev_checkout_t != checkout_t:
+                return True
+        return False
@@ -19,10 +19,7 @@ People shouldn't run this directly; instead, they should use the `repo` wrapper
 which takes care of execing this entry point.
 """
 
-import difflib
-import getpass
 import json
-import netrc
 import optparse
 import os
 import shlex
@@ -31,15 +28,6 @@ import sys
 import textwrap
 import time
 from typing import Optional
-import urllib.request
-
-from repo_logging import RepoLogger
-
-
-try:
-    import kerberos
-except ImportError:
-    kerberos = None
 
 from color import SetDefaultColoring
 from command import InteractiveCommand
@@ -57,17 +45,21 @@ from error import RepoExitError
 from error import RepoUnhandledExceptionError
 from error import SilentRepoExitError
 import event_log
-from git_command import user_agent
 from git_config import RepoConfig
+import git_info_cache
+import git_stats
 from git_trace2_event_log import EventLog
 from manifest_xml import RepoClient
 from pager import RunPager
 from pager import TerminatePager
+from repo_logging import RepoLogger
+import repo_trace
 from repo_trace import SetTrace
 from repo_trace import SetTraceToStderr
 from repo_trace import Trace
 from subcmds import all_commands
 from subcmds.version import Version
+import timeline
 from wrapper import Wrapper
 from wrapper import WrapperPath
 
@@ -174,6 +166,11 @@ global_options.add_option(
     action="store",
     help="filename of event log to append timeline to",
 )
+global_options.add_option(
+    "--trace-timeline",
+    metavar="FILE",
+    help="write a timeline of the run to FILE (in Chrome trace format)",
+)
 global_options.add_option(
     "--git-trace2-event-log",
     action="store",
@@ -298,6 +295,8 @@ class _Repo:
         self, name: str, config: RepoConfig
     ) -> Optional[str]:
         """Autocorrect command name based on user's git config."""
+        # Only needed for typos, so don't load it on every run.
+        import difflib
 
         close_commands = difflib.get_close_matches(
             name, self.commands.keys(), n=5, cutoff=0.7
@@ -394,6 +393,8 @@ class _Repo:
         """Execute the (longer running) requested subcommand."""
         result = 0
         SetDefaultColoring(gopts.color)
+        if gopts.trace_timeline:
+            timeline.Enable()
 
         outer_client = RepoClient(self.repodir)
         repo_client = outer_client
@@ -594,6 +595,8 @@ class _Repo:
                         "real\t%dh%dm%.3fs" % (hours, minutes, seconds),
                         file=sys.stderr,
                     )
+                for line in git_stats.Summary():
+                    print(line, file=sys.stderr)
 
             cmd.event_log.FinishEvent(
                 cmd_event, finish, result is None or result == 0
@@ -601,6 +604,7 @@ class _Repo:
             git_trace2_event_log.DefParamRepoEvents(
                 cmd.manifest.manifestProject.config.DumpConfigDict()
             )
+            _LogGitStats(git_trace2_event_log)
             git_trace2_event_log.ExitEvent(result)
 
             if gopts.event_log:
@@ -608,10 +612,35 @@ class _Repo:
                     os.path.abspath(os.path.expanduser(gopts.event_log))
                 )
 
+            if gopts.trace_timeline:
+                timeline.Add(f"repo {name}", start, finish, argv=argv)
+                timeline.Write(
+                    os.path.abspath(os.path.expanduser(gopts.trace_timeline))
+                )
+
             git_trace2_event_log.Write(gopts.git_trace2_event_log)
         return result
 
 
+def _LogGitStats(git_trace2_event_log):
+    """Add data events with the git commands run to the trace2 log."""
+
+    def _Stats(stats):
+        return [
+            [name, x.count, round(x.wall, 3), round(x.cpu, 3)]
+            for name, x in sorted(stats.items())
+        ]
+
+    git_trace2_event_log.LogDataConfigEvents(
+        {
+            "total": json.dumps(list(git_stats.Total())),
+            "by_command": json.dumps(_Stats(git_stats.ByCommand())),
+            "by_project": json.dumps(_Stats(git_stats.ByProject())),
+        },
+        "git_stats",
+    )
+
+
 def _CheckWrapperVersion(ver_str, repo_path):
     """Verify the repo launcher is new enough for this checkout.
 
@@ -705,208 +734,6 @@ def _PruneOptions(argv, opt):
         i += 1
 
 
-class _UserAgentHandler(urllib.request.BaseHandler):
-    def http_request(self, req):
-        req.add_header("User-Agent", user_agent.repo)
-        return req
-
-    def https_request(self, req):
-        req.add_header("User-Agent", user_agent.repo)
-        return req
-
-
-def _AddPasswordFromUserInput(handler, msg, req):
-    # If repo could not find auth info from netrc, try to get it from user input
-    url = req.get_full_url()
-    user, password = handler.passwd.find_user_password(None, url)
-    if user is None:
-        print(msg)
-        try:
-            user = input("User: ")
-            password = getpass.getpass()
-        except KeyboardInterrupt:
-            return
-        handler.passwd.add_password(None, url, user, password)
-
-
-class _BasicAuthHandler(urllib.request.HTTPBasicAuthHandler):
-    def http_error_401(self, req, fp, code, msg, headers):
-        _AddPasswordFromUserInput(self, msg, req)
-        return urllib.request.HTTPBasicAuthHandler.http_error_401(
-            self, req, fp, code, msg, headers
-        )
-
-    def http_error_auth_reqed(self, authreq, host, req, headers):
-        try:
-            old_add_header = req.add_header
-
-            def _add_header(name, val):
-                val = val.replace("\n", "")
-                old_add_header(name, val)
-
-            req.add_header = _add_header
-            return (
-                urllib.request.AbstractBasicAuthHandler.http_error_auth_reqed(
-                    self, authreq, host, req, headers
-                )
-            )
-        except Exception:
-            reset = getattr(self, "reset_retry_count", None)
-            if reset is not None:
-                reset()
-            elif getattr(self, "retried", None):
-                self.retried = 0
-            raise
-
-
-class _DigestAuthHandler(urllib.request.HTTPDigestAuthHandler):
-    def http_error_401(self, req, fp, code, msg, headers):
-        _AddPasswordFromUserInput(self, msg, req)
-        return urllib.request.HTTPDigestAuthHandler.http_error_401(
-            self, req, fp, code, msg, headers
-        )
-
-    def http_error_auth_reqed(self, auth_header, host, req, headers):
-        try:
-            old_add_header = req.add_header
-
-            def _add_header(name, val):
-                val = val.replace("\n", "")
-                old_add_header(name, val)
-
-            req.add_header = _add_header
-            return (
-                urllib.request.AbstractDigestAuthHandler.http_error_auth_reqed(
-                    self, auth_header, host, req, headers
-                )
-            )
-        except Exception:
-            reset = getattr(self, "reset_retry_count", None)
-            if reset is not None:
-                reset()
-            elif getattr(self, "retried", None):
-                self.retried = 0
-            raise
-
-
-class _KerberosAuthHandler(urllib.request.BaseHandler):
-    def __init__(self):
-        self.retried = 0
-        self.context = None
-        self.handler_order = urllib.request.BaseHandler.handler_order - 50
-
-    def http_error_401(self, req, fp, code, msg, headers):
-        host = req.get_host()
-        retry = self.http_error_auth_reqed(
-            "www-authenticate", host, req, headers
-        )
-        return retry
-
-    def http_error_auth_reqed(self, auth_header, host, req, headers):
-        try:
-            spn = "HTTP@%s" % host
-            authdata = self._negotiate_get_authdata(auth_header, headers)
-
-            if self.retried > 3:
-                raise urllib.request.HTTPError(
-                    req.get_full_url(),
-                    401,
-                    "Negotiate auth failed",
-                    headers,
-                    None,
-                )
-            else:
-                self.retried += 1
-
-            neghdr = self._negotiate_get_svctk(spn, authdata)
-            if neghdr is None:
-                return None
-
-            req.add_unredirected_header("Authorization", neghdr)
-            response = self.parent.open(req)
-
-            srvauth = self._negotiate_get_authdata(auth_header, response.info())
-            if self._validate_response(srvauth):
-                return response
-        except kerberos.GSSError:
-            return None
-        except Exception:
-            self.reset_retry_count()
-            raise
-        finally:
-            self._clean_context()
-
-    def reset_retry_count(self):
-        self.retried = 0
-
-    def _negotiate_get_authdata(self, auth_header, headers):
-        authhdr = headers.get(auth_header, None)
-        if authhdr is not None:
-            for mech_tuple in authhdr.split(","):
-                mech, __, authdata = mech_tuple.strip().partition(" ")
-                if mech.lower() == "negotiate":
-                    return authdata.strip()
-        return None
-
-    def _negotiate_get_svctk(self, spn, authdata):
-        if authdata is None:
-            return None
-
-        result, self.context = kerberos.authGSSClientInit(spn)
-        if result < kerberos.AUTH_GSS_COMPLETE:
-            return None
-
-        result = kerberos.authGSSClientStep(self.context, authdata)
-        if result < kerberos.AUTH_GSS_CONTINUE:
-            return None
-
-        response = kerberos.authGSSClientResponse(self.context)
-        return "Negotiate %s" % response
-
-    def _validate_response(self, authdata):
-        if authdata is None:
-            return None
-        result = kerberos.authGSSClientStep(self.context, authdata)
-        if result == kerberos.AUTH_GSS_COMPLETE:
-            return True
-        return None
-
-    def _clean_context(self):
-        if self.context is not None:
-            kerberos.authGSSClientClean(self.context)
-            self.context = None
-
-
-def init_http():
-    handlers = [_UserAgentHandler()]
-
-    mgr = urllib.request.HTTPPasswordMgrWithDefaultRealm()
-    try:
-        n = netrc.netrc()
-        for host in n.hosts:
-            p = n.hosts[host]
-            mgr.add_password(p[1], "http://%s/" % host, p[0], p[2])
-            mgr.add_password(p[1], "https://%s/" % host, p[0], p[2])
-    except netrc.NetrcParseError:
-        pass
-    except OSError:
-        pass
-    handlers.append(_BasicAuthHandler(mgr))
-    handlers.append(_DigestAuthHandler(mgr))
-    if kerberos:
-        handlers.append(_KerberosAuthHandler())
-
-    if "http_proxy" in os.environ:
-        url = os.environ["http_proxy"]
-        handlers.append(
-            urllib.request.ProxyHandler({"http": url, "https": url})
-        )
-    if "REPO_CURL_VERBOSE" in os.environ:
-        handlers.append(urllib.request.HTTPHandler(debuglevel=1))
-        handlers.append(urllib.request.HTTPSHandler(debuglevel=1))
-    urllib.request.install_opener(urllib.request.build_opener(*handlers))
-
-
 def _Main(argv):
     result = 0
 
@@ -927,6 +754,7 @@ def _Main(argv):
 
     _CheckWrapperVersion(opt.wrapper_version, opt.wrapper_path)
     _CheckRepoDir(opt.repodir)
+    git_info_cache.SetRepoDir(opt.repodir)
 
     Version.wrapper_version = opt.wrapper_version
     Version.wrapper_path = opt.wrapper_path
@@ -934,7 +762,6 @@ def _Main(argv):
     repo = _Repo(opt.repodir)
 
     try:
-        init_http()
         name, gopts, argv = repo._ParseArgs(argv)
 
         if gopts.trace:
@@ -955,6 +782,7 @@ def _Main(argv):
         # If repo changed, re-exec ourselves.
         argv = list(sys.argv)
         argv.extend(rce.extra_args)
+        repo_trace.Flush()
         try:
             os.execv(sys.executable, [sys.executable, __file__] + argv)
         except OSError as e:
@@ -13,13 +13,17 @@
 # limitations under the License.
 
 import collections
+import html
+import io
 import itertools
 import os
 import platform
 import re
 import sys
+import time
 import urllib.parse
 import xml.dom.minidom
+from xml.etree import ElementTree
 
 from error import ManifestInvalidPathError
 from error import ManifestInvalidRevisionError
@@ -34,6 +38,7 @@ from project import ManifestProject
 from project import Project
 from project import RemoteSpec
 from project import RepoProject
+import timeline
 from wrapper import Wrapper
 
 
@@ -117,6 +122,115 @@ def XmlInt(node, attr, default=None):
         raise ManifestParseError(f'manifest: invalid {attr}="{value}" integer')
 
 
+class _XmlText:
+    """The text in an element of a parsed manifest."""
+
+    __slots__ = ("data",)
+
+    nodeName = "#text"
+    nodeType = xml.dom.Node.TEXT_NODE
+
+    def __init__(self, data):
+        self.data = data
+
+    def toxml(self):
+        return html.escape(self.data, quote=False)
+
+
+class _XmlElement:
+    """An element of a parsed manifest.
+
+    This has the parts of the xml.dom.minidom API that manifest parsing uses,
+    but is much smaller & quicker to create than a DOM node.  Elements may be
+    shared by several loads of the same file (see _ParseXmlFile), so they must
+    not be changed: use withAttributes to get a changed copy.
+    """
+
+    __slots__ = ("nodeName", "_attrs", "childNodes")
+
+    ELEMENT_NODE = xml.dom.Node.ELEMENT_NODE
+    nodeType = xml.dom.Node.ELEMENT_NODE
+
+    def __init__(self, name, attrs, children):
+        self.nodeName = name
+        self._attrs = attrs
+        self.childNodes = children
+
+    def getAttribute(self, name):
+        return self._attrs.get(name, "")
+
+    def hasAttribute(self, name):
+        return name in self._attrs
+
+    def hasAttributes(self):
+        return bool(self._attrs)
+
+    def hasChildNodes(self):
+        return bool(self.childNodes)
+
+    def withAttributes(self, attrs):
+        """Return a copy of this element with |attrs| added."""
+        return _XmlElement(
+            self.nodeName, {**self._attrs, **attrs}, self.childNodes
+        )
+
+    def toxml(self):
+        attrs = "".join(
+            f' {k}="{html.escape(v)}"' for k, v in self._attrs.items()
+        )
+        if not self.childNodes:
+            return f"<{self.nodeName}{attrs}/>"
+        children = "".join(x.toxml() for x in self.childNodes)
+        return f"<{self.nodeName}{attrs}>{children}</{self.nodeName}>"
+
+
+# Included manifests that were parsed, by path: (content, root element).
+_xml_cache = {}
+
+
+def _ParseXmlFile(path, cache=False):
+    """Parse the XML file |path|, and return its root _XmlElement.
+
+    Elements are built as the file is read, and the ElementTree elements are
+    thrown away as soon as they have been copied, so only one copy of the
+    document is ever kept.
+
+    Args:
+        path: The file to parse.
+        cache: Whether to reuse the last parse of |path| if its content hasn't
+            changed since.  The content is compared rather than the mtime as
+            a file may be rewritten several times within the mtime's
+            granularity.
+    """
+    with open(path, "rb") as fp:
+        data = fp.read()
+    if cache:
+        cached = _xml_cache.get(path)
+        if cached and cached[0] == data:
+            return cached[1]
+
+    # The children of every element that has been started but not ended.
+    stack = [[]]
+    for event, elem in ElementTree.iterparse(
+        io.BytesIO(data), events=("start", "end")
+    ):
+        if event == "start":
+            stack.append([])
+        else:
+            children = stack.pop()
+            if elem.text is not None:
+                children.insert(0, _XmlText(elem.text))
+            # Copy the attributes, as clear() empties the dict in place in
+            # the pure Python ElementTree.
+            stack[-1].append(_XmlElement(elem.tag, dict(elem.attrib), children))
+            elem.clear()
+    root = stack[0][0]
+
+    if cache:
+        _xml_cache[path] = (data, root)
+    return root
+
+
 def normalize_url(url: str) -> str:
     """Mutate input 'url' into normalized form:
 
@@ -1188,6 +1302,7 @@ https://gerrit.googlesource.com/git-repo/+/HEAD/docs/manifest-format.md
             if override:
                 self.manifestFile = override
 
+            start = time.time()
             try:
                 m = self.manifestProject
                 b = m.GetBranch(m.CurrentBranch).merge
@@ -1257,6 +1372,13 @@ https://gerrit.googlesource.com/git-repo/+/HEAD/docs/manifest-format.md
                     self._AddMetaProjectMirror(self.manifestProject)
 
                 self._loaded = True
+                timeline.Add(
+                    "manifest load",
+                    start,
+                    time.time(),
+                    cat="manifest",
+                    path=self.manifestFile,
+                )
             finally:
                 if override:
                     self.manifestFile = savedManifestFile
@@ -1305,20 +1427,11 @@ https://gerrit.googlesource.com/git-repo/+/HEAD/docs/manifest-format.md
             List of XML nodes.
         """
         try:
-            root = xml.dom.minidom.parse(path)
-        except (OSError, xml.parsers.expat.ExpatError) as e:
+            manifest = _ParseXmlFile(path, cache=parent_node is not None)
+        except (OSError, ElementTree.ParseError) as e:
             raise ManifestParseError(f"error parsing manifest {path}: {e}")
 
-        if not root or not root.childNodes:
-            raise ManifestParseError(f"no root node in {path}")
-
-        for manifest in root.childNodes:
-            if (
-                manifest.nodeType == manifest.ELEMENT_NODE
-                and manifest.nodeName == "manifest"
-            ):
-                break
-        else:
+        if manifest.nodeName != "manifest":
             raise ManifestParseError(f"no <manifest> in {path}")
 
         nodes = []
@@ -1328,8 +1441,8 @@ https://gerrit.googlesource.com/git-repo/+/HEAD/docs/manifest-format.md
                 and node.nodeName in ("include", "project")
                 and not node.hasAttribute("revision")
             ):
-                node.setAttribute(
-                    "revision", parent_node.getAttribute("revision")
+                node = node.withAttributes(
+                    {"revision": parent_node.getAttribute("revision")}
                 )
             if node.nodeName == "include":
                 name = self._reqatt(node, "name")
@@ -1374,7 +1487,9 @@ https://gerrit.googlesource.com/git-repo/+/HEAD/docs/manifest-format.md
                         nodeGroups |= self._ParseSet(
                             node.getAttribute("groups")
                         )
-                    node.setAttribute("groups", ",".join(sorted(nodeGroups)))
+                    node = node.withAttributes(
+                        {"groups": ",".join(sorted(nodeGroups))}
+                    )
                 nodes.append(node)
         return nodes
 
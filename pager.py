@@ -18,6 +18,7 @@ import subprocess
 import sys
 
 import platform_utils
+import repo_trace
 
 
 active = False
@@ -124,6 +125,7 @@ def _BecomePager(pager):
     # https://git-scm.com/docs/git-config#Documentation/git-config.txt-corepager
     os.environ.setdefault("LESS", "FRX")
 
+    repo_trace.Flush()
     try:
         os.execvp(pager, [pager])
     except OSError:
@@ -16,6 +16,7 @@ import datetime
 import errno
 import filecmp
 import glob
+import json
 import os
 import platform
 import random
@@ -42,8 +43,10 @@ from error import NoManifestException
 from error import RepoError
 from error import UploadError
 import fetch
+import git_async
 from git_command import git_require
 from git_command import GitCommand
+from git_command import GitStream
 from git_config import GetSchemeFromUrl
 from git_config import GetUrlCookieFile
 from git_config import GitConfig
@@ -57,10 +60,12 @@ from git_refs import R_TAGS
 from git_refs import R_WORKTREE_M
 import git_superproject
 from git_trace2_event_log import EventLog
+import gitdir_registry
 import platform_utils
 import progress
 from repo_logging import RepoLogger
 from repo_trace import Trace
+import trash
 
 
 logger = RepoLogger(__file__)
@@ -130,6 +135,102 @@ def sq(r):
     return "'" + r.replace("'", "'''") + "'"
 
 
+# Parsed submodules keyed by (objdir, revision).
+_SUBMODULES_CACHE = {}
+
+# How many revisions to remember in each objdir's on-disk submodule cache.
+_SUBMODULES_CACHE_SIZE = 16
+
+_GITCONFIG_SECTION_RE = re.compile(
+    r'^\[\s*([-.\w]+)\s*(?:"((?:[^"\\]|\\.)*)")?\s*\](.*)$'
+)
+_GITCONFIG_KEY_RE = re.compile(r"^([A-Za-z][-A-Za-z0-9]*)\s*(=?)(.*)$")
+_GITCONFIG_ESCAPES = {"n": "\n", "t": "\t", "b": "\b", '"': '"', "\\": "\\"}
+
+
+def _ParseGitconfigValue(lines, value):
+    """Decode a git config |value|, consuming continuation |lines| as needed."""
+    result = []
+    pending_space = ""
+    quoted = False
+    i = 0
+    while i < len(value):
+        c = value[i]
+        i += 1
+        if c == "\\":
+            if i >= len(value):
+                # Line continuation.
+                value = next(lines, "")
+                i = 0
+                continue
+            c = value[i]
+            i += 1
+            result.append(pending_space + _GITCONFIG_ESCAPES.get(c, c))
+            pending_space = ""
+        elif c == '"':
+            quoted = not quoted
+            result.append(pending_space)
+            pending_space = ""
+        elif not quoted and c in "#;":
+            break
+        elif not quoted and c.isspace():
+            # Whitespace is kept only when something follows it.
+            if result:
+                pending_space += c
+        else:
+            result.append(pending_space + c)
+            pending_space = ""
+    return "".join(result)
+
+
+def _ParseGitmodules(text):
+    """Parse the contents of a .gitmodules file without invoking git.
+
+    This understands the subset of the git config syntax that can show up in
+    .gitmodules files.
+
+    Returns:
+        A dict mapping submodule names to a dict of their (lowercase) settings.
+    """
+    modules = {}
+    current = None
+    lines = iter(text.splitlines())
+    for line in lines:
+        line = line.strip()
+        while line.startswith("["):
+            m = _GITCONFIG_SECTION_RE.match(line)
+            if not m:
+                current = None
+                line = ""
+                break
+            section, subsection, line = m.groups()
+            line = line.strip()
+            section = section.lower()
+            if subsection is None and "." in section:
+                # The deprecated [section.subsection] syntax.
+                section, subsection = section.split(".", 1)
+            elif subsection is not None:
+                subsection = re.sub(r"\\(.)", r"\1", subsection)
+            if section == "submodule" and subsection is not None:
+                current = modules.setdefault(subsection, {})
+            else:
+                current = None
+        if not line or line[0] in "#;":
+            continue
+        m = _GITCONFIG_KEY_RE.match(line)
+        if not m:
+            continue
+        key, equals, value = m.groups()
+        if equals:
+            value = _ParseGitconfigValue(lines, value)
+        else:
+            # A bare key is a boolean true.
+            value = "true"
+        if current is not None:
+            current[key.lower()] = value
+    return modules
+
+
 _project_hook_list = None
 
 
@@ -183,12 +284,16 @@ class DownloadedChange:
 
 class ReviewableBranch:
     _commit_cache = None
+    _date_cache = None
     _base_exists = None
 
-    def __init__(self, project, branch, base):
+    def __init__(self, project, branch, base, commits=None, date=None):
         self.project = project
         self.branch = branch
         self.base = base
+        # Filled in up front when the branches are scanned in a batch.
+        self._commit_cache = commits
+        self._date_cache = date
 
     @property
     def name(self):
@@ -234,9 +339,11 @@ class ReviewableBranch:
 
     @property
     def date(self):
-        return self.project.bare_git.log(
-            "--pretty=format:%cd", "-n", "1", R_HEADS + self.name, "--"
-        )
+        if self._date_cache is None:
+            self._date_cache = self.project.bare_git.log(
+                "--pretty=format:%cd", "-n", "1", R_HEADS + self.name, "--"
+            )
+        return self._date_cache
 
     @property
     def base_exists(self):
@@ -270,6 +377,8 @@ class ReviewableBranch:
         validate_certs=True,
         push_options=None,
         patchset_description=None,
+        ssh_proxy=None,
+        output=None,
     ):
         self.project.UploadForReview(
             branch=self.name,
@@ -286,6 +395,8 @@ class ReviewableBranch:
             validate_certs=validate_certs,
             push_options=push_options,
             patchset_description=patchset_description,
+            ssh_proxy=ssh_proxy,
+            output=output,
         )
 
     def GetPublishedRefs(self):
@@ -391,6 +502,26 @@ def _SafeExpandPath(base, subpath, skipfinal=False):
     return path
 
 
+def _HasNestedCheckout(manifest, path):
+    """Whether a git checkout is anywhere under the directory |path|."""
+    # The projects of every (sub)manifest are checked out where the outer
+    # client says they are.
+    outer = manifest.outer_client
+    prefix = os.path.join(path, "")
+    if any(
+        os.path.join(outer.topdir, x).startswith(prefix)
+        for x in outer.all_paths
+    ):
+        return True
+
+    # The walk is only to protect the user's own clones nested in the
+    # worktree, which no manifest knows about.
+    for root, dirs, _ in platform_utils.walk(path):
+        if any(os.path.lexists(os.path.join(root, d, ".git")) for d in dirs):
+            return True
+    return False
+
+
 class _CopyFile(NamedTuple):
     """Container for <copyfile> manifest element."""
 
@@ -757,7 +888,7 @@ class Project:
         work_git is otheriwse inaccessible (e.g. an incomplete sync).
         """
         try:
-            b = self.work_git.GetHead()
+            b = self._GetHead()
         except NoManifestException:
             # If the local checkout is in a bad state, don't barf.  Let the
             # callers process this like the head is unreadable.
@@ -969,6 +1100,19 @@ class Project:
                 (sub)manifest.  If false, the path is relative to the outermost
                 manifest.
         """
+        (ret,) = git_async.Map(
+            lambda runner, project: project.PrintWorkTreeStatusAsync(
+                runner, output_redir=output_redir, quiet=quiet, local=local
+            ),
+            [self],
+            jobs=1,
+        )
+        return ret
+
+    async def PrintWorkTreeStatusAsync(
+        self, runner, output_redir=None, quiet=False, local=False
+    ):
+        """Like PrintWorkTreeStatus, but runs git with a git_async.Runner."""
         if not platform_utils.isdir(self.worktree):
             if output_redir is None:
                 output_redir = sys.stdout
@@ -977,13 +1121,31 @@ class Project:
             print('  missing (run "repo sync")', file=output_redir)
             return
 
-        self.work_git.update_index(
-            "-q", "--unmerged", "--ignore-missing", "--refresh"
+        await runner.Run(
+            self,
+            [
+                "update-index",
+                "-q",
+                "--unmerged",
+                "--ignore-missing",
+                "--refresh",
+            ],
+            check=True,
         )
         rb = self.IsRebaseInProgress()
-        di = self.work_git.DiffZ("diff-index", "-M", "--cached", HEAD)
-        df = self.work_git.DiffZ("diff-files")
-        do = self.work_git.LsOthers()
+        # With the index refreshed, these only read it, so run them at once.
+        # The refs are loaded too, so CurrentBranch doesn't block.
+        di, df, do, _ = await git_async.Gather(
+            runner.Run(self, _DiffZArgs("diff-index", "-M", "--cached", HEAD)),
+            runner.Run(self, _DiffZArgs("diff-files")),
+            runner.Run(
+                self, ["ls-files", "-z", "--others", "--exclude-standard"]
+            ),
+            self.bare_ref.LoadAsync(runner),
+        )
+        di = _ParseDiffZ(di.stdout)
+        df = _ParseDiffZ(df.stdout)
+        do = do.stdout[:-1].split("\0") if not do.rc and do.stdout else []
         if not rb and not di and not df and not do and not self.CurrentBranch:
             return "CLEAN"
 
@@ -1005,12 +1167,17 @@ class Project:
             try:
                 local_merge = branch_obj.LocalMerge
                 if local_merge:
-                    left_right = self.work_git.rev_list(
-                        "--left-right",
-                        "--count",
-                        f"{local_merge}...{R_HEADS}{branch_name}",
+                    left_right = await runner.Run(
+                        self,
+                        [
+                            "rev-list",
+                            "--left-right",
+                            "--count",
+                            f"{local_merge}...{R_HEADS}{branch_name}",
+                        ],
+                        check=True,
                     )
-                    left, right = left_right[0].split()
+                    left, right = left_right.stdout.split()
                     behind = int(left)
                     ahead = int(right)
                     if ahead and behind:
@@ -1134,43 +1301,187 @@ class Project:
             elif name.startswith(R_PUB):
                 canrm[name] = ref_id
 
-        for name, ref_id in canrm.items():
-            n = name[len(R_PUB) :]
-            if R_HEADS + n not in heads:
-                self.bare_git.DeleteRef(name, ref_id)
+        stale = [
+            (name, ref_id)
+            for name, ref_id in canrm.items()
+            if R_HEADS + name[len(R_PUB) :] not in heads
+        ]
+        if stale:
+            self._UpdateRefs(
+                f"delete {name} {ref_id}" for name, ref_id in stale
+            )
+            for name, _ in stale:
+                self.bare_ref.deleted(name)
 
-    def GetUploadableBranches(self, selected_branch=None):
-        """List any branches which can be uploaded for review."""
-        heads = {}
-        pubed = {}
+    def _GetHead(self):
+        """Return the ref (or commit) HEAD points to, like work_git.GetHead.
 
-        for name, ref_id in self._allrefs.items():
-            if name.startswith(R_HEADS):
-                heads[name[len(R_HEADS) :]] = ref_id
-            elif name.startswith(R_PUB):
-                pubed[name[len(R_PUB) :]] = ref_id
+        Unless the checkout is a git worktree, it shares HEAD with the gitdir,
+        so the refs that are already loaded can answer without running git.
+        """
+        if not self.use_git_worktrees:
+            head = self.bare_ref.symref(HEAD) or self.bare_ref.get(HEAD)
+            if head:
+                return head
+        return self.work_git.GetHead()
 
-        ready = []
-        for branch, ref_id in heads.items():
-            if branch in pubed and pubed[branch] == ref_id:
-                continue
-            if selected_branch and branch != selected_branch:
-                continue
+    def _UpdateRefs(self, updates, head=None):
+        """Update refs in a single `git update-ref --stdin` transaction.
 
-            rb = self.GetUploadableBranch(branch)
-            if rb:
+        Args:
+            updates: The commands for update-ref, e.g. "create <ref> <id>".
+            head: The ref to point HEAD at, after the refs are updated.
+        """
+        updates = list(updates)
+        # Older gits can't update symbolic refs in a transaction, and a
+        # worktree has its own HEAD.
+        if head and not self.use_git_worktrees and git_require((2, 46, 0)):
+            updates.append(f"symref-update {HEAD} {head}")
+            head = None
+        if updates:
+            GitCommand(
+                self,
+                ["update-ref", "--stdin"],
+                bare=True,
+                input="".join(f"{x}\n" for x in updates),
+                capture_stdout=True,
+                capture_stderr=True,
+                verify_command=True,
+            ).Wait()
+        if head:
+            self.work_git.SetHead(head)
+
+    def _MergedBranches(self, rev):
+        """Return the names of the local branches that are merged into rev."""
+        p = GitCommand(
+            self,
+            [
+                "for-each-ref",
+                f"--merged={rev}",
+                "--format=%(refname)",
+                R_HEADS,
+            ],
+            bare=True,
+            capture_stdout=True,
+            capture_stderr=True,
+            verify_command=True,
+        )
+        p.Wait()
+        return {
+            x[len(R_HEADS) :]
+            for x in p.stdout.splitlines()
+            if x.startswith(R_HEADS)
+        }
+
+    def GetUploadableBranches(self, selected_branch=None):
+        """List any branches which can be uploaded for review."""
+        ready = []
+        for rb in self.ScanBranches(
+            [selected_branch] if selected_branch else None
+        ):
+            # Skip branches that haven't changed since they were uploaded.
+            if rb.branch.published != rb.branch.revision:
                 ready.append(rb)
         return ready
 
     def GetUploadableBranch(self, branch_name):
         """Get a single uploadable branch, or None."""
-        branch = self.GetBranch(branch_name)
-        base = branch.LocalMerge
-        if branch.LocalMerge:
-            rb = ReviewableBranch(self, branch, base)
-            if rb.commits:
-                return rb
-        return None
+        ready = self.ScanBranches([branch_name])
+        return ready[0] if ready else None
+
+    def ScanBranches(self, branch_names=None):
+        """Find the local branches that have commits on top of their upstream.
+
+        Rather than running git for each branch, the branches & their published
+        state are read from the refs, and the commits of all the branches that
+        track the same upstream are found with a single walk.
+
+        Args:
+            branch_names: The branches to consider (defaults to all of them).
+
+        Returns:
+            The ReviewableBranch of each branch that has commits, with its
+            commits & date already filled in.
+        """
+        all_refs = self._allrefs
+        by_base = {}
+        for name, branch in self.GetBranches().items():
+            if branch_names is not None and name not in branch_names:
+                continue
+            base = branch.LocalMerge
+            if base:
+                by_base.setdefault(base, []).append(branch)
+
+        ready = []
+        for base, branches in by_base.items():
+            if base not in all_refs and not IsId(base):
+                # The upstream is a symbolic ref, or it has been deleted.
+                if not ReviewableBranch(self, branches[0], base).base_exists:
+                    continue
+            ahead = self._WalkAhead(base, {b.revision for b in branches})
+            for branch in branches:
+                commits, date = ahead.get(branch.revision, ([], None))
+                if commits:
+                    ready.append(
+                        ReviewableBranch(self, branch, base, commits, date)
+                    )
+        return ready
+
+    def _WalkAhead(self, base, revisions):
+        """Find the commits each of |revisions| has that |base| doesn't.
+
+        Returns:
+            A dict of each revision that has commits to the oneline summary of
+            them (oldest first) & its commit date.
+        """
+        p = GitCommand(
+            self,
+            [
+                "log",
+                "--stdin",
+                "--date-order",
+                "--abbrev=8",
+                "--pretty=format:%H%x00%P%x00%cd%x00%h %s",
+                "--",
+            ],
+            bare=True,
+            input="".join(f"{x}\n" for x in sorted(revisions))
+            + not_rev(base)
+            + "\n",
+            capture_stdout=True,
+            capture_stderr=True,
+            verify_command=True,
+        )
+        p.Wait()
+
+        # The walk covers every commit that is in any of |revisions| but not in
+        # |base|, so what each revision has is whatever can be reached from it
+        # without leaving the walk.
+        walked = []
+        parents = {}
+        dates = {}
+        for line in p.stdout.splitlines():
+            commit, commit_parents, date, summary = line.split("\0", 3)
+            walked.append((commit, summary))
+            parents[commit] = commit_parents.split()
+            dates[commit] = date
+
+        ahead = {}
+        for revision in revisions:
+            if revision not in parents:
+                continue
+            reachable = {revision}
+            todo = [revision]
+            while todo:
+                for parent in parents[todo.pop()]:
+                    if parent in parents and parent not in reachable:
+                        reachable.add(parent)
+                        todo.append(parent)
+            ahead[revision] = (
+                [y for x, y in reversed(walked) if x in reachable],
+                dates[revision],
+            )
+        return ahead
 
     def UploadForReview(
         self,
@@ -1188,8 +1499,16 @@ class Project:
         validate_certs=True,
         push_options=None,
         patchset_description=None,
+        ssh_proxy=None,
+        output=None,
     ):
-        """Uploads the named branch for code review."""
+        """Uploads the named branch for code review.
+
+        Args:
+            ssh_proxy: The SSH settings for managing master sessions.
+            output: Where to write the output of the push, rather than letting
+                it go straight to the terminal.
+        """
         if branch is None:
             branch = self.CurrentBranch
         if branch is None:
@@ -1277,7 +1596,20 @@ class Project:
             ref_spec = ref_spec + "%" + ",".join(opts)
         cmd.append(ref_spec)
 
-        GitCommand(self, cmd, bare=True, verify_command=True).Wait()
+        if ssh_proxy and not ssh_proxy.preconnect(url):
+            ssh_proxy = None
+        p = GitCommand(
+            self,
+            cmd,
+            bare=True,
+            capture_stdout=output is not None,
+            merge_output=output is not None,
+            ssh_proxy=ssh_proxy,
+            verify_command=True,
+        )
+        if output is not None and p.stdout:
+            output.write(p.stdout)
+        p.Wait()
 
         if not dryrun:
             msg = f"posted to {branch.remote.review} for {dest_branch}"
@@ -1709,6 +2041,18 @@ class Project:
                 pass
         return None
 
+    async def GetHeadRevisionIdAsync(self, runner) -> Optional[str]:
+        """Like GetHeadRevisionId, but runs git with a git_async.Runner."""
+        if self.work_git:
+            try:
+                result = await runner.Run(
+                    self, ["rev-parse", "HEAD"], check=True
+                )
+                return result.stdout.strip()
+            except GitError:
+                pass
+        return None
+
     def GetRevisionId(self, all_refs=None):
         if self.revisionId:
             return self.revisionId
@@ -2155,7 +2499,7 @@ class Project:
         except OSError:
             pass
         try:
-            platform_utils.rmtree(self.gitdir)
+            trash.Delete(self.manifest.repodir, self.gitdir)
         except OSError as e:
             if e.errno != errno.ENOENT:
                 logger.error("error: %s: %s", self.gitdir, e)
@@ -2166,12 +2510,23 @@ class Project:
                 )
                 raise DeleteWorktreeError(aggregate_errors=[e])
 
+        # If no git checkout is nested anywhere under the worktree (another
+        # project, from any manifest, or the user's own clone), move it out of
+        # the way to be deleted in the background.
+        nested = _HasNestedCheckout(self.manifest, self.worktree)
+        if not nested and trash.MoveToTrash(
+            self.manifest.repodir, self.worktree
+        ):
+            walk = []
+        else:
+            walk = platform_utils.walk(self.worktree)
+
         # Delete everything under the worktree, except for directories that
         # contain another git project.
         dirs_to_remove = []
         failed = False
         errors = []
-        for root, dirs, files in platform_utils.walk(self.worktree):
+        for root, dirs, files in walk:
             for f in files:
                 path = os.path.join(root, f)
                 try:
@@ -2246,7 +2601,7 @@ class Project:
         """Create a new branch off the manifest's revision."""
         if not branch_merge:
             branch_merge = self.revisionExpr
-        head = self.work_git.GetHead()
+        head = self._GetHead()
         if head == (R_HEADS + name):
             return True
 
@@ -2275,8 +2630,7 @@ class Project:
                 head = None
         if revid and head and revid == head:
             ref = R_HEADS + name
-            self.work_git.update_ref(ref, revid)
-            self.work_git.symbolic_ref(HEAD, ref)
+            self._UpdateRefs([f"create {ref} {revid}"], head=ref)
             branch.Save()
             return True
 
@@ -2299,7 +2653,7 @@ class Project:
             branch doesn't exist.
         """
         rev = R_HEADS + name
-        head = self.work_git.GetHead()
+        head = self._GetHead()
         if head == rev:
             # Already on the branch.
             return True
@@ -2348,7 +2702,7 @@ class Project:
             # Doesn't exist
             return None
 
-        head = self.work_git.GetHead()
+        head = self._GetHead()
         if head == rev:
             # We can't destroy the branch while we are sitting
             # on it.  Switch to a detached HEAD.
@@ -2387,35 +2741,40 @@ class Project:
         rev = self.GetRevisionId(left)
         if (
             cb is not None
-            and not self._revlist(HEAD + "..." + rev)
+            and left.get(R_HEADS + cb) == rev
             and not self.IsDirty(consider_untracked=False)
         ):
             self.work_git.DetachHead(HEAD)
             kill.append(cb)
 
         if kill:
-            old = self.bare_git.GetHead()
-
-            try:
-                self.bare_git.DetachHead(rev)
-
-                b = ["branch", "-d"]
-                b.extend(kill)
-                b = GitCommand(
-                    self, b, bare=True, capture_stdout=True, capture_stderr=True
-                )
-                b.Wait()
-            finally:
-                if IsId(old):
-                    self.bare_git.DetachHead(old)
-                else:
-                    self.bare_git.SetHead(old)
+            # As `git branch -d` would, only delete the branches that are
+            # merged into their upstream, or into the revision when they
+            # don't have one we can resolve locally.
+            by_base = {}
+            for name in kill:
+                try:
+                    base = self.GetBranch(name).LocalMerge
+                except GitError:
+                    # The remote doesn't fetch the upstream.
+                    base = None
+                if not base or (base not in left and not IsId(base)):
+                    base = rev
+                by_base.setdefault(base, []).append(name)
+            delete = []
+            for base, names in by_base.items():
+                merged = self._MergedBranches(base)
+                delete.extend(x for x in names if x in merged)
+            if delete:
+                GitCommand(
+                    self,
+                    ["branch", "-D"] + delete,
+                    bare=True,
+                    capture_stdout=True,
+                    capture_stderr=True,
+                ).Wait()
                 left = self._allrefs
-
-            for branch in kill:
-                if (R_HEADS + branch) not in left:
-                    self.CleanPublishedCache()
-                    break
+                self.CleanPublishedCache(left)
 
         if cb and cb not in kill:
             kill.append(cb)
@@ -2448,129 +2807,118 @@ class Project:
         # Unfortunately we cannot call `git submodule status --recursive` here
         # because the working tree might not exist yet, and it cannot be used
         # without a working tree in its current implementation.
+        try:
+            rev = self.GetRevisionId()
+        except (GitError, ManifestInvalidRevisionError):
+            # The git repo may be outdated (i.e. not fetched yet) and querying
+            # its submodules using the revision may not work; so return here.
+            return []
 
-        def get_submodules(gitdir, rev):
-            # Parse .gitmodules for submodule sub_paths and sub_urls.
-            sub_paths, sub_urls, sub_shallows = parse_gitmodules(gitdir, rev)
-            if not sub_paths:
-                return []
-            # Run `git ls-tree` to read SHAs of submodule object, which happen
-            # to be revision of submodule repository.
-            sub_revs = git_ls_tree(gitdir, rev, sub_paths)
-            submodules = []
-            for sub_path, sub_url, sub_shallow in zip(
-                sub_paths, sub_urls, sub_shallows
-            ):
-                try:
-                    sub_rev = sub_revs[sub_path]
-                except KeyError:
-                    # Ignore non-exist submodules.
-                    continue
-                submodules.append((sub_rev, sub_path, sub_url, sub_shallow))
-            return submodules
+        # The submodules of a commit never change, so cache them by the object
+        # store & commit.  Projects sharing an objdir share the results.
+        key = (self.objdir, rev)
+        submodules = _SUBMODULES_CACHE.get(key)
+        if submodules is None:
+            submodules = self._ReadSubmodulesCache(rev)
+            if submodules is None:
+                submodules, cacheable = self._ReadSubmodules(rev)
+                if cacheable:
+                    self._SaveSubmodulesCache(rev, submodules)
+            _SUBMODULES_CACHE[key] = submodules
+        return list(submodules)
 
-        re_path = re.compile(r"^submodule\.(.+)\.path=(.*)$")
-        re_url = re.compile(r"^submodule\.(.+)\.url=(.*)$")
-        re_shallow = re.compile(r"^submodule\.(.+)\.shallow=(.*)$")
+    @property
+    def _submodules_cache_file(self):
+        return os.path.join(self.objdir, ".repo_submodules.json")
 
-        def parse_gitmodules(gitdir, rev):
-            cmd = ["cat-file", "blob", "%s:.gitmodules" % rev]
-            try:
-                p = GitCommand(
-                    None,
-                    cmd,
-                    capture_stdout=True,
-                    capture_stderr=True,
-                    bare=True,
-                    gitdir=gitdir,
-                )
-            except GitError:
-                return [], [], []
-            if p.Wait() != 0:
-                return [], [], []
+    def _ReadSubmodulesCache(self, rev):
+        """Load the submodules of |rev| from the on-disk cache (if any)."""
+        try:
+            with open(self._submodules_cache_file) as fd:
+                cache = json.load(fd)
+        except (OSError, ValueError):
+            return None
+        entries = cache.get(rev) if isinstance(cache, dict) else None
+        if not isinstance(entries, list):
+            return None
+        return [tuple(x) for x in entries]
 
-            gitmodules_lines = []
-            fd, temp_gitmodules_path = tempfile.mkstemp()
-            try:
-                os.write(fd, p.stdout.encode("utf-8"))
-                os.close(fd)
-                cmd = ["config", "--file", temp_gitmodules_path, "--list"]
-                p = GitCommand(
-                    None,
-                    cmd,
-                    capture_stdout=True,
-                    capture_stderr=True,
-                    bare=True,
-                    gitdir=gitdir,
-                )
-                if p.Wait() != 0:
-                    return [], [], []
-                gitmodules_lines = p.stdout.split("\n")
-            except GitError:
-                return [], [], []
-            finally:
-                platform_utils.remove(temp_gitmodules_path)
-
-            names = set()
-            paths = {}
-            urls = {}
-            shallows = {}
-            for line in gitmodules_lines:
-                if not line:
-                    continue
-                m = re_path.match(line)
-                if m:
-                    names.add(m.group(1))
-                    paths[m.group(1)] = m.group(2)
-                    continue
-                m = re_url.match(line)
-                if m:
-                    names.add(m.group(1))
-                    urls[m.group(1)] = m.group(2)
-                    continue
-                m = re_shallow.match(line)
-                if m:
-                    names.add(m.group(1))
-                    shallows[m.group(1)] = m.group(2)
-                    continue
-            names = sorted(names)
-            return (
-                [paths.get(name, "") for name in names],
-                [urls.get(name, "") for name in names],
-                [shallows.get(name, "") for name in names],
-            )
+    def _SaveSubmodulesCache(self, rev, submodules):
+        """Record the submodules of |rev| in the on-disk cache."""
+        path = self._submodules_cache_file
+        try:
+            with open(path) as fd:
+                cache = json.load(fd)
+            if not isinstance(cache, dict):
+                cache = {}
+        except (OSError, ValueError):
+            cache = {}
+        cache.pop(rev, None)
+        cache[rev] = [list(x) for x in submodules]
+        # Only keep the most recently seen revisions around.
+        while len(cache) > _SUBMODULES_CACHE_SIZE:
+            del cache[next(iter(cache))]
+        try:
+            _lwrite(path, json.dumps(cache, indent=2))
+        except OSError:
+            pass
 
-        def git_ls_tree(gitdir, rev, paths):
-            cmd = ["ls-tree", rev, "--"]
-            cmd.extend(paths)
-            try:
-                p = GitCommand(
-                    None,
-                    cmd,
-                    capture_stdout=True,
-                    capture_stderr=True,
-                    bare=True,
-                    gitdir=gitdir,
-                )
-            except GitError:
-                return []
-            if p.Wait() != 0:
-                return []
-            objects = {}
-            for line in p.stdout.split("\n"):
-                if not line.strip():
-                    continue
-                object_rev, object_path = line.split()[2:4]
-                objects[object_path] = object_rev
-            return objects
+    def _ReadSubmodules(self, rev):
+        """Query git for the submodules of |rev|.
 
+        Returns:
+            A tuple of the (rev, path, url, shallow) submodules, and whether
+            the result is stable enough to be saved to disk.
+        """
         try:
-            rev = self.GetRevisionId()
-        except (GitError, ManifestInvalidRevisionError):
-            # The git repo may be outdated (i.e. not fetched yet) and querying
-            # its submodules using the revision may not work; so return here.
-            return []
-        return get_submodules(self.gitdir, rev)
+            p = GitCommand(
+                None,
+                ["cat-file", "blob", "%s:.gitmodules" % rev],
+                capture_stdout=True,
+                capture_stderr=True,
+                bare=True,
+                gitdir=self.gitdir,
+            )
+            if p.Wait() != 0:
+                # The blob might be missing from a partial clone, so don't
+                # remember this across runs.
+                return [], False
+        except GitError:
+            return [], False
+
+        modules = []
+        for _, settings in sorted(_ParseGitmodules(p.stdout).items()):
+            path = settings.get("path")
+            if path:
+                modules.append(
+                    (path, settings.get("url", ""), settings.get("shallow", ""))
+                )
+        if not modules:
+            return [], True
+
+        # Read the SHAs of all the gitlinks in one go, which happen to be the
+        # revisions of the submodule repositories.
+        cmd = ["ls-tree", "-z", rev, "--"]
+        cmd.extend(path for path, _, _ in modules)
+        gitlinks = {}
+        try:
+            with GitStream(None, cmd, bare=True, gitdir=self.gitdir) as p:
+                for record in p.Records("\0"):
+                    info, object_path = record.split("\t", 1)
+                    _, object_type, object_rev = info.split()
+                    if object_type == "commit":
+                        gitlinks[object_path] = object_rev
+        except GitError:
+            return [], False
+        if p.rc:
+            return [], False
+
+        submodules = []
+        for path, url, shallow in modules:
+            # Ignore non-exist submodules.
+            if path in gitlinks:
+                submodules.append((gitlinks[path], path, url, shallow))
+        return submodules, True
 
     def GetDerivedSubprojects(self):
         result = []
@@ -3635,6 +3983,19 @@ class Project:
                 else:
                     self.config.SetString("gc.pruneExpire", "never")
 
+            if init_obj_dir or init_git_dir:
+                # Let `repo gc` find these without scanning the file system.
+                try:
+                    gitdir_registry.Register(
+                        self.manifest.repodir, {self.gitdir, self.objdir}
+                    )
+                except OSError as e:
+                    logger.warning(
+                        "warning: %s: unable to register git dirs: %s",
+                        self.name,
+                        e,
+                    )
+
         except Exception:
             if init_obj_dir and os.path.exists(self.objdir):
                 platform_utils.rmtree(self.objdir)
@@ -4285,55 +4646,16 @@ class Project:
             return []
 
         def DiffZ(self, name, *args):
-            cmd = [name]
-            cmd.append("-z")
-            cmd.append("--ignore-submodules")
-            cmd.extend(args)
             p = GitCommand(
                 self._project,
-                cmd,
+                _DiffZArgs(name, *args),
                 gitdir=self._gitdir,
                 bare=False,
                 capture_stdout=True,
                 capture_stderr=True,
             )
             p.Wait()
-            r = {}
-            out = p.stdout
-            if out:
-                out = iter(out[:-1].split("\0"))
-                while out:
-                    try:
-                        info = next(out)
-                        path = next(out)
-                    except StopIteration:
-                        break
-
-                    class _Info:
-                        def __init__(self, path, omode, nmode, oid, nid, state):
-                            self.path = path
-                            self.src_path = None
-                            self.old_mode = omode
-                            self.new_mode = nmode
-                            self.old_id = oid
-                            self.new_id = nid
-
-                            if len(state) == 1:
-                                self.status = state
-                                self.level = None
-                            else:
-                                self.status = state[:1]
-                                self.level = state[1:]
-                                while self.level.startswith("0"):
-                                    self.level = self.level[1:]
-
-                    info = info[1:].split(" ")
-                    info = _Info(path, *info)
-                    if info.status in ("R", "C"):
-                        info.src_path = info.path
-                        info.path = next(out)
-                    r[info.path] = info
-            return r
+            return _ParseDiffZ(p.stdout)
 
         def GetDotgitPath(self, subpath=None):
             """Return the full path to the .git dir.
@@ -4500,6 +4822,57 @@ class Project:
             return runner
 
 
+def _DiffZArgs(name, *args):
+    """Get the args to run diff command |name| for _ParseDiffZ."""
+    return [name, "-z", "--ignore-submodules"] + list(args)
+
+
+class _DiffInfo:
+    """A file in the output of a diff command (see _ParseDiffZ)."""
+
+    def __init__(self, path, omode, nmode, oid, nid, state):
+        self.path = path
+        self.src_path = None
+        self.old_mode = omode
+        self.new_mode = nmode
+        self.old_id = oid
+        self.new_id = nid
+
+        if len(state) == 1:
+            self.status = state
+            self.level = None
+        else:
+            self.status = state[:1]
+            self.level = state[1:]
+            while self.level.startswith("0"):
+                self.level = self.level[1:]
+
+
+def _ParseDiffZ(out):
+    """Parse the raw -z output of a diff command.
+
+    Returns:
+        A dict of the paths to their _DiffInfo.
+    """
+    r = {}
+    if out:
+        out = iter(out[:-1].split("\0"))
+        while out:
+            try:
+                info = next(out)
+                path = next(out)
+            except StopIteration:
+                break
+
+            info = info[1:].split(" ")
+            info = _DiffInfo(path, *info)
+            if info.status in ("R", "C"):
+                info.src_path = info.path
+                info.path = next(out)
+            r[info.path] = info
+    return r
+
+
 class LocalSyncFail(RepoError):
     """Default error when there is an Sync_LocalHalf error."""
 
@@ -0,0 +1,256 @@
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Set up urllib for repo's HTTP requests.
+
+This pulls in urllib.request, netrc & friends, which most commands never need,
+so import it only right before making a request.  The opener (with repo's user
+agent, netrc & interactive auth, and proxy) is installed on first use.
+
+Examples:
+  import repo_http
+
+  with repo_http.urlopen(url) as f:
+      data = f.read()
+"""
+
+import getpass
+import netrc
+import os
+import urllib.request
+
+from git_command import user_agent
+
+
+try:
+    import kerberos
+except ImportError:
+    kerberos = None
+
+
+_initialized = False
+
+
+class _UserAgentHandler(urllib.request.BaseHandler):
+    def http_request(self, req):
+        req.add_header("User-Agent", user_agent.repo)
+        return req
+
+    def https_request(self, req):
+        req.add_header("User-Agent", user_agent.repo)
+        return req
+
+
+def _AddPasswordFromUserInput(handler, msg, req):
+    # If repo could not find auth info from netrc, try to get it from user input
+    url = req.get_full_url()
+    user, password = handler.passwd.find_user_password(None, url)
+    if user is None:
+        print(msg)
+        try:
+            user = input("User: ")
+            password = getpass.getpass()
+        except KeyboardInterrupt:
+            return
+        handler.passwd.add_password(None, url, user, password)
+
+
+class _BasicAuthHandler(urllib.request.HTTPBasicAuthHandler):
+    def http_error_401(self, req, fp, code, msg, headers):
+        _AddPasswordFromUserInput(self, msg, req)
+        return urllib.request.HTTPBasicAuthHandler.http_error_401(
+            self, req, fp, code, msg, headers
+        )
+
+    def http_error_auth_reqed(self, authreq, host, req, headers):
+        try:
+            old_add_header = req.add_header
+
+            def _add_header(name, val):
+                val = val.replace("\n", "")
+                old_add_header(name, val)
+
+            req.add_header = _add_header
+            return (
+                urllib.request.AbstractBasicAuthHandler.http_error_auth_reqed(
+                    self, authreq, host, req, headers
+                )
+            )
+        except Exception:
+            reset = getattr(self, "reset_retry_count", None)
+            if reset is not None:
+                reset()
+            elif getattr(self, "retried", None):
+                self.retried = 0
+            raise
+
+
+class _DigestAuthHandler(urllib.request.HTTPDigestAuthHandler):
+    def http_error_401(self, req, fp, code, msg, headers):
+        _AddPasswordFromUserInput(self, msg, req)
+        return urllib.request.HTTPDigestAuthHandler.http_error_401(
+            self, req, fp, code, msg, headers
+        )
+
+    def http_error_auth_reqed(self, auth_header, host, req, headers):
+        try:
+            old_add_header = req.add_header
+
+            def _add_header(name, val):
+                val = val.replace("\n", "")
+                old_add_header(name, val)
+
+            req.add_header = _add_header
+            return (
+                urllib.request.AbstractDigestAuthHandler.http_error_auth_reqed(
+                    self, auth_header, host, req, headers
+                )
+            )
+        except Exception:
+            reset = getattr(self, "reset_retry_count", None)
+            if reset is not None:
+                reset()
+            elif getattr(self, "retried", None):
+                self.retried = 0
+            raise
+
+
+class _KerberosAuthHandler(urllib.request.BaseHandler):
+    def __init__(self):
+        self.retried = 0
+        self.context = None
+        self.handler_order = urllib.request.BaseHandler.handler_order - 50
+
+    def http_error_401(self, req, fp, code, msg, headers):
+        host = req.get_host()
+        retry = self.http_error_auth_reqed(
+            "www-authenticate", host, req, headers
+        )
+        return retry
+
+    def http_error_auth_reqed(self, auth_header, host, req, headers):
+        try:
+            spn = "HTTP@%s" % host
+            authdata = self._negotiate_get_authdata(auth_header, headers)
+
+            if self.retried > 3:
+                raise urllib.request.HTTPError(
+                    req.get_full_url(),
+                    401,
+                    "Negotiate auth failed",
+                    headers,
+                    None,
+                )
+            else:
+                self.retried += 1
+
+            neghdr = self._negotiate_get_svctk(spn, authdata)
+            if neghdr is None:
+                return None
+
+            req.add_unredirected_header("Authorization", neghdr)
+            response = self.parent.open(req)
+
+            srvauth = self._negotiate_get_authdata(auth_header, response.info())
+            if self._validate_response(srvauth):
+                return response
+        except kerberos.GSSError:
+            return None
+        except Exception:
+            self.reset_retry_count()
+            raise
+        finally:
+            self._clean_context()
+
+    def reset_retry_count(self):
+        self.retried = 0
+
+    def _negotiate_get_authdata(self, auth_header, headers):
+        authhdr = headers.get(auth_header, None)
+        if authhdr is not None:
+            for mech_tuple in authhdr.split(","):
+                mech, __, authdata = mech_tuple.strip().partition(" ")
+                if mech.lower() == "negotiate":
+                    return authdata.strip()
+        return None
+
+    def _negotiate_get_svctk(self, spn, authdata):
+        if authdata is None:
+            return None
+
+        result, self.context = kerberos.authGSSClientInit(spn)
+        if result < kerberos.AUTH_GSS_COMPLETE:
+            return None
+
+        result = kerberos.authGSSClientStep(self.context, authdata)
+        if result < kerberos.AUTH_GSS_CONTINUE:
+            return None
+
+        response = kerberos.authGSSClientResponse(self.context)
+        return "Negotiate %s" % response
+
+    def _validate_response(self, authdata):
+        if authdata is None:
+            return None
+        result = kerberos.authGSSClientStep(self.context, authdata)
+        if result == kerberos.AUTH_GSS_COMPLETE:
+            return True
+        return None
+
+    def _clean_context(self):
+        if self.context is not None:
+            kerberos.authGSSClientClean(self.context)
+            self.context = None
+
+
+def init_http():
+    """Install repo's urllib opener, once."""
+    global _initialized
+    if _initialized:
+        return
+    _initialized = True
+
+    handlers = [_UserAgentHandler()]
+
+    mgr = urllib.request.HTTPPasswordMgrWithDefaultRealm()
+    try:
+        n = netrc.netrc()
+        for host in n.hosts:
+            p = n.hosts[host]
+            mgr.add_password(p[1], "http://%s/" % host, p[0], p[2])
+            mgr.add_password(p[1], "https://%s/" % host, p[0], p[2])
+    except netrc.NetrcParseError:
+        pass
+    except OSError:
+        pass
+    handlers.append(_BasicAuthHandler(mgr))
+    handlers.append(_DigestAuthHandler(mgr))
+    if kerberos:
+        handlers.append(_KerberosAuthHandler())
+
+    if "http_proxy" in os.environ:
+        url = os.environ["http_proxy"]
+        handlers.append(
+            urllib.request.ProxyHandler({"http": url, "https": url})
+        )
+    if "REPO_CURL_VERBOSE" in os.environ:
+        handlers.append(urllib.request.HTTPHandler(debuglevel=1))
+        handlers.append(urllib.request.HTTPSHandler(debuglevel=1))
+    urllib.request.install_opener(urllib.request.build_opener(*handlers))
+
+
+def urlopen(*args, **kwargs):
+    """Like urllib.request.urlopen, with repo's opener installed."""
+    init_http()
+    return urllib.request.urlopen(*args, **kwargs)
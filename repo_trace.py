@@ -18,12 +18,22 @@ Activated via `repo --trace ...` or `REPO_TRACE=1 repo ...`.
 
 Temporary: Tracing is always on. Set `REPO_TRACE=0` to turn off.
 To also include trace outputs in stderr do `repo --trace_to_stderr ...`
+
+Each process keeps the records it traces in memory, and appends them to the
+trace file every _FLUSH_INTERVAL seconds, when _FLUSH_SIZE bytes are waiting,
+and at exit.  Every flush is a single write of whole records to a file opened
+in append mode, so the records of parallel workers never interleave.  Records
+start with the PID of the process that wrote them.
+
+When the trace file grows over _MAX_SIZE, the next repo command moves it aside
+to TRACE_FILE.old (replacing the one before) and starts a new one.
 """
 
+import atexit
 import contextlib
 import os
 import sys
-import tempfile
+import threading
 import time
 
 import platform_utils
@@ -38,6 +48,9 @@ _TRACE_TO_STDERR = False
 _TRACE_FILE = None
 _TRACE_FILE_NAME = "TRACE_FILE"
 _MAX_SIZE = 70  # in MiB
+_OLD_TRACE_SUFFIX = ".old"
+_FLUSH_INTERVAL = 1.0  # in seconds
+_FLUSH_SIZE = 64 * 1024  # in bytes
 _NEW_COMMAND_SEP = "+++++++++++++++NEW COMMAND+++++++++++++++++++"
 
 
@@ -69,6 +82,102 @@ def _SetTraceFile(quiet):
     _TRACE_FILE = _GetTraceFile(quiet)
 
 
+class _Writer:
+    """Buffers trace records & appends them to the trace file."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._records = []
+        self._size = 0
+        self._timer = None
+        self._fd = None
+        self._path = None
+
+    def ResetAfterFork(self):
+        """Drop the state copied from the parent process."""
+        # The lock may have been held by another thread of the parent, and
+        # the parent writes out its own records.  The file can be shared.
+        self._lock = threading.Lock()
+        self._records = []
+        self._size = 0
+        self._timer = None
+
+    def Write(self, record):
+        """Queue |record| to be written."""
+        with self._lock:
+            if self._path != _TRACE_FILE:
+                # Records go to the file that was set when they were traced.
+                self._CloseLocked()
+                self._path = _TRACE_FILE
+            self._records.append(record)
+            self._size += len(record)
+            if self._size >= _FLUSH_SIZE:
+                self._FlushLocked()
+            elif self._timer is None:
+                self._timer = threading.Timer(_FLUSH_INTERVAL, self.Flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def Flush(self):
+        """Write out all the queued records."""
+        with self._lock:
+            self._FlushLocked()
+
+    def Close(self):
+        """Write out all the queued records, and close the trace file."""
+        with self._lock:
+            self._CloseLocked()
+
+    def _CloseLocked(self):
+        self._FlushLocked()
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _FlushLocked(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._records:
+            return
+        data = "".join(self._records).encode("utf-8", errors="replace")
+        self._records = []
+        self._size = 0
+        try:
+            if self._fd is None:
+                self._fd = os.open(
+                    self._path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666
+                )
+            # A single write, so the records don't interleave with those of
+            # other processes (regular files don't get short writes in
+            # practice).
+            while data:
+                data = data[os.write(self._fd, data) :]
+        except OSError:
+            # Tracing is best effort.
+            pass
+
+
+_writer = _Writer()
+atexit.register(_writer.Close)
+if hasattr(os, "register_at_fork"):
+    # Write out the parent's records first, as the child drops its copy (and
+    # may exec something else, e.g. the pager).
+    os.register_at_fork(
+        before=_writer.Flush, after_in_child=_writer.ResetAfterFork
+    )
+
+
+def Flush():
+    """Write out the trace records of this process.
+
+    Happens at exit anyway, but processes that are killed (e.g. pool workers),
+    that exec something else, or that want to read the trace file need to call
+    this.
+    """
+    _writer.Flush()
+
+
 class Trace(contextlib.ContextDecorator):
     """Used to capture and save git traces."""
 
@@ -104,8 +213,7 @@ class Trace(contextlib.ContextDecorator):
             f"PID: {os.getpid()} START: {self._time()} :{self._trace_msg}\n"
         )
 
-        with open(_TRACE_FILE, "a") as f:
-            print(print_msg, file=f)
+        _writer.Write(print_msg + "\n")
 
         if _TRACE_TO_STDERR:
             print(print_msg, file=sys.stderr)
@@ -120,8 +228,7 @@ class Trace(contextlib.ContextDecorator):
             f"PID: {os.getpid()} END: {self._time()} :{self._trace_msg}\n"
         )
 
-        with open(_TRACE_FILE, "a") as f:
-            print(print_msg, file=f)
+        _writer.Write(print_msg + "\n")
 
         if _TRACE_TO_STDERR:
             print(print_msg, file=sys.stderr)
@@ -140,32 +247,14 @@ def _GetTraceFile(quiet):
 
 
 def _ClearOldTraces():
-    """Clear the oldest commands if trace file is too big."""
+    """Rotate the trace file if it is too big."""
+    # Write out what came before this command, e.g. the traces of an earlier
+    # command run in the same process, and reopen the file after rotating it.
+    _writer.Close()
     try:
-        with open(_TRACE_FILE, errors="ignore") as f:
-            if os.path.getsize(f.name) / (1024 * 1024) <= _MAX_SIZE:
-                return
-            trace_lines = f.readlines()
-    except FileNotFoundError:
-        return
-
-    while sum(len(x) for x in trace_lines) / (1024 * 1024) > _MAX_SIZE:
-        for i, line in enumerate(trace_lines):
-            if "END:" in line and _NEW_COMMAND_SEP in line:
-                trace_lines = trace_lines[i + 1 :]
-                break
-        else:
-            # The last chunk is bigger than _MAX_SIZE, so just throw everything
-            # away.
-            trace_lines = []
-
-    while trace_lines and trace_lines[-1] == "\n":
-        trace_lines = trace_lines[:-1]
-    # Write to a temporary file with a unique name in the same filesystem
-    # before replacing the original trace file.
-    temp_dir, temp_prefix = os.path.split(_TRACE_FILE)
-    with tempfile.NamedTemporaryFile(
-        "w", dir=temp_dir, prefix=temp_prefix, delete=False
-    ) as f:
-        f.writelines(trace_lines)
-    platform_utils.rename(f.name, _TRACE_FILE)
+        if os.path.getsize(_TRACE_FILE) / (1024 * 1024) <= _MAX_SIZE:
+            return
+        platform_utils.rename(_TRACE_FILE, _TRACE_FILE + _OLD_TRACE_SUFFIX)
+    except OSError:
+        # Missing, or another repo command rotated it already.
+        pass
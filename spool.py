@@ -0,0 +1,151 @@
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Stream output from parallel workers back to the parent in order.
+
+Workers write their output to a Spool, which keeps it in memory until it grows
+too big, and then spills it to a file in a directory shared with the parent.
+The parent processes results in order, and while it waits on the project at the
+head of the queue, it can read whatever that project has spilled so far.
+
+Examples:
+  # Worker:
+  spool = Spool(os.path.join(spool_dir, str(idx)))
+  spool.write(data)
+  return spool.result()
+
+  # Parent:
+  reader = SpoolReader(spool_dir)
+  for idx, result in OrderedResults(pool, results, count, on_wait):
+      data = reader.Finish(idx, *result)
+"""
+
+import contextlib
+import functools
+import io
+import multiprocessing
+import os
+import tempfile
+
+import platform_utils
+
+
+# How much output a single worker may buffer in memory before it is spilled to
+# a temporary file.
+MAX_MEMORY = 64 * 1024
+
+# How much output to read or write at a time.
+CHUNK_SIZE = 64 * 1024
+
+# How often (in seconds) to check for output of the project being waited on.
+POLL_INTERVAL = 0.1
+
+
+@contextlib.contextmanager
+def SpoolDir(prefix):
+    """Create a temporary directory for spools, and clean it up afterwards."""
+    path = tempfile.mkdtemp(prefix=prefix)
+    try:
+        yield path
+    finally:
+        platform_utils.rmtree(path, ignore_errors=True)
+
+
+class Spool:
+    """Buffer output in memory, spilling to |path| if it gets too big."""
+
+    def __init__(self, path):
+        self.path = path
+        self._buf = io.BytesIO()
+        self._fp = None
+
+    def __bool__(self):
+        return self._fp is not None or self._buf.tell() > 0
+
+    def write(self, data):
+        if self._fp is None:
+            if self._buf.tell() + len(data) <= MAX_MEMORY:
+                self._buf.write(data)
+                return
+            self._fp = open(self.path, "wb")
+            self._fp.write(self._buf.getvalue())
+            self._buf = None
+        self._fp.write(data)
+        # Let the parent see the output as it arrives.
+        self._fp.flush()
+
+    def close(self):
+        if self._fp is not None:
+            self._fp.close()
+
+    def result(self):
+        """Return the (data, spilled) pair to pass back to the parent."""
+        self.close()
+        if self._fp is None:
+            return (self._buf.getvalue(), False)
+        return (b"", True)
+
+
+class SpoolReader:
+    """Read the spools of workers in order."""
+
+    def __init__(self, spool_dir):
+        self.spool_dir = spool_dir
+        self._offset = 0
+
+    def _path(self, idx):
+        return os.path.join(self.spool_dir, str(idx))
+
+    def Tail(self, idx):
+        """Yield the output that worker |idx| spilled since the last call."""
+        try:
+            with open(self._path(idx), "rb") as fp:
+                fp.seek(self._offset)
+                for chunk in iter(functools.partial(fp.read, CHUNK_SIZE), b""):
+                    self._offset += len(chunk)
+                    yield chunk
+        except FileNotFoundError:
+            pass
+
+    def Finish(self, idx, data, spilled):
+        """Yield the rest of the output of worker |idx| once it has finished."""
+        if spilled:
+            yield from self.Tail(idx)
+            platform_utils.remove(self._path(idx), missing_ok=True)
+        elif data:
+            yield data
+        self._offset = 0
+
+
+def OrderedResults(pool, results, count, on_wait):
+    """Yield the |count| (index, result) pairs of ordered |results|.
+
+    Args:
+        pool: The multiprocessing pool (or None when running serially).
+        results: The ordered results iterator from Command.ExecuteInParallel.
+        count: How many results there are.
+        on_wait: Called with the index of the result being waited on every
+            POLL_INTERVAL seconds.
+    """
+    for idx in range(count):
+        while True:
+            try:
+                if pool is None:
+                    result = next(results)
+                else:
+                    result = results.next(timeout=POLL_INTERVAL)
+                break
+            except multiprocessing.TimeoutError:
+                on_wait(idx)
+        yield idx, result
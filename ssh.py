@@ -23,8 +23,10 @@ import subprocess
 import sys
 import tempfile
 import time
+from typing import Optional
 
 from git_command import git
+import git_info_cache
 import platform_utils
 from repo_trace import Trace
 
@@ -347,6 +349,21 @@ def _get_git_protocol_version() -> str:
 
     See https://git-scm.com/docs/gitprotocol-v2 for details.
     """
+    version = git_info_cache.Get(
+        "global:protocol.version", _read_git_protocol_version
+    )
+    if version is not None:
+        return version
+    # Try to imitate the defaults that git would have used.
+    git_version = git.version_tuple()
+    if git_version >= (2, 26, 0):
+        # Since git version 2.26, protocol v2 is the default.
+        return "2"
+    return "1"
+
+
+def _read_git_protocol_version() -> Optional[str]:
+    """Read protocol.version from the global git config (None if unset)."""
     try:
         return subprocess.check_output(
             ["git", "config", "--get", "--global", "protocol.version"],
@@ -356,11 +373,6 @@ def _get_git_protocol_version() -> str:
     except subprocess.CalledProcessError as e:
         if e.returncode == 1:
             # Exit code 1 means that the git config key was not found.
-            # Try to imitate the defaults that git would have used.
-            git_version = git.version_tuple()
-            if git_version >= (2, 26, 0):
-                # Since git version 2.26, protocol v2 is the default.
-                return "2"
-            return "1"
+            return None
         # Other exit codes indicate error with reading the config.
         raise
@@ -12,37 +12,87 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections.abc
 import os
 
 
-# A mapping of the subcommand name to the class that implements it.
-all_commands = {}
-all_modules = []
+def _ClassName(module_name):
+    """Return the name of the class that implements a subcommand module."""
+    clsn = module_name.capitalize()
+    while clsn.find("_") > 0:
+        h = clsn.index("_")
+        clsn = clsn[0:h] + clsn[h + 1 :].capitalize()
+    return clsn
 
-my_dir = os.path.dirname(__file__)
-for py in os.listdir(my_dir):
-    if py == "__init__.py":
-        continue
 
-    if py.endswith(".py"):
-        name = py[:-3]
+class _Commands(collections.abc.MutableMapping):
+    """A mapping of the subcommand name to the class that implements it.
 
-        clsn = name.capitalize()
-        while clsn.find("_") > 0:
-            h = clsn.index("_")
-            clsn = clsn[0:h] + clsn[h + 1 :].capitalize()
+    Subcommand modules are only imported when their class is looked up, so
+    running one command doesn't pay for importing all the others.
+    """
 
-        mod = __import__(__name__, globals(), locals(), ["%s" % name])
-        mod = getattr(mod, name)
+    def __init__(self):
+        # The module that implements each command.
+        self._modules = {}
+        self._classes = {}
+
+    def AddModule(self, name, module_name):
+        """Register the command |name| implemented by subcmds.|module_name|."""
+        self._modules[name] = module_name
+        self._classes.pop(name, None)
+
+    def __getitem__(self, name):
+        try:
+            return self._classes[name]
+        except KeyError:
+            pass
+
+        module_name = self._modules[name]
+        mod = __import__(__name__, globals(), locals(), [module_name])
+        mod = getattr(mod, module_name)
+        clsn = _ClassName(module_name)
         try:
             cmd = getattr(mod, clsn)
         except AttributeError:
-            raise SyntaxError(f"{__name__}/{py} does not define class {clsn}")
+            raise SyntaxError(
+                f"{__name__}/{module_name}.py does not define class {clsn}"
+            )
+        cmd.NAME = module_name.replace("_", "-")
+        self._classes[name] = cmd
+        return cmd
+
+    def __setitem__(self, name, cmd):
+        self._modules.pop(name, None)
+        self._classes[name] = cmd
+
+    def __delitem__(self, name):
+        if name not in self:
+            raise KeyError(name)
+        self._modules.pop(name, None)
+        self._classes.pop(name, None)
 
-        name = name.replace("_", "-")
-        cmd.NAME = name
-        all_commands[name] = cmd
-        all_modules.append(mod)
+    def __contains__(self, name):
+        return name in self._modules or name in self._classes
+
+    def __iter__(self):
+        # NB: Importing subcmds.list shadows the list builtin in this module.
+        return iter(dict.fromkeys([*self._modules, *self._classes]))
+
+    def __len__(self):
+        return len(set(self._modules) | set(self._classes))
+
+
+all_commands = _Commands()
+
+my_dir = os.path.dirname(__file__)
+for py in os.listdir(my_dir):
+    if py == "__init__.py":
+        continue
+
+    if py.endswith(".py"):
+        name = py[:-3]
+        all_commands.AddModule(name.replace("_", "-"), name)
 
 # Add 'branch' as an alias for 'branches'.
-all_commands["branch"] = all_commands["branches"]
+all_commands.AddModule("branch", "branches")
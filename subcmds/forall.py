@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import codecs
 import errno
 import functools
 import io
@@ -25,7 +26,10 @@ from color import Coloring
 from command import Command
 from command import DEFAULT_LOCAL_JOBS
 from command import MirrorSafeCommand
+from local_sync_state import LocalSyncState
+from manifest_xml import RepoClient
 from repo_logging import RepoLogger
+import spool
 
 
 logger = RepoLogger(__file__)
@@ -59,7 +63,9 @@ regex or wildcard expression.
 By default, projects are processed non-interactively in parallel.  If you want
 to run interactive commands, make sure to pass --interactive to force --jobs 1.
 While the processing order of projects is not guaranteed, the order of project
-output is stable.
+output is stable.  Output of the project at the head of the queue is shown as
+it is produced, while output of later projects is held in bounded buffers (and
+temporary files) until its turn comes.
 
 # Output Formatting
 
@@ -135,6 +141,27 @@ terminal and are not redirected.
 
 If -e is used, when a command exits unsuccessfully, '%prog' will abort
 without iterating through the remaining projects.
+
+# Changed Projects
+
+The --changed-since-* options limit the command to projects that moved, which
+is useful for CI jobs that only need to look at what a sync brought in.
+
+--changed-since-sync selects projects that the most recent `repo sync` checked
+out to a different revision than the sync before it.
+
+--changed-since-checkpoint selects projects whose synced revision differs from
+the one recorded in the named checkpoint.  Checkpoints are recorded with
+--save-checkpoint once all the commands have succeeded, e.g.:
+
+  %prog --changed-since-checkpoint=ci --save-checkpoint=ci -c make lint
+
+--changed-since-manifest selects projects that were added or point to another
+revision compared to the given manifest file (see `repo diffmanifests`).  In
+a tree with submanifests, it needs --this-manifest-only.
+
+These options only look at revisions recorded by `repo sync`, so local commits
+made since then are not taken into account.
 """
     PARALLEL_JOBS = DEFAULT_LOCAL_JOBS
 
@@ -185,6 +212,29 @@ without iterating through the remaining projects.
             help="silently skip & do not exit non-zero due missing "
             "checkouts",
         )
+        p.add_option(
+            "--changed-since-sync",
+            action="store_true",
+            help="only run on projects whose revision changed in the last sync",
+        )
+        p.add_option(
+            "--changed-since-checkpoint",
+            metavar="NAME",
+            help="only run on projects whose revision changed since the "
+            "checkpoint NAME",
+        )
+        p.add_option(
+            "--changed-since-manifest",
+            metavar="MANIFEST",
+            help="only run on projects that differ from the manifest file "
+            "MANIFEST",
+        )
+        p.add_option(
+            "--save-checkpoint",
+            metavar="NAME",
+            help="record the synced revisions as checkpoint NAME if all "
+            "commands succeed",
+        )
 
         g = p.get_option_group("--quiet")
         g.add_option(
@@ -203,6 +253,81 @@ without iterating through the remaining projects.
     def ValidateOptions(self, opt, args):
         if not opt.command:
             self.Usage()
+        changed_opts = [
+            opt.changed_since_sync,
+            opt.changed_since_checkpoint,
+            opt.changed_since_manifest,
+        ]
+        if len([x for x in changed_opts if x]) > 1:
+            self.OptionParser.error(
+                "only one --changed-since-* option may be used"
+            )
+        # The manifest file only describes one tree, so the projects of the
+        # others can't be compared to it.
+        if (
+            opt.changed_since_manifest
+            and not opt.this_manifest_only
+            and self.manifest.is_multimanifest
+        ):
+            self.OptionParser.error(
+                "--changed-since-manifest only supports the current tree; "
+                "use --this-manifest-only"
+            )
+
+    def _FilterChangedProjects(self, opt, projects):
+        """Limit |projects| to the ones selected by --changed-since-*."""
+        if opt.changed_since_manifest:
+            manifest = RepoClient(self.repodir)
+            manifest.Override(
+                opt.changed_since_manifest, load_local_manifests=False
+            )
+            diff = manifest.projectsDiff(self.manifest)
+            changed = {p.relpath for p in diff["added"] + diff["missing"]}
+            changed.update(
+                x.relpath for _, x in diff["changed"] + diff["unreachable"]
+            )
+            return [p for p in projects if p.relpath in changed]
+
+        states = {}
+        checkpoints = {}
+        result = []
+        for project in projects:
+            state = states.get(project.manifest)
+            if state is None:
+                state = states[project.manifest] = LocalSyncState(
+                    project.manifest
+                )
+                if opt.changed_since_checkpoint:
+                    checkpoint = state.GetCheckpoint(
+                        opt.changed_since_checkpoint
+                    )
+                    if checkpoint is None:
+                        logger.warning(
+                            "checkpoint %s not found; selecting all projects",
+                            opt.changed_since_checkpoint,
+                        )
+                    checkpoints[project.manifest] = checkpoint
+            if opt.changed_since_sync:
+                if state.ChangedInLastSync(project):
+                    result.append(project)
+            else:
+                checkpoint = checkpoints[project.manifest]
+                revision = state.GetRevision(project)
+                if (
+                    checkpoint is None
+                    or not revision
+                    or checkpoint.get(project.relpath) != revision
+                ):
+                    result.append(project)
+        return result
+
+    def _SaveCheckpoint(self, name, projects):
+        """Record the synced revisions of |projects| as checkpoint |name|."""
+        by_manifest = {}
+        for project in projects:
+            by_manifest.setdefault(project.manifest, []).append(project)
+        for manifest, manifest_projects in by_manifest.items():
+            LocalSyncState(manifest).SaveCheckpoint(name, manifest_projects)
 
     def Execute(self, opt, args):
         cmd = [opt.command[0]]
@@ -256,23 +381,27 @@ without iterating through the remaining projects.
                 args, groups=opt.groups, all_manifests=all_trees
             )
 
+        all_projects = projects
+        if (
+            opt.changed_since_sync
+            or opt.changed_since_checkpoint
+            or opt.changed_since_manifest
+        ):
+            projects = self._FilterChangedProjects(opt, projects)
+
         os.environ["REPO_COUNT"] = str(len(projects))
 
-        def _ProcessResults(_pool, _output, results):
+        def _ProcessResults(pool, _output, results):
             rc = 0
-            first = True
-            for r, output in results:
-                if output:
-                    if first:
-                        first = False
-                    elif opt.project_header:
-                        print()
-                    # To simplify the DoWorkWrapper, take care of automatic
-                    # newlines.
-                    end = "\n"
-                    if output[-1] == "\n":
-                        end = ""
-                    print(output, end=end)
+            streamer = _OutputStreamer(spool_dir, opt.project_header)
+            for idx, (r, data, spilled) in spool.OrderedResults(
+                pool,
+                results,
+                len(projects),
+                # Show what the project has produced so far.
+                streamer.Tail,
+            ):
+                streamer.Finish(idx, data, spilled)
                 rc = rc or r
                 if r != 0 and opt.abort_on_errors:
                     raise Exception("Aborting due to previous error")
@@ -280,8 +409,11 @@ without iterating through the remaining projects.
 
         try:
             config = self.manifest.manifestProject.config
-            with self.ParallelContext():
+            with self.ParallelContext(), spool.SpoolDir(
+                "repo-forall-"
+            ) as spool_dir:
                 self.get_parallel_context()["projects"] = projects
+                self.get_parallel_context()["spool_dir"] = spool_dir
                 rc = self.ExecuteInParallel(
                     opt.jobs,
                     functools.partial(
@@ -306,6 +438,8 @@ without iterating through the remaining projects.
             rc = getattr(e, "errno", 1)
         if rc != 0:
             sys.exit(rc)
+        if opt.save_checkpoint:
+            self._SaveCheckpoint(opt.save_checkpoint, all_projects)
 
     @classmethod
     def InitWorker(cls):
@@ -320,9 +454,15 @@ without iterating through the remaining projects.
         with stacktraces and making the parent hang indefinitely.
 
         """
-        project = cls.get_parallel_context()["projects"][project_idx]
+        context = cls.get_parallel_context()
+        project = context["projects"][project_idx]
+        output = spool.Spool(
+            os.path.join(context["spool_dir"], str(project_idx))
+        )
         try:
-            return DoWork(project, mirror, opt, cmd, shell, project_idx, config)
+            return DoWork(
+                project, mirror, opt, cmd, shell, project_idx, config, output
+            )
         except KeyboardInterrupt:
             print("%s: Worker interrupted" % project.name)
             raise WorkerKeyboardInterrupt()
@@ -332,7 +472,49 @@ class WorkerKeyboardInterrupt(Exception):
     """Keyboard interrupt exception for worker processes."""
 
 
-def DoWork(project, mirror, opt, cmd, shell, cnt, config):
+class _OutputStreamer:
+    """Write the spooled output of each project to stdout in order."""
+
+    def __init__(self, spool_dir, project_header):
+        self.reader = spool.SpoolReader(spool_dir)
+        self.project_header = project_header
+        self.first = True
+        self._Reset()
+
+    def _Reset(self):
+        self._started = False
+        self._last = b""
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def _Write(self, data, final=False):
+        if data and not self._started:
+            self._started = True
+            if self.first:
+                self.first = False
+            elif self.project_header:
+                sys.stdout.write("\n")
+        if data:
+            self._last = data[-1:]
+        sys.stdout.write(self._decoder.decode(data, final=final))
+        sys.stdout.flush()
+
+    def Tail(self, idx):
+        """Show any new output that project |idx| spilled to disk."""
+        for chunk in self.reader.Tail(idx):
+            self._Write(chunk)
+
+    def Finish(self, idx, data, spilled):
+        """Show the rest of project |idx|'s output once it has finished."""
+        for chunk in self.reader.Finish(idx, data, spilled):
+            self._Write(chunk)
+        self._Write(b"", final=True)
+        # To simplify the DoWorkWrapper, take care of automatic newlines.
+        if self._started and self._last != b"\n":
+            sys.stdout.write("\n")
+        self._Reset()
+
+
+def DoWork(project, mirror, opt, cmd, shell, cnt, config, output):
     env = os.environ.copy()
 
     def setenv(name, val):
@@ -353,14 +535,16 @@ def DoWork(project, mirror, opt, cmd, shell, cnt, config):
         # Allow the user to silently ignore missing checkouts so they can run on
         # partial checkouts (good for infra recovery tools).
         if opt.ignore_missing:
-            return (0, "")
+            return (0, b"", False)
 
-        output = ""
         if (opt.project_header and opt.verbose) or not opt.project_header:
-            output = "skipping %s/" % project.RelPath(
-                local=opt.this_manifest_only
+            output.write(
+                (
+                    "skipping %s/"
+                    % project.RelPath(local=opt.this_manifest_only)
+                ).encode("utf-8")
             )
-        return (1, output)
+        return (1,) + output.result()
 
     if opt.verbose:
         stderr = subprocess.STDOUT
@@ -369,33 +553,33 @@ def DoWork(project, mirror, opt, cmd, shell, cnt, config):
 
     stdin = None if opt.interactive else subprocess.DEVNULL
 
-    result = subprocess.run(
+    header = b""
+    if opt.project_header:
+        buf = io.StringIO()
+        out = ForallColoring(config)
+        out.redirect(buf)
+        if mirror:
+            project_header_path = project.name
+        else:
+            project_header_path = project.RelPath(local=opt.this_manifest_only)
+        out.project("project %s/" % project_header_path)
+        out.nl()
+        header = buf.getvalue().encode("utf-8")
+
+    with subprocess.Popen(
         cmd,
         cwd=cwd,
         shell=shell,
         env=env,
-        check=False,
-        encoding="utf-8",
-        errors="replace",
         stdin=stdin,
         stdout=subprocess.PIPE,
         stderr=stderr,
-    )
-
-    output = result.stdout
-    if opt.project_header:
-        if output:
-            buf = io.StringIO()
-            out = ForallColoring(config)
-            out.redirect(buf)
-            if mirror:
-                project_header_path = project.name
-            else:
-                project_header_path = project.RelPath(
-                    local=opt.this_manifest_only
-                )
-            out.project("project %s/" % project_header_path)
-            out.nl()
-            buf.write(output)
-            output = buf.getvalue()
-    return (result.returncode, output)
+    ) as p:
+        for chunk in iter(
+            functools.partial(p.stdout.read1, spool.CHUNK_SIZE), b""
+        ):
+            # Only show the header when the command produces output.
+            if header and not output:
+                output.write(header)
+            output.write(chunk)
+    return (p.returncode,) + output.result()
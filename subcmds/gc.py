@@ -12,15 +12,53 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import functools
 import os
+import subprocess
 from typing import List, Set
 
 from command import Command
+from command import DEFAULT_LOCAL_JOBS
 from git_command import git_require
 from git_command import GitCommand
+from git_command import GitStream
+import gitdir_registry
 import platform_utils
 from progress import Progress
 from project import Project
+import trash
+
+
+def _PackObjects(project, pack_dir, rev_lists, threads):
+    """Pack the objects listed by |rev_lists| into a new pack in |pack_dir|.
+
+    The output of each `git rev-list` is piped straight into a single
+    `git pack-objects`, so the object lists never pass through repo.
+
+    Args:
+        project: The project to pack.
+        pack_dir: The directory to write the pack to.
+        rev_lists: The rev-list arguments of each object list to pack.
+        threads: How many threads pack-objects may use.
+    """
+    pack_cmd = [
+        "pack-objects",
+        f"--threads={threads}",
+        os.path.join(pack_dir, "pack"),
+    ]
+    with GitStream(
+        project,
+        pack_cmd,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.DEVNULL,
+        verify_command=True,
+    ) as pack:
+        for args in rev_lists:
+            cmd = ["rev-list", "--objects", "--missing=allow-promisor"]
+            cmd += args
+            GitStream(
+                project, cmd, stdout=pack.stdin, verify_command=True
+            ).Wait()
 
 
 class Gc(Command):
@@ -29,6 +67,16 @@ class Gc(Command):
     helpUsage = """
 %prog
 """
+    helpDescription = """
+'%prog' deletes the git directories of projects that are no longer in the
+manifest.
+
+With --repack, projects that use partial clone with filter=blob:none are
+repacked in parallel (see --jobs).  The pack.threads setting in your git
+config sets the total number of threads (the number of CPUs by default), and
+it is shared between the projects being repacked at the same time.
+"""
+    PARALLEL_JOBS = DEFAULT_LOCAL_JOBS
 
     def _Options(self, p):
         p.add_option(
@@ -54,46 +102,38 @@ class Gc(Command):
             "filter=blob:none",
         )
 
-    def _find_git_to_delete(
-        self, to_keep: Set[str], start_dir: str
-    ) -> Set[str]:
-        """Searches no longer needed ".git" directories.
+    def _find_git_dirs(self, opt) -> Set[str]:
+        """Find the git directories repo has created.
 
-        Scans the file system starting from `start_dir` and removes all
-        directories that end with ".git" that are not in the `to_keep` set.
+        The registry of git directories is used when it is complete.
+        Otherwise the file system is scanned (which is slow), and the
+        registry is rebuilt from what was found.
         """
-        to_delete = set()
-        for root, dirs, _ in platform_utils.walk(start_dir):
-            for directory in dirs:
-                if not directory.endswith(".git"):
-                    continue
-
-                path = os.path.join(root, directory)
-                if path not in to_keep:
-                    to_delete.add(path)
-
-        return to_delete
+        paths = gitdir_registry.Load(self.repodir)
+        if paths is None:
+            print(f"Scanning filesystem under {self.repodir}...")
+            paths = set()
+            for root in ("projects", "project-objects"):
+                paths |= gitdir_registry.Scan(os.path.join(self.repodir, root))
+            if not opt.dryrun:
+                gitdir_registry.Save(self.repodir, paths)
+        else:
+            # Verify the registry, in case directories were removed by hand.
+            paths = {x for x in paths if os.path.isdir(x)}
+        return paths
 
     def delete_unused_projects(self, projects: List[Project], opt):
-        print(f"Scanning filesystem under {self.repodir}...")
-
-        project_paths = set()
-        project_object_paths = set()
-
+        to_keep = set()
         for project in projects:
-            project_paths.add(project.gitdir)
-            project_object_paths.add(project.objdir)
-
-        to_delete = self._find_git_to_delete(
-            project_paths, os.path.join(self.repodir, "projects")
-        )
+            to_keep.add(os.path.normpath(project.gitdir))
+            to_keep.add(os.path.normpath(project.objdir))
 
-        to_delete.update(
-            self._find_git_to_delete(
-                project_object_paths,
-                os.path.join(self.repodir, "project-objects"),
-            )
+        found = self._find_git_dirs(opt)
+        roots = tuple(
+            os.path.join(self.repodir, x, "")
+            for x in ("projects", "project-objects")
         )
+        to_delete = sorted(x for x in found - to_keep if x.startswith(roots))
 
         if not to_delete:
             print("Nothing to clean up.")
@@ -111,31 +151,46 @@ class Gc(Command):
             if ask.lower() != "y":
                 return 1
 
+        if opt.dryrun:
+            for path in to_delete:
+                print(f"\nWould have deleted {path}")
+            return 0
+
+        # Moving the directories into the trash is quick, so the registry
+        # can't get out of sync with what is on disk.
+        try:
+            for path in to_delete:
+                trash.Delete(self.repodir, path)
+        finally:
+            # Forget whatever is gone now.
+            gitdir_registry.Save(
+                self.repodir,
+                {x for x in found | to_keep if os.path.isdir(x)},
+            )
+
+        self._EmptyTrash(opt)
+        return 0
+
+    def _EmptyTrash(self, opt):
+        """Finish deleting everything in the trash."""
+        if not trash.HasTrash(self.repodir):
+            return
+
         pm = Progress(
             "Deleting",
-            len(to_delete),
+            0,
             delay=False,
             quiet=opt.quiet,
             show_elapsed=True,
             elide=True,
         )
-
-        for path in to_delete:
-            if opt.dryrun:
-                print(f"\nWould have deleted ${path}")
-            else:
-                tmp_path = os.path.join(
-                    os.path.dirname(path),
-                    f"to_be_deleted_{os.path.basename(path)}",
-                )
-                platform_utils.rename(path, tmp_path)
-                platform_utils.rmtree(tmp_path)
-            pm.update(msg=path)
+        trash.Reap(
+            self.repodir, jobs=opt.jobs, callback=lambda x: pm.update(msg=x)
+        )
         pm.end()
 
-        return 0
-
-    def _generate_promisor_files(self, pack_dir: str):
+    @staticmethod
+    def _generate_promisor_files(pack_dir: str):
         """Generates promisor files for all pack files in the given directory.
 
         Promisor files are empty files with the same name as the corresponding
@@ -167,6 +222,13 @@ class Gc(Command):
             print(f"Would have repacked {len(repack_projects)} projects.")
             return 0
 
+        # Split the thread budget between the projects packed at once.
+        budget = self.manifest.globalConfig.GetInt("pack.threads")
+        if not budget:
+            budget = os.cpu_count()
+        jobs = max(1, min(opt.jobs, len(repack_projects)))
+        threads = max(1, budget // jobs)
+
         pm = Progress(
             "Repacking (this will take a while)",
             len(repack_projects),
@@ -176,62 +238,71 @@ class Gc(Command):
             elide=True,
         )
 
-        for project in repack_projects:
-            pm.update(msg=f"{project.name}")
-
-            pack_dir = os.path.join(project.gitdir, "tmp_repo_repack")
-            if os.path.isdir(pack_dir):
-                platform_utils.rmtree(pack_dir)
-            os.mkdir(pack_dir)
+        def _ProcessResults(_pool, pm, results):
+            for name in results:
+                pm.update(msg=name)
+
+        with self.ParallelContext():
+            self.get_parallel_context()["projects"] = repack_projects
+            self.ExecuteInParallel(
+                jobs,
+                functools.partial(self._RepackOne, threads),
+                range(len(repack_projects)),
+                callback=_ProcessResults,
+                output=pm,
+                chunksize=1,
+            )
 
-            # Prepare workspace for repacking - remove all unreachable refs and
-            # their objects.
-            GitCommand(
-                project,
-                ["reflog", "expire", "--expire-unreachable=all"],
-                verify_command=True,
-            ).Wait()
-            pm.update(msg=f"{project.name} | gc", inc=0)
-            GitCommand(
-                project,
-                ["gc"],
-                verify_command=True,
-            ).Wait()
+        pm.end()
+        return 0
 
-            # Get all objects that are reachable from the remote, and pack them.
-            pm.update(msg=f"{project.name} | generating list of objects", inc=0)
-            remote_objects_cmd = GitCommand(
-                project,
+    @classmethod
+    def _RepackOne(cls, threads, project_idx):
+        """Repack one project using up to |threads| threads."""
+        project = cls.get_parallel_context()["projects"][project_idx]
+
+        pack_dir = os.path.join(project.gitdir, "tmp_repo_repack")
+        if os.path.isdir(pack_dir):
+            platform_utils.rmtree(pack_dir)
+        os.mkdir(pack_dir)
+
+        # Prepare workspace for repacking - remove all unreachable refs and
+        # their objects.
+        GitCommand(
+            project,
+            ["reflog", "expire", "--expire-unreachable=all"],
+            verify_command=True,
+        ).Wait()
+        GitCommand(
+            project,
+            ["-c", f"pack.threads={threads}", "gc"],
+            verify_command=True,
+        ).Wait()
+
+        # Pack all objects that are reachable from the remote.
+        _PackObjects(
+            project,
+            pack_dir,
+            [
                 [
-                    "rev-list",
-                    "--objects",
-                    "--missing=allow-promisor",
                     f"--remotes={project.remote.name}",
                     "--filter=blob:none",
                     "--tags",
-                ],
-                capture_stdout=True,
-                verify_command=True,
-            )
+                ]
+            ],
+            threads,
+        )
 
-            # Get all local objects and pack them.
-            local_head_objects_cmd = GitCommand(
-                project,
-                [
-                    "rev-list",
-                    "--objects",
-                    "--missing=allow-promisor",
-                    "HEAD^{tree}",
-                ],
-                capture_stdout=True,
-                verify_command=True,
-            )
-            local_objects_cmd = GitCommand(
-                project,
+        # create promisor file for each pack file
+        cls._generate_promisor_files(pack_dir)
+
+        # Pack all local objects.
+        _PackObjects(
+            project,
+            pack_dir,
+            [
+                ["HEAD^{tree}"],
                 [
-                    "rev-list",
-                    "--objects",
-                    "--missing=allow-promisor",
                     "--all",
                     "--reflog",
                     "--indexed-objects",
@@ -239,53 +310,23 @@ class Gc(Command):
                     f"--remotes={project.remote.name}",
                     "--tags",
                 ],
-                capture_stdout=True,
-                verify_command=True,
-            )
-
-            remote_objects_cmd.Wait()
-
-            pm.update(msg=f"{project.name} | remote repack", inc=0)
-            GitCommand(
-                project,
-                ["pack-objects", os.path.join(pack_dir, "pack")],
-                input=remote_objects_cmd.stdout,
-                capture_stderr=True,
-                capture_stdout=True,
-                verify_command=True,
-            ).Wait()
-
-            # create promisor file for each pack file
-            self._generate_promisor_files(pack_dir)
-
-            local_head_objects_cmd.Wait()
-            local_objects_cmd.Wait()
-
-            pm.update(msg=f"{project.name} | local repack", inc=0)
-            GitCommand(
-                project,
-                ["pack-objects", os.path.join(pack_dir, "pack")],
-                input=local_head_objects_cmd.stdout + local_objects_cmd.stdout,
-                capture_stderr=True,
-                capture_stdout=True,
-                verify_command=True,
-            ).Wait()
-
-            # Swap the old pack directory with the new one.
-            platform_utils.rename(
-                os.path.join(project.objdir, "objects", "pack"),
-                os.path.join(project.objdir, "objects", "pack_old"),
-            )
-            platform_utils.rename(
-                pack_dir,
-                os.path.join(project.objdir, "objects", "pack"),
-            )
-            platform_utils.rmtree(
-                os.path.join(project.objdir, "objects", "pack_old")
-            )
+            ],
+            threads,
+        )
 
-        pm.end()
-        return 0
+        # Swap the old pack directory with the new one.
+        platform_utils.rename(
+            os.path.join(project.objdir, "objects", "pack"),
+            os.path.join(project.objdir, "objects", "pack_old"),
+        )
+        platform_utils.rename(
+            pack_dir,
+            os.path.join(project.objdir, "objects", "pack"),
+        )
+        platform_utils.rmtree(
+            os.path.join(project.objdir, "objects", "pack_old")
+        )
+        return project.name
 
     def Execute(self, opt, args):
         projects: List[Project] = self.GetProjects(
@@ -301,6 +342,11 @@ class Gc(Command):
         else:
             all_projects = projects
 
+        # Finish any deletions that were interrupted, or left to a background
+        # process.
+        if not opt.dryrun:
+            self._EmptyTrash(opt)
+
         ret = self.delete_unused_projects(all_projects, opt)
         if ret != 0:
             return ret
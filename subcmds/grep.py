@@ -13,6 +13,8 @@
 # limitations under the License.
 
 import functools
+import os
+import re
 import sys
 from typing import NamedTuple
 
@@ -22,12 +24,37 @@ from command import PagedCommand
 from error import GitError
 from error import InvalidArgumentsError
 from error import SilentRepoExitError
-from git_command import GitCommand
+from git_command import GitCommandError
+from git_command import GitPopenCommandError
+from git_command import GitStream
+from grep_index import GrepIndex
+from grep_index import RequiredLiterals
 from repo_logging import RepoLogger
+import spool
 
 
 logger = RepoLogger(__file__)
 
+# Past this many candidate files, just search the whole project.
+_MAX_INDEX_PATHS = 1000
+
+# Options whose meaning is the opposite of finding something.
+_INDEX_INCOMPATIBLE = {
+    "-v",
+    "--invert-match",
+    "--not",
+    "-L",
+    "--files-without-match",
+}
+
+# The (possibly colored) line git grep puts between groups of context lines.
+_SEPARATOR_RE = re.compile(rb"^(\x1b\[[0-9;]*m)*--(\x1b\[[0-9;]*m)*$")
+
+
+def _CountResults(lines):
+    """Count the lines of |lines| that count towards --max-results."""
+    return sum(1 for line in lines if not _SEPARATOR_RE.match(line))
+
 
 class GrepColoring(Coloring):
     def __init__(self, config):
@@ -41,9 +68,10 @@ class ExecuteOneResult(NamedTuple):
 
     project_idx: int
     rc: int
-    stdout: str
+    stdout: bytes
     stderr: str
     error: GitError
+    spilled: bool = False
 
 
 class GrepCommandError(SilentRepoExitError):
@@ -85,6 +113,28 @@ contain a line that matches both expressions:
 
   repo grep --all-match -e NODE -e Unexpected
 
+Find the first file that mentions 'FIXME', and stop searching:
+
+  repo grep -l --max-results=1 FIXME
+
+# Output
+
+Results are shown as soon as they are found, in project order.  With
+--max-results, the search stops once that many lines of results (not counting
+the '--' lines between context groups) have been shown, and the remaining
+projects are not searched.
+
+# Indexed Searches
+
+With --indexed, a trigram index of each project's checked out tree is used to
+skip the projects & files that cannot contain the literal parts of the
+patterns, and git grep only runs on the rest.  The output is the same as a
+normal search.
+
+The index is created on first use (which takes a while), and `repo sync` keeps
+existing indexes up to date.  Patterns that have no literal text of at least
+3 characters, inverted matches and --revision searches don't use the index.
+
 """
     PARALLEL_JOBS = DEFAULT_LOCAL_JOBS
 
@@ -124,6 +174,12 @@ contain a line that matches both expressions:
             metavar="TREEish",
             help="Search TREEish, instead of the work tree",
         )
+        g.add_option(
+            "--indexed",
+            action="store_true",
+            help="Use (and create) a trigram index to skip files that "
+            "cannot match",
+        )
 
         g = p.add_option_group("Pattern")
         g.add_option(
@@ -259,43 +315,168 @@ contain a line that matches both expressions:
             callback=self._carry_option,
             help="Show only file names not containing matching lines",
         )
+        g.add_option(
+            "--max-results",
+            type="int",
+            metavar="N",
+            help="Stop after showing N lines of results across all projects",
+        )
+
+    def ValidateOptions(self, opt, args):
+        if opt.max_results is not None and opt.max_results < 1:
+            self.OptionParser.error("--max-results must be at least 1")
+
+    @staticmethod
+    def _IndexQuery(cmd_argv):
+        """Work out what to look up in the grep index.
+
+        Returns:
+            The arguments for _IndexCandidates, or None if the index can't be
+            used for this search.
+        """
+        patterns = []
+        flags = set()
+        args = iter(cmd_argv)
+        for arg in args:
+            if arg == "-e":
+                patterns.append(next(args))
+            elif arg in ("-A", "-B", "-C"):
+                next(args)
+            else:
+                flags.add(arg)
+        if not patterns or flags & _INDEX_INCOMPATIBLE:
+            return None
+
+        fixed = bool(flags & {"-F", "--fixed-strings"})
+        alternatives = []
+        for pattern in patterns:
+            literals = RequiredLiterals(pattern, fixed=fixed)
+            if literals is None:
+                return None
+            alternatives.append(literals)
+        ignore_case = bool(flags & {"-i", "--ignore-case"})
+        return (alternatives, ignore_case, "--cached" in flags)
+
+    @staticmethod
+    def _IndexCandidates(project, alternatives, ignore_case, cached):
+        """Find the files in |project| that might match.
+
+        Returns:
+            The paths to search, or None to search the whole project.
+        """
+        index = GrepIndex(project)
+        tree = index.HeadTree()
+        if not tree or not index.Update(tree):
+            return None
+        paths = index.Candidates(tree, alternatives, ignore_case=ignore_case)
+        if paths is None:
+            return None
+        # Files that were modified locally might match now.
+        changed = index.LocalChanges(cached=cached)
+        if changed is None:
+            return None
+        paths = sorted(set(paths) | set(changed))
+        if len(paths) > _MAX_INDEX_PATHS:
+            return None
+        return paths
 
     @classmethod
-    def _ExecuteOne(cls, cmd_argv, project_idx):
+    def _ExecuteOne(cls, cmd_argv, index_query, max_results, project_idx):
         """Process one project."""
-        project = cls.get_parallel_context()["projects"][project_idx]
+        context = cls.get_parallel_context()
+        project = context["projects"][project_idx]
+        if index_query is not None:
+            paths = cls._IndexCandidates(project, *index_query)
+            if paths is not None:
+                if not paths:
+                    # Nothing can match, so act like git grep found nothing.
+                    return ExecuteOneResult(project_idx, 1, b"", "", None)
+                cmd_argv = cmd_argv + [":(literal)" + x for x in paths]
+
+        output = spool.Spool(
+            os.path.join(context["spool_dir"], str(project_idx))
+        )
+        count = 0
+        partial = b""
+        stopped = False
         try:
-            p = GitCommand(
-                project,
-                cmd_argv,
-                bare=False,
-                capture_stdout=True,
-                capture_stderr=True,
-                verify_command=True,
+            p = GitStream(project, cmd_argv)
+        except GitPopenCommandError as error:
+            return ExecuteOneResult(project_idx, -1, None, str(error), error)
+
+        with p:
+            for chunk in p.Chunks(spool.CHUNK_SIZE):
+                output.write(chunk)
+                if max_results:
+                    lines = (partial + chunk).split(b"\n")
+                    partial = lines.pop()
+                    count += _CountResults(lines)
+                    if count >= max_results:
+                        # The parent won't show any more than this.
+                        stopped = True
+                        p.Kill()
+                        break
+        err = p.stderr
+
+        rc = 0 if stopped else p.rc
+        error = None
+        if rc:
+            error = GitCommandError(
+                project=project.name,
+                command_args=cmd_argv,
+                git_rc=rc,
+                git_stderr=err or None,
             )
-        except GitError as e:
-            return ExecuteOneResult(project_idx, -1, None, str(e), e)
-
-        try:
-            error = None
-            rc = p.Wait()
-        except GitError as e:
-            rc = 1
-            error = e
-        return ExecuteOneResult(project_idx, rc, p.stdout, p.stderr, error)
+        data, spilled = output.result()
+        return ExecuteOneResult(project_idx, rc, data, err, error, spilled)
 
     @staticmethod
     def _ProcessResults(
-        full_name, have_rev, opt, projects, _pool, out, results
+        full_name, have_rev, opt, projects, spool_dir, pool, out, results
     ):
         git_failed = False
         bad_rev = False
         have_match = False
         _RelPath = lambda p: p.RelPath(local=opt.this_manifest_only)
         errors = []
-
-        for result in results:
-            project = projects[result.project_idx]
+        streamer = _LineStreamer(spool_dir)
+        # How many more lines of results to show.
+        remaining = opt.max_results
+
+        def _Show(idx, lines):
+            nonlocal remaining
+            project = projects[idx]
+            for line in lines:
+                if remaining == 0:
+                    continue
+                if remaining is not None and not _SEPARATOR_RE.match(line):
+                    remaining -= 1
+                line = line.decode("utf-8", "backslashreplace")
+                if have_rev and full_name:
+                    rev, line = line.split(":", 1)
+                    out.write("%s", rev)
+                    out.write(":")
+                    out.project(_RelPath(project))
+                    out.write("/")
+                    out.write("%s", line)
+                    out.nl()
+                elif full_name:
+                    out.project(_RelPath(project))
+                    out.write("/")
+                    out.write("%s", line)
+                    out.nl()
+                else:
+                    print(line)
+            out.flush()
+
+        for idx, result in spool.OrderedResults(
+            pool,
+            results,
+            len(projects),
+            # Show the results the project has found so far.
+            lambda i: _Show(i, streamer.Tail(i)),
+        ):
+            project = projects[idx]
             if result.rc < 0:
                 git_failed = True
                 out.project("--- project %s ---" % _RelPath(project))
@@ -305,6 +486,9 @@ contain a line that matches both expressions:
                 errors.append(result.error)
                 continue
 
+            # Show the rest of the results the project found.
+            _Show(idx, streamer.Finish(idx, result.stdout, result.spilled))
+
             if result.rc:
                 # no results
                 if result.stderr:
@@ -323,28 +507,9 @@ contain a line that matches both expressions:
                 continue
             have_match = True
 
-            # We cut the last element, to avoid a blank line.
-            r = result.stdout.split("\n")
-            r = r[0:-1]
-
-            if have_rev and full_name:
-                for line in r:
-                    rev, line = line.split(":", 1)
-                    out.write("%s", rev)
-                    out.write(":")
-                    out.project(_RelPath(project))
-                    out.write("/")
-                    out.write("%s", line)
-                    out.nl()
-            elif full_name:
-                for line in r:
-                    out.project(_RelPath(project))
-                    out.write("/")
-                    out.write("%s", line)
-                    out.nl()
-            else:
-                for line in r:
-                    print(line)
+            if remaining == 0:
+                # Stop (and cancel) the search of the remaining projects.
+                break
 
         return (git_failed, bad_rev, have_match, errors)
 
@@ -382,14 +547,29 @@ contain a line that matches both expressions:
             cmd_argv.extend(opt.revision)
         cmd_argv.append("--")
 
-        with self.ParallelContext():
+        index_query = None
+        if opt.indexed:
+            if have_rev:
+                logger.warning("warning: --indexed is ignored with --revision")
+            else:
+                index_query = self._IndexQuery(cmd_argv)
+
+        with self.ParallelContext(), spool.SpoolDir("repo-grep-") as spool_dir:
             self.get_parallel_context()["projects"] = projects
+            self.get_parallel_context()["spool_dir"] = spool_dir
             git_failed, bad_rev, have_match, errors = self.ExecuteInParallel(
                 opt.jobs,
-                functools.partial(self._ExecuteOne, cmd_argv),
+                functools.partial(
+                    self._ExecuteOne, cmd_argv, index_query, opt.max_results
+                ),
                 range(len(projects)),
                 callback=functools.partial(
-                    self._ProcessResults, full_name, have_rev, opt, projects
+                    self._ProcessResults,
+                    full_name,
+                    have_rev,
+                    opt,
+                    projects,
+                    spool_dir,
                 ),
                 output=out,
                 ordered=True,
@@ -406,3 +586,28 @@ contain a line that matches both expressions:
             for r in opt.revision:
                 logger.error("error: can't search revision %s", r)
         raise GrepCommandError(aggregate_errors=errors)
+
+
+class _LineStreamer:
+    """Split the spooled output of each project into lines."""
+
+    def __init__(self, spool_dir):
+        self.reader = spool.SpoolReader(spool_dir)
+        self._partial = b""
+
+    def _Lines(self, chunks):
+        for chunk in chunks:
+            lines = (self._partial + chunk).split(b"\n")
+            self._partial = lines.pop()
+            yield from lines
+
+    def Tail(self, idx):
+        """Yield the complete lines project |idx| spilled to disk so far."""
+        yield from self._Lines(self.reader.Tail(idx))
+
+    def Finish(self, idx, data, spilled):
+        """Yield the rest of project |idx|'s lines once it has finished."""
+        yield from self._Lines(self.reader.Finish(idx, data, spilled))
+        if self._partial:
+            yield self._partial
+            self._partial = b""
@@ -23,6 +23,7 @@ from typing import Any, Dict, List, NamedTuple
 from color import Coloring
 from command import DEFAULT_LOCAL_JOBS
 from command import PagedCommand
+import git_async
 from git_refs import R_HEADS
 from git_refs import R_M
 
@@ -54,11 +55,21 @@ class _Coloring(Coloring):
 
 class Info(PagedCommand):
     COMMON = True
-    PARALLEL_JOBS = DEFAULT_LOCAL_JOBS
+    # A value of 0 means we want parallel jobs, but the default depends on
+    # what is run (see below).
+    PARALLEL_JOBS = 0
     helpSummary = (
         "Get info on the manifest branch, current branch or unmerged branches"
     )
     helpUsage = "%prog [-dl] [-o [-c]] [--format=<format>] [<project>...]"
+    helpDescription = f"""
+Show the manifest branch, and the current branch & revision of each project.
+
+For the projects (-d, and --format=json), the -j/--jobs option limits how
+many git commands are run at once (default: {git_async.DEFAULT_JOBS}).  For
+fetching (-d without -l) and -o, it is the number of jobs to run in parallel
+(default: based on number of CPU cores).
+"""
 
     def _Options(self, p):
         p.add_option(
@@ -191,14 +202,18 @@ class Info(PagedCommand):
             "superproject_revision": srev,
         }
 
-    @classmethod
-    def _getProjectData(cls, project) -> Dict[str, Any]:
+    @staticmethod
+    async def _getProjectData(runner, project) -> Dict[str, Any]:
         """Gather project data as a dict."""
+        # Load the refs at the same time, so reading the branches won't block.
+        head, _ = await git_async.Gather(
+            project.GetHeadRevisionIdAsync(runner),
+            project.bare_ref.LoadAsync(runner),
+        )
         data = {
             "name": project.name,
             "mount_path": project.worktree,
-            "current_revision": project.GetHeadRevisionId()
-            or project.GetRevisionId(),
+            "current_revision": head or project.GetRevisionId(),
             "manifest_revision": project.revisionExpr,
             "local_branches": list(project.GetBranches()),
         }
@@ -207,12 +222,6 @@ class Info(PagedCommand):
             data["current_branch"] = currentBranch
         return data
 
-    @classmethod
-    def _ProjectDataHelper(cls, project_idx: int) -> Dict[str, Any]:
-        """Helper to get project data in parallel."""
-        project = cls.get_parallel_context()["projects"][project_idx]
-        return cls._getProjectData(project)
-
     def _ExecuteJson(self, opt, args) -> None:
         """Output info as JSON."""
         result = {}
@@ -222,22 +231,11 @@ class Info(PagedCommand):
             projs = self.GetProjects(
                 args, all_manifests=not opt.this_manifest_only
             )
-            project_data = []
-
-            def _ProcessResults(_pool, _output, results):
-                project_data.extend(results)
-
-            with self.ParallelContext():
-                self.get_parallel_context()["projects"] = projs
-                self.ExecuteInParallel(
-                    opt.jobs,
-                    self._ProjectDataHelper,
-                    range(len(projs)),
-                    callback=_ProcessResults,
-                    ordered=True,
-                    chunksize=1,
-                )
-            result["projects"] = project_data
+            result["projects"] = git_async.Map(
+                self._getProjectData,
+                projs,
+                jobs=opt.jobs or git_async.DEFAULT_JOBS,
+            )
 
         json_settings = {
             # JSON style guide says Unicode characters are fully allowed.
@@ -271,13 +269,15 @@ class Info(PagedCommand):
         self.out.nl()
 
     @classmethod
-    def _DiffHelper(cls, project_idx: int, opt: Any) -> str:
-        """Helper for ParallelContext to get diff info for a project."""
-        buf = io.StringIO()
+    def _FetchHelper(cls, project_idx: int) -> None:
+        """Helper for ParallelContext to fetch a project."""
         project = cls.get_parallel_context()["projects"][project_idx]
-        config = cls.get_parallel_context()["config"]
+        project.Sync_NetworkHalf(quiet=True, current_branch_only=True)
 
-        out = _Coloring(config)
+    async def _DiffHelper(self, opt: Any, runner, project) -> str:
+        """Get the diff info for a project."""
+        buf = io.StringIO()
+        out = _Coloring(self.manifest.manifestProject.config)
         out.redirect(buf)
 
         heading = out.printer("heading", attr="bold")
@@ -296,7 +296,12 @@ class Info(PagedCommand):
         out.nl()
 
         heading("Current revision: ")
-        headtext(project.GetHeadRevisionId() or project.GetRevisionId())
+        # Load the refs at the same time, so reading the branches won't block.
+        head, _ = await git_async.Gather(
+            project.GetHeadRevisionIdAsync(runner),
+            project.bare_ref.LoadAsync(runner),
+        )
+        headtext(head or project.GetRevisionId())
         out.nl()
 
         currentBranch = project.CurrentBranch
@@ -319,9 +324,6 @@ class Info(PagedCommand):
         out.nl()
 
         if opt.all:
-            if not opt.local:
-                project.Sync_NetworkHalf(quiet=True, current_branch_only=True)
-
             branch = project.manifest.manifestProject.config.GetBranch(
                 "default"
             ).merge
@@ -329,24 +331,25 @@ class Info(PagedCommand):
                 branch = branch[len(R_HEADS) :]
             logTarget = R_M + branch
 
-            bareTmp = project.bare_git._bare
-            project.bare_git._bare = False
-            localCommits = project.bare_git.rev_list(
-                "--abbrev=8",
-                "--abbrev-commit",
-                "--pretty=oneline",
-                logTarget + "..",
-                "--",
-            )
-
-            originCommits = project.bare_git.rev_list(
-                "--abbrev=8",
-                "--abbrev-commit",
-                "--pretty=oneline",
-                ".." + logTarget,
-                "--",
+            localCommits, originCommits = await git_async.Gather(
+                *(
+                    runner.Run(
+                        project,
+                        [
+                            "rev-list",
+                            "--abbrev=8",
+                            "--abbrev-commit",
+                            "--pretty=oneline",
+                            revs,
+                            "--",
+                        ],
+                        check=True,
+                    )
+                    for revs in (logTarget + "..", ".." + logTarget)
+                )
             )
-            project.bare_git._bare = bareTmp
+            localCommits = localCommits.stdout.splitlines()
+            originCommits = originCommits.stdout.splitlines()
 
             heading("Local Commits: ")
             redtext(str(len(localCommits)))
@@ -380,25 +383,29 @@ class Info(PagedCommand):
     def _printDiffInfo(self, opt, args):
         projs = self.GetProjects(args, all_manifests=not opt.this_manifest_only)
 
-        def _ProcessResults(_pool, _output, results):
-            for output in results:
-                if output:
-                    print(output, end="")
+        if opt.all and not opt.local:
+            # Fetching is slow & not read-only, so it is left to worker
+            # processes before the diffs are gathered.
+            with self.ParallelContext():
+                self.get_parallel_context()["projects"] = projs
+                self.ExecuteInParallel(
+                    opt.jobs or DEFAULT_LOCAL_JOBS,
+                    self._FetchHelper,
+                    range(len(projs)),
+                    callback=lambda _pool, _output, results: list(results),
+                    chunksize=1,
+                )
 
-        with self.ParallelContext():
-            self.get_parallel_context()["projects"] = projs
-            self.get_parallel_context()[
-                "config"
-            ] = self.manifest.manifestProject.config
+        def _ProcessResult(output):
+            if output:
+                print(output, end="")
 
-            self.ExecuteInParallel(
-                opt.jobs,
-                functools.partial(self._DiffHelper, opt=opt),
-                range(len(projs)),
-                callback=_ProcessResults,
-                ordered=True,
-                chunksize=1,
-            )
+        git_async.Map(
+            functools.partial(self._DiffHelper, opt),
+            projs,
+            jobs=opt.jobs or git_async.DEFAULT_JOBS,
+            callback=_ProcessResult,
+        )
 
     @classmethod
     def _OverviewHelper(cls, project_idx: int, opt: Any) -> List[BranchInfo]:
@@ -406,10 +413,9 @@ class Info(PagedCommand):
         project = cls.get_parallel_context()["projects"][project_idx]
 
         branches = []
-        br = [project.GetUploadableBranch(x) for x in project.GetBranches()]
-        br = [x for x in br if x]
-        if opt.current_branch:
-            br = [x for x in br if x.name == project.CurrentBranch]
+        br = project.ScanBranches(
+            [project.CurrentBranch] if opt.current_branch else None
+        )
 
         for b in br:
             branches.append(
@@ -436,7 +442,7 @@ class Info(PagedCommand):
             self.get_parallel_context()["projects"] = projs
 
             self.ExecuteInParallel(
-                opt.jobs,
+                opt.jobs or DEFAULT_LOCAL_JOBS,
                 functools.partial(self._OverviewHelper, opt=opt),
                 range(len(projs)),
                 callback=_ProcessResults,
@@ -12,12 +12,25 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import functools
 import optparse
+from typing import List, NamedTuple
 
 from color import Coloring
+from command import DEFAULT_LOCAL_JOBS
 from command import PagedCommand
 
 
+class _BranchInfo(NamedTuple):
+    """A branch with unmerged commits."""
+
+    relpath: str
+    name: str
+    commits: List[str]
+    date: str
+    is_current: bool
+
+
 class Overview(PagedCommand):
     COMMON = True
     helpSummary = "Display overview of unmerged project branches"
@@ -32,6 +45,7 @@ The -c/--current-branch option can be used to restrict the output to only
 branches currently checked out in each project.  By default, all branches
 are displayed.
 """
+    PARALLEL_JOBS = DEFAULT_LOCAL_JOBS
 
     def _Options(self, p):
         p.add_option(
@@ -54,16 +68,46 @@ are displayed.
             help=optparse.SUPPRESS_HELP,
         )
 
+    @classmethod
+    def _ScanOne(cls, opt, project_idx):
+        """Find the branches of a project that have unmerged commits."""
+        project = cls.get_parallel_context()["projects"][project_idx]
+        current = project.CurrentBranch
+        # Send back plain data: the branches refer to the project, and so
+        # would drag the whole manifest back to the parent.
+        return [
+            _BranchInfo(
+                relpath=project.RelPath(local=opt.this_manifest_only),
+                name=b.name,
+                commits=b.commits,
+                date=b.date,
+                is_current=b.name == current,
+            )
+            for b in project.ScanBranches(
+                [current] if opt.current_branch else None
+            )
+        ]
+
     def Execute(self, opt, args):
-        all_branches = []
-        for project in self.GetProjects(
+        projects = self.GetProjects(
             args, all_manifests=not opt.this_manifest_only
-        ):
-            br = [project.GetUploadableBranch(x) for x in project.GetBranches()]
-            br = [x for x in br if x]
-            if opt.current_branch:
-                br = [x for x in br if x.name == project.CurrentBranch]
-            all_branches.extend(br)
+        )
+        all_branches = []
+
+        def _ProcessResults(_pool, _output, results):
+            for branches in results:
+                all_branches.extend(branches)
+
+        with self.ParallelContext():
+            self.get_parallel_context()["projects"] = projects
+            self.ExecuteInParallel(
+                opt.jobs,
+                functools.partial(self._ScanOne, opt),
+                range(len(projects)),
+                callback=_ProcessResults,
+                ordered=True,
+                chunksize=1,
+            )
 
         if not all_branches:
             return
@@ -74,22 +118,19 @@ are displayed.
                 self.project = self.printer("header", attr="bold")
                 self.text = self.printer("text")
 
-        out = Report(all_branches[0].project.config)
+        out = Report(self.manifest.manifestProject.config)
         out.text("Deprecated. See repo info -o.")
         out.nl()
         out.project("Projects Overview")
         out.nl()
 
-        project = None
+        relpath = None
 
         for branch in all_branches:
-            if project != branch.project:
-                project = branch.project
+            if relpath != branch.relpath:
+                relpath = branch.relpath
                 out.nl()
-                out.project(
-                    "project %s/"
-                    % project.RelPath(local=opt.this_manifest_only)
-                )
+                out.project("project %s/" % relpath)
                 out.nl()
 
             commits = branch.commits
@@ -97,7 +138,7 @@ are displayed.
             print(
                 "%s %-33s (%2d commit%s, %s)"
                 % (
-                    branch.name == project.CurrentBranch and "*" or " ",
+                    branch.is_current and "*" or " ",
                     branch.name,
                     len(commits),
                     len(commits) != 1 and "s" or " ",
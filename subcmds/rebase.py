@@ -12,10 +12,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import functools
+import io
 import sys
+from typing import NamedTuple, Optional
 
 from color import Coloring
 from command import Command
+from command import DEFAULT_LOCAL_JOBS
 from git_command import GitCommand
 from repo_logging import RepoLogger
 
@@ -30,6 +34,17 @@ class RebaseColoring(Coloring):
         self.fail = self.printer("fail", fg="red")
 
 
+class RebaseResult(NamedTuple):
+    """The result of rebasing a single project."""
+
+    # Why the project was skipped, if it was.
+    skipped: Optional[str]
+    # Whether the rebase failed.
+    failed: bool
+    # The output of the rebase, if it was captured.
+    output: str
+
+
 class Rebase(Command):
     COMMON = True
     helpSummary = "Rebase local branches on upstream branch"
@@ -40,7 +55,13 @@ class Rebase(Command):
 '%prog' uses git rebase to move local changes in the current topic branch to
 the HEAD of the upstream history, useful when you have made commits in a topic
 branch but need to incorporate new upstream changes "underneath" them.
+
+Projects are rebased in parallel (see --jobs), and the output of each project
+is shown once its rebase finishes.  A project that fails to rebase doesn't stop
+the others, unless --fail-fast is used, in which case projects are rebased one
+at a time.  Interactive rebases always run in the foreground.
 """
+    PARALLEL_JOBS = DEFAULT_LOCAL_JOBS
 
     def _Options(self, p):
         g = p.get_option_group("--quiet")
@@ -127,76 +148,46 @@ branch but need to incorporate new upstream changes "underneath" them.
         if opt.interactive:
             common_args.append("-i")
 
+        # Interactive rebases need the terminal, and stopping at the first
+        # error means not starting the next rebase until this one is done.
+        jobs = 1 if opt.interactive or opt.fail_fast else opt.jobs
+        capture = jobs != 1
+
         config = self.manifest.manifestProject.config
         out = RebaseColoring(config)
         out.redirect(sys.stdout)
         _RelPath = lambda p: p.RelPath(local=opt.this_manifest_only)
 
-        ret = 0
-        for project in all_projects:
-            if ret and opt.fail_fast:
-                break
-
-            cb = project.CurrentBranch
-            if not cb:
-                if one_project:
-                    logger.error(
-                        "error: project %s has a detached HEAD",
-                        _RelPath(project),
-                    )
-                    return 1
-                # Ignore branches with detached HEADs.
-                continue
-
-            upbranch = project.GetBranch(cb)
-            if not upbranch.LocalMerge:
-                if one_project:
-                    logger.error(
-                        "error: project %s does not track any remote branches",
-                        _RelPath(project),
-                    )
-                    return 1
-                # Ignore branches without remotes.
-                continue
-
-            args = common_args[:]
-            if opt.onto_manifest:
-                args.append("--onto")
-                args.append(project.revisionExpr)
-
-            args.append(upbranch.LocalMerge)
-
-            out.project(
-                "project %s: rebasing %s -> %s",
-                _RelPath(project),
-                cb,
-                upbranch.LocalMerge,
-            )
-            out.nl()
-            out.flush()
-
-            needs_stash = False
-            if opt.auto_stash:
-                stash_args = ["update-index", "--refresh", "-q"]
-
-                if GitCommand(project, stash_args).Wait() != 0:
-                    needs_stash = True
-                    # Dirty index, requires stash...
-                    stash_args = ["stash"]
-
-                    if GitCommand(project, stash_args).Wait() != 0:
-                        ret += 1
-                        continue
-
-            if GitCommand(project, args).Wait() != 0:
-                ret += 1
-                continue
-
-            if needs_stash:
-                stash_args.append("pop")
-                stash_args.append("--quiet")
-                if GitCommand(project, stash_args).Wait() != 0:
+        def _ProcessResults(_pool, _output, results):
+            ret = 0
+            for project, result in zip(all_projects, results):
+                if result.output:
+                    print(result.output, end="")
+                if result.skipped:
+                    if one_project:
+                        logger.error(
+                            "error: project %s %s",
+                            _RelPath(project),
+                            result.skipped,
+                        )
+                        return 1
+                elif result.failed:
                     ret += 1
+                    if opt.fail_fast:
+                        break
+            return ret
+
+        with self.ParallelContext():
+            self.get_parallel_context()["projects"] = all_projects
+            ret = self.ExecuteInParallel(
+                jobs,
+                functools.partial(
+                    self._RebaseOne, opt, common_args, capture, config
+                ),
+                range(len(all_projects)),
+                callback=_ProcessResults,
+                ordered=True,
+            )
 
         if ret:
             msg_fmt = "%d projects had errors"
@@ -205,3 +196,84 @@ branch but need to incorporate new upstream changes "underneath" them.
             out.nl()
 
         return ret
+
+    @classmethod
+    def _RebaseOne(cls, opt, common_args, capture, config, project_idx):
+        """Rebase the current branch of a single project.
+
+        Args:
+            opt: The command options.
+            common_args: The git rebase arguments to use for all projects.
+            capture: Whether to capture the output, rather than letting it go
+                straight to the terminal.
+            config: The config to color the output with.
+            project_idx: Index of the project to rebase.
+
+        Returns:
+            A RebaseResult.
+        """
+        project = cls.get_parallel_context()["projects"][project_idx]
+
+        cb = project.CurrentBranch
+        if not cb:
+            # Ignore branches with detached HEADs.
+            return RebaseResult("has a detached HEAD", False, "")
+
+        upbranch = project.GetBranch(cb)
+        if not upbranch.LocalMerge:
+            # Ignore branches without remotes.
+            return RebaseResult("does not track any remote branches", False, "")
+
+        args = common_args[:]
+        if opt.onto_manifest:
+            args.append("--onto")
+            args.append(project.revisionExpr)
+
+        args.append(upbranch.LocalMerge)
+
+        buf = io.StringIO() if capture else sys.stdout
+        out = RebaseColoring(config)
+        out.redirect(buf)
+        out.project(
+            "project %s: rebasing %s -> %s",
+            project.RelPath(local=opt.this_manifest_only),
+            cb,
+            upbranch.LocalMerge,
+        )
+        out.nl()
+        out.flush()
+
+        def _Run(cmd):
+            p = GitCommand(
+                project, cmd, capture_stdout=capture, merge_output=capture
+            )
+            rc = p.Wait()
+            if capture and p.stdout:
+                buf.write(p.stdout)
+            return rc == 0
+
+        def _Result(failed):
+            return RebaseResult(None, failed, buf.getvalue() if capture else "")
+
+        needs_stash = False
+        if opt.auto_stash:
+            stash_args = ["update-index", "--refresh", "-q"]
+
+            if not _Run(stash_args):
+                needs_stash = True
+                # Dirty index, requires stash...
+                stash_args = ["stash"]
+
+                if not _Run(stash_args):
+                    return _Result(True)
+
+        if not _Run(args):
+            return _Result(True)
+
+        if needs_stash:
+            stash_args.append("pop")
+            stash_args.append("--quiet")
+            if not _Run(stash_args):
+                return _Result(True)
+
+        return _Result(False)
@@ -20,6 +20,7 @@ import os
 from color import Coloring
 from command import DEFAULT_LOCAL_JOBS
 from command import PagedCommand
+import git_async
 import platform_utils
 
 
@@ -35,8 +36,8 @@ and the most recent commit on this branch (HEAD), in each project
 specified.  A summary is displayed, one line per file where there
 is a difference between these three states.
 
-The -j/--jobs option can be used to run multiple status queries
-in parallel.
+The -j/--jobs option limits how many git commands are run at
+once.
 
 The -o/--orphans option can be used to show objects that are in
 the working directory, but not associated with a repo project.
@@ -82,7 +83,7 @@ the following meanings:
  d:  deleted       (    in index, not in work tree                )
 
 """
-    PARALLEL_JOBS = DEFAULT_LOCAL_JOBS
+    PARALLEL_JOBS = git_async.DEFAULT_JOBS
 
     def _Options(self, p):
         p.add_option(
@@ -93,8 +94,8 @@ the following meanings:
             "projects",
         )
 
-    @classmethod
-    def _StatusHelper(cls, quiet, local, project_idx):
+    @staticmethod
+    async def _StatusHelper(quiet, local, runner, project):
         """Obtains the status for a specific project.
 
         Obtains the status for a project, redirecting the output to
@@ -105,18 +106,38 @@ the following meanings:
             local: a boolean, if True, the path is relative to the local
                 (sub)manifest.  If false, the path is relative to the outermost
                 manifest.
-            project_idx: Project index to get status of.
+            runner: The git_async.Runner to run git with.
+            project: Project to get status of.
 
         Returns:
             The status of the project.
         """
         buf = io.StringIO()
-        project = cls.get_parallel_context()["projects"][project_idx]
-        ret = project.PrintWorkTreeStatus(
-            quiet=quiet, output_redir=buf, local=local
+        ret = await project.PrintWorkTreeStatusAsync(
+            runner, quiet=quiet, output_redir=buf, local=local
         )
         return (ret, buf.getvalue())
 
+    @classmethod
+    def _StatusChunk(cls, quiet, local, jobs, chunk):
+        """Obtains the status for a slice of the projects at once.
+
+        Args:
+            quiet: Where to output the status.
+            local: Whether the paths are relative to the local (sub)manifest.
+            jobs: How many git commands to run at a time.
+            chunk: The slice of the projects in the parallel context.
+
+        Returns:
+            The status & output of each project in the slice.
+        """
+        projects = cls.get_parallel_context()["projects"]
+        return git_async.Map(
+            functools.partial(cls._StatusHelper, quiet, local),
+            projects[chunk],
+            jobs=jobs,
+        )
+
     def _FindOrphans(self, dirs, proj_dirs, proj_dirs_parents, outstring):
         """find 'dirs' that are present in 'proj_dirs_parents' but not in 'proj_dirs'"""  # noqa: E501
         status_header = " --\t"
@@ -141,27 +162,54 @@ the following meanings:
             args, all_manifests=not opt.this_manifest_only
         )
 
-        def _ProcessResults(_pool, _output, results):
-            ret = 0
-            for state, output in results:
-                if output:
-                    print(output, end="")
-                if state == "CLEAN":
-                    ret += 1
+        def _ProcessResult(result):
+            _state, output = result
+            if output:
+                print(output, end="")
+
+        def _ProcessResults(_pool, _output, chunks):
+            ret = []
+            for results in chunks:
+                for result in results:
+                    _ProcessResult(result)
+                ret.extend(results)
             return ret
 
-        with self.ParallelContext():
-            self.get_parallel_context()["projects"] = all_projects
-            counter = self.ExecuteInParallel(
-                opt.jobs,
+        # The git commands are short, so many run at once in each process.
+        # Parsing their output takes a while too, so the projects are split
+        # across a few worker processes when there are CPUs for them.
+        procs = min(DEFAULT_LOCAL_JOBS, opt.jobs, len(all_projects))
+        if procs < 2:
+            results = git_async.Map(
                 functools.partial(
                     self._StatusHelper, opt.quiet, opt.this_manifest_only
                 ),
-                range(len(all_projects)),
-                callback=_ProcessResults,
-                ordered=True,
-                chunksize=1,
+                all_projects,
+                jobs=opt.jobs,
+                callback=_ProcessResult,
             )
+        else:
+            # Keep the slices contiguous so the output stays in order.
+            size = -(-len(all_projects) // procs)
+            with self.ParallelContext():
+                self.get_parallel_context()["projects"] = all_projects
+                results = self.ExecuteInParallel(
+                    procs,
+                    functools.partial(
+                        self._StatusChunk,
+                        opt.quiet,
+                        opt.this_manifest_only,
+                        max(1, opt.jobs // procs),
+                    ),
+                    [
+                        slice(i, i + size)
+                        for i in range(0, len(all_projects), size)
+                    ],
+                    callback=_ProcessResults,
+                    ordered=True,
+                    chunksize=1,
+                )
+        counter = sum(1 for state, _output in results if state == "CLEAN")
 
         if not opt.quiet and len(all_projects) == counter:
             print("nothing to commit (working directory clean)")
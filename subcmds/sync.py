@@ -58,6 +58,7 @@ from command import DEFAULT_LOCAL_JOBS
 from command import MirrorSafeCommand
 from command import WORKER_BATCH_SIZE
 from error import GitError
+from error import ManifestInvalidRevisionError
 from error import RepoChangedException
 from error import RepoError
 from error import RepoExitError
@@ -68,10 +69,14 @@ import event_log
 from git_command import git_require
 from git_command import GitCommand
 from git_config import GetUrlCookieFile
+import git_maintenance
 from git_refs import HEAD
 from git_refs import R_HEADS
+from git_refs import ReadHead
 import git_superproject
+from grep_index import GrepIndex
 from hooks import RepoHook
+from local_sync_state import LocalSyncState
 import platform_utils
 from progress import elapsed_str
 from progress import jobs_str
@@ -83,6 +88,8 @@ from project import SyncBuffer
 from repo_logging import RepoLogger
 from repo_trace import Trace
 import ssh
+import timeline
+import trash
 from wrapper import Wrapper
 
 
@@ -161,6 +168,25 @@ def _chunksize(projects: int, jobs: int) -> int:
     return min(max(1, projects // jobs), WORKER_BATCH_SIZE)
 
 
+def _GetCheckoutRevision(project):
+    """Look up the revision |project| is about to be checked out to.
+
+    This reuses the refs Sync_LocalHalf is going to load anyways, so it normally
+    doesn't need to run git.
+    """
+    try:
+        return project.GetRevisionId(project.bare_ref.all)
+    except (GitError, ManifestInvalidRevisionError):
+        return None
+
+
+def _UpdateGrepIndex(project):
+    """Index the new checkout of |project| if it has a `repo grep` index."""
+    index = GrepIndex(project)
+    if index.Exists:
+        index.Update()
+
+
 class _FetchOneResult(NamedTuple):
     """_FetchOne return value.
 
@@ -170,6 +196,7 @@ class _FetchOneResult(NamedTuple):
       start (float): The starting time.time().
       finish (float): The ending time.time().
       remote_fetched (bool): True if the remote was actually queried.
+      timeline (Optional[List[dict]]): The spans the worker recorded.
     """
 
     success: bool
@@ -178,6 +205,7 @@ class _FetchOneResult(NamedTuple):
     start: float
     finish: float
     remote_fetched: bool
+    timeline: Optional[List[dict]] = None
 
 
 class _FetchResult(NamedTuple):
@@ -210,6 +238,8 @@ class _CheckoutOneResult(NamedTuple):
       project_idx (int): The project index.
       start (float): The starting time.time().
       finish (float): The ending time.time().
+      revision (Optional[str]): The revision checked out, if known.
+      timeline (Optional[List[dict]]): The spans the worker recorded.
     """
 
     success: bool
@@ -217,6 +247,8 @@ class _CheckoutOneResult(NamedTuple):
     project_idx: int
     start: float
     finish: float
+    revision: Optional[str] = None
+    timeline: Optional[List[dict]] = None
 
 
 class _SyncResult(NamedTuple):
@@ -239,6 +271,7 @@ class _SyncResult(NamedTuple):
       checkout_finish (Optional[float]): The time.time() when checkout
           finished.
       stderr_text (str): The combined output from both fetch and checkout.
+      revision (Optional[str]): The revision checked out, if known.
     """
 
     project_index: int
@@ -256,6 +289,7 @@ class _SyncResult(NamedTuple):
     checkout_finish: Optional[float]
 
     stderr_text: str
+    revision: Optional[str] = None
 
 
 class _InterleavedSyncResult(NamedTuple):
@@ -264,9 +298,11 @@ class _InterleavedSyncResult(NamedTuple):
     Attributes:
       results (List[_SyncResult]): A list of results, one for each project
           processed. Empty if the worker failed before creating results.
+      timeline (Optional[List[dict]]): The spans the worker recorded.
     """
 
     results: List[_SyncResult]
+    timeline: Optional[List[dict]] = None
 
 
 class SuperprojectError(SyncError):
@@ -897,8 +933,22 @@ later is required to fix a server side protocol bug.
             del cls.get_parallel_context()["sync_dict"][k]
 
         finish = time.time()
+        timeline.Add(
+            "fetch",
+            start,
+            finish,
+            cat="sync",
+            project=project.name,
+            worker=os.getpid(),
+        )
         return _FetchOneResult(
-            success, errors, project_idx, start, finish, remote_fetched
+            success,
+            errors,
+            project_idx,
+            start,
+            finish,
+            remote_fetched,
+            timeline=timeline.Take(),
         )
 
     def _GetSyncProgressMessage(self):
@@ -955,6 +1005,7 @@ later is required to fix a server side protocol bug.
                     project = projects[result.project_idx]
                     start = result.start
                     finish = result.finish
+                    timeline.Extend(result.timeline)
                     self._fetch_times.Set(project, finish - start)
                     self._local_sync_state.SetFetchTime(project)
                     self.event_log.AddSync(
@@ -1132,6 +1183,7 @@ later is required to fix a server side protocol bug.
         )
         success = False
         errors = []
+        revision = _GetCheckoutRevision(project)
         try:
             project.Sync_LocalHalf(
                 syncbuf,
@@ -1142,6 +1194,8 @@ later is required to fix a server side protocol bug.
             )
             success = syncbuf.Finish()
             errors.extend(syncbuf.errors)
+            if success:
+                _UpdateGrepIndex(project)
         except KeyboardInterrupt:
             logger.error("Keyboard interrupt while processing %s", project.name)
             if not cls.is_multiprocessing_active():
@@ -1163,7 +1217,23 @@ later is required to fix a server side protocol bug.
         if not success:
             logger.error("error: Cannot checkout %s", project.name)
         finish = time.time()
-        return _CheckoutOneResult(success, errors, project_idx, start, finish)
+        timeline.Add(
+            "checkout",
+            start,
+            finish,
+            cat="sync",
+            project=project.name,
+            worker=os.getpid(),
+        )
+        return _CheckoutOneResult(
+            success,
+            errors,
+            project_idx,
+            start,
+            finish,
+            revision,
+            timeline=timeline.Take(),
+        )
 
     def _Checkout(self, all_projects, opt, err_results, checkout_errors):
         """Checkout projects listed in all_projects
@@ -1186,6 +1256,7 @@ later is required to fix a server side protocol bug.
                 ]
                 start = result.start
                 finish = result.finish
+                timeline.Extend(result.timeline)
                 self.event_log.AddSync(
                     project, event_log.TASK_SYNC_LOCAL, start, finish, success
                 )
@@ -1196,7 +1267,9 @@ later is required to fix a server side protocol bug.
                 # Check for any errors before running any more tasks.
                 # ...we'll let existing jobs finish, though.
                 if success:
-                    self._local_sync_state.SetCheckoutTime(project)
+                    self._local_sync_state.SetCheckoutTime(
+                        project, result.revision
+                    )
                 else:
                     ret = False
                     err_results.append(
@@ -1361,33 +1434,58 @@ later is required to fix a server side protocol bug.
         )
         pm.update(inc=0, msg="prescan")
 
+        use_maintenance = git_require(git_maintenance.MIN_GIT_VERSION)
         tidy_dirs = {}
         for project in projects:
             cls._SetPreciousObjectsState(project, opt)
 
-            # Only call git gc once per objdir, but call pack-refs for the
+            # Only maintain each objdir once, but call pack-refs for the
             # remainder.
             if project.objdir not in tidy_dirs:
-                tidy_dirs[project.objdir] = (
-                    True,  # Run a full gc.
-                    project.bare_git,
-                )
-            elif project.gitdir not in tidy_dirs:
+                if use_maintenance:
+                    plan = git_maintenance.PlanMaintenance(project)
+                else:
+                    plan = git_maintenance.MaintenancePlan(0, None)
+                tidy_dirs[project.objdir] = (plan, project)
+                if plan.tasks is None or not project.config.GetBoolean(
+                    "extensions.preciousObjects"
+                ):
+                    continue
+            # Shared objdirs are never repacked (which packs the refs too),
+            # so the first project's refs are packed like the others.
+            if project.gitdir not in tidy_dirs:
                 tidy_dirs[project.gitdir] = (
-                    False,  # Do not run a full gc; just run pack-refs.
-                    project.bare_git,
+                    git_maintenance.MaintenancePlan(
+                        0, [git_maintenance.TASK_PACK_REFS]
+                    ),
+                    project,
                 )
 
+        # Start with the largest repositories so they don't finish last.
+        work = sorted(
+            (x for x in tidy_dirs.values() if x[0].tasks != []),
+            key=lambda x: x[0].cost,
+            reverse=True,
+        )
+
+        def tidy_up(plan, project, config=None):
+            with timeline.Span(
+                "gc", cat="sync", objdir=project.objdir, tasks=plan.tasks
+            ):
+                if plan.tasks is None:
+                    # Too old for incremental maintenance.
+                    cls._RunOneGC(project, config=config)
+                else:
+                    git_maintenance.RunMaintenance(
+                        project, plan.tasks, config=config
+                    )
+
         jobs = opt.jobs
 
         if jobs < 2:
-            for run_gc, bare_git in tidy_dirs.values():
-                pm.update(msg=bare_git._project.name)
-
-                if run_gc:
-                    cls._RunOneGC(bare_git._project)
-                else:
-                    bare_git.pack_refs()
+            for plan, project in work:
+                pm.update(msg=project.name)
+                tidy_up(plan, project)
             pm.end()
             return
 
@@ -1397,32 +1495,29 @@ later is required to fix a server side protocol bug.
         threads = set()
         sem = _threading.Semaphore(jobs)
 
-        def tidy_up(run_gc, bare_git):
-            pm.start(bare_git._project.name)
+        def tidy_up_thread(plan, project):
+            pm.start(project.name)
             try:
                 try:
-                    if run_gc:
-                        cls._RunOneGC(bare_git._project, config=config)
-                    else:
-                        bare_git.pack_refs(config=config)
+                    tidy_up(plan, project, config=config)
                 except GitError:
                     err_event.set()
                 except Exception:
                     err_event.set()
                     raise
             finally:
-                pm.finish(bare_git._project.name)
+                pm.finish(project.name)
                 sem.release()
 
-        for run_gc, bare_git in tidy_dirs.values():
+        for plan, project in work:
             if err_event.is_set() and opt.fail_fast:
                 break
             sem.acquire()
             t = _threading.Thread(
-                target=tidy_up,
+                target=tidy_up_thread,
                 args=(
-                    run_gc,
-                    bare_git,
+                    plan,
+                    project,
                 ),
             )
             t.daemon = True
@@ -1433,55 +1528,45 @@ later is required to fix a server side protocol bug.
             t.join()
         pm.end()
 
-    @classmethod
-    def _CheckOneBloatedProject(cls, project_index: int) -> Optional[str]:
+    def _CheckOneBloatedProject(self, project: Project) -> Optional[str]:
         """Checks if a single project is bloated.
 
+        This doesn't run git: the state is read from the git directory, and
+        from what this sync recorded.
+
         Args:
-            project_index: The index of the project in the parallel context.
+            project: The project to check.
 
         Returns:
             The name of the project if it is bloated, else None.
         """
-        project = cls.get_parallel_context()["projects"][project_index]
-
         if not project.Exists or not project.worktree:
             return None
 
         # Only check dirty or locally modified projects. These can't be
-        # freshly cloned and will accumulate garbage.
-        try:
-            is_dirty = project.IsDirty(consider_untracked=True)
-
-            manifest_rev = project.GetRevisionId(project.bare_ref.all)
-            head_rev = project.work_git.rev_parse(HEAD)
-            has_local_commits = manifest_rev != head_rev
-
-            if not (is_dirty or has_local_commits):
-                return None
-
-            output = project.bare_git.count_objects("-v")
-        except Exception:
-            return None
-
-        stats = {}
-        for line in output.splitlines():
+        # freshly cloned and will accumulate garbage.  A HEAD that isn't what
+        # sync checked out means local commits, and an index that changed
+        # since then means the user has been working in the project.
+        checkout_time = self._local_sync_state.GetCheckoutTime(project)
+        revision = self._local_sync_state.GetRevision(project)
+        if checkout_time and revision:
+            head_rev = ReadHead(project.gitdir)
             try:
-                key, value = line.split(": ", 1)
-                stats[key.strip()] = int(value.strip())
-            except ValueError:
-                pass
-
-        pack_count = stats.get("packs", 0)
-        size_pack_kb = stats.get("size-pack", 0)
-        size_garbage_kb = stats.get("size-garbage", 0)
+                index_time = os.path.getmtime(
+                    os.path.join(project.gitdir, "index")
+                )
+            except OSError:
+                index_time = 0
+            if head_rev == revision and index_time <= checkout_time:
+                return None
 
+        stats = git_maintenance.ReadObjectStats(project.objdir, scan_loose=True)
         is_fragmented = (
-            pack_count > _BLOAT_PACK_COUNT_THRESHOLD
-            and size_pack_kb > _BLOAT_SIZE_PACK_THRESHOLD_KB
+            stats.packs > _BLOAT_PACK_COUNT_THRESHOLD
+            and stats.pack_size // 1024 > _BLOAT_SIZE_PACK_THRESHOLD_KB
         )
         has_excessive_garbage = (
-            size_garbage_kb > _BLOAT_SIZE_GARBAGE_THRESHOLD_KB
+            stats.garbage_size // 1024 > _BLOAT_SIZE_GARBAGE_THRESHOLD_KB
         )
 
         if is_fragmented or has_excessive_garbage:
@@ -1492,8 +1577,12 @@ later is required to fix a server side protocol bug.
         """Check for shallow projects that are accumulating unoptimized data.
 
         For projects with clone-depth="1" that are dirty (have local changes),
-        run 'git count-objects -v' and warn if the repository is accumulating
-        excessive pack files or garbage.
+        look at the object directory and warn if the repository is
+        accumulating excessive pack files or garbage.
+
+        Only shallow projects are checked: `repo gc --repack` only repacks
+        them, and full clones keep several packs around anyway (see
+        git_maintenance).
         """
         # We only care about bloated projects if we have a git version that
         # supports --no-auto-gc (2.23.0+) since what we use to disable auto-gc
@@ -1512,23 +1601,11 @@ later is required to fix a server side protocol bug.
         pm = Progress(
             "Checking for bloat", len(projects), delay=False, quiet=opt.quiet
         )
-
-        def _ProcessResults(pool, pm, results):
-            for result in results:
-                if result:
-                    self._bloated_projects.append(result)
-                pm.update(msg="")
-
-        with self.ParallelContext():
-            self.get_parallel_context()["projects"] = projects
-            self.ExecuteInParallel(
-                opt.jobs,
-                self._CheckOneBloatedProject,
-                range(len(projects)),
-                callback=_ProcessResults,
-                output=pm,
-                chunksize=1,
-            )
+        for project in projects:
+            result = self._CheckOneBloatedProject(project)
+            if result:
+                self._bloated_projects.append(result)
+            pm.update(msg="")
         pm.end()
 
     def _UpdateRepoProject(self, opt, manifest, errors):
@@ -2311,9 +2388,10 @@ later is required to fix a server side protocol bug.
         self._UpdateRepoProject(opt, manifest, errors)
 
         superproject_logging_data = {}
-        self._UpdateProjectsRevisionId(
-            opt, args, superproject_logging_data, manifest
-        )
+        with timeline.Span("superproject", cat="sync"):
+            self._UpdateProjectsRevisionId(
+                opt, args, superproject_logging_data, manifest
+            )
 
         all_projects = self.GetProjects(
             args,
@@ -2373,6 +2451,9 @@ later is required to fix a server side protocol bug.
         if existing:
             self._CheckForBloatedProjects(all_projects, opt)
 
+        # Finish deleting removed projects in the background.
+        trash.StartReaper(self.repodir)
+
         for project_name in sorted(self._bloated_projects):
             warn_msg = (
                 f'warning: Project "{project_name}" is accumulating '
@@ -2449,7 +2530,10 @@ later is required to fix a server side protocol bug.
                     raise SyncFailFastError(aggregate_errors=errors)
 
             try:
-                self.UpdateCopyLinkfileList(m)
+                with timeline.Span(
+                    "copy & link files", cat="sync", manifest=m.path_prefix
+                ):
+                    self.UpdateCopyLinkfileList(m)
             except Exception as e:
                 err_event.set()
                 err_update_linkfiles = True
@@ -2653,6 +2737,7 @@ later is required to fix a server side protocol bug.
         checkout_start = None
         checkout_finish = None
         checkout_stderr = ""
+        revision = None
 
         if fetch_success:
             # We skip checkout if it's network-only or if the project has no
@@ -2663,6 +2748,7 @@ later is required to fix a server side protocol bug.
                 # This is a normal project that needs a checkout.
                 checkout_start = time.time()
                 stderr_capture = io.StringIO()
+                revision = _GetCheckoutRevision(project)
                 try:
                     with contextlib.redirect_stderr(stderr_capture):
                         syncbuf = SyncBuffer(
@@ -2679,6 +2765,8 @@ later is required to fix a server side protocol bug.
                         checkout_success = syncbuf.Finish()
                         if syncbuf.errors:
                             checkout_errors.extend(syncbuf.errors)
+                        if checkout_success:
+                            _UpdateGrepIndex(project)
                 except KeyboardInterrupt:
                     logger.error(
                         "Keyboard interrupt while processing %s", project.name
@@ -2704,6 +2792,20 @@ later is required to fix a server side protocol bug.
                     checkout_finish = time.time()
                     checkout_stderr = stderr_capture.getvalue()
 
+        for name, start, finish in (
+            ("fetch", fetch_start, fetch_finish),
+            ("checkout", checkout_start, checkout_finish),
+        ):
+            if start is not None:
+                timeline.Add(
+                    name,
+                    start,
+                    finish,
+                    cat="sync",
+                    project=project.name,
+                    worker=os.getpid(),
+                )
+
         # Consolidate all captured output.
         captured_parts = []
         if network_output:
@@ -2725,6 +2827,7 @@ later is required to fix a server side protocol bug.
             fetch_finish=fetch_finish,
             checkout_start=checkout_start,
             checkout_finish=checkout_finish,
+            revision=revision,
         )
 
     @classmethod
@@ -2761,7 +2864,7 @@ later is required to fix a server side protocol bug.
         finally:
             del sync_dict[key]
 
-        return _InterleavedSyncResult(results=results)
+        return _InterleavedSyncResult(results=results, timeline=timeline.Take())
 
     def _ProcessSyncInterleavedResults(
         self,
@@ -2777,6 +2880,7 @@ later is required to fix a server side protocol bug.
         ret = True
         projects = self.get_parallel_context()["projects"]
         for result_group in results_sets:
+            timeline.Extend(result_group.timeline)
             for result in result_group.results:
                 pm.update()
                 project = projects[result.project_index]
@@ -2800,7 +2904,9 @@ later is required to fix a server side protocol bug.
                     )
                 if result.checkout_start:
                     if result.checkout_success:
-                        self._local_sync_state.SetCheckoutTime(project)
+                        self._local_sync_state.SetCheckoutTime(
+                            project, result.revision
+                        )
                     self.event_log.AddSync(
                         project,
                         event_log.TASK_SYNC_LOCAL,
@@ -3112,95 +3218,6 @@ class _FetchTimes:
             platform_utils.remove(self._path, missing_ok=True)
 
 
-class LocalSyncState:
-    _LAST_FETCH = "last_fetch"
-    _LAST_CHECKOUT = "last_checkout"
-
-    def __init__(self, manifest):
-        self._manifest = manifest
-        self._path = os.path.join(
-            self._manifest.repodir, ".repo_localsyncstate.json"
-        )
-        self._time = time.time()
-        self._state = None
-        self._Load()
-
-    def SetFetchTime(self, project):
-        self._Set(project, self._LAST_FETCH)
-
-    def SetCheckoutTime(self, project):
-        self._Set(project, self._LAST_CHECKOUT)
-
-    def GetFetchTime(self, project):
-        return self._Get(project, self._LAST_FETCH)
-
-    def GetCheckoutTime(self, project):
-        return self._Get(project, self._LAST_CHECKOUT)
-
-    def _Get(self, project, key):
-        self._Load()
-        p = project.relpath
-        if p not in self._state:
-            return
-        return self._state[p].get(key)
-
-    def _Set(self, project, key):
-        p = project.relpath
-        if p not in self._state:
-            self._state[p] = {}
-        self._state[p][key] = self._time
-
-    def _Load(self):
-        if self._state is None:
-            try:
-                with open(self._path) as f:
-                    self._state = json.load(f)
-            except (OSError, ValueError):
-                platform_utils.remove(self._path, missing_ok=True)
-                self._state = {}
-
-    def Save(self):
-        if not self._state:
-            return
-        try:
-            with open(self._path, "w") as f:
-                json.dump(self._state, f, indent=2)
-        except (OSError, TypeError):
-            platform_utils.remove(self._path, missing_ok=True)
-
-    def PruneRemovedProjects(self):
-        """Remove entries don't exist on disk and save."""
-        if not self._state:
-            return
-        delete = set()
-        for path in self._state:
-            gitdir = os.path.join(self._manifest.topdir, path, ".git")
-            if not os.path.exists(gitdir) or os.path.islink(gitdir):
-                delete.add(path)
-        if not delete:
-            return
-        for path in delete:
-            del self._state[path]
-        self.Save()
-
-    def IsPartiallySynced(self):
-        """Return whether a partial sync state is detected."""
-        self._Load()
-        prev_checkout_t = None
-        for path, data in self._state.items():
-            if path == self._manifest.repoProject.relpath:
-                # The repo project isn't included in most syncs so we should
-                # ignore it here.
-                continue
-            checkout_t = data.get(self._LAST_CHECKOUT)
-            if not checkout_t:
-                return True
-            prev_checkout_t = prev_checkout_t or checkout_t
-            if prev_checkout_t != checkout_t:
-                return True
-        return False
-
-
 # This is a replacement for xmlrpc.client.Transport using urllib2
 # and supporting persistent-http[s]. It cannot change hosts from
 # request to request like the normal transport, the real url
@@ -12,11 +12,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import concurrent.futures
 import copy
 import functools
+import io
+import multiprocessing
 import optparse
 import re
 import sys
+import threading
 from typing import List
 
 from command import DEFAULT_LOCAL_JOBS
@@ -28,13 +32,19 @@ from error import UploadError
 from git_command import GitCommand
 from git_refs import R_HEADS
 import git_superproject
+from hooks import HookResultCache
 from hooks import RepoHook
+from local_sync_state import LocalSyncState
 from project import ReviewableBranch
 from repo_logging import RepoLogger
-from subcmds.sync import LocalSyncState
+import ssh
 
 
 _DEFAULT_UNUSUAL_COMMIT_THRESHOLD = 5
+
+# How many branches to push to a single review server at once by default.
+_DEFAULT_UPLOAD_JOBS = 4
+
 logger = RepoLogger(__file__)
 
 
@@ -138,6 +148,12 @@ yet support, or doesn't have plans to support.  See the Push Options
 documentation for more details:
 https://gerrit-review.googlesource.com/Documentation/user-upload.html#push_options
 
+Branches in different projects are pushed in parallel (see --jobs), and the
+output of each push is shown once it finishes.
+
+The pre-upload hook remembers the commits it passed on, and is only run on the
+projects whose commits have changed since (see --rerun-hooks).
+
 # Configuration
 
 review.URL.autoupload:
@@ -209,6 +225,12 @@ of commits in one or more branches. By default, the threshold
 is five commits. This option allows you to override the warning
 threshold to a different value.
 
+review.URL.uploadjobs:
+
+The most branches to push to the review server at once.  By default,
+up to four pushes share a server, so it isn't overloaded by large
+uploads.
+
 # References
 
 Gerrit Code Review:  https://www.gerritcodereview.com/
@@ -379,6 +401,11 @@ Gerrit Code Review:  https://www.gerritcodereview.com/
             default=True,
             help="disable verifying ssl certs (unsafe)",
         )
+        p.add_option(
+            "--rerun-hooks",
+            action="store_true",
+            help="forget which commits the pre-upload hook already passed on",
+        )
         RepoHook.AddOptionGroup(p, "pre-upload")
 
     def _SingleBranch(self, opt, branch, people):
@@ -535,7 +562,7 @@ Gerrit Code Review:  https://www.gerritcodereview.com/
             people[1].extend([entry.strip() for entry in raw_list.split(",")])
 
     def _FindGerritChange(self, branch):
-        last_pub = branch.project.WasPublished(branch.name)
+        last_pub = branch.branch.published
         if last_pub is None:
             return ""
 
@@ -546,8 +573,15 @@ Gerrit Code Review:  https://www.gerritcodereview.com/
         except (AttributeError, IndexError):
             return ""
 
-    def _UploadBranch(self, opt, branch, original_people):
-        """Upload Branch."""
+    def _PrepareBranch(self, opt, branch, original_people):
+        """Work out how to upload |branch|.
+
+        This runs one branch at a time, as the options a branch is uploaded
+        with can depend on the branches before it (e.g. --topic-branch).
+
+        Returns:
+            The arguments to upload the branch with, or None to skip it.
+        """
         people = copy.deepcopy(original_people)
         self._AppendAutoList(branch, people)
 
@@ -623,7 +657,7 @@ Gerrit Code Review:  https://www.gerritcodereview.com/
                     "is intentional"
                 )
                 branch.uploaded = False
-                return
+                return None
 
         # If using superproject, add the root repo as a push option.
         manifest = branch.project.manifest
@@ -635,36 +669,114 @@ Gerrit Code Review:  https://www.gerritcodereview.com/
                 if r_id:
                     push_options.append(f"custom-keyed-value=rootRepo:{r_id}")
 
-        branch.UploadForReview(
-            people,
-            dryrun=opt.dryrun,
-            topic=opt.topic,
-            hashtags=hashtags,
-            labels=labels,
-            private=opt.private,
-            notify=notify,
-            wip=opt.wip,
-            ready=opt.ready,
-            dest_branch=destination,
-            validate_certs=opt.validate_certs,
-            push_options=push_options,
-            patchset_description=opt.patchset_description,
-        )
+        return {
+            "people": people,
+            "dryrun": opt.dryrun,
+            "topic": opt.topic,
+            "hashtags": hashtags,
+            "labels": labels,
+            "private": opt.private,
+            "notify": notify,
+            "wip": opt.wip,
+            "ready": opt.ready,
+            "dest_branch": destination,
+            "validate_certs": opt.validate_certs,
+            "push_options": push_options,
+            "patchset_description": opt.patchset_description,
+        }
+
+    @staticmethod
+    def _UploadJobs(branch):
+        """How many branches may be pushed to the review server at once."""
+        key = "review.%s.uploadjobs" % branch.project.remote.review
+        jobs = branch.project.config.GetInt(key)
+        return jobs if jobs and jobs > 0 else _DEFAULT_UPLOAD_JOBS
 
-        branch.uploaded = True
+    def _PushBranches(self, opt, pushes, ssh_proxy):
+        """Push the prepared branches, several projects at a time.
+
+        The branches of a project are pushed one after the other, as each push
+        updates the project's refs & config.
+
+        Args:
+            opt: The command options.
+            pushes: The (branch, arguments) pairs to push.
+            ssh_proxy: The SSH settings for managing master sessions.
+
+        Yields:
+            The (branch, error) of each branch as it finishes, where error is
+            None if the push succeeded.
+        """
+        by_project = {}
+        for branch, kwargs in pushes:
+            by_project.setdefault(branch.project, []).append((branch, kwargs))
+        # Limit how many pushes go to a single review server at once.
+        limits = {}
+        for branch, _ in pushes:
+            review = branch.project.remote.review
+            if review not in limits:
+                limits[review] = threading.Semaphore(self._UploadJobs(branch))
+
+        jobs = min(opt.jobs or 1, len(by_project))
+
+        def _PushProject(project_pushes):
+            results = []
+            for branch, kwargs in project_pushes:
+                # When pushing in parallel, hold the output back so the output
+                # of different pushes isn't mixed up.
+                output = io.StringIO() if jobs > 1 else None
+                try:
+                    with limits[branch.project.remote.review]:
+                        branch.UploadForReview(
+                            ssh_proxy=ssh_proxy, output=output, **kwargs
+                        )
+                    error = None
+                except (UploadError, GitError) as e:
+                    error = e
+                results.append((branch, output, error))
+            return results
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+            futures = [
+                pool.submit(_PushProject, x) for x in by_project.values()
+            ]
+            for future in concurrent.futures.as_completed(futures):
+                for branch, output, error in future.result():
+                    if output is not None:
+                        sys.stderr.write(output.getvalue())
+                    yield branch, error
 
     def _UploadAndReport(self, opt, todo, people):
         have_errors = False
         aggregate_errors = []
+
+        def _Failed(branch, e):
+            nonlocal have_errors
+            self.git_event_log.ErrorEvent(f"upload error: {e}")
+            branch.error = e
+            aggregate_errors.append(e)
+            branch.uploaded = False
+            have_errors = True
+
+        pushes = []
         for branch in todo:
             try:
-                self._UploadBranch(opt, branch, people)
+                kwargs = self._PrepareBranch(opt, branch, people)
             except (UploadError, GitError) as e:
-                self.git_event_log.ErrorEvent(f"upload error: {e}")
-                branch.error = e
-                aggregate_errors.append(e)
-                branch.uploaded = False
-                have_errors = True
+                _Failed(branch, e)
+                continue
+            if kwargs is not None:
+                pushes.append((branch, kwargs))
+
+        if pushes:
+            with multiprocessing.Manager() as manager, ssh.ProxyManager(
+                manager
+            ) as ssh_proxy:
+                for branch, error in self._PushBranches(opt, pushes, ssh_proxy):
+                    if error is None:
+                        branch.uploaded = True
+                    else:
+                        _Failed(branch, error)
 
         print(file=sys.stderr)
         print("-" * 70, file=sys.stderr)
@@ -723,6 +835,19 @@ Gerrit Code Review:  https://www.gerritcodereview.com/
         merge_branch = p.stdout.strip()
         return merge_branch
 
+    @staticmethod
+    def _HookCommits(project, branches):
+        """Return the commits the pre-upload hook checks in |project|.
+
+        The hook looks at the checked out commit & the uploadable branches, so
+        it has to run again if any of them (or what they're based on) moves.
+        """
+        commits = [project.GetHeadRevisionId() or ""]
+        for branch in sorted(branches, key=lambda x: x.name):
+            base = project.bare_ref.get(branch.base) or branch.base
+            commits.append(f"{branch.name}:{base}..{branch.branch.revision}")
+        return commits
+
     @classmethod
     def _GatherOne(cls, opt, project_idx):
         """Figure out the upload status for |project|."""
@@ -793,14 +918,25 @@ Gerrit Code Review:  https://www.gerritcodereview.com/
                 for (project, available) in pending
                 if project.manifest.topdir == manifest.topdir
             ]
+            pending_commits = [
+                self._HookCommits(project, available)
+                for (project, available) in pending
+                if project.manifest.topdir == manifest.topdir
+            ]
             hook = RepoHook.FromSubcmd(
                 hook_type="pre-upload",
                 manifest=manifest,
                 opt=opt,
                 abort_if_user_denies=True,
             )
-            if not hook.Run(
-                project_list=pending_proj_names, worktree_list=pending_worktrees
+            cache = HookResultCache(manifest.repodir)
+            if opt.rerun_hooks:
+                cache.Clear()
+            if not hook.RunCached(
+                cache,
+                pending_commits,
+                project_list=pending_proj_names,
+                worktree_list=pending_worktrees,
             ):
                 if LocalSyncState(manifest).IsPartiallySynced():
                     logger.info(
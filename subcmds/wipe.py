@@ -19,8 +19,8 @@ from typing import List
 from command import Command
 from error import GitError
 from error import RepoExitError
-import platform_utils
 from project import DeleteWorktreeError
+import trash
 
 
 class Error(RepoExitError):
@@ -181,4 +181,7 @@ Examples:
                             f"Deleting objects directory: {objdir}",
                             file=sys.stderr,
                         )
-                    platform_utils.rmtree(objdir)
+                    trash.Delete(self.repodir, objdir)
+
+        # Finish deleting everything in the background.
+        trash.StartReaper(self.repodir)
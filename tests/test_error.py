@@ -16,6 +16,7 @@
 
 import inspect
 import pickle
+import sys
 from typing import Iterator, Type
 
 import pytest
@@ -25,10 +26,10 @@ import error
 import fetch
 import git_command
 import project
-from subcmds import all_modules
+from subcmds import all_commands
 
 
-_IMPORTS = all_modules + [
+_IMPORTS = [sys.modules[x.__module__] for x in all_commands.values()] + [
     error,
     project,
     git_command,
@@ -0,0 +1,191 @@
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unittests for the git_async.py module."""
+
+import asyncio
+import os
+from pathlib import Path
+import signal
+import time
+from unittest import mock
+
+import pytest
+import utils_for_test
+
+import git_async
+import git_command
+import git_stats
+
+
+@pytest.fixture(autouse=True)
+def _reset_stats():
+    git_stats.Take()
+    yield
+    git_stats.Take()
+
+
+def test_run() -> None:
+    """Check the output & exit status are returned, and stats recorded."""
+
+    async def _Version(runner, _item):
+        return await runner.Run(None, ["version"])
+
+    (result,) = git_async.Map(_Version, [None])
+    assert result.rc == 0
+    assert result.stdout.startswith("git version")
+    assert result.stderr == ""
+    assert git_stats.ByCommand()["version"].count == 1
+
+
+def test_run_input(tmp_path: Path) -> None:
+    """Check input is written to the command."""
+    utils_for_test.init_git_tree(tmp_path)
+
+    async def _Hash(runner, _item):
+        return await runner.Run(
+            None,
+            ["hash-object", "--stdin"],
+            cwd=str(tmp_path),
+            input="hello\n",
+        )
+
+    (result,) = git_async.Map(_Hash, [None])
+    assert result.stdout == "ce013625030ba8dba906f756967f9e9ca394464a\n"
+
+
+def test_run_check(tmp_path: Path) -> None:
+    """Check failures raise GitCommandError only when checked."""
+    utils_for_test.init_git_tree(tmp_path)
+
+    async def _RevParse(runner, check):
+        return await runner.Run(
+            None,
+            ["rev-parse", "--verify", "missing"],
+            cwd=str(tmp_path),
+            check=check,
+        )
+
+    (result,) = git_async.Map(_RevParse, [False])
+    assert result.rc
+    assert "fatal:" in result.stderr
+
+    with pytest.raises(git_command.GitCommandError) as e:
+        git_async.Map(_RevParse, [True])
+    assert e.value.git_rc == result.rc
+    assert "fatal:" in e.value.git_stderr
+
+
+def test_map_order() -> None:
+    """Check results come back in order, whatever order they finish in."""
+    seen = []
+
+    async def _Sleep(_runner, item):
+        await asyncio.sleep(item / 20)
+        return item
+
+    assert git_async.Map(_Sleep, [3, 0, 2, 1], callback=seen.append) == [
+        3,
+        0,
+        2,
+        1,
+    ]
+    assert seen == [3, 0, 2, 1]
+
+
+def test_map_jobs() -> None:
+    """Check no more than |jobs| commands run at once."""
+
+    async def _Sleep(runner, _item):
+        return await runner.Run(None, ["-c", "sleep 0.2"])
+
+    with mock.patch.object(git_command, "GIT", "sh"):
+        start = time.perf_counter()
+        results = git_async.Map(_Sleep, range(6), jobs=2)
+        elapsed = time.perf_counter() - start
+
+    assert [x.rc for x in results] == [0] * 6
+    assert elapsed >= 0.6
+
+
+def test_map_cancel() -> None:
+    """Check a failure kills the commands still running."""
+    kill = mock.Mock(wraps=asyncio.subprocess.Process.kill)
+
+    async def _Work(runner, item):
+        if item:
+            await runner.Run(None, ["30"])
+        else:
+            await asyncio.sleep(0.2)
+            raise ValueError("failed")
+
+    with mock.patch.object(git_command, "GIT", "sleep"), mock.patch.object(
+        asyncio.subprocess.Process, "kill", lambda self: kill(self)
+    ):
+        start = time.perf_counter()
+        with pytest.raises(ValueError):
+            git_async.Map(_Work, [0, 1])
+
+    assert time.perf_counter() - start < 10
+    kill.assert_called_once()
+    assert git_stats.Total().count == 0
+
+
+def test_map_interrupt() -> None:
+    """Check SIGINT raises KeyboardInterrupt once the commands are killed."""
+
+    async def _Work(runner, item):
+        if item:
+            await runner.Run(None, ["30"])
+        else:
+            await asyncio.sleep(0.2)
+            os.kill(os.getpid(), signal.SIGINT)
+
+    with mock.patch.object(git_command, "GIT", "sleep"):
+        start = time.perf_counter()
+        with pytest.raises(KeyboardInterrupt):
+            git_async.Map(_Work, [0, 1])
+
+    assert time.perf_counter() - start < 10
+    assert git_stats.Total().count == 0
+    assert signal.getsignal(signal.SIGINT) is signal.default_int_handler
+
+
+def test_gather() -> None:
+    """Check Gather runs the commands at once."""
+
+    async def _Both(runner, _item):
+        return await git_async.Gather(
+            runner.Run(None, ["-c", "sleep 0.5; echo a"]),
+            runner.Run(None, ["-c", "sleep 0.5; echo b"]),
+        )
+
+    with mock.patch.object(git_command, "GIT", "sh"):
+        start = time.perf_counter()
+        ((a, b),) = git_async.Map(_Both, [None])
+        elapsed = time.perf_counter() - start
+
+    assert (a.stdout, b.stdout) == ("a\n", "b\n")
+    assert elapsed < 0.9
+
+
+def test_max_jobs() -> None:
+    """Check jobs are limited by the open file limit."""
+    assert git_async.MaxJobs(1) == 1
+    if git_async.resource is None:
+        return
+    with mock.patch.object(
+        git_async.resource, "getrlimit", return_value=(256, 256)
+    ):
+        assert git_async.MaxJobs(1000) == 48
@@ -22,6 +22,7 @@ import unittest
 from unittest import mock
 
 import pytest
+import utils_for_test
 
 import git_command
 import wrapper
@@ -64,6 +65,22 @@ class GitCommandTest(unittest.TestCase):
             r.get("GIT_OBJECT_DIRECTORY"), os.path.join("wow", "objects")
         )
 
+    def test_env_follows_environ(self):
+        """Check the cached env is rebuilt when os.environ changes."""
+        with mock.patch.dict(os.environ, {"REPO_TEST_VAR": "1"}):
+            self.assertEqual(git_command._build_env()["REPO_TEST_VAR"], "1")
+            with mock.patch.dict(os.environ, {"REPO_TEST_VAR": "2"}):
+                self.assertEqual(git_command._build_env()["REPO_TEST_VAR"], "2")
+        self.assertNotIn("REPO_TEST_VAR", git_command._build_env())
+
+    def test_env_copies(self):
+        """Check callers get their own copy of the env."""
+        env = git_command.GitCommand._GetBasicEnv()
+        env["REPO_TEST_VAR"] = "1"
+        git_command._build_env()["REPO_TEST_VAR"] = "1"
+        self.assertNotIn("REPO_TEST_VAR", git_command.GitCommand._GetBasicEnv())
+        self.assertNotIn("REPO_TEST_VAR", git_command._build_env())
+
 
 class GitCommandWaitTest(unittest.TestCase):
     """Tests the GitCommand class .Wait()"""
@@ -86,8 +103,10 @@ class GitCommandWaitTest(unittest.TestCase):
                 return self.rc
 
         self.popen = popen = MockPopen()
+        self.popen_kwargs = {}
 
         def popen_mock(*args, **kwargs):
+            self.popen_kwargs = kwargs
             return popen
 
         def realpath_mock(val):
@@ -118,6 +137,25 @@ class GitCommandWaitTest(unittest.TestCase):
         r = git_command.GitCommand(None, ["status"])
         self.assertEqual(1, r.Wait())
 
+    def test_event_log_on_failure(self):
+        """Check the event log is only created when the command fails."""
+        mock.patch.object(
+            git_command, "GetEventTargetPath", return_value=None
+        ).start()
+        event_log = mock.patch.object(git_command, "BaseEventLog").start()
+
+        git_command.GitCommand(None, ["status"], verify_command=True)
+        event_log.assert_not_called()
+        sid = self.popen_kwargs["env"]["GIT_TRACE2_PARENT_SID"]
+
+        self.popen.rc = 1
+        git_command.GitCommand(None, ["status"], verify_command=True)
+        failed_sid = self.popen_kwargs["env"]["GIT_TRACE2_PARENT_SID"]
+        self.assertNotEqual(sid, failed_sid)
+        # The log is for the sid git ran under.
+        event_log.assert_called_once_with(full_sid=failed_sid)
+        event_log.return_value.ErrorEvent.assert_called_once()
+
 
 class GitCommandStreamLogsTest(unittest.TestCase):
     """Tests the GitCommand class stderr log streaming cases."""
@@ -346,3 +384,117 @@ class GitCommandErrorTest(unittest.TestCase):
             ).suggestion,
             "Are you running this repo command outside of a repo workspace?",
         )
+
+
+class GitStreamTest(unittest.TestCase):
+    """Tests the GitStream class."""
+
+    def setUp(self):
+        self.tempdirobj = utils_for_test.TempGitTree()
+        self.tempdir = self.tempdirobj.__enter__()
+        for name in ("a", "b c"):
+            with open(os.path.join(self.tempdir, name), "w") as fp:
+                fp.write(name)
+        subprocess.check_call(["git", "add", "."], cwd=self.tempdir)
+
+    def tearDown(self):
+        self.tempdirobj.__exit__(None, None, None)
+
+    def test_records(self):
+        """Check the output is split into records."""
+        cmd = ["ls-files", "-z"]
+        with git_command.GitStream(None, cmd, cwd=self.tempdir) as p:
+            self.assertEqual(["a", "b c"], list(p.Records("\0")))
+        self.assertEqual(0, p.rc)
+
+        with git_command.GitStream(None, cmd, cwd=self.tempdir) as p:
+            self.assertEqual([b"a", b"b c"], list(p.Records(b"\0")))
+
+        with git_command.GitStream(None, ["ls-files"], cwd=self.tempdir) as p:
+            self.assertEqual(["a", "b c"], list(p.Lines()))
+
+    def test_records_across_chunks(self):
+        """Check records split across reads are put back together."""
+        with git_command.GitStream(None, ["version"]) as p:
+            chunks = [b"a\0b", b"c\0\xe2\x82", b"\xac\0", b"d"]
+            with mock.patch.object(p, "Chunks", return_value=iter(chunks)):
+                self.assertEqual(["a", "bc", "€", "d"], list(p.Records("\0")))
+
+    def test_failure(self):
+        """Check failures are reported with stderr."""
+        cmd = ["rev-parse", "--verify", "missing"]
+        with git_command.GitStream(None, cmd, cwd=self.tempdir) as p:
+            self.assertEqual([], list(p.Lines()))
+        self.assertNotEqual(0, p.rc)
+        self.assertIn("fatal:", p.stderr)
+
+        with self.assertRaises(git_command.GitCommandError) as e:
+            with git_command.GitStream(
+                None, cmd, cwd=self.tempdir, verify_command=True
+            ) as p:
+                list(p.Lines())
+        self.assertEqual(p.rc, e.exception.git_rc)
+        self.assertIn("fatal:", e.exception.git_stderr)
+
+    def test_event_log_on_failure(self):
+        """Check the event log is written under the sid git ran with."""
+        cmd = ["rev-parse", "--verify", "missing"]
+        with mock.patch.object(
+            git_command, "GetEventTargetPath", return_value=None
+        ), mock.patch.object(
+            git_command, "BaseEventLog"
+        ) as event_log, mock.patch.object(
+            subprocess, "Popen", wraps=subprocess.Popen
+        ) as popen:
+            git_command.GitStream(
+                None, ["version"], stdout=subprocess.DEVNULL
+            ).Wait()
+            event_log.assert_not_called()
+
+            git_command.GitStream(None, cmd, cwd=self.tempdir).Wait()
+            sid = popen.call_args[1]["env"]["GIT_TRACE2_PARENT_SID"]
+            event_log.assert_called_once_with(full_sid=sid)
+            event_log.return_value.ErrorEvent.assert_called_once()
+
+            event_log.reset_mock()
+            with git_command.GitStream(
+                None, ["hash-object", "--stdin"], stdin=subprocess.PIPE
+            ) as p:
+                p.Kill()
+            event_log.assert_not_called()
+
+    def test_kill(self):
+        """Check a killed command isn't reported as failing."""
+        cmd = ["hash-object", "--stdin"]
+        with git_command.GitStream(
+            None, cmd, stdin=subprocess.PIPE, verify_command=True
+        ) as p:
+            p.Kill()
+        self.assertNotEqual(0, p.rc)
+
+    def test_pipe(self):
+        """Check the output of one command can be piped into another."""
+        with git_command.GitStream(
+            None, ["hash-object", "--stdin"], stdin=subprocess.PIPE
+        ) as hasher:
+            git_command.GitStream(
+                None,
+                ["cat-file", "blob", ":a"],
+                cwd=self.tempdir,
+                stdout=hasher.stdin,
+                verify_command=True,
+            ).Wait()
+            hasher.stdin.close()
+            (blob,) = hasher.Lines()
+        self.assertEqual(
+            blob,
+            subprocess.check_output(
+                ["git", "rev-parse", ":a"], cwd=self.tempdir, encoding="utf-8"
+            ).strip(),
+        )
+
+    def test_popen_error(self):
+        """Check failing to start the command is reported."""
+        with mock.patch.object(subprocess, "Popen", side_effect=OSError):
+            with self.assertRaises(git_command.GitPopenCommandError):
+                git_command.GitStream(None, ["version"])
@@ -0,0 +1,60 @@
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unittests for the git_info_cache.py module."""
+
+import os
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+import git_info_cache
+
+
+@pytest.fixture(autouse=True)
+def _reset_cache():
+    yield
+    git_info_cache.SetRepoDir(None)
+
+
+def test_cache(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Check values are kept across processes until git config changes."""
+    config = tmp_path / "gitconfig"
+    config.write_text("")
+    monkeypatch.setenv("GIT_CONFIG_GLOBAL", str(config))
+    load = mock.Mock(return_value="git version 2.50.0")
+
+    git_info_cache.SetRepoDir(str(tmp_path))
+    assert git_info_cache.Get("version", load) == "git version 2.50.0"
+    assert git_info_cache.Get("version", load) == "git version 2.50.0"
+    assert load.call_count == 1
+
+    # A new process reads what the last one saved.
+    git_info_cache.SetRepoDir(str(tmp_path))
+    assert git_info_cache.Get("version", load) == "git version 2.50.0"
+    assert load.call_count == 1
+
+    config.write_text("[protocol]\n\tversion = 2\n")
+    os.utime(config, ns=(0, 0))
+    git_info_cache.SetRepoDir(str(tmp_path))
+    assert git_info_cache.Get("version", load) == "git version 2.50.0"
+    assert load.call_count == 2
+
+
+def test_no_repodir() -> None:
+    """Check values are only kept in memory without a repodir."""
+    git_info_cache.SetRepoDir(None)
+    assert git_info_cache.Get("key", lambda: None) is None
+    assert git_info_cache.Get("key", lambda: "unused") is None
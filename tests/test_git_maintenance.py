@@ -0,0 +1,153 @@
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unittests for the git_maintenance.py module."""
+
+import os
+import subprocess
+import unittest
+from unittest import mock
+
+import utils_for_test
+
+import git_maintenance
+
+
+def _Project(config=None):
+    """Create a mock project with |config|."""
+    config = config or {}
+    project = mock.MagicMock()
+    project.config.GetBoolean.side_effect = config.get
+    project.config.GetInt.side_effect = config.get
+    return project
+
+
+class PlanMaintenanceTests(unittest.TestCase):
+    """Check PlanMaintenance behavior."""
+
+    def test_clean(self):
+        stats = git_maintenance.ObjectStats(0, 1, 100, 10, 20, 0)
+        self.assertEqual(
+            [], git_maintenance.PlanMaintenance(_Project(), stats).tasks
+        )
+
+    def test_new_pack(self):
+        stats = git_maintenance.ObjectStats(0, 2, 100, 30, 20, 20)
+        self.assertEqual(
+            ["multi-pack-index", "commit-graph"],
+            git_maintenance.PlanMaintenance(_Project(), stats).tasks,
+        )
+
+    def test_repack(self):
+        for stats in (
+            git_maintenance.ObjectStats(7000, 1, 100, 10, 20, 0),
+            git_maintenance.ObjectStats(0, 51, 100, 10, 20, 20),
+        ):
+            plan = git_maintenance.PlanMaintenance(_Project(), stats)
+            self.assertEqual(
+                ["geometric-repack", "pack-refs", "commit-graph"], plan.tasks
+            )
+
+    def test_repack_config(self):
+        stats = git_maintenance.ObjectStats(7000, 51, 100, 10, 20, 0)
+        for config in (
+            {"gc.auto": 0},
+            {"extensions.preciousObjects": True},
+        ):
+            plan = git_maintenance.PlanMaintenance(_Project(config), stats)
+            self.assertEqual(["multi-pack-index", "commit-graph"], plan.tasks)
+
+        config = {"gc.auto": 100000, "gc.autoPackLimit": 10}
+        plan = git_maintenance.PlanMaintenance(_Project(config), stats)
+        self.assertEqual("geometric-repack", plan.tasks[0])
+
+    def test_cost(self):
+        small = git_maintenance.ObjectStats(0, 1, 100, 10, 20, 0)
+        big = git_maintenance.ObjectStats(256, 1, 100, 10, 20, 0)
+        self.assertLess(
+            git_maintenance.PlanMaintenance(_Project(), small).cost,
+            git_maintenance.PlanMaintenance(_Project(), big).cost,
+        )
+
+
+class MaintenanceTests(unittest.TestCase):
+    """Check maintenance of real repositories."""
+
+    def test_maintenance(self):
+        with utils_for_test.TempGitTree() as tempdir:
+            gitdir = os.path.join(tempdir, ".git")
+            for i in range(2):
+                with open(os.path.join(tempdir, "file"), "w") as fp:
+                    fp.write(str(i))
+                subprocess.check_call(["git", "add", "."], cwd=tempdir)
+                subprocess.check_call(
+                    ["git", "commit", "-qm", str(i)], cwd=tempdir
+                )
+                subprocess.check_call(["git", "repack", "-q"], cwd=tempdir)
+
+            stats = git_maintenance.ReadObjectStats(gitdir)
+            self.assertEqual(2, stats.packs)
+            self.assertEqual(0, stats.commit_graph)
+            self.assertEqual(0, stats.midx)
+
+            project = _Project({"gc.autoPackLimit": 1})
+            project.objdir = gitdir
+            plan = git_maintenance.PlanMaintenance(project)
+            self.assertEqual(
+                ["geometric-repack", "pack-refs", "commit-graph"], plan.tasks
+            )
+
+            def git(name):
+                def run(*args, config=None):
+                    subprocess.check_call(
+                        ["git", name.replace("_", "-")] + list(args),
+                        cwd=tempdir,
+                    )
+
+                return run
+
+            project.bare_git.repack = git("repack")
+            project.bare_git.pack_refs = git("pack_refs")
+            project.bare_git.commit_graph = git("commit_graph")
+            git_maintenance.RunMaintenance(project, plan.tasks)
+
+            stats = git_maintenance.ReadObjectStats(gitdir)
+            self.assertEqual(1, stats.packs)
+            self.assertNotEqual(0, stats.commit_graph)
+            self.assertNotEqual(0, stats.midx)
+            self.assertEqual(
+                [], git_maintenance.PlanMaintenance(project, stats).tasks
+            )
+
+    def test_scan_loose(self):
+        with utils_for_test.TempGitTree() as tempdir:
+            gitdir = os.path.join(tempdir, ".git")
+            for i in range(3):
+                subprocess.run(
+                    ["git", "hash-object", "-w", "--stdin"],
+                    input=str(i).encode(),
+                    cwd=tempdir,
+                    check=True,
+                    stdout=subprocess.DEVNULL,
+                )
+            pack_dir = os.path.join(gitdir, "objects", "pack")
+            with open(os.path.join(pack_dir, "tmp_pack_1"), "w") as fp:
+                fp.write("x" * 10)
+            with open(os.path.join(pack_dir, "pack-1.idx"), "w") as fp:
+                fp.write("x" * 5)
+
+            stats = git_maintenance.ReadObjectStats(gitdir, scan_loose=True)
+            self.assertEqual(3, stats.loose)
+            self.assertEqual(0, stats.packs)
+            self.assertEqual(15, stats.garbage_size)
@@ -21,7 +21,9 @@ import subprocess
 import pytest
 import utils_for_test
 
+import git_async
 import git_refs
+import git_stats
 
 
 def _run(repo, *args):
@@ -97,3 +99,47 @@ def test_updates_when_storage_backend_toggles(tmp_path):
     _run(repo, "refs", "migrate", "--ref-format=files")
     _run(repo, "branch", "files-branch")
     assert refs.get("refs/heads/files-branch") == head
+
+
+def test_load_async(tmp_path):
+    repo = _init_repo(tmp_path)
+    gitdir = os.path.join(repo, ".git")
+    refs = git_refs.GitRefs(gitdir)
+    head = _run(repo, "rev-parse", "HEAD")
+    branch = _run(repo, "symbolic-ref", "--short", "HEAD")
+
+    git_async.Map(lambda runner, x: x.LoadAsync(runner), [refs])
+    # The refs are loaded, so reading them doesn't run git.
+    git_stats.Take()
+    assert refs.get(f"refs/heads/{branch}") == head
+    assert git_stats.Total().count == 0
+
+    # Until they change.
+    _run(repo, "branch", "topic")
+    git_async.Map(lambda runner, x: x.LoadAsync(runner), [refs])
+    assert refs.get("refs/heads/topic") == head
+    assert git_stats.Total().count == 1
+
+
+def test_reads_detached_head(tmp_path):
+    repo = _init_repo(tmp_path)
+    gitdir = os.path.join(repo, ".git")
+    refs = git_refs.GitRefs(gitdir)
+
+    head = _run(repo, "rev-parse", "HEAD")
+    _run(repo, "checkout", "-q", "--detach")
+    assert refs.symref("HEAD") == ""
+    assert refs.get("HEAD") == head
+
+
+def test_read_head(tmp_path):
+    repo = _init_repo(tmp_path)
+    gitdir = os.path.join(repo, ".git")
+    head = _run(repo, "rev-parse", "HEAD")
+
+    assert git_refs.ReadHead(gitdir) == head
+    _run(repo, "pack-refs", "--all")
+    assert git_refs.ReadHead(gitdir) == head
+    _run(repo, "checkout", "-q", "--detach")
+    assert git_refs.ReadHead(gitdir) == head
+    assert git_refs.ReadHead(os.path.join(tmp_path, "missing")) is None
@@ -0,0 +1,220 @@
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unittests for the git_stats.py module."""
+
+import json
+import os
+from pathlib import Path
+import subprocess
+import sys
+from typing import Callable, Dict, List
+
+import pytest
+import utils_for_test
+
+from command import Command
+import git_command
+import git_stats
+import wrapper
+
+
+# How many projects the synthetic workspace has.
+_PROJECTS = 4
+
+# How many git commands a repo command may run: (per project, fixed).  When a
+# change makes a command run fewer, lower its budget to match.
+_BUDGETS = {
+    "status": (5, 2),
+    "sync -l": (3, 12),
+    "start topic --all": (3, 3),
+    "info": (3, 1),
+}
+
+
+@pytest.fixture(autouse=True)
+def _reset_stats():
+    git_stats.Take()
+    yield
+    git_stats.Take()
+
+
+class _Worker(Command):
+    """A command whose workers run git."""
+
+    @classmethod
+    def Work(cls, idx):
+        git_command.GitCommand(None, ["--version"], capture_stdout=True).Wait()
+        return idx
+
+
+def test_add() -> None:
+    """Check commands are totaled by command & project."""
+    git_stats.Add("rev-parse", "a", 1.0, 0.5)
+    git_stats.Add("rev-parse", "b", 2.0, 0.25)
+    git_stats.Add("fetch", "a", 3.0)
+    git_stats.Add("version", None, 0.5)
+
+    assert git_stats.ByCommand() == {
+        "rev-parse": git_stats.Stat(2, 3.0, 0.75),
+        "fetch": git_stats.Stat(1, 3.0, 0.0),
+        "version": git_stats.Stat(1, 0.5, 0.0),
+    }
+    assert git_stats.ByProject() == {
+        "a": git_stats.Stat(2, 4.0, 0.5),
+        "b": git_stats.Stat(1, 2.0, 0.25),
+        git_stats.NO_PROJECT: git_stats.Stat(1, 0.5, 0.0),
+    }
+    assert git_stats.Total() == git_stats.Stat(4, 6.5, 0.75)
+
+    lines = git_stats.Summary(limit=2)
+    assert lines[0] == "git\t4 commands, 6.500s wall, 0.750s cpu"
+    assert len(lines) == 3
+    assert lines[1].split()[:2] == ["rev-parse", "2"]
+
+
+def test_take_merge() -> None:
+    """Check stats can be handed from one process to another."""
+    git_stats.Add("fetch", "a", 1.0)
+    data = git_stats.Take()
+    assert git_stats.Total() == git_stats.Stat()
+
+    git_stats.Add("fetch", "b", 1.0)
+    git_stats.Merge(json.loads(json.dumps(data)))
+    git_stats.Merge(None)
+    assert git_stats.ByCommand() == {"fetch": git_stats.Stat(2, 2.0, 0.0)}
+    assert set(git_stats.ByProject()) == {"a", "b"}
+
+
+def test_git_command() -> None:
+    """Check GitCommand records what it runs."""
+    git_command.GitCommand(
+        None, ["-c", "a.b=c", "--no-pager", "version"], capture_stdout=True
+    ).Wait()
+    (stat,) = git_stats.ByCommand().values()
+    assert git_stats.ByCommand() == {"version": stat}
+    assert stat.count == 1
+    assert stat.wall > 0
+
+
+def test_workers() -> None:
+    """Check stats of parallel workers make it back to the parent."""
+
+    def _Callback(pool, output, results):
+        return sorted(results)
+
+    with _Worker.ParallelContext():
+        results = _Worker.ExecuteInParallel(
+            2, _Worker.Work, [1, 2, 3], _Callback, chunksize=2
+        )
+
+    assert results == [1, 2, 3]
+    assert git_stats.ByCommand()["--version"].count == 3
+
+
+def _Git(*args: str, cwd: Path) -> None:
+    subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True)
+
+
+def _Repo(topdir: Path, *args: str, **kwargs) -> None:
+    """Run repo from this checkout in |topdir|."""
+    ver = ".".join(str(x) for x in wrapper.Wrapper().VERSION)
+    subprocess.run(
+        [
+            sys.executable,
+            str(utils_for_test.THIS_DIR.parent / "main.py"),
+            f"--repo-dir={topdir / '.repo'}",
+            f"--wrapper-version={ver}",
+            f"--wrapper-path={wrapper.WrapperPath()}",
+            "--",
+            *args,
+        ],
+        cwd=topdir,
+        check=True,
+        capture_output=True,
+        **kwargs,
+    )
+
+
+@pytest.fixture(scope="module")
+def workspace(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    """Create a synced repo client with a few projects."""
+    upstream = tmp_path_factory.mktemp("upstream")
+    projects = []
+    for i in range(_PROJECTS):
+        utils_for_test.init_git_tree(upstream / f"p{i}")
+        _Git("commit", "-q", "--allow-empty", "-m", "A", cwd=upstream / f"p{i}")
+        projects.append(f'<project name="p{i}" path="src/p{i}" />')
+
+    manifests = upstream / "manifest"
+    utils_for_test.init_git_tree(manifests)
+    (manifests / "default.xml").write_text(
+        f"""<manifest>
+  <remote name="origin" fetch="{upstream.as_uri()}" />
+  <default remote="origin" revision="main" />
+  {"".join(projects)}
+</manifest>
+"""
+    )
+    _Git("add", "default.xml", cwd=manifests)
+    _Git("commit", "-q", "-m", "A", cwd=manifests)
+
+    topdir = tmp_path_factory.mktemp("client")
+    _Repo(topdir, "init", "-u", manifests.as_uri(), "--no-repo-verify")
+    # A recent (empty) repo project, so sync doesn't try to update it.
+    utils_for_test.init_git_tree(topdir / ".repo" / "repo")
+    (topdir / ".repo" / "repo" / ".git" / "FETCH_HEAD").touch()
+    _Repo(topdir, "sync", "-j1")
+    return topdir
+
+
+@pytest.fixture
+def git_budget(
+    workspace: Path, tmp_path: Path
+) -> Callable[[List[str], int, int], Dict[str, int]]:
+    """Check the number of git commands a repo command runs.
+
+    The budget is |per_project| commands for each project of the workspace,
+    plus |fixed| more.
+    """
+
+    def _Check(argv: List[str], per_project: int, fixed: int):
+        trace_dir = tmp_path / "trace2"
+        trace_dir.mkdir()
+        _Repo(
+            workspace,
+            f"--git-trace2-event-log={trace_dir}",
+            *argv,
+            env={**os.environ, "REPO_TRACE": "0"},
+        )
+
+        (log,) = trace_dir.iterdir()
+        events = [json.loads(x) for x in log.read_text().splitlines()]
+        (data,) = [x for x in events if x.get("key") == "git_stats/by_command"]
+        counts = {x[0]: x[1] for x in json.loads(data["value"])}
+        budget = per_project * _PROJECTS + fixed
+        assert sum(counts.values()) <= budget, (
+            f"`repo {' '.join(argv)}` ran {sum(counts.values())} git "
+            f"commands, over its budget of {budget}: {counts}"
+        )
+        return counts
+
+    return _Check
+
+
+@pytest.mark.parametrize("command", _BUDGETS)
+def test_budget(git_budget, command: str) -> None:
+    """Check repo commands don't run more git commands than they used to."""
+    counts = git_budget(command.split(), *_BUDGETS[command])
+    assert counts
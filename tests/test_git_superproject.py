@@ -17,6 +17,7 @@
 import json
 import os
 import platform
+import subprocess
 import tempfile
 import unittest
 from unittest import mock
@@ -214,8 +215,8 @@ class SuperprojectTestCase(unittest.TestCase):
                 self.assertFalse(sync_result.success)
                 self.assertTrue(sync_result.fatal)
 
-    def test_superproject_get_all_project_commit_ids_mock_ls_tree(self):
-        """Test with LsTree being a mock."""
+    def test_superproject_get_all_project_commit_ids_ls_tree(self):
+        """Test the commit ids are read from the superproject's gitlinks."""
         data = (
             "120000 blob 158258bdf146f159218e2b90f8b699c4d85b5804\tAndroid.bp\x00"
             "160000 commit 2c2724cb36cd5a9cec6c852c681efc3b7c6b86ea\tart\x00"
@@ -223,25 +224,49 @@ class SuperprojectTestCase(unittest.TestCase):
             "120000 blob acc2cbdf438f9d2141f0ae424cec1d8fc4b5d97f\tbootstrap.bash\x00"
             "160000 commit ade9b7a0d874e25fff4bf2552488825c6f111928\tbuild/bazel\x00"
         )
+        work_git = self._superproject._work_git
+        os.makedirs(work_git)
+
+        def _Git(*args, **kwargs):
+            return subprocess.run(
+                ["git", f"--git-dir={work_git}", *args],
+                check=True,
+                stdout=subprocess.PIPE,
+                encoding="utf-8",
+                **kwargs,
+            ).stdout.strip()
+
+        _Git("init", "-q", "--bare")
+        env = dict(os.environ, GIT_INDEX_FILE=os.path.join(work_git, "index"))
+        _Git("update-index", "-z", "--index-info", input=data, env=env)
+        tree = _Git("write-tree", "--missing-ok", env=env)
+        commit = _Git("commit-tree", "-m", "A", tree)
+        _Git("update-ref", "refs/heads/main", commit)
+
         with mock.patch.object(self._superproject, "_Init", return_value=True):
             with mock.patch.object(
                 self._superproject, "_Fetch", return_value=True
             ):
-                with mock.patch.object(
-                    self._superproject, "_LsTree", return_value=data
-                ):
-                    commit_ids_result = (
-                        self._superproject._GetAllProjectsCommitIds()
-                    )
-                    self.assertEqual(
-                        commit_ids_result.commit_ids,
-                        {
-                            "art": "2c2724cb36cd5a9cec6c852c681efc3b7c6b86ea",
-                            "bootable/recovery": "e9d25da64d8d365dbba7c8ee00fe8c4473fe9a06",
-                            "build/bazel": "ade9b7a0d874e25fff4bf2552488825c6f111928",
-                        },
-                    )
-                    self.assertFalse(commit_ids_result.fatal)
+                commit_ids_result = (
+                    self._superproject._GetAllProjectsCommitIds()
+                )
+                self.assertEqual(
+                    commit_ids_result.commit_ids,
+                    {
+                        "art": "2c2724cb36cd5a9cec6c852c681efc3b7c6b86ea",
+                        "bootable/recovery": "e9d25da64d8d365dbba7c8ee00fe8c4473fe9a06",
+                        "build/bazel": "ade9b7a0d874e25fff4bf2552488825c6f111928",
+                    },
+                )
+                self.assertFalse(commit_ids_result.fatal)
+
+                # A missing revision fails.
+                self._superproject.revision = "refs/heads/missing"
+                commit_ids_result = (
+                    self._superproject._GetAllProjectsCommitIds()
+                )
+                self.assertIsNone(commit_ids_result.commit_ids)
+                self.assertTrue(commit_ids_result.fatal)
 
     def test_superproject_write_manifest_file(self):
         """Test with writing manifest to a file after setting revisionId."""
@@ -269,10 +294,10 @@ class SuperprojectTestCase(unittest.TestCase):
         """Test with LsTree being a mock."""
         self.assertEqual(len(self._superproject._manifest.projects), 1)
         projects = self._superproject._manifest.projects
-        data = (
-            "160000 commit 2c2724cb36cd5a9cec6c852c681efc3b7c6b86ea\tart\x00"
-            "160000 commit e9d25da64d8d365dbba7c8ee00fe8c4473fe9a06\tbootable/recovery\x00"
-        )
+        data = {
+            "art": "2c2724cb36cd5a9cec6c852c681efc3b7c6b86ea",
+            "bootable/recovery": "e9d25da64d8d365dbba7c8ee00fe8c4473fe9a06",
+        }
         with mock.patch.object(self._superproject, "_Init", return_value=True):
             with mock.patch.object(
                 self._superproject, "_Fetch", return_value=True
@@ -359,7 +384,7 @@ class SuperprojectTestCase(unittest.TestCase):
         )
         self.assertEqual(len(self._superproject._manifest.projects), 2)
         projects = self._superproject._manifest.projects
-        data = "160000 commit 2c2724cb36cd5a9cec6c852c681efc3b7c6b86ea\tart\x00"
+        data = {"art": "2c2724cb36cd5a9cec6c852c681efc3b7c6b86ea"}
         with mock.patch.object(self._superproject, "_Init", return_value=True):
             with mock.patch.object(
                 self._superproject, "_Fetch", return_value=True
@@ -421,10 +446,10 @@ class SuperprojectTestCase(unittest.TestCase):
         )
         self.assertEqual(len(self._superproject._manifest.projects), 3)
         projects = self._superproject._manifest.projects
-        data = (
-            "160000 commit 2c2724cb36cd5a9cec6c852c681efc3b7c6b86ea\tart\x00"
-            "160000 commit e9d25da64d8d365dbba7c8ee00fe8c4473fe9a06\tvendor/x\x00"
-        )
+        data = {
+            "art": "2c2724cb36cd5a9cec6c852c681efc3b7c6b86ea",
+            "vendor/x": "e9d25da64d8d365dbba7c8ee00fe8c4473fe9a06",
+        }
         with mock.patch.object(self._superproject, "_Init", return_value=True):
             with mock.patch.object(
                 self._superproject, "_Fetch", return_value=True
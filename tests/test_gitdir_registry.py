@@ -0,0 +1,45 @@
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unittests for the gitdir_registry.py module."""
+
+import os
+from pathlib import Path
+
+import gitdir_registry
+
+
+def test_registry(tmp_path: Path) -> None:
+    """Check the registry is only used once it is complete."""
+    repodir = str(tmp_path)
+    a = os.path.join(repodir, "projects", "a.git")
+    b = os.path.join(repodir, "project-objects", "b.git")
+
+    assert gitdir_registry.Load(repodir) is None
+    gitdir_registry.Register(repodir, [a])
+    assert gitdir_registry.Load(repodir) is None
+
+    gitdir_registry.Save(repodir, {a})
+    gitdir_registry.Register(repodir, [b, a])
+    assert gitdir_registry.Load(repodir) == {a, b}
+
+
+def test_scan(tmp_path: Path) -> None:
+    """Check the scan finds git dirs without looking inside them."""
+    for path in ("a.git/objects", "a.git/x.git", "dir/b.git", "dir/c"):
+        (tmp_path / path).mkdir(parents=True)
+    assert gitdir_registry.Scan(str(tmp_path)) == {
+        str(tmp_path / "a.git"),
+        str(tmp_path / "dir" / "b.git"),
+    }
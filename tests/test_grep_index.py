@@ -0,0 +1,161 @@
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unittests for the grep_index.py module."""
+
+import os
+import subprocess
+import unittest
+from unittest import mock
+
+import utils_for_test
+
+import grep_index
+import subcmds
+
+
+class RequiredLiteralsTests(unittest.TestCase):
+    """Check RequiredLiterals behavior."""
+
+    def test_fixed(self):
+        self.assertEqual(
+            ["a.b*c"], grep_index.RequiredLiterals("a.b*c", fixed=True)
+        )
+
+    def test_regex(self):
+        tests = (
+            ("foobar", ["foobar"]),
+            ("foo.bar", ["foo", "bar"]),
+            ("fooo*bar", ["foo", "bar"]),
+            ("fooo?bar", ["foo", "bar"]),
+            ("fooo{2}bar", ["foo", "bar"]),
+            ("foo[]x]bar", ["foo", "bar"]),
+            ("foo[^]x]bar", ["foo", "bar"]),
+            ("foo[[:alpha:]x]bar", ["foo", "bar"]),
+            ("^foo+bar$", ["foo", "bar"]),
+            ("ab.cd", None),
+            ("foo|bar", None),
+            ("(foo)*", None),
+            ("foo\\.bar", None),
+        )
+        for pattern, expected in tests:
+            with self.subTest(pattern=pattern):
+                self.assertEqual(expected, grep_index.RequiredLiterals(pattern))
+
+
+class IndexQueryTests(unittest.TestCase):
+    """Check Grep._IndexQuery behavior."""
+
+    def test_query(self):
+        query = subcmds.grep.Grep._IndexQuery
+        self.assertEqual(
+            ([["foo"], ["barbaz"]], True, False),
+            query(["grep", "-i", "-C", "-v", "-e", "foo", "-e", "barbaz"]),
+        )
+        self.assertIsNone(query(["grep", "-v", "-e", "foobar"]))
+        self.assertIsNone(query(["grep", "-e", "fo"]))
+
+
+class GrepIndexTests(unittest.TestCase):
+    """Check GrepIndex behavior."""
+
+    def test_index(self):
+        with utils_for_test.TempGitTree() as tempdir:
+            gitdir = os.path.join(tempdir, ".git")
+            project = mock.MagicMock(
+                gitdir=gitdir, objdir=gitdir, worktree=tempdir
+            )
+
+            def git(*args):
+                return subprocess.check_output(
+                    ["git", "-C", tempdir] + list(args), encoding="utf-8"
+                ).strip()
+
+            files = {
+                "a.txt": "Hello World\n",
+                "dir/b.txt": "goodbye world\n",
+                "c.bin": "\0Hello\0",
+                "big.txt": "x" * 100,
+            }
+            for path, content in files.items():
+                os.makedirs(
+                    os.path.dirname(os.path.join(tempdir, path)), exist_ok=True
+                )
+                with open(os.path.join(tempdir, path), "w") as fp:
+                    fp.write(content)
+            git("add", ".")
+            git("commit", "-qm", "init")
+            tree = git("rev-parse", "HEAD^{tree}")
+
+            index = grep_index.GrepIndex(project)
+            self.assertFalse(index.Exists)
+            self.assertEqual(tree, index.HeadTree())
+            with mock.patch.object(grep_index, "_MAX_BLOB_SIZE", 50):
+                self.assertTrue(index.Update(tree))
+                self.assertTrue(index.Exists)
+                self.assertTrue(index.HasTree(tree))
+
+                # Big files can't be ruled out.
+                self.assertEqual(
+                    ["a.txt", "big.txt", "c.bin"],
+                    index.Candidates(tree, [["hello"]]),
+                )
+
+                with open(os.path.join(tempdir, "a.txt"), "a") as fp:
+                    fp.write("more\n")
+                git("commit", "-qam", "more")
+                new_tree = index.HeadTree()
+                self.assertTrue(index.Update())
+                self.assertTrue(index.HasTree(new_tree))
+
+            self.assertEqual(
+                ["a.txt", "big.txt", "c.bin"],
+                index.Candidates(new_tree, [["HELLO"]], ignore_case=True),
+            )
+            self.assertEqual(
+                ["a.txt", "big.txt", "dir/b.txt"],
+                index.Candidates(new_tree, [["world"], ["more"]]),
+            )
+            self.assertEqual(
+                ["big.txt"], index.Candidates(new_tree, [["hello", "bye"]])
+            )
+            self.assertEqual(["big.txt"], index.Candidates(tree, [["more"]]))
+
+            self.assertEqual([], index.LocalChanges())
+            with open(os.path.join(tempdir, "dir/b.txt"), "w") as fp:
+                fp.write("changed")
+            self.assertEqual(["dir/b.txt"], index.LocalChanges())
+            self.assertEqual([], index.LocalChanges(cached=True))
+
+    def test_prune(self):
+        with utils_for_test.TempGitTree() as tempdir:
+            gitdir = os.path.join(tempdir, ".git")
+            project = mock.MagicMock(
+                gitdir=gitdir, objdir=gitdir, worktree=tempdir
+            )
+            index = grep_index.GrepIndex(project)
+            trees = []
+            with mock.patch.object(grep_index, "_MAX_TREES", 2):
+                for i in range(3):
+                    with open(os.path.join(tempdir, "file"), "w") as fp:
+                        fp.write("content %d" % i)
+                    subprocess.check_call(["git", "-C", tempdir, "add", "."])
+                    subprocess.check_call(
+                        ["git", "-C", tempdir, "commit", "-qm", str(i)]
+                    )
+                    trees.append(index.HeadTree())
+                    index.Update()
+            self.assertFalse(index.HasTree(trees[0]))
+            self.assertTrue(index.HasTree(trees[1]))
+            self.assertTrue(index.HasTree(trees[2]))
@@ -15,7 +15,9 @@
 """Unittests for the hooks.py module."""
 
 from io import StringIO
+from pathlib import Path
 import sys
+from unittest import mock
 
 import pytest
 
@@ -105,3 +107,71 @@ def test_post_sync_argument_validation() -> None:
 
     finally:
         sys.stderr = old_stderr
+
+
+def test_hook_result_cache(tmp_path: Path) -> None:
+    """Passes are remembered until they expire or are cleared."""
+    cache = hooks.HookResultCache(str(tmp_path))
+    key = cache.Key("pre-upload", "hash", "proj", "/wt", ["a", "b"], {})
+    assert key != cache.Key("pre-upload", "hash", "proj", "/wt", ["b"], {})
+    assert key != cache.Key("pre-upload", "new", "proj", "/wt", ["a", "b"], {})
+
+    assert not cache.Passed(key)
+    cache.AddPass(key)
+    assert cache.Passed(key)
+    with mock.patch.object(hooks.HookResultCache, "_MAX_AGE", -1):
+        assert not cache.Passed(key)
+
+    cache.Clear()
+    assert not cache.Passed(key)
+
+
+def test_run_cached(tmp_path: Path) -> None:
+    """Only projects whose commits changed are checked again."""
+    hooks_project = mock.MagicMock(
+        worktree=str(tmp_path), enabled_repo_hooks=["pre-upload"]
+    )
+    hook = hooks.RepoHook(
+        hook_type="pre-upload",
+        hooks_project=hooks_project,
+        repo_topdir=str(tmp_path),
+        manifest_url="https://gerrit",
+        allow_all_hooks=True,
+    )
+    cache = hooks.HookResultCache(str(tmp_path / ".repo"))
+    checked = []
+    failing = set()
+
+    def _ExecuteHook(project_list, worktree_list):
+        checked.append(project_list)
+        if failing & set(project_list):
+            raise hooks.HookError("rejected")
+
+    def _Run(commits):
+        return hook.RunCached(
+            cache,
+            commits,
+            project_list=["a", "b"],
+            worktree_list=["/a", "/b"],
+        )
+
+    with mock.patch.object(hook, "_CheckHook"), mock.patch.object(
+        hook, "_GetHash", return_value="hash"
+    ), mock.patch.object(hook, "_ExecuteHook", side_effect=_ExecuteHook):
+        assert _Run([["1"], ["2"]])
+        assert _Run([["1"], ["2"]])
+        assert _Run([["1"], ["3"]])
+        assert checked == [["a", "b"], ["b"]]
+
+        # Rejected results aren't cached.
+        failing.add("b")
+        assert not _Run([["1"], ["4"]])
+        assert not _Run([["1"], ["4"]])
+        assert checked[2:] == [["b"], ["b"]]
+
+        # Nor are results that were ignored.
+        hook._ignore_hooks = True
+        assert _Run([["1"], ["4"]])
+        failing.clear()
+        assert _Run([["1"], ["4"]])
+        assert checked[4:] == [["b"], ["b"]]
@@ -14,13 +14,37 @@
 
 """Tests for the main repo script and subcommand routing."""
 
+import subprocess
+import sys
 from unittest import mock
 
 import pytest
+import utils_for_test
 
 from main import _Repo
 
 
+# Modules that only some commands (or network access) need, so simple commands
+# shouldn't pay for importing them.
+_HEAVY_MODULES = (
+    "difflib",
+    "getpass",
+    "http.client",
+    "http.cookiejar",
+    "netrc",
+    "ssl",
+    "subcmds.init",
+    "subcmds.sync",
+    "subcmds.upload",
+    "urllib.request",
+    "xmlrpc.client",
+)
+
+# The most importing main & a simple command may take (in microseconds).
+# This is far above what it takes, so it only catches big regressions.
+_MAX_STARTUP_IMPORT_US = 1000000
+
+
 @pytest.fixture(name="repo")
 def fixture_repo():
     repo = _Repo("repodir")
@@ -164,3 +188,35 @@ def test_autocorrect_prompt_interrupt(mock_input, repo, mock_config):
     res = repo._autocorrect_command_name("tart", mock_config)
 
     assert res is None
+
+
+@pytest.mark.parametrize("name", ("list", "status", "forall"))
+def test_startup_imports(name):
+    """Check simple commands only import what they need."""
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            f"import main; main.all_commands[{name!r}]",
+        ],
+        cwd=utils_for_test.THIS_DIR.parent,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        encoding="utf-8",
+        check=True,
+    )
+
+    # Lines look like "import time: <self> | <cumulative> | <module>".
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[1].strip().isdigit():
+            cumulative[fields[2].strip()] = int(fields[1])
+
+    assert f"subcmds.{name}" in cumulative
+    assert [] == [x for x in _HEAVY_MODULES if x in cumulative]
+    assert sum(cumulative[x] for x in ("main", f"subcmds.{name}")) < (
+        _MAX_STARTUP_IMPORT_US
+    )
@@ -14,11 +14,14 @@
 
 """Unittests for the manifest_xml.py module."""
 
+import importlib
 import os
 from pathlib import Path
 import platform
 import re
+import sys
 import xml.dom.minidom
+import xml.etree.ElementTree
 
 import pytest
 
@@ -395,6 +398,28 @@ class TestXmlManifest:
         assert len(manifest.projects) == 1
         assert manifest.projects[0].name == "test-project"
 
+    def test_parse_pure_python_elementtree(
+        self, repo_client: RepoClient, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """Check attributes are kept without the C accelerator."""
+        monkeypatch.setitem(sys.modules, "_elementtree", None)
+        monkeypatch.delitem(sys.modules, "xml.etree.ElementTree")
+        # Importing it again rebinds the package's attribute.
+        monkeypatch.setattr(xml.etree, "ElementTree", xml.etree.ElementTree)
+        pure = importlib.import_module("xml.etree.ElementTree")
+        monkeypatch.setattr(manifest_xml, "ElementTree", pure)
+        manifest = repo_client.get_xml_manifest(
+            """
+<manifest>
+  <remote name="test-remote" fetch="http://localhost" />
+  <default remote="test-remote" revision="refs/heads/main" />
+  <project name="test-project" path="src/test-project"/>
+</manifest>
+"""
+        )
+        assert manifest.projects[0].name == "test-project"
+        assert manifest.projects[0].relpath == "src/test-project"
+
     def test_sync_j_max(self, repo_client: RepoClient) -> None:
         """Check sync-j-max handling."""
         # Check valid value.
@@ -489,6 +514,36 @@ class TestIncludeElement:
             if proj.name == "man2-name2":
                 assert proj.revisionExpr == "stable-branch3"
 
+    def test_cache(self, repo_client: RepoClient) -> None:
+        """Check included files are only parsed again when they change."""
+        include = repo_client.manifest_dir / "projects.xml"
+        include.write_text('<manifest><project name="a" /></manifest>')
+
+        def load(revision: str) -> manifest_xml.XmlManifest:
+            return repo_client.get_xml_manifest(
+                f"""
+<manifest>
+  <remote name="test-remote" fetch="http://localhost" />
+  <default remote="test-remote" revision="refs/heads/main" />
+  <include name="projects.xml" revision="{revision}" groups="g" />
+</manifest>
+"""
+            )
+
+        manifest = load("r1")
+        assert [x.revisionExpr for x in manifest.projects] == ["r1"]
+        root = manifest_xml._xml_cache[str(include)][1]
+
+        # The cached elements aren't changed by the include's attributes.
+        manifest = load("r2")
+        assert [x.revisionExpr for x in manifest.projects] == ["r2"]
+        assert manifest_xml._xml_cache[str(include)][1] is root
+        assert not root.childNodes[0].hasAttribute("revision")
+
+        include.write_text('<manifest><project name="b" /></manifest>')
+        manifest = load("r2")
+        assert [x.name for x in manifest.projects] == ["b"]
+
     def test_group_levels(self, repo_client: RepoClient) -> None:
         """Check handling of nested include groups."""
         root_m = repo_client.manifest_dir / "root.xml"
@@ -15,6 +15,7 @@
 """Unittests for the project.py module."""
 
 import contextlib
+import io
 import os
 from pathlib import Path
 import shutil
@@ -104,6 +105,189 @@ class ProjectTests(unittest.TestCase):
             "abcd00%21%21_%2b",
         )
 
+    def test_scan_branches(self):
+        """Check ScanBranches finds the commits of all branches at once."""
+        with utils_for_test.TempGitTree() as tempdir:
+            proj = _create_mock_project(tempdir)
+            proj.config = git_config.GitConfig.ForRepository(gitdir=proj.gitdir)
+
+            def git(*args):
+                subprocess.check_call(["git", "-C", tempdir] + list(args))
+
+            def track(branch):
+                git("config", f"branch.{branch}.remote", ".")
+                git("config", f"branch.{branch}.merge", "refs/heads/main")
+
+            git("commit", "-q", "--allow-empty", "-m", "A")
+            git("checkout", "-q", "-b", "work1")
+            git("commit", "-q", "--allow-empty", "-m", "B")
+            git("branch", "work2")
+            git("commit", "-q", "--allow-empty", "-m", "C")
+            git("checkout", "-q", "work2")
+            git("commit", "-q", "--allow-empty", "-m", "D")
+            git("branch", "work3", "main")
+            git("branch", "untracked")
+            for branch in ("work1", "work2", "work3"):
+                track(branch)
+            git("update-ref", "refs/published/work1", "work1")
+
+            branches = {x.name: x for x in proj.ScanBranches()}
+            self.assertEqual({"work1", "work2"}, set(branches))
+            for name, summaries in (("work1", "BC"), ("work2", "BD")):
+                rb = branches[name]
+                self.assertEqual(
+                    list(summaries), [x.split()[1] for x in rb.commits]
+                )
+                # The batched scan agrees with checking the branch by itself.
+                lazy = project.ReviewableBranch(
+                    FakeProject(tempdir), rb.branch, rb.base
+                )
+                self.assertEqual(lazy.commits, rb.commits)
+                self.assertEqual(lazy.date, rb.date)
+
+            self.assertEqual(
+                ["work2"], [x.name for x in proj.GetUploadableBranches()]
+            )
+            self.assertEqual("work1", proj.GetUploadableBranch("work1").name)
+            self.assertIsNone(proj.GetUploadableBranch("work3"))
+
+    def test_start_and_prune_branches(self):
+        """Check starting & pruning branches with batched ref updates."""
+        with utils_for_test.TempGitTree() as tempdir:
+            proj = _create_mock_project(tempdir)
+            proj.config = git_config.GitConfig.ForRepository(gitdir=proj.gitdir)
+            proj.bare_git = project.Project._GitGetByExec(
+                proj, bare=True, gitdir=proj.gitdir
+            )
+
+            def git(*args):
+                return subprocess.check_output(
+                    ["git", "-C", tempdir] + list(args), encoding="utf-8"
+                ).strip()
+
+            git("commit", "-q", "--allow-empty", "-m", "A")
+            proj.revisionId = git("rev-parse", "HEAD")
+            git("checkout", "-q", "--detach")
+
+            self.assertTrue(proj.StartBranch("topic"))
+            self.assertEqual("topic", proj.CurrentBranch)
+            self.assertEqual(proj.revisionId, git("rev-parse", "topic"))
+            self.assertEqual(
+                "refs/heads/main", git("config", "branch.topic.merge")
+            )
+
+            git("branch", "work")
+            git("branch", "ahead")
+            git("checkout", "-q", "ahead")
+            git("commit", "-q", "--allow-empty", "-m", "B")
+            git("checkout", "-q", "topic")
+            git("update-ref", "refs/published/topic", "topic")
+            git("update-ref", "refs/published/ahead", "ahead")
+
+            kept = proj.PruneHeads()
+            self.assertEqual(["ahead"], [x.name for x in kept])
+            self.assertIsNone(proj.CurrentBranch)
+            self.assertEqual(
+                ["refs/heads/ahead", "refs/published/ahead"],
+                git("for-each-ref", "--format=%(refname)").split(),
+            )
+
+    def test_prune_branches_with_other_upstream(self):
+        """Check branches are pruned against their own upstream."""
+        with utils_for_test.TempGitTree() as tempdir:
+            proj = _create_mock_project(tempdir)
+            proj.config = git_config.GitConfig.ForRepository(gitdir=proj.gitdir)
+            proj.bare_git = project.Project._GitGetByExec(
+                proj, bare=True, gitdir=proj.gitdir
+            )
+
+            def git(*args):
+                return subprocess.check_output(
+                    ["git", "-C", tempdir] + list(args), encoding="utf-8"
+                ).strip()
+
+            def track(branch, upstream):
+                git("config", f"branch.{branch}.remote", "origin")
+                git(
+                    "config", f"branch.{branch}.merge", f"refs/heads/{upstream}"
+                )
+
+            git("config", "remote.origin.url", "http://example.com/repo")
+            git(
+                "config",
+                "remote.origin.fetch",
+                "+refs/heads/*:refs/remotes/origin/*",
+            )
+            git("commit", "-q", "--allow-empty", "-m", "A")
+            git("update-ref", "refs/remotes/origin/release", "HEAD")
+            git("commit", "-q", "--allow-empty", "-m", "B")
+            proj.revisionId = git("rev-parse", "HEAD")
+            git("checkout", "-q", "--detach")
+            git("branch", "-D", "main")
+            git("branch", "fix")
+            git("branch", "plain")
+            git("commit", "-q", "--allow-empty", "-m", "C")
+            git("update-ref", "refs/remotes/origin/feature", "HEAD")
+            git("branch", "done")
+            # Merged into the revision, but not into its upstream.
+            track("fix", "release")
+            # Merged into its upstream, but not into the revision.
+            track("done", "feature")
+            # Its upstream hasn't been fetched, so the revision is used.
+            track("plain", "missing")
+
+            kept = proj.PruneHeads()
+            self.assertEqual(["fix"], [x.name for x in kept])
+            self.assertEqual(
+                ["refs/heads/fix"],
+                git(
+                    "for-each-ref", "--format=%(refname)", "refs/heads/"
+                ).split(),
+            )
+
+    def test_upload_for_review(self):
+        """Check UploadForReview pushes to the review server."""
+        with utils_for_test.TempGitTree() as tempdir:
+            proj = _create_mock_project(tempdir)
+            proj.config = git_config.GitConfig.ForRepository(gitdir=proj.gitdir)
+            proj.bare_git = project.Project._GitGetByExec(
+                proj, bare=True, gitdir=proj.gitdir
+            )
+            server = os.path.join(tempdir, "server.git")
+            subprocess.check_call(["git", "init", "-q", "--bare", server])
+
+            def git(*args):
+                subprocess.check_call(["git", "-C", tempdir] + list(args))
+
+            git("commit", "-q", "--allow-empty", "-m", "A")
+            git("checkout", "-q", "-b", "work")
+            git("commit", "-q", "--allow-empty", "-m", "B")
+            git("config", "remote.origin.review", "review.example.com")
+            git("config", "remote.origin.projectname", "test-project")
+            git(
+                "config",
+                "remote.origin.fetch",
+                "+refs/heads/*:refs/remotes/origin/*",
+            )
+            git("config", "branch.work.remote", "origin")
+            git("config", "branch.work.merge", "main")
+
+            output = io.StringIO()
+            with mock.patch.object(
+                git_config.Remote, "ReviewUrl", return_value=server
+            ):
+                proj.UploadForReview(branch="work", output=output)
+            self.assertIn("refs/for/main", output.getvalue())
+            head = proj.bare_git.rev_parse("refs/heads/work")
+            self.assertEqual(
+                head,
+                subprocess.check_output(
+                    ["git", "-C", server, "rev-parse", "refs/for/main"],
+                    encoding="utf-8",
+                ).strip(),
+            )
+            self.assertEqual(head, proj.WasPublished("work"))
+
     def test_get_head_revision_id(self):
         """Check GetHeadRevisionId behavior."""
         with utils_for_test.TempGitTree() as tempdir:
@@ -232,6 +416,101 @@ class ProjectTests(unittest.TestCase):
                 )
 
 
+class GitmodulesTests(unittest.TestCase):
+    """Check _ParseGitmodules behavior."""
+
+    def test_basic(self):
+        text = """
+# A comment.
+[submodule "foo"]
+\tpath = src/foo
+\turl = ../foo.git
+[submodule "bar baz"]
+\tpath = "src/bar baz" ; trailing comment
+\turl = https://example.com/bar
+\tshallow = true
+"""
+        self.assertEqual(
+            {
+                "foo": {"path": "src/foo", "url": "../foo.git"},
+                "bar baz": {
+                    "path": "src/bar baz",
+                    "url": "https://example.com/bar",
+                    "shallow": "true",
+                },
+            },
+            project._ParseGitmodules(text),
+        )
+
+    def test_syntax(self):
+        """Check less common git config syntax."""
+        text = """
+[Submodule "a"] PATH = a
+[core]
+\tpath = ignored
+[submodule.b]
+\tpath = b\\
+continued
+\tshallow
+[submodule "c\\"d"]
+\turl = x\\ty
+"""
+        self.assertEqual(
+            {
+                "a": {"path": "a"},
+                "b": {"path": "bcontinued", "shallow": "true"},
+                'c"d': {"url": "x\ty"},
+            },
+            project._ParseGitmodules(text),
+        )
+
+
+class SubmodulesCacheTests(unittest.TestCase):
+    """Check _GetSubmodules caching."""
+
+    def setUp(self):
+        project._SUBMODULES_CACHE.clear()
+        self.addCleanup(project._SUBMODULES_CACHE.clear)
+
+    def test_cache(self):
+        with utils_for_test.TempGitTree() as tempdir:
+            proj = _create_mock_project(tempdir)
+            del proj.bare_git
+
+            def git(*args):
+                return subprocess.check_output(
+                    ["git", "-C", tempdir] + list(args), encoding="utf-8"
+                ).strip()
+
+            with open(os.path.join(tempdir, ".gitmodules"), "w") as fp:
+                fp.write(
+                    '[submodule "sub"]\n'
+                    "\tpath = sub\n"
+                    "\turl = ../sub\n"
+                    '[submodule "missing"]\n'
+                    "\tpath = missing\n"
+                    "\turl = ../missing\n"
+                )
+            subrev = "1234567890123456789012345678901234567890"
+            git("add", ".gitmodules")
+            git("update-index", "--add", "--cacheinfo", f"160000,{subrev},sub")
+            git("commit", "-qm", "init")
+            rev = git("rev-parse", "HEAD")
+
+            expected = [(subrev, "sub", "../sub", "")]
+            with mock.patch.object(proj, "GetRevisionId", return_value=rev):
+                self.assertEqual(expected, proj._GetSubmodules())
+                self.assertTrue(os.path.exists(proj._submodules_cache_file))
+
+                # Later lookups should not need to run git at all.
+                with mock.patch.object(
+                    project, "GitCommand", side_effect=AssertionError
+                ):
+                    self.assertEqual(expected, proj._GetSubmodules())
+                    project._SUBMODULES_CACHE.clear()
+                    self.assertEqual(expected, proj._GetSubmodules())
+
+
 class CopyLinkTestCase(unittest.TestCase):
     """TestCase for stub repo client checkouts.
 
@@ -788,6 +1067,52 @@ class ManifestPropertiesFetchedCorrectly(unittest.TestCase):
                         self.assertFalse(os.path.exists(proj.worktree))
                         self.assertFalse(os.path.exists(proj.gitdir))
 
+    def test_delete_worktree_keeps_nested_clone(self):
+        """Test DeleteWorktree keeps a clone nested in it repo doesn't know."""
+        with utils_for_test.TempGitTree() as tempdir:
+            proj = _create_mock_project(tempdir)
+            proj.worktree = os.path.join(tempdir, "worktree")
+            proj.gitdir = os.path.join(tempdir, "gitdir")
+            os.makedirs(proj.gitdir)
+            clone = os.path.join(proj.worktree, "sub", "clone")
+            os.makedirs(os.path.join(clone, ".git"))
+            with open(os.path.join(clone, "file"), "w") as fp:
+                fp.write("mine")
+            with open(os.path.join(proj.worktree, "file"), "w") as fp:
+                fp.write("obsolete")
+
+            with mock.patch.object(proj, "IsDirty", return_value=False):
+                self.assertTrue(proj.DeleteWorktree())
+
+            self.assertFalse(
+                os.path.exists(os.path.join(proj.worktree, "file"))
+            )
+            self.assertTrue(os.path.exists(os.path.join(clone, "file")))
+            trashed = os.listdir(os.path.join(tempdir, ".repo", "trash"))
+            self.assertFalse([x for x in trashed if x.endswith("-worktree")])
+
+    def test_nested_checkout_known_projects(self):
+        """Test projects nested in a worktree are found without a walk."""
+        with utils_for_test.TempGitTree() as tempdir:
+            manifest = mock.MagicMock()
+            manifest.outer_client.topdir = tempdir
+            manifest.outer_client.all_paths = {"old": None, "sub/old/new": None}
+            old = os.path.join(tempdir, "old")
+            sub_old = os.path.join(tempdir, "sub", "old")
+            os.makedirs(old)
+            os.makedirs(sub_old)
+
+            with mock.patch.object(platform_utils, "walk") as walk:
+                self.assertTrue(project._HasNestedCheckout(manifest, sub_old))
+                walk.assert_not_called()
+
+            # A project whose path merely starts with the worktree's isn't in
+            # it.
+            manifest.outer_client.all_paths = {"old": None, "older": None}
+            self.assertFalse(project._HasNestedCheckout(manifest, old))
+            os.makedirs(os.path.join(old, "clone", ".git"))
+            self.assertTrue(project._HasNestedCheckout(manifest, old))
+
 
 def _create_mock_project(
     tempdir,
@@ -809,6 +1134,8 @@ def _create_mock_project(
     manifest.is_multimanifest = False
     manifest.IsMirror = False
     manifest.topdir = tempdir
+    manifest.repodir = os.path.join(tempdir, ".repo")
+    manifest.paths = {}
 
     remote = mock.MagicMock()
     remote.name = "origin"
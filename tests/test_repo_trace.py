@@ -14,6 +14,7 @@
 
 """Unittests for the repo_trace.py module."""
 
+import multiprocessing
 import os
 
 import pytest
@@ -21,31 +22,105 @@ import pytest
 import repo_trace
 
 
+def _Size(path: str) -> int:
+    repo_trace.Flush()
+    return os.path.getsize(path)
+
+
 def test_trace_max_size_enforced(monkeypatch: pytest.MonkeyPatch) -> None:
     """Check Trace behavior."""
     content = "git chicken"
+    old_file = repo_trace._TRACE_FILE + repo_trace._OLD_TRACE_SUFFIX
 
     with repo_trace.Trace(content, first_trace=True):
         pass
-    first_trace_size = os.path.getsize(repo_trace._TRACE_FILE)
+    first_trace_size = _Size(repo_trace._TRACE_FILE)
 
-    with repo_trace.Trace(content):
+    with repo_trace.Trace(content, first_trace=True):
         pass
-    assert os.path.getsize(repo_trace._TRACE_FILE) > first_trace_size
+    assert _Size(repo_trace._TRACE_FILE) == first_trace_size * 2
+    assert not os.path.exists(old_file)
 
-    # Check we clear everything if the last chunk is larger than _MAX_SIZE.
+    # Check the file is rotated when it's too big.
     monkeypatch.setattr(repo_trace, "_MAX_SIZE", 0)
     with repo_trace.Trace(content, first_trace=True):
         pass
-    assert os.path.getsize(repo_trace._TRACE_FILE) == first_trace_size
+    assert _Size(repo_trace._TRACE_FILE) == first_trace_size
+    assert _Size(old_file) == first_trace_size * 2
 
-    # Check we only clear the chunks we need to.
+    # Check it's only rotated when it's over the limit.
     new_max = (first_trace_size + 1) / (1024 * 1024)
     monkeypatch.setattr(repo_trace, "_MAX_SIZE", new_max)
     with repo_trace.Trace(content, first_trace=True):
         pass
-    assert os.path.getsize(repo_trace._TRACE_FILE) == first_trace_size * 2
+    assert _Size(repo_trace._TRACE_FILE) == first_trace_size * 2
 
     with repo_trace.Trace(content, first_trace=True):
         pass
-    assert os.path.getsize(repo_trace._TRACE_FILE) == first_trace_size * 2
+    assert _Size(repo_trace._TRACE_FILE) == first_trace_size
+    assert _Size(old_file) == first_trace_size * 2
+
+
+def test_buffered() -> None:
+    """Check records are only written when flushed."""
+    with repo_trace.Trace("git chicken", first_trace=True):
+        pass
+    assert not os.path.exists(repo_trace._TRACE_FILE)
+
+    repo_trace.Flush()
+    with open(repo_trace._TRACE_FILE) as f:
+        lines = [x for x in f.read().splitlines() if x]
+    assert len(lines) == 2
+    assert lines[0].startswith(f"PID: {os.getpid()} START: ")
+    assert lines[1].startswith(f"PID: {os.getpid()} END: ")
+    assert lines[1].endswith(" git chicken")
+
+
+def test_flush_size(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Check records are written once enough of them are queued."""
+    monkeypatch.setattr(repo_trace, "_FLUSH_SIZE", 1)
+    with repo_trace.Trace("git chicken"):
+        assert os.path.getsize(repo_trace._TRACE_FILE)
+
+
+def _TraceMany(worker: int) -> None:
+    for i in range(200):
+        with repo_trace.Trace("worker %d record %d %s", worker, i, "x" * 500):
+            pass
+    repo_trace.Flush()
+
+
+def test_processes(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Check records of parallel processes don't interleave."""
+    monkeypatch.setattr(repo_trace, "_FLUSH_SIZE", 4096)
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=_TraceMany, args=(x,)) for x in range(4)]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join()
+        assert proc.exitcode == 0
+
+    with open(repo_trace._TRACE_FILE) as f:
+        lines = [x for x in f.read().splitlines() if x]
+    assert len(lines) == 4 * 200 * 2
+    pids = {x.pid for x in procs}
+    for line in lines:
+        pid, rest = line[len("PID: ") :].split(" ", 1)
+        assert int(pid) in pids
+        assert rest.endswith(" " + "x" * 500)
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_fork() -> None:
+    """Check records are written before forking, e.g. to exec the pager."""
+    with repo_trace.Trace("git chicken", first_trace=True):
+        pass
+    pid = os.fork()
+    if not pid:
+        # Like the pager, exit without writing anything.
+        os._exit(0)
+    os.waitpid(pid, 0)
+
+    with open(repo_trace._TRACE_FILE) as f:
+        assert f.read().count(repo_trace._NEW_COMMAND_SEP) == 2
@@ -0,0 +1,76 @@
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unittests for the spool.py module."""
+
+import multiprocessing
+from pathlib import Path
+
+import spool
+
+
+def test_spool_in_memory(tmp_path: Path) -> None:
+    """Small outputs stay in memory."""
+    output = spool.Spool(str(tmp_path / "0"))
+    assert not output
+    output.write(b"data")
+    assert output
+    assert output.result() == (b"data", False)
+    assert not (tmp_path / "0").exists()
+
+    reader = spool.SpoolReader(str(tmp_path))
+    assert list(reader.Finish(0, b"data", False)) == [b"data"]
+
+
+def test_spool_spills(tmp_path: Path) -> None:
+    """Large outputs are spilled to disk & can be read while being written."""
+    path = tmp_path / "0"
+    output = spool.Spool(str(path))
+    output.write(b"x" * 10)
+    assert not path.exists()
+    output.write(b"y" * spool.MAX_MEMORY)
+    assert path.exists()
+
+    reader = spool.SpoolReader(str(tmp_path))
+    head = b"".join(reader.Tail(0))
+    assert head == b"x" * 10 + b"y" * spool.MAX_MEMORY
+    output.write(b"z")
+    data, spilled = output.result()
+    assert (data, spilled) == (b"", True)
+    assert b"".join(reader.Finish(0, data, spilled)) == b"z"
+    assert not path.exists()
+
+
+def test_ordered_results() -> None:
+    """Results are yielded in order, with callbacks while waiting."""
+    waits = []
+
+    class FakeResults:
+        def __init__(self):
+            self.calls = 0
+
+        def next(self, timeout=None):
+            self.calls += 1
+            if self.calls == 1:
+                raise multiprocessing.TimeoutError()
+            return self.calls
+
+    results = list(
+        spool.OrderedResults(object(), FakeResults(), 2, waits.append)
+    )
+    assert results == [(0, 2), (1, 3)]
+    assert waits == [0]
+
+    results = list(spool.OrderedResults(None, iter("ab"), 2, waits.append))
+    assert results == [(0, "a"), (1, "b")]
@@ -34,6 +34,26 @@ def test_required_basic(cmd: str) -> None:
     assert cmd in subcmds.all_commands
 
 
+def test_lazy_commands() -> None:
+    """Check commands are only imported when they are looked up."""
+    commands = subcmds._Commands()
+    commands.AddModule("branch", "branches")
+    commands.AddModule("cherry-pick", "cherry_pick")
+    assert ["branch", "cherry-pick"] == list(commands)
+    assert not commands._classes
+
+    cls = commands["cherry-pick"]
+    assert "CherryPick" == cls.__name__
+    assert "cherry-pick" == cls.NAME
+    assert ["cherry-pick"] == list(commands._classes)
+    # Aliases report the name of the command they implement.
+    assert "branches" == commands["branch"].NAME
+
+    del commands["branch"]
+    assert "branch" not in commands
+    assert 1 == len(commands)
+
+
 @pytest.mark.parametrize("name", subcmds.all_commands.keys())
 def test_naming(name: str) -> None:
     """Verify we don't add things that we shouldn't."""
@@ -17,10 +17,14 @@
 import contextlib
 import io
 from pathlib import Path
+from unittest import mock
 
+import pytest
 import utils_for_test
 
+from local_sync_state import LocalSyncState
 import manifest_xml
+import spool
 import subcmds
 
 
@@ -105,3 +109,90 @@ def test_forall_all_projects_called_once(tmp_path: Path) -> None:
     line_count = sum(1 for x in output.splitlines() if x)
     # Verify that we didn't get more lines than expected.
     assert line_count == 8
+
+
+def test_output_streamer(tmp_path: Path) -> None:
+    """Test that spooled outputs are written out in order."""
+    path = tmp_path / "0"
+    output = spool.Spool(str(path))
+    small = b"x" * 10
+    output.write(small)
+    big = "é".encode("utf-8") * spool.MAX_MEMORY
+    output.write(big)
+    data, spilled = output.result()
+
+    streamer = subcmds.forall._OutputStreamer(str(tmp_path), True)
+    with contextlib.redirect_stdout(io.StringIO()) as stdout:
+        # Read part of the output while the "worker" is still running.
+        streamer.Tail(0)
+        streamer.Finish(0, data, spilled)
+        streamer.Finish(1, b"done\n", False)
+    assert stdout.getvalue() == (
+        (small + big).decode("utf-8") + "\n" + "\n" + "done\n"
+    )
+    assert not path.exists()
+
+
+def test_forall_changed_since(tmp_path: Path) -> None:
+    """Test that --changed-since-* limit the projects run."""
+    manifest = _create_manifest_with_8_projects(tmp_path)
+    projects = manifest.projects
+
+    state = LocalSyncState(manifest)
+    for proj in projects:
+        state.SetCheckoutTime(proj, "rev1")
+    state.Save()
+    state = LocalSyncState(manifest)
+    for i, proj in enumerate(projects):
+        state.SetCheckoutTime(proj, "rev2" if i < 2 else "rev1")
+    state.Save()
+
+    def run(argv):
+        cmd = subcmds.forall.Forall()
+        cmd.manifest = manifest
+        opts, args = cmd.OptionParser.parse_args(
+            argv + ["-c", "echo $REPO_PROJECT"]
+        )
+        opts.verbose = False
+        cmd.ValidateOptions(opts, args)
+        for proj in manifest.projects:
+            proj.revisionId = "refs/heads/main"
+        with contextlib.redirect_stdout(io.StringIO()) as stdout:
+            cmd.Execute(opts, args)
+        return stdout.getvalue().split()
+
+    assert run(["--changed-since-sync"]) == ["project1", "project2"]
+
+    # Unknown checkpoints select everything, and get recorded.
+    assert len(run(["--changed-since-checkpoint=ci", "--save-checkpoint=ci"]))
+    assert run(["--changed-since-checkpoint=ci"]) == []
+
+    state = LocalSyncState(manifest)
+    state.SetCheckoutTime(projects[4], "rev3")
+    state.Save()
+    assert run(["--changed-since-checkpoint=ci"]) == ["project5"]
+
+
+def test_forall_changed_since_manifest_multimanifest(tmp_path: Path) -> None:
+    """Test --changed-since-manifest is limited to one tree of a multi-tree."""
+    manifest = _create_manifest_with_8_projects(tmp_path)
+    cmd = subcmds.forall.Forall()
+    cmd.manifest = manifest
+
+    def validate(argv):
+        opts, args = cmd.OptionParser.parse_args(
+            argv + ["--changed-since-manifest=old.xml", "-c", "true"]
+        )
+        cmd.ValidateOptions(opts, args)
+
+    validate([])
+    with mock.patch.object(
+        manifest_xml.XmlManifest,
+        "is_multimanifest",
+        new_callable=mock.PropertyMock,
+        return_value=True,
+    ):
+        for argv in ([], ["--all-manifests"]):
+            with pytest.raises(SystemExit):
+                validate(argv)
+        validate(["--this-manifest-only"])
@@ -14,10 +14,19 @@
 
 """Unittests for the subcmds/gc.py module."""
 
+import os
+import shutil
+import subprocess
+import tempfile
 import unittest
 from unittest import mock
 
+import utils_for_test
+
+from git_command import GitCommandError
+import gitdir_registry
 from subcmds import gc
+import trash
 
 
 class GcCommand(unittest.TestCase):
@@ -41,6 +50,10 @@ class GcCommand(unittest.TestCase):
             self.cmd, "repack_projects", return_value=0
         ).start()
 
+        self.mock_empty_trash = mock.patch.object(
+            self.cmd, "_EmptyTrash"
+        ).start()
+
     def tearDown(self):
         mock.patch.stopall()
 
@@ -53,6 +66,7 @@ class GcCommand(unittest.TestCase):
         self.mock_get_projects.assert_called_once_with([], all_manifests=True)
         self.mock_delete.assert_called_once_with(["all_projects"], self.opt)
         self.mock_repack.assert_not_called()
+        self.mock_empty_trash.assert_called_once_with(self.opt)
 
     def test_gc_with_args(self):
         """Test gc with specific projects uses all_projects for delete."""
@@ -80,3 +94,134 @@ class GcCommand(unittest.TestCase):
         ret = self.cmd.Execute(self.opt, [])
         self.assertEqual(ret, 1)
         self.mock_repack.assert_not_called()
+
+
+class RepackProjects(unittest.TestCase):
+    """Tests for repacking projects."""
+
+    def test_thread_budget(self):
+        """Test the pack.threads budget is split between the jobs."""
+        manifest = mock.MagicMock()
+        manifest.globalConfig.GetInt.return_value = 8
+        cmd = gc.Gc(manifest=manifest)
+        opt, _ = cmd.OptionParser.parse_args(["--jobs=3"])
+        opt.quiet = True
+        project = mock.MagicMock(clone_depth=1)
+        project.config.GetBoolean.return_value = False
+        project.manifest.CloneFilterForDepth = "blob:none"
+        with mock.patch.object(cmd, "ExecuteInParallel") as execute:
+            cmd.repack_projects([project] * 2, opt)
+            self.assertEqual(2, execute.call_args[0][0])
+            self.assertEqual((4,), execute.call_args[0][1].args)
+
+            cmd.repack_projects([project] * 5, opt)
+            self.assertEqual(3, execute.call_args[0][0])
+            self.assertEqual((2,), execute.call_args[0][1].args)
+
+    def test_pack_objects(self):
+        """Test object lists are piped into a new pack."""
+        with utils_for_test.TempGitTree() as tempdir:
+            with open(os.path.join(tempdir, "file"), "w") as fp:
+                fp.write("data")
+            subprocess.check_call(["git", "add", "."], cwd=tempdir)
+            subprocess.check_call(["git", "commit", "-qm", "init"], cwd=tempdir)
+            project = mock.MagicMock(worktree=tempdir)
+            project.name = "project"
+            pack_dir = os.path.join(tempdir, ".git", "tmp_repo_repack")
+            os.mkdir(pack_dir)
+
+            gc._PackObjects(project, pack_dir, [["HEAD^{tree}"], ["HEAD"]], 1)
+            packs = [x for x in os.listdir(pack_dir) if x.endswith(".idx")]
+            self.assertEqual(1, len(packs))
+            objects = subprocess.check_output(
+                ["git", "show-index"],
+                stdin=open(os.path.join(pack_dir, packs[0]), "rb"),
+                cwd=tempdir,
+            )
+            # The commit, its tree & the file.
+            self.assertEqual(3, len(objects.splitlines()))
+
+            with self.assertRaises(GitCommandError):
+                gc._PackObjects(project, pack_dir, [["missing-ref"]], 1)
+
+
+class DeleteUnusedProjects(unittest.TestCase):
+    """Tests for deleting unused projects."""
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp(prefix="repo-tests")
+        self.repodir = os.path.join(self.tempdir, ".repo")
+        self.cmd = gc.Gc(repodir=self.repodir)
+        self.opt, _ = self.cmd.OptionParser.parse_args(["--yes", "--jobs=1"])
+        self.opt.quiet = True
+
+        self.used = mock.MagicMock(
+            gitdir=os.path.join(self.repodir, "projects", "used.git"),
+            objdir=os.path.join(self.repodir, "project-objects", "used.git"),
+        )
+        self.unused = [
+            os.path.join(self.repodir, "projects", "unused.git"),
+            os.path.join(self.repodir, "project-objects", "unused.git"),
+        ]
+        for path in [self.used.gitdir, self.used.objdir] + self.unused:
+            os.makedirs(os.path.join(path, "objects"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_scan(self):
+        """Test unused projects are found by scanning without a registry."""
+        with mock.patch("builtins.print"):
+            self.assertEqual(
+                0, self.cmd.delete_unused_projects([self.used], self.opt)
+            )
+        for path in self.unused:
+            self.assertFalse(os.path.exists(path))
+        self.assertEqual(
+            {self.used.gitdir, self.used.objdir},
+            gitdir_registry.Load(self.repodir),
+        )
+
+    def test_dryrun(self):
+        """Test a dry run only lists the unused projects."""
+        self.opt.dryrun = True
+        with mock.patch("builtins.print") as mock_print:
+            self.assertEqual(
+                0, self.cmd.delete_unused_projects([self.used], self.opt)
+            )
+        for path in self.unused:
+            self.assertTrue(os.path.exists(path))
+            mock_print.assert_any_call(f"\nWould have deleted {path}")
+
+    def test_registry(self):
+        """Test unused projects are found with the registry."""
+        gitdir_registry.Save(
+            self.repodir, [self.used.gitdir, self.used.objdir, self.unused[0]]
+        )
+        with mock.patch("builtins.print"), mock.patch.object(
+            gitdir_registry, "Scan"
+        ) as scan:
+            self.cmd.delete_unused_projects([self.used], self.opt)
+        self.assertFalse(scan.called)
+        self.assertFalse(os.path.exists(self.unused[0]))
+        # Only registered directories are found.
+        self.assertTrue(os.path.exists(self.unused[1]))
+
+    def test_interrupted(self):
+        """Test deleted projects are only moved to the trash in a pinch."""
+        with mock.patch("builtins.print"), mock.patch.object(
+            trash, "Reap"
+        ) as reap:
+            self.cmd.delete_unused_projects([self.used], self.opt)
+        self.assertTrue(reap.called)
+        self.assertTrue(trash.HasTrash(self.repodir))
+        for path in self.unused:
+            self.assertFalse(os.path.exists(path))
+
+        self.opt.this_manifest_only = False
+        self.opt.repack = False
+        with mock.patch("builtins.print"), mock.patch.object(
+            self.cmd, "GetProjects", return_value=[self.used]
+        ):
+            self.cmd.Execute(self.opt, [])
+        self.assertFalse(trash.HasTrash(self.repodir))
@@ -0,0 +1,117 @@
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unittests for the subcmds/grep.py module."""
+
+import contextlib
+import io
+import os
+from pathlib import Path
+import subprocess
+from unittest import mock
+
+import spool
+import subcmds.grep
+
+
+def _CreateProject(path: Path, name: str, lines: int) -> mock.MagicMock:
+    """Create a git checkout with a file of |lines| matching lines."""
+    path.mkdir()
+    subprocess.check_call(["git", "init", "-q"], cwd=path)
+    (path / "file.txt").write_text(
+        "".join(f"match {i}\n" for i in range(lines))
+    )
+    subprocess.check_call(["git", "add", "."], cwd=path)
+    project = mock.MagicMock(worktree=str(path))
+    project.name = name
+    project.RelPath.return_value = name
+    return project
+
+
+def _Grep(projects, spool_dir, max_results=None):
+    """Run a serial grep over |projects| & return (results, stdout)."""
+    cmd = subcmds.grep.Grep
+    opt = mock.MagicMock(max_results=max_results, this_manifest_only=False)
+    cmd_argv = ["grep", "--cached", "--full-name", "-e", "match", "--"]
+    out = mock.MagicMock()
+    out.project.side_effect = lambda x: print(x, end="")
+    out.write.side_effect = lambda fmt, *args: print(fmt % args, end="")
+    out.nl.side_effect = print
+    with cmd.ParallelContext():
+        cmd.get_parallel_context()["projects"] = projects
+        cmd.get_parallel_context()["spool_dir"] = spool_dir
+        with contextlib.redirect_stdout(io.StringIO()) as stdout:
+            results = cmd._ProcessResults(
+                True,
+                False,
+                opt,
+                projects,
+                spool_dir,
+                None,
+                out,
+                (
+                    cmd._ExecuteOne(cmd_argv, None, max_results, i)
+                    for i in range(len(projects))
+                ),
+            )
+    return results, stdout.getvalue()
+
+
+def test_count_results() -> None:
+    """Check separator lines are not counted."""
+    lines = [b"a", b"--", b"\x1b[36m--\x1b[m", b"b", b"---"]
+    assert subcmds.grep._CountResults(lines) == 3
+
+
+def test_grep_streams_results(tmp_path: Path) -> None:
+    """Check results of every project are shown in order."""
+    projects = [
+        _CreateProject(tmp_path / "a", "a", 2),
+        _CreateProject(tmp_path / "b", "b", 1),
+    ]
+    with spool.SpoolDir("repo-grep-test-") as spool_dir:
+        results, stdout = _Grep(projects, spool_dir)
+        assert not os.listdir(spool_dir)
+    assert results == (False, False, True, [])
+    assert stdout.splitlines() == [
+        "a/file.txt:match 0",
+        "a/file.txt:match 1",
+        "b/file.txt:match 0",
+    ]
+
+
+def test_grep_max_results(tmp_path: Path) -> None:
+    """Check the search stops at the limit across projects."""
+    projects = [
+        _CreateProject(tmp_path / "a", "a", 2),
+        _CreateProject(tmp_path / "b", "b", 2),
+        _CreateProject(tmp_path / "c", "c", 2),
+    ]
+    # Make sure the limit works on output that was spilled to disk.
+    with mock.patch.object(spool, "MAX_MEMORY", 0):
+        with spool.SpoolDir("repo-grep-test-") as spool_dir:
+            with mock.patch.object(
+                subcmds.grep.Grep,
+                "_ExecuteOne",
+                wraps=subcmds.grep.Grep._ExecuteOne,
+            ) as execute:
+                results, stdout = _Grep(projects, spool_dir, max_results=3)
+    assert results == (False, False, True, [])
+    assert stdout.splitlines() == [
+        "a/file.txt:match 0",
+        "a/file.txt:match 1",
+        "b/file.txt:match 0",
+    ]
+    # The last project was never searched.
+    assert execute.call_count == 2
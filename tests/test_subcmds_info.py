@@ -19,6 +19,7 @@ from unittest import mock
 
 import pytest
 
+import git_async
 from subcmds import info
 
 
@@ -202,7 +203,7 @@ def test_text_enables_pager() -> None:
 
 
 def test_get_project_data_uses_head_revision() -> None:
-    """_getProjectData should use GetHeadRevisionId if available."""
+    """_getProjectData should use GetHeadRevisionIdAsync if available."""
     cmd = _get_cmd()
     project = mock.MagicMock()
     project.name = "foo"
@@ -210,18 +211,21 @@ def test_get_project_data_uses_head_revision() -> None:
     project.revisionExpr = "refs/heads/main"
     project.GetBranches.return_value = []
 
-    # GetHeadRevisionId() returns a SHA, it should be used.
-    project.GetHeadRevisionId.return_value = "head_sha_12345"
+    # GetHeadRevisionIdAsync() returns a SHA, it should be used.
+    project.GetHeadRevisionIdAsync = mock.AsyncMock(
+        return_value="head_sha_12345"
+    )
+    project.bare_ref.LoadAsync = mock.AsyncMock()
     project.GetRevisionId.return_value = "manifest_sha_54321"
 
-    data = cmd._getProjectData(project)
+    (data,) = git_async.Map(cmd._getProjectData, [project])
     assert data["current_revision"] == "head_sha_12345"
-    project.GetHeadRevisionId.assert_called_once()
+    project.GetHeadRevisionIdAsync.assert_awaited_once()
 
-    # GetHeadRevisionId() is None, fall back to GetRevisionId().
-    project.GetHeadRevisionId.reset_mock()
-    project.GetHeadRevisionId.return_value = None
-    data = cmd._getProjectData(project)
+    # GetHeadRevisionIdAsync() is None, fall back to GetRevisionId().
+    project.GetHeadRevisionIdAsync.reset_mock()
+    project.GetHeadRevisionIdAsync.return_value = None
+    (data,) = git_async.Map(cmd._getProjectData, [project])
     assert data["current_revision"] == "manifest_sha_54321"
 
 
@@ -229,14 +233,16 @@ def test_json_with_projects(capsys) -> None:
     """--format=json should emit project data."""
     cmd = _get_cmd()
     opts, args = cmd.OptionParser.parse_args(["--format=json"])
-    opts.jobs = 1  # To avoid multiprocessing pickle issues with mocks
 
     project = mock.MagicMock()
     project.name = "foo"
     project.worktree = "/path/to/foo"
     project.revisionExpr = "refs/heads/main"
     project.GetBranches.return_value = {"branch1": mock.MagicMock()}
-    project.GetHeadRevisionId.return_value = "head_sha_12345"
+    project.GetHeadRevisionIdAsync = mock.AsyncMock(
+        return_value="head_sha_12345"
+    )
+    project.bare_ref.LoadAsync = mock.AsyncMock()
     project.CurrentBranch = "branch1"
 
     cmd.GetProjects = mock.MagicMock(return_value=[project])
@@ -253,3 +259,16 @@ def test_json_with_projects(capsys) -> None:
     assert project_data["manifest_revision"] == "refs/heads/main"
     assert project_data["local_branches"] == ["branch1"]
     assert project_data["current_branch"] == "branch1"
+
+
+@pytest.mark.parametrize(
+    "argv, jobs", (([], info.DEFAULT_LOCAL_JOBS), (["-j32"], 32))
+)
+def test_overview_jobs(argv, jobs) -> None:
+    """-o should run its default jobs, unless -j is given."""
+    cmd = _get_cmd()
+    cmd.GetProjects = mock.MagicMock(return_value=[])
+    opts, args = cmd.OptionParser.parse_args(argv + ["-o"])
+    with mock.patch.object(cmd, "ExecuteInParallel") as execute:
+        cmd._printCommitOverview(opts, args)
+    assert execute.call_args[0][0] == jobs
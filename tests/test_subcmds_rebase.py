@@ -0,0 +1,100 @@
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unittests for the subcmds/rebase.py module."""
+
+from unittest import mock
+
+import pytest
+
+from subcmds import rebase
+
+
+def _MakeProject(name, branch="work", upstream="refs/remotes/origin/main"):
+    project = mock.MagicMock()
+    project.name = name
+    project.CurrentBranch = branch
+    project.GetBranch.return_value.LocalMerge = upstream
+    project.RelPath.return_value = name
+    return project
+
+
+def _FakeGitCommand(failures):
+    """Fake GitCommand, failing the rebase of the projects in |failures|."""
+
+    def _GitCommand(project, cmdv, capture_stdout=False, merge_output=False):
+        p = mock.MagicMock()
+        p.Wait.return_value = 1 if project.name in failures else 0
+        p.stdout = (
+            f"{project.name}: {' '.join(cmdv)}\n" if capture_stdout else None
+        )
+        return p
+
+    return _GitCommand
+
+
+@pytest.fixture
+def cmd() -> rebase.Rebase:
+    cmd = rebase.Rebase(manifest=mock.MagicMock())
+    cmd.manifest.manifestProject.config.GetString.return_value = "never"
+    with mock.patch.object(cmd, "git_event_log"):
+        yield cmd
+
+
+def test_rebase_one_captures_output(cmd: rebase.Rebase) -> None:
+    """Each project's output is buffered when running in parallel."""
+    opt, _ = cmd.OptionParser.parse_args(["--auto-stash"])
+    projects = [_MakeProject("a"), _MakeProject("b", branch=None)]
+    config = cmd.manifest.manifestProject.config
+    with cmd.ParallelContext(), mock.patch.object(
+        rebase, "GitCommand", side_effect=_FakeGitCommand({"a"})
+    ):
+        cmd.get_parallel_context()["projects"] = projects
+        result = cmd._RebaseOne(opt, ["rebase"], True, config, 0)
+        assert not result.skipped
+        assert result.failed
+        assert result.output.splitlines() == [
+            "project a: rebasing work -> refs/remotes/origin/main",
+            "a: update-index --refresh -q",
+            "a: stash",
+        ]
+
+        result = cmd._RebaseOne(opt, ["rebase"], True, config, 1)
+        assert result.skipped == "has a detached HEAD"
+
+
+def test_failures_dont_stop_others(cmd: rebase.Rebase) -> None:
+    """A failed rebase doesn't stop the other projects."""
+    opt, _ = cmd.OptionParser.parse_args(["--jobs=1"])
+    opt.quiet = False
+    projects = [_MakeProject(x) for x in "abc"]
+    git = mock.MagicMock(side_effect=_FakeGitCommand({"a"}))
+    with mock.patch.object(
+        cmd, "GetProjects", return_value=projects
+    ), mock.patch.object(rebase, "GitCommand", git):
+        assert cmd.Execute(opt, []) == 1
+    assert [x.args[0].name for x in git.call_args_list] == ["a", "b", "c"]
+
+
+def test_fail_fast(cmd: rebase.Rebase) -> None:
+    """--fail-fast stops at the first failure."""
+    opt, _ = cmd.OptionParser.parse_args(["--fail-fast", "--jobs=4"])
+    opt.quiet = False
+    projects = [_MakeProject(x) for x in "abc"]
+    git = mock.MagicMock(side_effect=_FakeGitCommand({"a"}))
+    with mock.patch.object(
+        cmd, "GetProjects", return_value=projects
+    ), mock.patch.object(rebase, "GitCommand", git):
+        assert cmd.Execute(opt, []) == 1
+    assert [x.args[0].name for x in git.call_args_list] == ["a"]
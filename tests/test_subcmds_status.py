@@ -84,13 +84,15 @@ def _init_temp_git_tree(git_dir: Path) -> None:
     subprocess.check_call(["git", "commit", "-q", "-m", "init"], cwd=git_dir)
 
 
-def _run_status(manifest: manifest_xml.XmlManifest, argv: List[str]) -> None:
+def _run_status(
+    manifest: manifest_xml.XmlManifest, argv: List[str], jobs: int = 1
+) -> None:
     """Run the status subcommand with parsed options against a test manifest."""
     cmd = subcmds.status.Status()
     cmd.manifest = manifest
     cmd.client = mock.MagicMock(globalConfig=manifest.globalConfig)
 
-    opts, args = cmd.OptionParser.parse_args(argv + ["--jobs=1"])
+    opts, args = cmd.OptionParser.parse_args(argv + [f"--jobs={jobs}"])
     cmd.CommonValidateOptions(opts, args)
 
     cmd.Execute(opts, args)
@@ -451,3 +453,45 @@ def test_status_branch_synced_no_ahead_behind(
     lines = _status_lines(stdout.getvalue())
     assert len(lines) == 1
     _assert_project_header(lines[0], project_path, "synced")
+
+
+def test_status_split_across_processes(
+    repo_client_checkout: Tuple[Path, manifest_xml.XmlManifest],
+) -> None:
+    """Verify the output stays in order when worker processes share it out."""
+    topdir, manifest = repo_client_checkout
+    names = ["proj", "proj1", "proj2"]
+    (topdir / ".repo" / manifest_xml.MANIFEST_FILE_NAME).write_text(
+        """
+            <manifest>
+                <remote name="origin" fetch="http://localhost" />
+                <default remote="origin" revision="refs/heads/main" />
+                %s
+            </manifest>
+        """
+        % "".join(f'<project name="{x}" path="src/{x}" />' for x in names),
+        encoding="utf-8",
+    )
+    for name in names[1:]:
+        (topdir / ".repo" / "projects" / "src" / f"{name}.git").mkdir()
+        (topdir / ".repo" / "project-objects" / f"{name}.git").mkdir()
+        _init_temp_git_tree(topdir / "src" / name)
+    for name in names:
+        (topdir / "src" / name / "README").write_text("updated")
+
+    cmd = subcmds.status.Status
+    with mock.patch.object(
+        subcmds.status, "DEFAULT_LOCAL_JOBS", 2
+    ), mock.patch.object(
+        cmd, "ExecuteInParallel", wraps=cmd.ExecuteInParallel
+    ) as execute, contextlib.redirect_stdout(
+        io.StringIO()
+    ) as stdout:
+        _run_status(manifest, [], jobs=4)
+
+    assert execute.call_args[0][0] == 2
+    lines = _status_lines(stdout.getvalue())
+    assert len(lines) == 6
+    for i, name in enumerate(names):
+        _assert_project_header(lines[i * 2], f"src/{name}", "main")
+        assert lines[i * 2 + 1] == " -m\tREADME"
@@ -26,6 +26,7 @@ import pytest
 import command
 from error import GitError
 from error import RepoExitError
+import git_maintenance
 from project import SyncNetworkHalfResult
 from subcmds import sync
 
@@ -333,6 +334,46 @@ class LocalSyncState(unittest.TestCase):
         self.assertIsNone(self.state.GetFetchTime(projB))
         self.assertEqual(self.state.GetFetchTime(projA), 5)
 
+    def test_changed_in_last_sync(self):
+        """Revision changes of the latest sync are detected."""
+        projA = mock.MagicMock(relpath="projA")
+        projB = mock.MagicMock(relpath="projB")
+        projC = mock.MagicMock(relpath="projC")
+        self.state.SetCheckoutTime(projA, "a1")
+        self.state.SetCheckoutTime(projB, "b1")
+        self.state.SetCheckoutTime(projC, "c1")
+        self.state.Save()
+
+        self.state = self._new_state(self._TIME + 1)
+        self.state.SetCheckoutTime(projA, "a2")
+        self.state.SetCheckoutTime(projB, "b1")
+        self.state.Save()
+        self.assertEqual(self.state.GetRevision(projA), "a2")
+        self.assertTrue(self.state.ChangedInLastSync(projA))
+        self.assertFalse(self.state.ChangedInLastSync(projB))
+        # projC changed in an older sync, not the latest one.
+        self.assertFalse(self.state.ChangedInLastSync(projC))
+        # Unknown projects are assumed to have changed.
+        self.assertTrue(
+            self.state.ChangedInLastSync(mock.MagicMock(relpath="projD"))
+        )
+
+    def test_checkpoints(self):
+        """Checkpoints record & merge revisions."""
+        projA = mock.MagicMock(relpath="projA")
+        projB = mock.MagicMock(relpath="projB")
+        self.state.SetCheckoutTime(projA, "a1")
+        self.state.SetCheckoutTime(projB, "b1")
+        self.assertIsNone(self.state.GetCheckpoint("ci"))
+
+        self.state.SaveCheckpoint("ci", [projA])
+        self.assertEqual(self.state.GetCheckpoint("ci"), {"projA": "a1"})
+        self.state.SaveCheckpoint("ci", [projB])
+        self.assertEqual(
+            self._new_state().GetCheckpoint("ci"),
+            {"projA": "a1", "projB": "b1"},
+        )
+
 
 class FakeProject:
     def __init__(self, relpath, name=None, objdir=None):
@@ -348,6 +389,8 @@ class FakeProject:
         self.manifest.GetProjectsWithName.return_value = [self]
         self.config = mock.MagicMock()
         self.EnableRepositoryExtension = mock.MagicMock()
+        self.bare_ref = mock.MagicMock(all={})
+        self.GetRevisionId = mock.MagicMock(return_value="1234abcd")
 
     def RelPath(self, local=None):
         return self.relpath
@@ -611,36 +654,82 @@ class CheckForBloatedProjects(unittest.TestCase):
         self.cmd._CheckForBloatedProjects([self.project], self.opt)
         self.assertFalse(self.cmd.git_event_log.ErrorEvent.called)
 
-    @mock.patch("subcmds.sync.git_require")
-    def test_no_projects(self, mock_git_require):
-        """Test that it returns early if no projects have clone_depth."""
-        mock_git_require.return_value = True
-        self.project.clone_depth = None
-        self.cmd._CheckForBloatedProjects([self.project], self.opt)
-        self.assertFalse(self.cmd.git_event_log.ErrorEvent.called)
-
     @mock.patch("subcmds.sync.git_require")
     @mock.patch("subcmds.sync.Progress")
     def test_bloated_project_found(self, mock_progress, mock_git_require):
         """Test that it adds project to _bloated_projects."""
         mock_git_require.return_value = True
+        self.cmd._local_sync_state = mock.MagicMock()
+        self.cmd._local_sync_state.GetCheckoutTime.return_value = None
 
-        self.cmd.get_parallel_context = mock.Mock(
-            return_value={"projects": [self.project]}
+        stats = git_maintenance.ObjectStats(
+            0, 11, 11 * 1024 * 1024 * 1024, 0, 0, 0
         )
+        with mock.patch.object(
+            git_maintenance, "ReadObjectStats", return_value=stats
+        ):
+            self.cmd._CheckForBloatedProjects([self.project], self.opt)
+        self.assertEqual(self.cmd._bloated_projects, ["project"])
 
-        def mock_execute_in_parallel(
-            jobs, func, work_items, callback, **kwargs
+        self.cmd._bloated_projects = []
+        stats = git_maintenance.ObjectStats(0, 11, 1024, 0, 0, 0)
+        with mock.patch.object(
+            git_maintenance, "ReadObjectStats", return_value=stats
         ):
-            callback(None, mock.Mock(), ["project"])
-            return True
+            self.cmd._CheckForBloatedProjects([self.project], self.opt)
+        self.assertEqual(self.cmd._bloated_projects, [])
 
-        self.cmd.ExecuteInParallel = mock_execute_in_parallel
+    @mock.patch("subcmds.sync.git_require")
+    @mock.patch("subcmds.sync.Progress")
+    def test_garbage(self, mock_progress, mock_git_require):
+        """Test that garbage is found without running git."""
+        mock_git_require.return_value = True
+        self.cmd._local_sync_state = mock.MagicMock()
+        self.cmd._local_sync_state.GetCheckoutTime.return_value = None
+        with tempfile.TemporaryDirectory() as tempdir:
+            pack_dir = os.path.join(tempdir, "objects", "pack")
+            os.makedirs(pack_dir)
+            with open(os.path.join(pack_dir, "tmp_pack_123"), "wb") as fp:
+                fp.truncate(2 * 1024 * 1024 * 1024)
+            self.project.objdir = tempdir
+            self.cmd._CheckForBloatedProjects([self.project], self.opt)
+        self.assertEqual(self.cmd._bloated_projects, ["project"])
 
-        with mock.patch.object(self.cmd, "ParallelContext"):
+    @mock.patch("subcmds.sync.git_require")
+    @mock.patch("subcmds.sync.Progress")
+    def test_unmodified_project(self, mock_progress, mock_git_require):
+        """Test that projects left as sync checked them out are skipped."""
+        mock_git_require.return_value = True
+        self.cmd._local_sync_state = mock.MagicMock()
+        self.cmd._local_sync_state.GetCheckoutTime.return_value = time.time()
+        self.cmd._local_sync_state.GetRevision.return_value = "1234"
+        self.project.gitdir = "gitdir"
+        with mock.patch.object(
+            sync, "ReadHead", return_value="1234"
+        ), mock.patch.object(git_maintenance, "ReadObjectStats") as mock_read:
             self.cmd._CheckForBloatedProjects([self.project], self.opt)
+        self.assertFalse(mock_read.called)
 
-        self.assertEqual(self.cmd._bloated_projects, ["project"])
+        stats = git_maintenance.ObjectStats(0, 0, 0, 0, 0, 0)
+        with mock.patch.object(
+            sync, "ReadHead", return_value="5678"
+        ), mock.patch.object(
+            git_maintenance, "ReadObjectStats", return_value=stats
+        ) as mock_read:
+            self.cmd._CheckForBloatedProjects([self.project], self.opt)
+        self.assertTrue(mock_read.called)
+
+    @mock.patch("subcmds.sync.git_require")
+    @mock.patch("subcmds.sync.Progress")
+    def test_full_clone_excluded(self, mock_progress, mock_git_require):
+        """Test that projects that aren't shallow are excluded."""
+        mock_git_require.return_value = True
+        self.project.clone_depth = None
+
+        with mock.patch.object(self.cmd, "_CheckOneBloatedProject") as check:
+            self.cmd._CheckForBloatedProjects([self.project], self.opt)
+
+        self.assertFalse(check.called)
 
     @mock.patch("subcmds.sync.git_require")
     @mock.patch("subcmds.sync.Progress")
@@ -649,12 +738,10 @@ class CheckForBloatedProjects(unittest.TestCase):
         mock_git_require.return_value = True
         self.project.stateless_prune_needed = True
 
-        self.cmd.ExecuteInParallel = mock.Mock()
-
-        with mock.patch.object(self.cmd, "ParallelContext"):
+        with mock.patch.object(self.cmd, "_CheckOneBloatedProject") as check:
             self.cmd._CheckForBloatedProjects([self.project], self.opt)
 
-        self.assertFalse(self.cmd.ExecuteInParallel.called)
+        self.assertFalse(check.called)
         self.assertEqual(self.cmd._bloated_projects, [])
 
 
@@ -686,10 +773,74 @@ class GCProjectsTest(unittest.TestCase):
             mock_set_state.assert_called_once_with(self.project, self.opt)
         self.assertFalse(self.project.bare_git.gc.called)
 
+    @mock.patch("subcmds.sync.Progress")
+    def test_GCProjects_maintenance(self, mock_progress):
+        """Test the largest projects are maintained first."""
+        small = mock.MagicMock(objdir="small", gitdir="small")
+        big = mock.MagicMock(objdir="big", gitdir="big")
+        shared = mock.MagicMock(objdir="big", gitdir="shared")
+        clean = mock.MagicMock(objdir="clean", gitdir="clean")
+        plans = {
+            "small": git_maintenance.MaintenancePlan(1, ["commit-graph"]),
+            "big": git_maintenance.MaintenancePlan(2, ["commit-graph"]),
+            "clean": git_maintenance.MaintenancePlan(3, []),
+        }
+        with mock.patch.object(
+            sync.Sync, "_SetPreciousObjectsState"
+        ), mock.patch.object(
+            sync, "git_require", return_value=True
+        ), mock.patch.object(
+            git_maintenance,
+            "PlanMaintenance",
+            side_effect=lambda p: plans[p.objdir],
+        ), mock.patch.object(
+            git_maintenance, "RunMaintenance"
+        ) as mock_run:
+            self.cmd._GCProjects([small, big, shared, clean], self.opt, None)
+        self.assertEqual(
+            [
+                mock.call(big, ["commit-graph"], config=None),
+                mock.call(small, ["commit-graph"], config=None),
+                mock.call(shared, ["pack-refs"], config=None),
+            ],
+            mock_run.call_args_list,
+        )
+        self.assertFalse(big.bare_git.gc.called)
+
+    @mock.patch("subcmds.sync.Progress")
+    def test_GCProjects_shared_pack_refs(self, mock_progress):
+        """Test the refs of every project sharing an objdir are packed."""
+        first = mock.MagicMock(objdir="objdir", gitdir="first")
+        second = mock.MagicMock(objdir="objdir", gitdir="second")
+        alone = mock.MagicMock(objdir="alone", gitdir="alone.git")
+        for project, precious in ((first, True), (second, True), (alone, None)):
+            project.config.GetBoolean.return_value = precious
+        with mock.patch.object(
+            sync.Sync, "_SetPreciousObjectsState"
+        ), mock.patch.object(
+            sync, "git_require", return_value=True
+        ), mock.patch.object(
+            git_maintenance,
+            "PlanMaintenance",
+            return_value=git_maintenance.MaintenancePlan(1, []),
+        ), mock.patch.object(
+            git_maintenance, "RunMaintenance"
+        ) as mock_run:
+            self.cmd._GCProjects([first, second, alone], self.opt, None)
+        self.assertEqual(
+            [
+                mock.call(first, ["pack-refs"], config=None),
+                mock.call(second, ["pack-refs"], config=None),
+            ],
+            mock_run.call_args_list,
+        )
+
     @mock.patch("subcmds.sync.Progress")
     def test_GCProjects_sequential(self, mock_progress):
-        """Test sequential GC (jobs < 2)."""
-        with mock.patch.object(sync.Sync, "_SetPreciousObjectsState"):
+        """Test sequential GC (jobs < 2) with old versions of git."""
+        with mock.patch.object(
+            sync.Sync, "_SetPreciousObjectsState"
+        ), mock.patch.object(sync, "git_require", return_value=False):
             self.cmd._GCProjects([self.project], self.opt, None)
         self.project.bare_git.gc.assert_called_once_with(
             "--auto", config={"gc.autoDetach": "false"}
@@ -702,7 +853,9 @@ class GCProjectsTest(unittest.TestCase):
     def test_GCProjects_parallel(self, mock_progress):
         """Test parallel GC (jobs >= 2)."""
         self.opt.jobs = 2
-        with mock.patch.object(sync.Sync, "_SetPreciousObjectsState"):
+        with mock.patch.object(
+            sync.Sync, "_SetPreciousObjectsState"
+        ), mock.patch.object(sync, "git_require", return_value=False):
             with mock.patch("subcmds.sync._threading.Thread") as mock_thread:
                 mock_t = mock.MagicMock()
                 mock_thread.return_value = mock_t
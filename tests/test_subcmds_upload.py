@@ -14,6 +14,9 @@
 
 """Unittests for the subcmds/upload.py module."""
 
+import collections
+import threading
+import time
 from unittest import mock
 
 import pytest
@@ -44,7 +47,7 @@ def cmd() -> upload.Upload:
 def test_UploadAndReport_UploadError(cmd: upload.Upload) -> None:
     """Check UploadExitError raised when UploadError encountered."""
     opt, _ = cmd.OptionParser.parse_args([])
-    with mock.patch.object(cmd, "_UploadBranch", side_effect=UploadError("")):
+    with mock.patch.object(cmd, "_PrepareBranch", side_effect=UploadError("")):
         with pytest.raises(upload.UploadExitError):
             cmd._UploadAndReport(opt, [mock.MagicMock()], _STUB_PEOPLE)
 
@@ -52,7 +55,7 @@ def test_UploadAndReport_UploadError(cmd: upload.Upload) -> None:
 def test_UploadAndReport_GitError(cmd: upload.Upload) -> None:
     """Check UploadExitError raised when GitError encountered."""
     opt, _ = cmd.OptionParser.parse_args([])
-    with mock.patch.object(cmd, "_UploadBranch", side_effect=GitError("")):
+    with mock.patch.object(cmd, "_PrepareBranch", side_effect=GitError("")):
         with pytest.raises(upload.UploadExitError):
             cmd._UploadAndReport(opt, [mock.MagicMock()], _STUB_PEOPLE)
 
@@ -60,6 +63,44 @@ def test_UploadAndReport_GitError(cmd: upload.Upload) -> None:
 def test_UploadAndReport_UnhandledError(cmd: upload.Upload) -> None:
     """Check UnexpectedError passed through."""
     opt, _ = cmd.OptionParser.parse_args([])
-    with mock.patch.object(cmd, "_UploadBranch", side_effect=UnexpectedError):
+    with mock.patch.object(cmd, "_PrepareBranch", side_effect=UnexpectedError):
         with pytest.raises(UnexpectedError):
             cmd._UploadAndReport(opt, [mock.MagicMock()], _STUB_PEOPLE)
+
+
+def test_UploadAndReport_parallel(cmd: upload.Upload) -> None:
+    """Check branches are pushed in parallel within the per-server limit."""
+    opt, _ = cmd.OptionParser.parse_args(["--jobs=8"])
+    lock = threading.Lock()
+    active = collections.Counter()
+    most_active = collections.Counter()
+
+    def _MakeBranch(review, name, fail=False):
+        branch = mock.MagicMock()
+        branch.name = name
+        branch.project.remote.review = review
+        branch.project.config.GetInt.return_value = 2
+
+        def _Upload(output, **kwargs):
+            with lock:
+                active[review] += 1
+                most_active[review] = max(most_active[review], active[review])
+            time.sleep(0.05)
+            output.write(f"pushed {name}\n")
+            with lock:
+                active[review] -= 1
+            if fail:
+                raise GitError("push failed")
+
+        branch.UploadForReview.side_effect = _Upload
+        return branch
+
+    todo = [_MakeBranch("a", f"a{i}") for i in range(6)]
+    todo += [_MakeBranch("b", "b0", fail=True), _MakeBranch("b", "b1")]
+    with mock.patch.object(cmd, "_PrepareBranch", return_value={}):
+        with pytest.raises(upload.UploadExitError):
+            cmd._UploadAndReport(opt, todo, _STUB_PEOPLE)
+
+    assert most_active["a"] == 2
+    assert [x.uploaded for x in todo] == [True] * 6 + [False, True]
+    assert isinstance(todo[6].error, GitError)
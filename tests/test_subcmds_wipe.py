@@ -20,6 +20,7 @@ import pytest
 
 import project
 from subcmds import wipe
+import trash
 
 
 def _create_mock_project(tempdir, name, objdir_path=None, has_changes=False):
@@ -35,8 +36,9 @@ def _create_mock_project(tempdir, name, objdir_path=None, has_changes=False):
     os.makedirs(gitdir, exist_ok=True)
     os.makedirs(objdir, exist_ok=True)
 
+    manifest = mock.MagicMock(repodir=os.path.join(tempdir, ".repo"))
     proj = project.Project(
-        manifest=mock.MagicMock(),
+        manifest=manifest,
         name=name,
         remote=mock.MagicMock(),
         gitdir=gitdir,
@@ -65,7 +67,7 @@ def _create_mock_project(tempdir, name, objdir_path=None, has_changes=False):
 
 def _run_wipe(all_projects, projects_to_wipe_names, options=None):
     """Helper to run the Wipe command with mocked projects."""
-    cmd = wipe.Wipe()
+    cmd = wipe.Wipe(repodir=all_projects[0].manifest.repodir)
     cmd.manifest = mock.MagicMock()
 
     def get_projects_mock(projects, all_manifests=False, **kwargs):
@@ -82,7 +84,9 @@ def _run_wipe(all_projects, projects_to_wipe_names, options=None):
     opts = cmd.OptionParser.parse_args(options + projects_to_wipe_names)[0]
     cmd.CommonValidateOptions(opts, projects_to_wipe_names)
     cmd.ValidateOptions(opts, projects_to_wipe_names)
-    cmd.Execute(opts, projects_to_wipe_names)
+    with mock.patch.object(trash, "StartReaper") as start_reaper:
+        cmd.Execute(opts, projects_to_wipe_names)
+    start_reaper.assert_called_once_with(cmd.repodir)
 
 
 def test_wipe_single_unshared_project(tmp_path):
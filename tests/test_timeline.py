@@ -0,0 +1,121 @@
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unittests for the timeline.py module."""
+
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from command import Command
+import git_command
+import timeline
+
+
+@pytest.fixture(autouse=True)
+def _reset_timeline():
+    timeline.Reset(True)
+    yield
+    timeline.Reset(False)
+
+
+class _Worker(Command):
+    """A command whose workers send their spans back."""
+
+    @classmethod
+    def Work(cls, idx):
+        with timeline.Span("work", idx=idx):
+            pass
+        return os.getpid(), timeline.Take()
+
+    @classmethod
+    def RunGit(cls, _idx):
+        git_command.GitCommand(None, ["--version"], capture_stdout=True).Wait()
+        return os.getpid()
+
+
+def test_disabled() -> None:
+    """Check nothing is recorded unless enabled."""
+    timeline.Reset(False)
+    with timeline.Span("span"):
+        pass
+    timeline.Add("add", 1, 2)
+    timeline.Extend([{"name": "worker"}])
+    assert timeline.Take() == []
+
+
+def test_write(tmp_path: Path) -> None:
+    """Check spans are written in the Chrome trace format."""
+    timeline.Add("span", 1.5, 2.0, cat="test", key="value")
+    path = tmp_path / "trace.json"
+    timeline.Write(str(path))
+
+    events = json.loads(path.read_text())["traceEvents"]
+    assert {
+        "name": "process_name",
+        "ph": "M",
+        "pid": os.getpid(),
+        "args": {"name": "repo"},
+    } in events
+    span = [x for x in events if x["ph"] == "X"]
+    assert len(span) == 1
+    assert span[0]["name"] == "span"
+    assert span[0]["cat"] == "test"
+    assert span[0]["ts"] == 1500000
+    assert span[0]["dur"] == 500000
+    assert span[0]["args"] == {"key": "value"}
+
+
+def test_git_command() -> None:
+    """Check git commands are recorded."""
+    git_command.GitCommand(None, ["--version"], capture_stdout=True).Wait()
+    (span,) = timeline.Take()
+    assert span["name"] == "git --version"
+    assert span["cat"] == "git"
+    assert span["args"]["argv"] == ["git", "--version"]
+    assert span["args"]["rc"] == 0
+
+
+def test_workers() -> None:
+    """Check spans of parallel workers make it back to the parent."""
+
+    def _Callback(pool, output, results):
+        for pid, events in results:
+            assert pid != os.getpid()
+            timeline.Extend(events)
+
+    with _Worker.ParallelContext():
+        _Worker.ExecuteInParallel(2, _Worker.Work, [1, 2], _Callback)
+
+    events = timeline.Take()
+    assert sorted(x["args"]["idx"] for x in events) == [1, 2]
+    assert all(x["pid"] != os.getpid() for x in events)
+
+
+def test_worker_git_commands() -> None:
+    """Check the git commands of parallel workers are recorded."""
+    pids = set()
+
+    def _Callback(pool, output, results):
+        pids.update(results)
+
+    with _Worker.ParallelContext():
+        _Worker.ExecuteInParallel(2, _Worker.RunGit, [1, 2], _Callback)
+
+    events = timeline.Take()
+    assert [x["name"] for x in events] == ["git --version"] * 2
+    assert {x["pid"] for x in events} == pids
+    assert os.getpid() not in pids
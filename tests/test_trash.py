@@ -0,0 +1,76 @@
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unittests for the trash.py module."""
+
+import errno
+import os
+from pathlib import Path
+from unittest import mock
+
+import platform_utils
+import trash
+
+
+def _MakeTree(path: Path) -> None:
+    (path / "sub").mkdir(parents=True)
+    (path / "sub" / "file").write_text("data")
+    (path / "link").symlink_to("sub")
+
+
+def test_delete_and_reap(tmp_path: Path) -> None:
+    """Trees are moved into the trash, and deleted when it is reaped."""
+    repodir = str(tmp_path / ".repo")
+    tree = tmp_path / "tree"
+    _MakeTree(tree)
+    (tmp_path / "file").write_text("data")
+
+    assert not trash.HasTrash(repodir)
+    trash.Delete(repodir, str(tree))
+    trash.Delete(repodir, str(tmp_path / "file"))
+    trash.Delete(repodir, str(tmp_path / "missing"))
+    assert not tree.exists()
+    assert not (tmp_path / "file").exists()
+    assert len(os.listdir(os.path.join(repodir, "trash"))) == 2
+
+    deleted = []
+    assert trash.Reap(repodir, callback=deleted.append)
+    assert len(deleted) == 2
+    assert not trash.HasTrash(repodir)
+
+
+def test_delete_fallback(tmp_path: Path) -> None:
+    """Trees that can't be moved are deleted right away."""
+    repodir = str(tmp_path / ".repo")
+    tree = tmp_path / "tree"
+    _MakeTree(tree)
+    with mock.patch.object(
+        platform_utils, "rename", side_effect=OSError(errno.EXDEV, "")
+    ):
+        trash.Delete(repodir, str(tree))
+    assert not tree.exists()
+    assert not trash.HasTrash(repodir)
+
+
+def test_reaper(tmp_path: Path) -> None:
+    """The background reaper empties the trash."""
+    repodir = str(tmp_path / ".repo")
+    assert trash.StartReaper(repodir) is None
+
+    tree = tmp_path / "tree"
+    _MakeTree(tree)
+    trash.Delete(repodir, str(tree))
+    reaper = trash.StartReaper(repodir)
+    assert reaper.wait() == 0
+    assert not trash.HasTrash(repodir)
@@ -0,0 +1,125 @@
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Record a timeline of where repo spends its time.
+
+Activated via `repo --trace-timeline FILE ...`.  The timeline is written in the
+Chrome Trace Event format, which chrome://tracing and https://ui.perfetto.dev
+can show.  Every span is a "complete" event, with the pid & thread of whoever
+recorded it, so work done by parallel workers shows up on their own rows.
+
+Spans are kept in memory by each process.  Workers hand theirs back to the
+parent with their results (see Take & Extend).
+
+Examples:
+  timeline.Enable()
+
+  with timeline.Span("manifest load", cat="sync"):
+      ...
+
+  # Worker:
+  return Result(..., timeline=timeline.Take())
+  # Parent:
+  timeline.Extend(result.timeline)
+
+  timeline.Write(path)
+"""
+
+import contextlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List
+
+
+_enabled = False
+_events = []
+
+
+def IsEnabled() -> bool:
+    """Whether spans are being recorded."""
+    return _enabled
+
+
+def Enable(enabled: bool = True) -> None:
+    """Start (or stop) recording spans."""
+    global _enabled
+    _enabled = enabled
+
+
+def Reset(enabled: bool) -> None:
+    """Drop all recorded spans, e.g. those a forked worker inherited."""
+    Enable(enabled)
+    _events.clear()
+
+
+def Add(name: str, start: float, finish: float, cat: str = "repo", **args):
+    """Record the span |name| from |start| to |finish| (as time.time())."""
+    if not _enabled:
+        return
+    _events.append(
+        {
+            "name": name,
+            "cat": cat,
+            "ph": "X",
+            "ts": int(start * 1e6),
+            "dur": int((finish - start) * 1e6),
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": args,
+        }
+    )
+
+
+@contextlib.contextmanager
+def Span(name: str, cat: str = "repo", **args):
+    """Record the span of the with block."""
+    if not _enabled:
+        yield
+        return
+    start = time.time()
+    try:
+        yield
+    finally:
+        Add(name, start, time.time(), cat=cat, **args)
+
+
+def Take() -> List[Dict[str, Any]]:
+    """Return the spans recorded so far, and forget them."""
+    events = _events[:]
+    del _events[: len(events)]
+    return events
+
+
+def Extend(events: Iterable[Dict[str, Any]]) -> None:
+    """Add spans that were recorded by another process."""
+    if _enabled and events:
+        _events.extend(events)
+
+
+def Write(path: str) -> None:
+    """Write all the spans to |path|."""
+    pid = os.getpid()
+    names = [
+        {
+            "name": "process_name",
+            "ph": "M",
+            "pid": x,
+            "args": {"name": "repo" if x == pid else f"repo worker {x}"},
+        }
+        for x in sorted({x["pid"] for x in _events} | {pid})
+    ]
+    with open(path, "w") as fp:
+        json.dump({"traceEvents": names + _events}, fp)
@@ -0,0 +1,169 @@
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Delete directory trees in the background.
+
+Deleting a big tree file by file takes a long time.  Instead, trees are
+renamed into .repo/trash/ (which is instant, and atomic), and the contents of
+the trash are deleted later: in parallel by a background reaper process, or by
+`repo gc`.  If repo is interrupted while deleting, whatever is left in the trash
+is deleted the next time it is reaped.
+
+Examples:
+  Delete(repodir, path)
+  ...
+  StartReaper(repodir)
+
+  # Or, to wait for it:
+  Reap(repodir, jobs=8)
+"""
+
+import concurrent.futures
+import itertools
+import os
+import subprocess
+import sys
+import time
+from typing import Callable, Optional
+
+import platform_utils
+
+
+_TRASH_DIR = "trash"
+
+# How many trees to delete at once by default.  Deleting is I/O bound.
+_DEFAULT_JOBS = 8
+
+_counter = itertools.count()
+
+
+def _TrashDir(repodir: str) -> str:
+    return os.path.join(repodir, _TRASH_DIR)
+
+
+def MoveToTrash(repodir: str, path: str) -> Optional[str]:
+    """Move |path| into the trash of |repodir|.
+
+    Returns:
+        Where |path| was moved to, or None if it couldn't be moved (e.g. it is
+        on a different file system).
+    """
+    trash_dir = _TrashDir(repodir)
+    dest = os.path.join(
+        trash_dir,
+        "%d-%d-%d-%s"
+        % (
+            time.time(),
+            os.getpid(),
+            next(_counter),
+            os.path.basename(os.path.normpath(path)),
+        ),
+    )
+    try:
+        os.makedirs(trash_dir, exist_ok=True)
+        platform_utils.rename(path, dest)
+    except OSError:
+        return None
+    return dest
+
+
+def Delete(repodir: str, path: str) -> None:
+    """Delete the tree at |path|.
+
+    The tree is moved into the trash if possible, and will be deleted when the
+    trash is reaped.  Otherwise it is deleted right away.
+    """
+    if not os.path.lexists(path):
+        return
+    if MoveToTrash(repodir, path) is None:
+        if platform_utils.isdir(path) and not platform_utils.islink(path):
+            platform_utils.rmtree(path)
+        else:
+            platform_utils.remove(path)
+
+
+def HasTrash(repodir: str) -> bool:
+    """Whether there is anything in the trash."""
+    try:
+        return bool(os.listdir(_TrashDir(repodir)))
+    except OSError:
+        return False
+
+
+def _DeleteOne(path: str) -> str:
+    if platform_utils.isdir(path) and not platform_utils.islink(path):
+        platform_utils.rmtree(path, ignore_errors=True)
+    else:
+        platform_utils.remove(path, missing_ok=True)
+    return path
+
+
+def Reap(
+    repodir: str,
+    jobs: Optional[int] = None,
+    callback: Optional[Callable[[str], None]] = None,
+) -> bool:
+    """Delete everything in the trash in parallel.
+
+    Args:
+        repodir: The .repo directory.
+        jobs: How many trees to delete at once.
+        callback: Called with the path of each tree once it is deleted.
+
+    Returns:
+        Whether the trash was emptied.
+    """
+    trash_dir = _TrashDir(repodir)
+    try:
+        paths = [os.path.join(trash_dir, x) for x in os.listdir(trash_dir)]
+    except OSError:
+        return True
+
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=jobs or _DEFAULT_JOBS
+    ) as executor:
+        for path in executor.map(_DeleteOne, paths):
+            if callback:
+                callback(path)
+
+    return not HasTrash(repodir)
+
+
+def StartReaper(repodir: str) -> Optional[subprocess.Popen]:
+    """Empty the trash in a background process that outlives repo."""
+    if not HasTrash(repodir):
+        return None
+
+    kwargs = {}
+    if platform_utils.isWindows():
+        kwargs["creationflags"] = (
+            subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+        )
+    else:
+        kwargs["start_new_session"] = True
+    try:
+        return subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), repodir],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            **kwargs,
+        )
+    except OSError:
+        # The next reap will take care of it.
+        return None
+
+
+if __name__ == "__main__":
+    Reap(sys.argv[1])